@@ -0,0 +1,194 @@
+"""
+Time the style passes of KFX to EPUB conversion.
+
+Without arguments, builds a synthetic novel (chapters of styled paragraphs with inline spans,
+the shape the content decoder leaves before style simplification) and times each style pass
+on it. Given KFX books, times the whole EPUB conversion of each one along with the time spent
+in the same style passes. Each result includes a digest of the generated XHTML and CSS so runs
+before and after a change can be checked for identical output.
+
+    python benchmarks/bench_epub_styles.py [--chapters N] [--paragraphs N] [--repeat N] [book.kfx ...]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+from lxml import etree
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib.epub_output import BookPart  # noqa: E402
+from kfxlib.yj_to_epub import KFX_EPUB  # noqa: E402
+
+STAGES = [
+    "update_default_font_and_language",
+    "set_html_defaults",
+    "fixup_styles_and_classes",
+    "create_css_files",
+]
+
+PARAGRAPH_STYLES = [
+    "-kfx-style-name: s%d; text-indent: 1.5em; margin-top: 0; margin-bottom: 0; "
+    "text-align: justify; line-height: 1.2lh; font-size: 1em" % i
+    for i in range(20)
+] + [
+    "-kfx-style-name: heading; -kfx-layout-hints: heading; -kfx-heading-level: 2; "
+    "font-size: 1.5em; font-weight: bold; text-align: center; margin-top: 2em",
+    "-kfx-style-name: first; text-indent: 0; margin-top: 1em; font-size: 1em",
+]
+
+SPAN_STYLES = [
+    "-kfx-style-name: italic; font-style: italic",
+    "-kfx-style-name: bold; font-weight: bold",
+    "-kfx-style-name: small; font-size: 0.8em; font-variant: small-caps",
+    "-kfx-style-name: link; -kfx-link-color: #0000ff; -kfx-visited-color: #0000ff",
+]
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+
+
+def synthetic_epub(chapters: int, paragraphs: int) -> KFX_EPUB:
+    rng = random.Random(0)
+    epub = KFX_EPUB.__new__(KFX_EPUB)
+    for base in KFX_EPUB.__bases__:
+        base.__init__(epub)
+
+    epub.book_has_illustrated_layout_conditional_page_template = False
+    epub.default_font_family = "serif"
+    epub.default_font_size = "1em"
+    epub.default_line_height = "normal"
+    epub.language = "en"
+    epub.writing_mode = "horizontal-tb"
+    epub.css_files.add(epub.STYLES_CSS_FILEPATH)
+
+    for chapter in range(chapters):
+        html = etree.Element("html")
+        body = etree.SubElement(html, "body")
+        section = etree.SubElement(
+            body, "div", style="-kfx-style-name: section; margin-left: 5%; margin-right: 5%"
+        )
+        heading = etree.SubElement(section, "div", style=PARAGRAPH_STYLES[-2])
+        etree.SubElement(heading, "span").text = "Chapter %d" % (chapter + 1)
+
+        for i in range(paragraphs):
+            para = etree.SubElement(
+                section, "div", style=PARAGRAPH_STYLES[-1] if i == 0 else rng.choice(PARAGRAPH_STYLES[:-2])
+            )
+            for _ in range(rng.randint(1, 4)):
+                span = etree.SubElement(para, "a" if rng.random() < 0.1 else "span", style=rng.choice(SPAN_STYLES))
+                span.text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 20)))
+
+        epub.book_parts.append(BookPart("/chapter%04d.xhtml" % chapter, chapter, html))
+
+    return epub
+
+
+def style_cache_stats(epub: KFX_EPUB) -> dict:
+    cache = epub.style_cache
+    return {"hits": cache.hits, "misses": cache.misses, "size": len(cache)}
+
+
+def output_digest(epub: KFX_EPUB) -> str:
+    digest = hashlib.sha256()
+    for book_part in epub.book_parts:
+        digest.update(etree.tostring(book_part.html))
+    digest.update(epub.oebps_files[epub.STYLES_CSS_FILEPATH].binary_data)
+    return digest.hexdigest()
+
+
+def bench_synthetic(chapters: int, paragraphs: int, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        epub = synthetic_epub(chapters, paragraphs)
+        stages = {}
+        for stage in STAGES:
+            start = time.perf_counter()
+            getattr(epub, stage)()
+            stages[stage] = round(time.perf_counter() - start, 4)
+
+        if best is None or sum(stages.values()) < sum(best[1].values()):
+            best = (epub, stages)
+
+    assert best is not None
+    epub, stages = best
+    return {
+        "chapters": chapters,
+        "paragraphs": paragraphs,
+        "elements": sum(1 for book_part in epub.book_parts for _ in book_part.html.iter()),
+        "seconds": round(sum(stages.values()), 4),
+        "stages": stages,
+        "style_cache": style_cache_stats(epub),
+        "sha256": output_digest(epub),
+    }
+
+
+def bench_book(filepath: str, repeat: int) -> dict:
+    from kfxlib.yj_book import YJ_Book
+
+    stage_seconds = {}
+    originals = {stage: getattr(KFX_EPUB, stage) for stage in STAGES}
+
+    def timed(stage):
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return originals[stage](self, *args, **kwargs)
+            finally:
+                stage_seconds[stage] += time.perf_counter() - start
+
+        return wrapper
+
+    best = None
+    for _ in range(repeat):
+        book = YJ_Book(filepath)
+        book.decode_book()
+        for stage in STAGES:
+            stage_seconds[stage] = 0.0
+            setattr(KFX_EPUB, stage, timed(stage))
+
+        try:
+            start = time.perf_counter()
+            epub = KFX_EPUB(book)
+            duration = time.perf_counter() - start
+        finally:
+            for stage, method in originals.items():
+                setattr(KFX_EPUB, stage, method)
+
+        if best is None or duration < best[1]:
+            best = (epub, duration, {stage: round(seconds, 4) for stage, seconds in stage_seconds.items()})
+
+    assert best is not None
+    epub, duration, stages = best
+    return {
+        "file": os.path.basename(filepath),
+        "elements": sum(1 for book_part in epub.book_parts for _ in book_part.html.iter()),
+        "seconds": round(duration, 4),
+        "stages": stages,
+        "style_cache": style_cache_stats(epub),
+        "sha256": output_digest(epub),
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--chapters", type=int, default=40)
+    argparser.add_argument("--paragraphs", type=int, default=250)
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument("files", nargs="*")
+    args = argparser.parse_args()
+
+    if args.files:
+        results = [bench_book(filepath, args.repeat) for filepath in args.files]
+    else:
+        results = bench_synthetic(args.chapters, args.paragraphs, args.repeat)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare EPUB zip output time and size for different compression settings.
+
+Builds a synthetic comic-shaped book (lots of incompressible image data plus some xhtml/css)
+and zips it with each combination of compress_level and store_compressed_media.
+
+    python benchmarks/bench_epub_zip.py [--pages N] [--image-kb N] [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib.epub_output import EPUB_Output  # noqa: E402
+
+
+def make_output(
+    pages: int, image_kb: int, compress_level: int | None, store_compressed_media: bool
+) -> EPUB_Output:
+    rng = random.Random(0)
+    output = EPUB_Output(
+        will_output=False,
+        compress_level=compress_level,
+        store_compressed_media=store_compressed_media,
+    )
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing"]
+    for i in range(pages):
+        text = " ".join(rng.choice(words) for _ in range(400))
+        xhtml = f'<html><body><div class="c{i % 7}"><p>{text}</p></div></body></html>'
+        output.add_oebps_file(
+            f"/part{i:04d}.xhtml", xhtml.encode("utf-8"), "application/xhtml+xml"
+        )
+        # random bytes are as incompressible as real jpeg data
+        jpeg = b"\xff\xd8\xff\xe0" + rng.randbytes(image_kb * 1024)
+        output.add_oebps_file(f"/image{i:04d}.jpg", jpeg, "image/jpeg")
+    css = "\n".join(f".c{i} {{margin: {i}em; text-indent: 0}}" for i in range(200))
+    output.add_oebps_file("/stylesheet.css", css.encode("utf-8"), "text/css")
+    return output
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--pages", type=int, default=300)
+    argparser.add_argument("--image-kb", type=int, default=400)
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+
+    results = []
+    for store_compressed_media in [False, True]:
+        for compress_level in [None, 1, 9]:
+            output = make_output(
+                args.pages, args.image_kb, compress_level, store_compressed_media
+            )
+            input_size = sum(len(f.binary_data) for f in output.oebps_files.values())
+            best = None
+            size = 0
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                size = len(output.zip_epub())
+                duration = time.perf_counter() - start
+                best = duration if best is None else min(best, duration)
+            assert best is not None
+            results.append(
+                {
+                    "compress_level": compress_level,
+                    "store_compressed_media": store_compressed_media,
+                    "seconds": round(best, 4),
+                    "mb_per_second": round(input_size / best / 1e6, 1),
+                    "input_bytes": input_size,
+                    "output_bytes": size,
+                }
+            )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Time and measure the peak memory of converting a fixed-layout comic to CBZ or PDF.
+
+Builds a synthetic comic (a KFX book with one JPEG page image per section) and converts it to CBZ,
+either returned in memory or written to a file, or to PDF. For PDF, the pages written directly into the
+PDF are compared with the previous method of making a PDF document of each image and appending them.
+Each conversion runs in a fresh process after the book is decoded, so the peak resident memory it
+reports is the increase caused by the conversion alone, shown next to the total size of the page
+images. The peak is read from /proc, so this runs on Linux only. Each result includes a digest of the
+page images stored so runs before and after a change can be checked for identical output.
+
+    python benchmarks/bench_image_book.py [--format cbz|pdf] [--pages N] [--width N] [--height N] [--output memory|file]
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib.ion import IonBLOB, IS  # noqa: E402
+from kfxlib.kfx_container import KfxContainer  # noqa: E402
+from kfxlib.resources import convert_image_to_pdf, pypdf  # noqa: E402
+from kfxlib.yj_book import YJ_Book  # noqa: E402
+from kfxlib.yj_container import YJFragment  # noqa: E402
+from kfxlib.yj_to_image_book import combine_images_into_pdf, KFX_IMAGE_BOOK  # noqa: E402
+from tests.kfx_synth import metadata_fragment, new_container, reading_order_fragment, struct  # noqa: E402
+
+DISTINCT_PAGES = 8
+
+
+def synthetic_pages(width: int, height: int) -> list:
+    rng = random.Random(0)
+    pages = []
+    for _ in range(DISTINCT_PAGES):
+        img = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(img)
+        for _ in range(width * height // 20000):
+            cx, cy, r = rng.randint(0, width), rng.randint(0, height), rng.randint(10, 200)
+            draw.ellipse(
+                (cx - r, cy - r, cx + r, cy + r), fill=tuple(rng.randint(0, 255) for _ in range(3)), outline="black", width=4)
+
+        outfile = io.BytesIO()
+        img.save(outfile, "JPEG", quality=90)
+        pages.append(outfile.getvalue())
+
+    return pages
+
+
+def synthetic_comic(pages: int, width: int, height: int) -> bytes:
+    page_images = synthetic_pages(width, height)
+    local_names = []
+    for page in range(pages):
+        local_names.extend(["section_%d" % page, "story_%d" % page, "image_%d" % page, "raw_%d" % page])
+
+    symtab, fragments = new_container(local_names, "CR!BENCH")
+    fragments.append(metadata_fragment([struct("$492", "title", "$307", "Synthetic comic")], fixed_layout=True))
+    fragments.append(reading_order_fragment(["section_%d" % page for page in range(pages)]))
+
+    eid = 1000
+    for page in range(pages):
+        image_name = IS("image_%d" % page)
+        story_name = IS("story_%d" % page)
+        fragments.append(YJFragment(ftype="$164", fid=image_name, value=struct(
+            "$175", image_name, "$161", IS("$285"), "$165", "raw_%d" % page, "$422", width, "$423", height)))
+        fragments.append(YJFragment(ftype="$417", fid=IS("raw_%d" % page), value=IonBLOB(
+            page_images[page % DISTINCT_PAGES])))
+
+        eid += 1
+        fragments.append(YJFragment(ftype="$259", fid=story_name, value=struct(
+            "$176", story_name, "$146", [struct("$155", eid, "$159", IS("$271"), "$175", image_name)])))
+
+        eid += 1
+        fragments.append(YJFragment(ftype="$260", fid=IS("section_%d" % page), value=struct(
+            "$174", IS("section_%d" % page),
+            "$141", [struct("$155", eid, "$159", IS("$270"), "$176", story_name, "$156", IS("$326"),
+                            "$66", width, "$67", height)])))
+
+    return KfxContainer(symtab, fragments=fragments).serialize()
+
+
+def peak_rss_kb() -> int:
+    # VmHWM starts over in a new process, unlike ru_maxrss which Linux carries over from the parent
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    raise Exception("VmHWM not found in /proc/self/status")
+
+
+def combine_images_per_image_pdf(ordered_images: list) -> bytes:
+    # the previous method: a PDF document made by Pillow for each image, parsed again to append it
+    writer = pypdf.PdfWriter()
+    for image_resource in ordered_images:
+        writer.append(fileobj=io.BytesIO(convert_image_to_pdf(image_resource).raw_media))
+
+    outfile = io.BytesIO()
+    writer.write(outfile)
+    return outfile.getvalue()
+
+
+def pdf_in_process(filepath: str, method: str) -> dict:
+    logging.disable(logging.CRITICAL)
+    book = YJ_Book(filepath)
+    book.decode_book()
+    ordered_images = KFX_IMAGE_BOOK(book).get_ordered_images()[0]
+    page_mb = sum(len(image_resource.raw_media) for image_resource in ordered_images) / (1024 * 1024)
+
+    rss_before = peak_rss_kb()
+    start = time.perf_counter()
+    if method == "direct":
+        pdf_data = combine_images_into_pdf(ordered_images)
+    else:
+        pdf_data = combine_images_per_image_pdf(ordered_images)
+    duration = time.perf_counter() - start
+    rss_after = peak_rss_kb()
+
+    digest = hashlib.sha256()
+    reader = pypdf.PdfReader(io.BytesIO(pdf_data))
+    for page in reader.pages:
+        for image_xobject in page["/Resources"]["/XObject"].values():
+            digest.update(image_xobject.get_object()._data)
+
+    return {
+        "method": method,
+        "seconds": round(duration, 4),
+        "peak_memory_increase_mb": round((rss_after - rss_before) / 1024, 1),
+        "page_images_mb": round(page_mb, 1),
+        "pdf_mb": round(len(pdf_data) / (1024 * 1024), 1),
+        "pdf_pages": len(reader.pages),
+        "sha256": digest.hexdigest(),
+    }
+
+
+def cbz_in_process(filepath: str, output: str) -> dict:
+    logging.disable(logging.CRITICAL)
+    book = YJ_Book(filepath)
+    book.decode_book()
+    page_mb = sum(len(fragment.value) for fragment in book.fragments.get_all("$417")) / (1024 * 1024)
+
+    cbz_filepath = os.path.splitext(filepath)[0] + ".cbz"
+    rss_before = peak_rss_kb()
+    start = time.perf_counter()
+    if output == "file":
+        book.convert_to_cbz(output_file=cbz_filepath)
+    else:
+        cbz_data = book.convert_to_cbz()
+    duration = time.perf_counter() - start
+    rss_after = peak_rss_kb()
+
+    if output != "file":
+        with open(cbz_filepath, "wb") as f:
+            f.write(cbz_data)
+
+        del cbz_data
+
+    digest = hashlib.sha256()
+    with zipfile.ZipFile(cbz_filepath) as zf:
+        for info in zf.infolist():
+            digest.update(info.filename.encode("utf8"))
+            digest.update(zf.read(info))
+
+    return {
+        "output": output,
+        "seconds": round(duration, 4),
+        "peak_memory_increase_mb": round((rss_after - rss_before) / 1024, 1),
+        "page_images_mb": round(page_mb, 1),
+        "cbz_mb": round(os.path.getsize(cbz_filepath) / (1024 * 1024), 1),
+        "sha256": digest.hexdigest(),
+    }
+
+
+def in_fresh_process(fn, *args) -> dict:
+    # a fresh process for each conversion so the peak resident size is not left over from earlier work
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(fn, *args).result()
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--format", choices=["cbz", "pdf"], default="cbz")
+    argparser.add_argument("--pages", type=int, default=300)
+    argparser.add_argument("--width", type=int, default=1200)
+    argparser.add_argument("--height", type=int, default=1800)
+    argparser.add_argument("--output", choices=["memory", "file"], default="file")
+    args = argparser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        filepath = os.path.join(tempdir, "comic.kfx")
+        with open(filepath, "wb") as f:
+            f.write(synthetic_comic(args.pages, args.width, args.height))
+
+        if args.format == "pdf":
+            results = [
+                {"pages": args.pages, "size": [args.width, args.height], **in_fresh_process(pdf_in_process, filepath, method)}
+                for method in ["direct", "per_image_pdf"]]
+        else:
+            results = [
+                {"pages": args.pages, "size": [args.width, args.height], **in_fresh_process(cbz_in_process, filepath, args.output)}]
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
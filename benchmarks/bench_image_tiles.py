@@ -0,0 +1,149 @@
+"""
+Time and measure the peak memory of combining tiled image resources.
+
+Without arguments, cuts a synthetic comic page into padded JPEG tiles the way large KFX images are
+stored and combines them. Given KFX books, combines every tiled image resource in each one. Each
+combination runs in a fresh process so the peak resident memory it reports is the increase caused
+by combining alone, shown next to the size of the decoded full image. The peak is read from /proc,
+so this runs on Linux only.
+
+    python benchmarks/bench_image_tiles.py [--width N] [--height N] [--tile N] [--padding N] [book.kfx ...]
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib import resources  # noqa: E402
+
+
+def synthetic_page(width: int, height: int) -> Image.Image:
+    rng = random.Random(0)
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(width * height // 20000):
+        cx, cy, r = rng.randint(0, width), rng.randint(0, height), rng.randint(10, 200)
+        draw.ellipse(
+            (cx - r, cy - r, cx + r, cy + r), fill=tuple(rng.randint(0, 255) for _ in range(3)), outline="black", width=4)
+
+    noise = Image.effect_noise((width, height), 20).convert("RGB")
+    return Image.blend(img, noise, 0.08).filter(ImageFilter.GaussianBlur(0.6))
+
+
+def synthetic_tiles(width: int, height: int, tile_size: int, padding: int) -> dict:
+    page = synthetic_page(width, height)
+    yj_tiles = []
+    tiles_raw_media = []
+    for y in range((height + tile_size - 1) // tile_size):
+        row = []
+        for x in range((width + tile_size - 1) // tile_size):
+            box = (
+                max(x * tile_size - padding, 0), max(y * tile_size - padding, 0),
+                min((x + 1) * tile_size + padding, width), min((y + 1) * tile_size + padding, height))
+            outfile = io.BytesIO()
+            page.crop(box).save(outfile, "JPEG", quality=90)
+            row.append("page-tile%d-%d" % (y, x))
+            tiles_raw_media.append(outfile.getvalue())
+        yj_tiles.append(row)
+
+    return {
+        "resource_name": "synthetic", "resource_height": height, "resource_width": width, "resource_format": "$285",
+        "tile_height": tile_size, "tile_width": tile_size, "tile_padding": padding, "yj_tiles": yj_tiles,
+        "tiles_raw_media": tiles_raw_media, "ignore_variants": False,
+    }
+
+
+def book_tiles(filepath: str) -> list:
+    from kfxlib.yj_book import YJ_Book
+
+    book = YJ_Book(filepath)
+    book.decode_book()
+    tiled_resources = []
+    for fragment in book.fragments.get_all("$164"):
+        res = fragment.value
+        if "$636" not in res:
+            continue
+
+        yj_tiles = res["$636"]
+        tiles_raw_media = []
+        for row in yj_tiles:
+            for tile_location in row:
+                tile_raw_media_frag = book.fragments.get(ftype="$417", fid=tile_location)
+                tiles_raw_media.append(None if tile_raw_media_frag is None else bytes(tile_raw_media_frag.value))
+
+        tiled_resources.append({
+            "resource_name": str(fragment.fid), "resource_height": res.get("$423", None) or res.get("$67", None),
+            "resource_width": res.get("$422", None) or res.get("$66", None), "resource_format": res.get("$161"),
+            "tile_height": res.get("$638"), "tile_width": res.get("$637"), "tile_padding": res.get("$797", 0),
+            "yj_tiles": [[str(tile_location) for tile_location in row] for row in yj_tiles],
+            "tiles_raw_media": tiles_raw_media, "ignore_variants": False,
+        })
+
+    return tiled_resources
+
+
+def peak_rss_kb() -> int:
+    # VmHWM starts over in a new process, unlike ru_maxrss which Linux carries over from the parent
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    raise Exception("VmHWM not found in /proc/self/status")
+
+
+def combine_in_process(kwargs: dict) -> dict:
+    rss_before = peak_rss_kb()
+    start = time.perf_counter()
+    raw_media, resource_format = resources.combine_image_tiles(**kwargs)
+    duration = time.perf_counter() - start
+    rss_after = peak_rss_kb()
+
+    return {
+        "resource": kwargs["resource_name"],
+        "size": [kwargs["resource_width"], kwargs["resource_height"]],
+        "tiles": sum(len(row) for row in kwargs["yj_tiles"]),
+        "seconds": round(duration, 4),
+        "peak_memory_increase_mb": round((rss_after - rss_before) / 1024, 1),
+        "full_image_mb": round(len(Image.open(io.BytesIO(raw_media)).tobytes()) / (1024 * 1024), 1),
+        "sha256": hashlib.sha256(raw_media).hexdigest(),
+    }
+
+
+def bench_combine(kwargs: dict) -> dict:
+    # a fresh process for each combination so the peak resident size is not left over from earlier work
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(combine_in_process, kwargs).result()
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--width", type=int, default=4800)
+    argparser.add_argument("--height", type=int, default=7200)
+    argparser.add_argument("--tile", type=int, default=512)
+    argparser.add_argument("--padding", type=int, default=2)
+    argparser.add_argument("files", nargs="*")
+    args = argparser.parse_args()
+
+    if args.files:
+        results = [
+            {"file": os.path.basename(filepath), "resources": [bench_combine(kwargs) for kwargs in book_tiles(filepath)]}
+            for filepath in args.files]
+    else:
+        results = bench_combine(synthetic_tiles(args.width, args.height, args.tile, args.padding))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Time serialization of fragments to a KFX container.
+
+Without arguments, builds a synthetic book (storylines of nested content structs, text content,
+styles and raw media) and times serializing it to a KFX container, along with the peak memory
+allocated while doing so. Given KFX books, decodes each one and times the same serialization of its
+fragments. Each result includes a digest of the container so runs before and after a change can be
+checked for identical output.
+
+    python benchmarks/bench_ion_binary.py [--sections N] [--repeat N] [book.kfx ...]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib.ion import IonBLOB, IonStruct, IS  # noqa: E402
+from kfxlib.ion_symbol_table import LocalSymbolTable  # noqa: E402
+from kfxlib.kfx_container import KfxContainer  # noqa: E402
+from kfxlib.yj_container import YJFragment, YJFragmentList  # noqa: E402
+from kfxlib.yj_symbol_catalog import YJ_SYMBOLS  # noqa: E402
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do"]
+
+
+def struct(*items) -> IonStruct:
+    value = IonStruct()
+    for key, val in zip(items[::2], items[1::2]):
+        value[IS(key)] = val
+    return value
+
+
+def synthetic_book(sections: int) -> tuple:
+    rng = random.Random(0)
+    symtab = LocalSymbolTable(YJ_SYMBOLS.name)
+    local_names = ["content_%d" % i for i in range(sections)] + ["story_%d" % i for i in range(sections)]
+    local_names += ["resource_%d" % i for i in range(sections // 4)]
+    for name in local_names:
+        symtab.create_local_symbol(name)
+
+    fragments = YJFragmentList()
+    fragments.append(YJFragment(ftype="$ion_symbol_table", value=struct(
+        "imports", [struct("name", YJ_SYMBOLS.name, "version", YJ_SYMBOLS.version, "max_id", len(YJ_SYMBOLS.symbols))],
+        "symbols", local_names)))
+    fragments.append(YJFragment(ftype="$270", value=struct("$409", "CR!BENCH", "$412", 4096, "$587", "1.0", "$588", "2.0")))
+    fragments.append(YJFragment(ftype="$419", value=struct("$252", [struct("$155", "CR!BENCH", "$181", [
+        IS(name) for name in local_names])])))
+
+    for section in range(sections):
+        content_name = IS("content_%d" % section)
+        text = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))) for _ in range(rng.randint(20, 60))]
+        fragments.append(YJFragment(ftype="$145", fid=content_name, value=struct("name", content_name, "$146", text)))
+
+        story = []
+        for i in range(len(text)):
+            item = struct(
+                "$155", rng.randint(1000, 100000), "$159", IS("$269"), "$157", IS("$%d" % rng.randint(10, 800)),
+                "$145", struct("name", content_name, "$403", i))
+            style_events = [
+                struct("$143", rng.randint(0, 100), "$144", rng.randint(1, 20), "$157", IS("$%d" % rng.randint(10, 800)))
+                for _ in range(rng.randint(0, 3))]
+            if style_events:
+                item[IS("$142")] = style_events
+            story.append(struct("$159", IS("$270"), "$146", [item]))
+
+        story_name = IS("story_%d" % section)
+        fragments.append(YJFragment(ftype="$259", fid=story_name, value=struct("$176", story_name, "$146", story)))
+
+    for i in range(sections // 4):
+        fragments.append(YJFragment(ftype="$417", fid=IS("resource_%d" % i), value=IonBLOB(rng.randbytes(50000))))
+
+    return symtab, fragments
+
+
+def book_fragments(filepath: str) -> tuple:
+    from kfxlib.yj_book import YJ_Book
+
+    book = YJ_Book(filepath)
+    book.decode_book()
+    return book.symtab, book.fragments
+
+
+def bench_serialize(name: str, symtab, fragments, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = KfxContainer(symtab, fragments=fragments).serialize()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+
+    tracemalloc.start()
+    KfxContainer(symtab, fragments=fragments).serialize()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "source": name,
+        "fragments": len(fragments),
+        "bytes": len(data),
+        "seconds": round(best, 4),
+        "peak_allocated_mb": round(peak / (1024 * 1024), 1),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--sections", type=int, default=200)
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument("files", nargs="*")
+    args = argparser.parse_args()
+
+    if args.files:
+        results = [
+            bench_serialize(os.path.basename(filepath), *book_fragments(filepath), args.repeat) for filepath in args.files]
+    else:
+        results = bench_serialize("synthetic", *synthetic_book(args.sections), args.repeat)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
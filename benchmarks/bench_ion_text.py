@@ -0,0 +1,139 @@
+"""
+Time parsing of Ion text symbol catalogs and book fragments.
+
+Without arguments, parses a synthetic shared symbol table catalog (the form passed to kfxlib as a
+symbol catalog file) and a synthetic book in Ion text (the book.ion form of an unpacked KFX book:
+storylines of nested content structs, text content lists, styles and resources). Given KFX books,
+serializes each decoded book to Ion text first and parses that. Each result includes a digest of
+the parsed values so runs before and after a change can be checked for identical output.
+
+    python benchmarks/bench_ion_text.py [--symbols N] [--sections N] [--repeat N] [book.kfx ...]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib.ion import IonAnnotation, IonBLOB, IonStruct, IonSymbol  # noqa: E402
+from kfxlib.ion_symbol_table import LocalSymbolTable, SymbolTableCatalog  # noqa: E402
+from kfxlib.ion_text import IonText  # noqa: E402
+from kfxlib.yj_symbol_catalog import YJ_SYMBOLS  # noqa: E402
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do"]
+
+
+def synthetic_catalog(symbols: int) -> bytes:
+    table = IonStruct()
+    table[IonSymbol("name")] = YJ_SYMBOLS.name
+    table[IonSymbol("version")] = YJ_SYMBOLS.version
+    table[IonSymbol("symbols")] = [
+        YJ_SYMBOLS.symbols[i] if i < len(YJ_SYMBOLS.symbols) else "yj.symbol_%d" % i for i in range(symbols)]
+    return IonText().serialize_multiple_values([IonAnnotation([IonSymbol("$ion_shared_symbol_table")], table)])
+
+
+def synthetic_book(sections: int) -> bytes:
+    rng = random.Random(0)
+
+    def struct(**kwargs):
+        value = IonStruct()
+        for key, val in kwargs.items():
+            value[IonSymbol(key)] = val
+        return value
+
+    def fragment(ftype, value):
+        return IonAnnotation([IonSymbol(ftype)], value)
+
+    fragments = []
+    for section in range(sections):
+        content_name = IonSymbol("content_%d" % section)
+        text = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))) for _ in range(rng.randint(20, 60))]
+        fragments.append(fragment("$145", struct(**{"$146": text, "name": content_name})))
+
+        story = []
+        for i in range(len(text)):
+            style_events = [
+                struct(**{"$143": rng.randint(0, 100), "$144": rng.randint(1, 20), "$157": IonSymbol("s%d" % rng.randint(0, 30))})
+                for _ in range(rng.randint(0, 3))]
+            item = struct(**{
+                "$155": rng.randint(1000, 100000), "$159": IonSymbol("$269"), "$157": IonSymbol("p%d" % rng.randint(0, 20)),
+                "$145": struct(**{"name": content_name, "$403": i})})
+            if style_events:
+                item[IonSymbol("$142")] = style_events
+            story.append(item)
+
+        fragments.append(fragment("$259", struct(**{"$176": IonSymbol("story_%d" % section), "$146": story})))
+
+    for i in range(30):
+        fragments.append(fragment("$157", struct(**{
+            "$173": IonSymbol("s%d" % i), "$16": struct(**{"$307": rng.random(), "$306": IonSymbol("$308")}),
+            "$12": rng.choice([IonSymbol("$350"), IonSymbol("$361")]), "$42": rng.random() * 2})))
+
+    for i in range(10):
+        fragments.append(fragment("$417", IonBLOB(bytes(rng.randint(0, 255) for _ in range(2000)))))
+
+    return IonText().serialize_multiple_values(fragments)
+
+
+def book_text(filepath: str) -> bytes:
+    from kfxlib.yj_book import YJ_Book
+
+    book = YJ_Book(filepath)
+    book.decode_book()
+    return IonText(book.symtab).serialize_multiple_values([fragment for fragment in book.fragments])
+
+
+def parse_catalog(data: bytes) -> list:
+    return IonText(LocalSymbolTable(catalog=SymbolTableCatalog())).deserialize_multiple_values(data, import_symbols=True)
+
+
+def parse_book(data: bytes) -> list:
+    return IonText(LocalSymbolTable(YJ_SYMBOLS.name)).deserialize_multiple_values(data, import_symbols=True)
+
+
+def bench_parse(name: str, parse, data: bytes, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        values = parse(data)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+
+    return {
+        "source": name,
+        "bytes": len(data),
+        "values": len(values),
+        "seconds": round(best, 4),
+        "mb_per_second": round(len(data) / (1024 * 1024) / best, 2),
+        "sha256": hashlib.sha256(repr(values).encode("utf8")).hexdigest(),
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--symbols", type=int, default=20000)
+    argparser.add_argument("--sections", type=int, default=100)
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument("files", nargs="*")
+    args = argparser.parse_args()
+
+    if args.files:
+        results = [
+            bench_parse(os.path.basename(filepath), parse_book, book_text(filepath), args.repeat)
+            for filepath in args.files]
+    else:
+        results = [
+            bench_parse("synthetic catalog", parse_catalog, synthetic_catalog(args.symbols), args.repeat),
+            bench_parse("synthetic book", parse_book, synthetic_book(args.sections), args.repeat),
+        ]
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Compare the JPEG quality search used for combined tiles and cropped images with plain binary search.
+
+Without arguments, runs both searches on synthetic comic pages (panels of flat color with black
+outlines and light noise) for a range of target sizes around each page's own sizes. Given KFX
+books, converts each one to CBZ, records every image and target size passed to the quality search
+and runs both searches on those. Results give the optimized and unoptimized encodes per image,
+the time spent and how often both searches picked the same quality.
+
+    python benchmarks/bench_jpeg_quality.py [--pages N] [--targets N] [book.kfx ...]
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib import resources  # noqa: E402
+
+
+def binary_search_quality(jpeg_image, desired_size):
+    min_quality = resources.MIN_JPEG_QUALITY
+    max_quality = resources.MAX_JPEG_QUALITY
+    best_size_diff = best_quality = best_raw_media = None
+
+    while max_quality >= min_quality:
+        quality = (max_quality + min_quality) // 2
+        outfile = io.BytesIO()
+        jpeg_image.save(outfile, "JPEG", quality=quality, optimize=True)
+        raw_media = outfile.getvalue()
+
+        size_diff = len(raw_media) - desired_size
+        if best_size_diff is None or abs(size_diff) < abs(best_size_diff):
+            best_size_diff = size_diff
+            best_quality = quality
+            best_raw_media = raw_media
+
+        if len(raw_media) < desired_size:
+            min_quality = quality + 1
+        else:
+            max_quality = quality - 1
+
+    return best_raw_media, best_quality
+
+
+SEARCHES = {
+    "binary_search": binary_search_quality,
+    "optimize_jpeg_image_quality": resources.optimize_jpeg_image_quality,
+}
+
+
+def comic_page(seed: int, width: int = 1200, height: int = 1800) -> Image.Image:
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+
+    y = 20
+    while y < height - 100:
+        panel_height = rng.randint(250, 600)
+        x = 20
+        while x < width - 100:
+            box = (x, y, min(x + rng.randint(300, 700), width - 20), min(y + panel_height, height - 20))
+            draw.rectangle(box, fill=tuple(rng.randint(100, 255) for _ in range(3)), outline="black", width=6)
+            for _ in range(rng.randint(5, 30)):
+                cx, cy, r = rng.randint(box[0], box[2]), rng.randint(box[1], box[3]), rng.randint(10, 120)
+                draw.ellipse(
+                    (cx - r, cy - r, cx + r, cy + r), fill=tuple(rng.randint(0, 255) for _ in range(3)),
+                    outline="black", width=3)
+            x = box[2] + 15
+        y += panel_height + 15
+
+    noise = Image.effect_noise((width, height), rng.randint(5, 40)).convert("RGB")
+    img = Image.blend(img, noise, 0.08).filter(ImageFilter.GaussianBlur(0.6))
+    return img.convert("L") if seed % 2 else img
+
+
+def synthetic_calls(pages: int, targets: int) -> list:
+    rng = random.Random(0)
+    calls = []
+    for seed in range(pages):
+        img = comic_page(seed)
+        for _ in range(targets):
+            outfile = io.BytesIO()
+            img.save(outfile, "JPEG", quality=rng.randint(resources.MIN_JPEG_QUALITY, resources.MAX_JPEG_QUALITY))
+            calls.append((img, int(len(outfile.getvalue()) * rng.uniform(0.8, 1.25))))
+    return calls
+
+
+def book_calls(filepath: str) -> list:
+    from kfxlib.yj_book import YJ_Book
+
+    calls = []
+    original = resources.optimize_jpeg_image_quality
+
+    def recording(jpeg_image, desired_size):
+        calls.append((jpeg_image.copy(), desired_size))
+        return original(jpeg_image, desired_size)
+
+    resources.optimize_jpeg_image_quality = recording
+    try:
+        YJ_Book(filepath).convert_to_cbz()
+    finally:
+        resources.optimize_jpeg_image_quality = original
+
+    return calls
+
+
+def run_search(search, calls: list) -> dict:
+    encodes = {True: 0, False: 0}
+    original_save = Image.Image.save
+
+    def counting_save(self, fp, format=None, **params):
+        if format == "JPEG":
+            encodes[bool(params.get("optimize"))] += 1
+        return original_save(self, fp, format, **params)
+
+    Image.Image.save = counting_save
+    try:
+        start = time.perf_counter()
+        results = [search(img, desired_size) for img, desired_size in calls]
+        duration = time.perf_counter() - start
+    finally:
+        Image.Image.save = original_save
+
+    size_error = sum(abs(len(raw_media) - desired_size) / desired_size
+                     for (raw_media, _), (_, desired_size) in zip(results, calls))
+    return {
+        "seconds": round(duration, 4),
+        "optimized_encodes_per_image": round(encodes[True] / len(calls), 2),
+        "unoptimized_encodes_per_image": round(encodes[False] / len(calls), 2),
+        "mean_size_error_percent": round(size_error * 100 / len(calls), 2),
+        "qualities": [quality for _, quality in results],
+    }
+
+
+def compare(name: str, calls: list) -> dict:
+    result = {"source": name, "images": len(calls)}
+    if not calls:
+        return result
+
+    for search_name, search in SEARCHES.items():
+        result[search_name] = run_search(search, calls)
+
+    qualities = [result[search_name].pop("qualities") for search_name in SEARCHES]
+    result["same_quality"] = sum(1 for a, b in zip(*qualities) if a == b)
+    return result
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--pages", type=int, default=6)
+    argparser.add_argument("--targets", type=int, default=8)
+    argparser.add_argument("files", nargs="*")
+    args = argparser.parse_args()
+
+    if args.files:
+        results = [compare(os.path.basename(filepath), book_calls(filepath)) for filepath in args.files]
+    else:
+        results = compare("synthetic", synthetic_calls(args.pages, args.targets))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
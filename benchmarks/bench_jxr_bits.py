@@ -0,0 +1,109 @@
+"""
+Micro-benchmark the JPEG-XR bit reader on real coded tiles.
+
+Entropy decodes each JXR file given (the test fixtures by default) while recording every
+read the decoder makes from its Deserializer, then replays exactly those reads against a
+fresh Deserializer over the same image data. The replay time isolates the bit reader from
+the rest of the decoder; the coded_image time is the whole entropy decoding pass.
+
+    python benchmarks/bench_jxr_bits.py [--repeat N] [file.jxr ...]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib.jxr_container import JXRContainer  # noqa: E402
+from kfxlib.jxr_image import JXRImage  # noqa: E402
+from kfxlib.jxr_misc import Deserializer  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "jxr")
+
+
+class RecordingDeserializer(Deserializer):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+        self.nested = 0
+
+    def record(self, name, args):
+        # a reader whose huff() is built on unpack_bits() must not have the inner reads recorded
+        if not self.nested:
+            self.reads.append((name, args))
+
+    def unpack_bits(self, size, name=""):
+        self.record("unpack_bits", (size,))
+        return super().unpack_bits(size, name)
+
+    def huff(self, table, name):
+        self.record("huff", (table, name))
+        self.nested += 1
+        try:
+            return super().huff(table, name)
+        finally:
+            self.nested -= 1
+
+    def discard_remainder_bits(self):
+        self.record("discard_remainder_bits", ())
+        return super().discard_remainder_bits()
+
+
+def best_time(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    assert best is not None
+    return best
+
+
+def bench_file(filepath: str, repeat: int) -> dict:
+    with open(filepath, "rb") as f:
+        data = JXRContainer(f.read()).image_data
+
+    recorder = JXRImage(data)
+    recorder.ds = RecordingDeserializer(data)
+    recorder.coded_image()
+    reads = [(getattr(Deserializer, name), args) for name, args in recorder.ds.reads]
+
+    def entropy_decode():
+        jxr_image = JXRImage(data)
+        jxr_image.ds = Deserializer(data)
+        jxr_image.coded_image()
+
+    def replay():
+        ds = Deserializer(data)
+        for method, args in reads:
+            method(ds, *args)
+
+    replay_seconds = best_time(replay, repeat)
+    return {
+        "file": os.path.basename(filepath),
+        "coded_bytes": len(data),
+        "reads": len(reads),
+        "huff_reads": sum(1 for method, _ in reads if method is Deserializer.huff),
+        "coded_image_seconds": round(best_time(entropy_decode, repeat), 4),
+        "replay_seconds": round(replay_seconds, 4),
+        "reads_per_second": round(len(reads) / replay_seconds),
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--repeat", type=int, default=5)
+    argparser.add_argument("files", nargs="*")
+    args = argparser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.jxr")))
+    print(json.dumps([bench_file(filepath, args.repeat) for filepath in files], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Time the pure-Python JPEG-XR decoder.
+
+Decodes each JXR file given (the test fixtures by default) and reports the best time and a
+digest of the pixels, so runs before and after a decoder change can be checked for bit-exact
+output. Also times each sample reconstruction and output formatting stage on a synthetic
+plane of random coefficients, since the fixtures are too small to show those stages.
+
+    python benchmarks/bench_jxr_decode.py [--repeat N] [--width PX] [--height PX] [file.jxr ...]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib.jxr_container import JXRContainer  # noqa: E402
+from kfxlib.jxr_image import BD8, RGB, YUV444, ImgPlane, JXRImage  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "jxr")
+
+STAGES = [
+    "FirstLevelInverseTransform",
+    "FirstLevelOverlapFiltering",
+    "SecondLevelInverseTransform",
+    "second_level_overlap_filtering",
+    "ConvertInternalToOutputClrFmt",
+    "AddBias",
+    "ComputeScaling",
+    "PostscalingProcess",
+    "ClippingAndPackingStage",
+]
+
+
+def bench_file(filepath: str, repeat: int) -> dict:
+    with open(filepath, "rb") as f:
+        data = f.read()
+
+    best = None
+    im = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        im = JXRContainer(data).unpack_image()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    assert best is not None and im is not None
+
+    return {
+        "file": os.path.basename(filepath),
+        "mode": im.mode,
+        "size": list(im.size),
+        "seconds": round(best, 4),
+        "megapixels_per_second": round(im.width * im.height / best / 1e6, 3),
+        "sha256": hashlib.sha256(im.tobytes()).hexdigest(),
+    }
+
+
+def synthetic_plane(width: int, height: int) -> ImgPlane:
+    rng = random.Random(0)
+    image = JXRImage(b"")
+    image.ds = None
+    image.MBWidth = (width + 15) // 16
+    image.MBHeight = (height + 15) // 16
+    image.width = image.MBWidth * 16
+    image.height = image.MBHeight * 16
+    image.LeftMBIndexOfTile = [0, image.MBWidth]
+    image.TopMBIndexOfTile = [0, image.MBHeight]
+    image.NumTileCols = image.NumTileRows = 1
+    image.hard_tiling_flag = False
+    image.overlap_mode = 2
+    image.output_clr_fmt = RGB
+    image.output_bitdepth = BD8
+    image.red_blue_not_swapped_flag = True
+    image.ExtraPixelsLeft = image.ExtraPixelsTop = 0
+    image.image_width = width
+    image.image_height = height
+
+    plane = ImgPlane(image, False)
+    plane.NumComponents = 3
+    plane.scaled_flag = True
+    plane.internal_clr_fmt = YUV444
+    plane.shift_bits = 0
+    plane.Mb = [
+        [
+            types.SimpleNamespace(
+                MBBuffer=[
+                    [rng.randint(-300, 300) for _ in range(256)] for _ in range(3)
+                ]
+            )
+            for _ in range(image.MBHeight)
+        ]
+        for _ in range(image.MBWidth)
+    ]
+    return plane
+
+
+def bench_stages(width: int, height: int) -> dict:
+    plane = synthetic_plane(width, height)
+    stages = {}
+    for stage in STAGES:
+        start = time.perf_counter()
+        getattr(plane, stage)()
+        stages[stage] = round(time.perf_counter() - start, 4)
+
+    return {
+        "size": [width, height],
+        "seconds": round(sum(stages.values()), 4),
+        "stages": stages,
+        "sha256": hashlib.sha256(
+            b"".join(p.tobytes() for p in plane.ImagePlane)
+        ).hexdigest(),
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument("--width", type=int, default=600)
+    argparser.add_argument("--height", type=int, default=800)
+    argparser.add_argument("files", nargs="*")
+    args = argparser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.jxr")))
+    results = {
+        "files": [bench_file(filepath, args.repeat) for filepath in files],
+        "reconstruction": bench_stages(args.width, args.height),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
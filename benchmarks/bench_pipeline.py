@@ -0,0 +1,432 @@
+"""
+Measure the throughput of the efm and kfxlib pipeline on synthetic books and libraries.
+
+Generates synthetic KFX books in five shapes: many fragments (a long novel of short sections), large
+blobs (a comic of large incompressible page images), deep storylines (content nested many containers
+deep), JPEG-XR pages (a comic stored as JPEG-XR) and tiled images (a comic of large pages stored as
+JPEG tiles). Each book is completed with the position, location and navigation fragments of a real
+book, so it converts without errors. For each book, times decoding, EPUB conversion, CBZ conversion
+(fixed-layout books) and metadata extraction. Also generates a library of EPUB and PDF files shaped
+like a real collection (novels, illustrated books, text and scanned PDFs) together with the KFX books,
+and times metadata extraction of the EPUB and PDF files and a full efm Transaction of every book in a
+fresh copy of the library. The Transaction needs the DeDRM tools that efm imports; use --only to
+leave it out without them.
+
+Results are JSON with one entry per measurement, keyed by name, giving the best time of the repeats,
+the items handled (fragments, pages or books) and the rate, with a digest of the output so runs
+before and after a change can be checked for identical output. Given the results of an earlier run
+with --compare, each measurement is compared with the entry of the same name, and those slower by
+more than --threshold percent are listed as regressions.
+
+    python benchmarks/bench_pipeline.py [--scale N] [--repeat N] [--only NAME ...] [--compare results.json] [--threshold PCT]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+import pymupdf
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from efm.kfx_index import extract_kfx_metadata  # noqa: E402
+from kfxlib.ion import IonBLOB, IS  # noqa: E402
+from kfxlib.kfx_container import KfxContainer  # noqa: E402
+from kfxlib.yj_book import YJ_Book  # noqa: E402
+from kfxlib.yj_container import YJFragment, YJFragmentList  # noqa: E402
+from tests.kfx_synth import complete_book, metadata_fragment, new_container, reading_order_fragment, struct  # noqa: E402
+
+RESULTS_FORMAT = 1
+KFX_SHAPES = ["many_fragments", "large_blobs", "deep_storylines", "jxr_pages", "tiled_images"]
+JXR_FIXTURE = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "jxr", "rgb_lossy.jxr")
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do"]
+
+
+class SyntheticKfx(object):
+    def __init__(self, title: str, fixed_layout: bool):
+        self.title = title
+        self.fixed_layout = fixed_layout
+        self.local_names = []
+        self.sections = []
+        self.fragments = YJFragmentList()
+        self.eid = 1000
+
+    def name(self, name: str) -> IS:
+        self.local_names.append(name)
+        return IS(name)
+
+    def next_eid(self) -> int:
+        self.eid += 1
+        return self.eid
+
+    def text(self, paragraphs: list) -> list:
+        content_name = self.name("content_%d" % len(self.fragments))
+        self.fragments.append(YJFragment(ftype="$145", fid=content_name, value=struct("name", content_name, "$146", paragraphs)))
+        return [struct("$155", self.next_eid(), "$159", IS("$269"), "$145", struct("name", content_name, "$403", i))
+                for i in range(len(paragraphs))]
+
+    def raw_media(self, data: bytes) -> str:
+        location = "raw_%d" % len(self.fragments)
+        self.fragments.append(YJFragment(ftype="$417", fid=self.name(location), value=IonBLOB(data)))
+        return location
+
+    def image(self, image_format: str, data: bytes, width: int, height: int) -> list:
+        image_name = self.name("image_%d" % len(self.fragments))
+        self.fragments.append(YJFragment(ftype="$164", fid=image_name, value=struct(
+            "$175", image_name, "$161", IS(image_format), "$165", self.raw_media(data), "$422", width, "$423", height)))
+        return [struct("$155", self.next_eid(), "$159", IS("$271"), "$175", image_name)]
+
+    def tiled_image(self, tiles: list, tile_size: int, width: int, height: int) -> list:
+        image_name = self.name("image_%d" % len(self.fragments))
+        yj_tiles = [[self.raw_media(tile) for tile in row] for row in tiles]
+        self.fragments.append(YJFragment(ftype="$164", fid=image_name, value=struct(
+            "$175", image_name, "$161", IS("$285"), "$422", width, "$423", height,
+            "$636", yj_tiles, "$638", tile_size, "$637", tile_size)))
+        return [struct("$155", self.next_eid(), "$159", IS("$271"), "$175", image_name)]
+
+    def section(self, content: list, page_size: tuple = None):
+        section_name = self.name("section_%d" % len(self.sections))
+        story_name = self.name("story_%d" % len(self.sections))
+        self.fragments.append(YJFragment(ftype="$259", fid=story_name, value=struct("$176", story_name, "$146", content)))
+
+        # fixed-layout pages are scaled to fit, reflowable content flows down the page
+        page_template = struct(
+            "$155", self.next_eid(), "$159", IS("$270"), "$176", story_name, "$156", IS("$326" if page_size else "$323"))
+        if page_size is not None:
+            page_template[IS("$66")], page_template[IS("$67")] = page_size
+
+        self.fragments.append(YJFragment(ftype="$260", fid=section_name, value=struct("$174", section_name, "$141", [page_template])))
+        self.sections.append(section_name)
+
+    def serialize(self, filepath: str):
+        symtab, fragments = new_container(self.local_names, "CR!BENCH")
+        fragments.append(metadata_fragment([
+            struct("$492", "title", "$307", self.title), struct("$492", "author", "$307", "Synthetic Author"),
+            struct("$492", "cde_content_type", "$307", "EBOK")], self.fixed_layout))
+        fragments.append(reading_order_fragment(self.sections))
+        fragments.extend(self.fragments)
+
+        with open(filepath, "wb") as f:
+            f.write(KfxContainer(symtab, fragments=fragments).serialize())
+
+        complete_book(filepath, "CR!BENCH")
+
+
+def paragraphs(rng: random.Random, count: int) -> list:
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))) for _ in range(count)]
+
+
+def drawn_image(rng: random.Random, width: int, height: int, noise: bool = False) -> Image.Image:
+    if noise:
+        return Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(max(width * height // 20000, 4)):
+        cx, cy, r = rng.randint(0, width), rng.randint(0, height), rng.randint(10, 200)
+        draw.ellipse((cx - r, cy - r, cx + r, cy + r), fill=tuple(rng.randint(0, 255) for _ in range(3)), outline="black")
+
+    return img
+
+
+def jpeg(img: Image.Image, quality: int = 90) -> bytes:
+    outfile = io.BytesIO()
+    img.save(outfile, "JPEG", quality=quality)
+    return outfile.getvalue()
+
+
+def deep_content(book: SyntheticKfx, rng: random.Random, depth: int) -> list:
+    if depth == 0:
+        return book.text(paragraphs(rng, 2))
+
+    return [struct("$155", book.next_eid(), "$159", IS("$270"), "$146", deep_content(book, rng, depth - 1) + (
+        deep_content(book, rng, depth - 1) if depth % 4 == 0 else []))]
+
+
+def synthetic_kfx(shape: str, scale: int, filepath: str):
+    rng = random.Random(0)
+    book = SyntheticKfx("Synthetic %s" % shape.replace("_", " "), shape not in ["many_fragments", "deep_storylines"])
+
+    if shape == "many_fragments":
+        for _ in range(300 * scale):
+            book.section(book.text(paragraphs(rng, rng.randint(2, 8))))
+    elif shape == "large_blobs":
+        for _ in range(8 * scale):
+            book.section(book.image("$285", jpeg(drawn_image(rng, 1000, 1500, noise=True)), 1000, 1500), (1000, 1500))
+    elif shape == "deep_storylines":
+        for _ in range(10 * scale):
+            book.section(deep_content(book, rng, 12))
+    elif shape == "jxr_pages":
+        with open(JXR_FIXTURE, "rb") as f:
+            jxr_data = f.read()
+
+        for _ in range(100 * scale):
+            book.section(book.image("$548", jxr_data, 61, 45), (61, 45))
+    elif shape == "tiled_images":
+        tile_size = 256
+        for _ in range(4 * scale):
+            page = drawn_image(rng, 1024, 1536)
+            tiles = [[jpeg(page.crop((x, y, x + tile_size, y + tile_size)))
+                      for x in range(0, 1024, tile_size)] for y in range(0, 1536, tile_size)]
+            book.section(book.tiled_image(tiles, tile_size, 1024, 1536), (1024, 1536))
+    else:
+        raise ValueError("Unknown KFX shape: %s" % shape)
+
+    book.serialize(filepath)
+
+
+def synthetic_epub(rng: random.Random, title: str, chapters: int, images: int, filepath: str):
+    manifest = []
+    spine = []
+    with zipfile.ZipFile(filepath, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        zf.writestr("META-INF/container.xml", (
+            '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+            '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+            '</rootfiles></container>'))
+
+        zf.writestr("OEBPS/cover.jpg", jpeg(drawn_image(rng, 600, 900)))
+        manifest.append('<item id="cover" href="cover.jpg" media-type="image/jpeg" properties="cover-image"/>')
+
+        for image in range(images):
+            zf.writestr("OEBPS/image%d.jpg" % image, jpeg(drawn_image(rng, 800, 600)))
+            manifest.append('<item id="image%d" href="image%d.jpg" media-type="image/jpeg"/>' % (image, image))
+
+        for chapter in range(chapters):
+            body = "".join("<p>%s</p>" % text for text in paragraphs(rng, rng.randint(20, 60)))
+            if images:
+                body += '<img src="image%d.jpg" alt=""/>' % (chapter % images)
+
+            zf.writestr("OEBPS/chapter%d.xhtml" % chapter, (
+                '<?xml version="1.0" encoding="utf-8"?><html xmlns="http://www.w3.org/1999/xhtml"><head><title>'
+                'Chapter %d</title></head><body><h1>Chapter %d</h1>%s</body></html>' % (chapter, chapter, body)))
+            manifest.append('<item id="c%d" href="chapter%d.xhtml" media-type="application/xhtml+xml"/>' % (chapter, chapter))
+            spine.append('<itemref idref="c%d"/>' % chapter)
+
+        zf.writestr("OEBPS/content.opf", (
+            '<?xml version="1.0" encoding="utf-8"?><package xmlns="http://www.idpf.org/2007/opf" version="3.0" '
+            'unique-identifier="uid"><metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            '<dc:identifier id="uid">urn:uuid:%s</dc:identifier><dc:title>%s</dc:title>'
+            '<dc:creator>Synthetic Author</dc:creator><dc:language>en</dc:language></metadata>'
+            '<manifest>%s</manifest><spine>%s</spine></package>' % (
+                hashlib.sha1(title.encode("utf8")).hexdigest(), title, "".join(manifest), "".join(spine))))
+
+
+def synthetic_pdf(rng: random.Random, title: str, pages: int, scanned: bool, filepath: str):
+    doc = pymupdf.open()
+    for _ in range(pages):
+        page = doc.new_page(width=612, height=792)
+        if scanned:
+            page.insert_image(page.rect, stream=jpeg(drawn_image(rng, 1275, 1650), quality=75))
+        else:
+            page.insert_textbox(pymupdf.Rect(72, 72, 540, 720), "\n\n".join(paragraphs(rng, 8)), fontsize=11)
+
+    doc.set_metadata({"title": title, "author": "Synthetic Author"})
+    doc.save(filepath)
+    doc.close()
+
+
+def synthetic_library(scale: int, dirpath: str, kfx_dirpath: str):
+    rng = random.Random(1)
+    os.makedirs(dirpath)
+    for i in range(6 * scale):
+        synthetic_epub(rng, "Novel %d" % i, rng.randint(10, 40), 0, os.path.join(dirpath, "novel_%d.epub" % i))
+
+    for i in range(2 * scale):
+        synthetic_epub(rng, "Illustrated %d" % i, 12, 6, os.path.join(dirpath, "illustrated_%d.epub" % i))
+
+    for i in range(2 * scale):
+        synthetic_pdf(rng, "Paper %d" % i, rng.randint(10, 30), False, os.path.join(dirpath, "paper_%d.pdf" % i))
+
+    for i in range(scale):
+        synthetic_pdf(rng, "Scan %d" % i, 10, True, os.path.join(dirpath, "scan_%d.pdf" % i))
+
+    for filename in sorted(os.listdir(kfx_dirpath)):
+        shutil.copy(os.path.join(kfx_dirpath, filename), dirpath)
+
+
+def measure(name: str, run, items: int, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = run()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+
+    return {
+        "name": name,
+        "items": items,
+        "seconds": round(best, 4),
+        "items_per_sec": round(items / best, 2) if best else None,
+        "sha256": hashlib.sha256(output).hexdigest(),
+    }
+
+
+def zip_digest(data, extensions: tuple) -> bytes:
+    # the parts of the output that do not change from run to run, leaving out dates and generated ids
+    digest = hashlib.sha256()
+    with zipfile.ZipFile(data if isinstance(data, str) else io.BytesIO(data)) as zf:
+        for name in sorted(zf.namelist()):
+            if name.endswith(extensions):
+                digest.update(name.encode("utf8"))
+                digest.update(zf.read(name))
+
+    return digest.digest()
+
+
+def decoded_book(filepath: str) -> YJ_Book:
+    book = YJ_Book(filepath)
+    book.decode_book()
+    return book
+
+
+def bench_kfx(shape: str, filepath: str, repeat: int) -> list:
+    book = decoded_book(filepath)
+    fragments = len(book.fragments)
+    sections = len(book.ordered_section_names())
+
+    def decode():
+        return repr(sorted(str(fragment.fid) for fragment in decoded_book(filepath).fragments)).encode("utf8")
+
+    def convert_epub():
+        return zip_digest(decoded_book(filepath).convert_to_epub(), (".xhtml", ".css", ".jpg", ".png"))
+
+    def convert_cbz():
+        return zip_digest(decoded_book(filepath).convert_to_cbz(), (".jpg", ".png"))
+
+    def metadata():
+        row = extract_kfx_metadata(filepath)
+        return repr([row[key] for key in ["title", "authors", "is_fixed_layout", "error"]]).encode("utf8")
+
+    results = [
+        measure("kfx/%s/decode" % shape, decode, fragments, repeat),
+        measure("kfx/%s/epub" % shape, convert_epub, sections, repeat),
+    ]
+    if book.is_fixed_layout:
+        results.append(measure("kfx/%s/cbz" % shape, convert_cbz, sections, repeat))
+
+    results.append(measure("kfx/%s/metadata" % shape, metadata, 1, repeat))
+    return results
+
+
+def bench_library(library_dirpath: str, repeat: int) -> list:
+    filepaths = [os.path.join(library_dirpath, filename) for filename in sorted(os.listdir(library_dirpath))
+                 if filename.endswith((".epub", ".pdf"))]
+
+    def metadata():
+        # the metadata the efm actions read for epub and pdf files
+        rows = []
+        for filepath in filepaths:
+            with pymupdf.open(filepath) as doc:
+                rows.append((os.path.basename(filepath), doc.metadata.get("title"), doc.metadata.get("author"), doc.page_count))
+
+        return repr(rows).encode("utf8")
+
+    return [measure("library/metadata", metadata, len(filepaths), repeat)]
+
+
+def bench_transaction(library_dirpath: str, workdir: str, repeat: int) -> list:
+    from efm.transaction import Transaction
+
+    actions = ["kfx2cbz", "kfx2epub", "rename", "print"]
+    books = len(os.listdir(library_dirpath))
+    run_count = [0]
+
+    def transaction():
+        # a fresh copy of the library each time, since the actions replace the books
+        run_count[0] += 1
+        dirpath = os.path.join(workdir, "run_%d" % run_count[0])
+        shutil.copytree(library_dirpath, dirpath)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for filename in sorted(os.listdir(dirpath)):
+                Transaction(os.path.join(dirpath, filename), actions, False).perform()
+
+        return repr(sorted(filename for filename in os.listdir(dirpath) if not filename.endswith(".bak"))).encode("utf8")
+
+    return [measure("library/transaction", transaction, books, repeat)]
+
+
+def compare(results: list, previous: dict, threshold: float) -> list:
+    previous_results = {result["name"]: result for result in previous.get("results", [])}
+    comparison = []
+    for result in results:
+        before = previous_results.get(result["name"])
+        if before is None or not before["seconds"]:
+            continue
+
+        change = (result["seconds"] - before["seconds"]) * 100 / before["seconds"]
+        comparison.append({
+            "name": result["name"],
+            "before_seconds": before["seconds"],
+            "after_seconds": result["seconds"],
+            "change_pct": round(change, 1),
+            "regression": change > threshold,
+            "same_output": result["sha256"] == before["sha256"],
+        })
+
+    return comparison
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--scale", type=int, default=1)
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument("--only", nargs="+", choices=KFX_SHAPES + ["library", "transaction"])
+    argparser.add_argument("--compare")
+    argparser.add_argument("--threshold", type=float, default=10.0)
+    args = argparser.parse_args()
+    logging.disable(logging.CRITICAL)
+    selected = args.only or KFX_SHAPES + ["library", "transaction"]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tempdir:
+        kfx_dirpath = os.path.join(tempdir, "kfx")
+        os.makedirs(kfx_dirpath)
+        for shape in KFX_SHAPES:
+            if shape in selected or "transaction" in selected:
+                synthetic_kfx(shape, args.scale, os.path.join(kfx_dirpath, "%s.kfx" % shape))
+
+        for shape in KFX_SHAPES:
+            if shape in selected:
+                results.extend(bench_kfx(shape, os.path.join(kfx_dirpath, "%s.kfx" % shape), args.repeat))
+
+        library_dirpath = os.path.join(tempdir, "library")
+        if "library" in selected or "transaction" in selected:
+            synthetic_library(args.scale, library_dirpath, kfx_dirpath)
+
+        if "library" in selected:
+            results.extend(bench_library(library_dirpath, args.repeat))
+
+        if "transaction" in selected:
+            results.extend(bench_transaction(library_dirpath, tempdir, args.repeat))
+
+    report = {
+        "format": RESULTS_FORMAT,
+        "benchmark": "pipeline",
+        "params": {"scale": args.scale, "repeat": args.repeat},
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = comparison = compare(results, json.load(f), args.threshold)
+
+        report["regressions"] = [entry["name"] for entry in comparison if entry["regression"]]
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Measure the memory and time taken by the position and location info of a book.
+
+Without arguments, builds a synthetic reflowable book (sections, each with a storyline of text
+paragraphs) and adds position and location maps to it. Given KFX books, decodes each one instead.
+For the content position info, the position map info and the location map info, reports the time to
+collect it and the memory it holds once collected. Also times approximate page numbering, which walks
+the content position info. Each result includes a digest of the chunks so runs before and after a
+change can be checked for identical output.
+
+    python benchmarks/bench_position_info.py [--sections N] [--repeat N] [book.kfx ...]
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib.ion import IS  # noqa: E402
+from kfxlib.kfx_container import KfxContainer  # noqa: E402
+from kfxlib.yj_book import YJ_Book  # noqa: E402
+from kfxlib.yj_container import YJFragment  # noqa: E402
+from tests.kfx_synth import metadata_fragment, new_container, reading_order_fragment, struct  # noqa: E402
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do"]
+
+
+def synthetic_book(sections: int) -> bytes:
+    rng = random.Random(0)
+    local_names = []
+    for section in range(sections):
+        local_names.extend(["section_%d" % section, "story_%d" % section, "content_%d" % section])
+
+    symtab, fragments = new_container(local_names, "CR!BENCH")
+    fragments.append(metadata_fragment([
+        struct("$492", "title", "$307", "Synthetic"), struct("$492", "cde_content_type", "$307", "EBOK")]))
+    fragments.append(reading_order_fragment(["section_%d" % section for section in range(sections)]))
+
+    eid = 1000
+    for section in range(sections):
+        content_name = IS("content_%d" % section)
+        story_name = IS("story_%d" % section)
+        text = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))) for _ in range(rng.randint(20, 60))]
+        fragments.append(YJFragment(ftype="$145", fid=content_name, value=struct("name", content_name, "$146", text)))
+
+        paragraphs = []
+        for i in range(len(text)):
+            eid += 1
+            paragraphs.append(struct("$155", eid, "$159", IS("$269"), "$145", struct("name", content_name, "$403", i)))
+
+        fragments.append(YJFragment(ftype="$259", fid=story_name, value=struct("$176", story_name, "$146", paragraphs)))
+
+        eid += 1
+        fragments.append(YJFragment(ftype="$260", fid=IS("section_%d" % section), value=struct(
+            "$174", IS("section_%d" % section),
+            "$141", [struct("$155", eid, "$159", IS("$270"), "$176", story_name, "$156", IS("$326"))])))
+
+    return KfxContainer(symtab, fragments=fragments).serialize()
+
+
+def load_book(filepath: str, add_maps: bool) -> YJ_Book:
+    book = YJ_Book(filepath)
+    book.decode_book()
+
+    if add_maps:
+        pos_info = book.collect_content_position_info()
+        book.create_position_map(pos_info)
+        book.create_location_map(book.generate_approximate_locations(pos_info))
+
+    return book
+
+
+def bench_collect(name: str, collect, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        collect()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+
+    gc.collect()
+    tracemalloc.start()
+    info = collect()
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return {
+        "source": name,
+        "chunks": len(info),
+        "seconds": round(best, 4),
+        "held_mb": round(held / (1024 * 1024), 2),
+        "sha256": hashlib.sha256("\n".join(repr(chunk) for chunk in info).encode("utf8")).hexdigest(),
+    }
+
+
+def bench_pages(name: str, book: YJ_Book, repeat: int) -> dict:
+    pos_info = book.collect_content_position_info()
+    first_section_name = book.ordered_section_names()[0]
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pages, new_section_page_count = book.determine_approximate_pages(pos_info, set(), first_section_name, 1850)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+
+    return {
+        "source": name,
+        "pages": len(pages),
+        "seconds": round(best, 4),
+        "sha256": hashlib.sha256(repr(pages).encode("utf8")).hexdigest(),
+    }
+
+
+def bench_book(name: str, book: YJ_Book, repeat: int) -> list:
+    map_pos_info = book.collect_position_map_info()
+    return [
+        bench_collect("%s content position info" % name, book.collect_content_position_info, repeat),
+        bench_collect("%s position map info" % name, book.collect_position_map_info, repeat),
+        bench_collect("%s location map info" % name, lambda: book.collect_location_map_info(map_pos_info), repeat),
+        bench_pages("%s approximate pages" % name, book, repeat),
+    ]
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--sections", type=int, default=400)
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument("files", nargs="*")
+    args = argparser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    results = []
+    if args.files:
+        for filepath in args.files:
+            results.extend(bench_book(os.path.basename(filepath), load_book(filepath, False), args.repeat))
+    else:
+        with tempfile.TemporaryDirectory() as tempdir:
+            filepath = os.path.join(tempdir, "synthetic.kfx")
+            with open(filepath, "wb") as f:
+                f.write(synthetic_book(args.sections))
+
+            results.extend(bench_book("synthetic", load_book(filepath, True), args.repeat))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
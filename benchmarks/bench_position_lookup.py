@@ -0,0 +1,111 @@
+"""
+Time locating eid offsets in position info, as done for location maps and navigation targets.
+
+Builds synthetic position info for a book (sections of paragraph and image content chunks, with some
+eids split across several chunks) and times looking up the pid of eid offsets in reading order (the
+location map) and in random order (table of contents, page list and anchor targets). Each result
+includes a digest of the pids found so runs before and after a change can be checked for identical
+output.
+
+    python benchmarks/bench_position_lookup.py [--positions N] [--lookups N] [--repeat N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from kfxlib.yj_position_location import BookPosLoc, ContentChunk  # noqa: E402
+
+KFX_POSITIONS_PER_LOCATION = 110
+
+
+def synthetic_pos_info(positions: int) -> list:
+    rng = random.Random(0)
+    pos_info = []
+    pid = 0
+    eid = 1000
+    section = 0
+
+    while pid < positions:
+        section_name = "c%d" % section
+        for _ in range(rng.randint(50, 400)):
+            eid += 1
+            length = 1 if rng.random() < 0.05 else rng.randint(1, 60)
+            pos_info.append(ContentChunk(pid, eid, 0, length, section_name))
+            pid += length
+
+            if rng.random() < 0.1:
+                # paragraph continued after an inline element
+                pos_info.append(ContentChunk(pid, eid + 1, 0, 1, section_name))
+                pos_info.append(ContentChunk(pid + 1, eid, length, rng.randint(1, 30), section_name))
+                pid += 1 + pos_info[-1].length
+                eid += 1
+
+        section += 1
+
+    return pos_info
+
+
+def location_targets(pos_info: list) -> list:
+    targets = []
+    next_pid = 0
+    for chunk in pos_info:
+        while next_pid < chunk.pid + chunk.length:
+            targets.append((chunk.eid, chunk.eid_offset + max(next_pid - chunk.pid, 0)))
+            next_pid += KFX_POSITIONS_PER_LOCATION
+
+    return targets
+
+
+def navigation_targets(pos_info: list, lookups: int) -> list:
+    rng = random.Random(1)
+    targets = []
+    for _ in range(lookups):
+        chunk = rng.choice(pos_info)
+        targets.append((chunk.eid, chunk.eid_offset + rng.randint(0, chunk.length)))
+
+    return targets
+
+
+def bench_lookup(name: str, pos_info: list, targets: list, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        book = BookPosLoc()
+        start = time.perf_counter()
+        pids = [book.pid_for_eid(eid, eid_offset, pos_info) for eid, eid_offset in targets]
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+
+    return {
+        "source": name,
+        "chunks": len(pos_info),
+        "lookups": len(targets),
+        "seconds": round(best, 4),
+        "sha256": hashlib.sha256(repr(pids).encode("utf8")).hexdigest(),
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--positions", type=int, default=1000000)
+    argparser.add_argument("--lookups", type=int, default=2000)
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+
+    pos_info = synthetic_pos_info(args.positions)
+    results = [
+        bench_lookup("location map", pos_info, location_targets(pos_info), args.repeat),
+        bench_lookup("navigation", pos_info, navigation_targets(pos_info, args.lookups), args.repeat),
+    ]
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
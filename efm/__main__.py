@@ -1,4 +1,5 @@
 import argparse
+import contextlib
 import glob
 import logging
 import os
@@ -13,6 +14,7 @@ from efm.exceptions import BookError
 from efm.transaction import Transaction
 from efm.action import ALL_ACTIONS
 from efm.config import valid_actions
+from efm.profiling import PROFILE_MODES, RunProfiler
 
 
 logger = logging.getLogger(__name__)
@@ -60,6 +62,22 @@ def main():
     argparser.add_argument(
         "--loglevel", choices=["debug", "info", "error"], help="log level"
     )
+    argparser.add_argument(
+        "--profile",
+        choices=PROFILE_MODES,
+        help="profile each book by cpu time or memory allocations and report the totals",
+    )
+    argparser.add_argument(
+        "--profile-report",
+        default="efm-profile.json",
+        help="file the profile report is written to",
+    )
+    argparser.add_argument(
+        "--profile-top",
+        type=int,
+        default=10,
+        help="number of slowest or most memory hungry books in the profile report",
+    )
     argparser.add_argument("spec", nargs="+", help="file, folder, or glob to process")
 
     args = argparser.parse_args()
@@ -96,6 +114,29 @@ def main():
             logger.debug(f"{original_filepath} is glob, expanded to {expanded}")
             all_files.extend(expanded)
 
+    profiler = RunProfiler(args.profile, args.profile_top) if args.profile else None
+    try:
+        errors = process_files(all_files, args.action, args.dry, profiler)
+    finally:
+        if profiler is not None:
+            profiler.write(args.profile_report)
+
+    if len(errors) > 0:
+        logger.error("Errors occurred during processing:")
+        for filepath, error in errors:
+            logger.error(
+                f"> {filepath}:{os.linesep}{''.join([f'  | {line}' for line in traceback.format_exception_only(error)])}"
+            )
+        return 1
+    return 0
+
+
+def process_files(
+    all_files: list[str],
+    action_ids: list[str] | None,
+    dry: bool,
+    profiler: RunProfiler | None,
+) -> list[tuple[str, BookError]]:
     errors = list[tuple[str, BookError]]()
     for original_filepath in all_files:
         if original_filepath.endswith(".bak"):
@@ -112,21 +153,19 @@ def main():
 
         logger.debug(f"Processing {original_filepath}")
         try:
-            Transaction(original_filepath, args.action, args.dry).perform()
+            transaction = Transaction(original_filepath, action_ids, dry, profiler)
+            with (
+                profiler.book(original_filepath)
+                if profiler is not None
+                else contextlib.nullcontext()
+            ):
+                transaction.perform()
         except Exception as e:
             if isinstance(e, BookError):
                 errors.append((original_filepath, e))
             else:
                 raise
-
-    if len(errors) > 0:
-        logger.error("Errors occurred during processing:")
-        for filepath, error in errors:
-            logger.error(
-                f"> {filepath}:{os.linesep}{''.join([f'  | {line}' for line in traceback.format_exception_only(error)])}"
-            )
-        return 1
-    return 0
+    return errors
 
 
 def get_files_from_dirpath(dirpath: str) -> list[str]:
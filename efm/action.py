@@ -5,7 +5,7 @@ import subprocess
 from typing import Literal, Sequence
 import pymupdf
 
-from efm import dedrm, kfxconvert
+from efm import dedrm, kfxconvert, kfx_index
 from adl.epub_get import get_ebook
 from adl.exceptions import GetEbookException
 from adl.login import login
@@ -37,6 +37,8 @@ class BaseAction(object):
     filepath: str
     temp_dirpath: str
     dry: bool
+    # other outputs of the action (say a cbz next to a converted epub), kept next to the final book
+    extra_filepaths: list[str]
 
     def __init__(
         self,
@@ -51,6 +53,7 @@ class BaseAction(object):
         self.metadata = metadata
         self.filepath = filepath
         self.temp_dirpath = temp_dirpath
+        self.extra_filepaths = []
 
     def perform(self) -> str:
         raise NotImplementedError
@@ -69,7 +72,19 @@ class BaseAction(object):
                 "TXT",
             ]
             ext = os.path.splitext(self.filepath)[1][1:].upper()
-            if ext not in supported_formats:
+            kfx_index_file = self.config.kfx_index_file if self.config else None
+            # without an index, kfx books are skipped as an unsupported format rather than decoded on every run
+            if kfx_index_file is not None and kfx_index.is_kfx_filepath(self.filepath):
+                # copies in the temp dir (say after drm) are looked up but not added to the index
+                self.metadata = (
+                    kfx_index.get_kfx_metadata(
+                        self.filepath,
+                        kfx_index_file,
+                        store=not self.filepath.startswith(self.temp_dirpath),
+                    )
+                    or False
+                )
+            elif ext not in supported_formats:
                 logger.info(
                     f"Setting metadata for {self.filepath} to False because it's not a supported format. Format is {ext}."
                 )
@@ -433,20 +448,97 @@ class Kfx2EpubAction(BaseAction):
         return "kfx2epub"
 
     def perform(self):
-        valid_extensions = ["kfx", "kfx-zip", "kpf"]
-        ext = os.path.splitext(self.filepath)[1].lower()[1:]
-        if ext in valid_extensions:
+        if kfx_index.is_kfx_filepath(self.filepath):
+            extra_formats = (self.config.kfx_extra_formats if self.config else None) or []
+            # the book is decoded once for the epub and any extra formats
+            results = kfxconvert.convert_to_formats(
+                self.filepath,
+                ["epub", *extra_formats],
+                compress_level=(
+                    self.config.epub_compress_level if self.config else None
+                ),
+                store_compressed_media=(
+                    self.config is None
+                    or self.config.epub_store_compressed_media is not False
+                ),
+                cache_dir=(self.config.conversion_cache_dir if self.config else None),
+                cache_max_mb=(
+                    self.config.conversion_cache_max_mb if self.config else None
+                ),
+                timing_file=(self.config.kfx_timing_file if self.config else None),
+            )
             filepath = os.path.join(self.temp_dirpath, "after_kfx2epub.epub")
             with open(filepath, "wb") as f:
-                f.write(kfxconvert.convert_to_epub(self.filepath))
+                f.write(results["epub"])
             logger.info(f"Converted {self.filepath} to {filepath}")
+
+            for extra_format in extra_formats:
+                if results[extra_format] is None:
+                    logger.info(
+                        f"Skipping {extra_format} for {self.filepath} because it has no page images."
+                    )
+                    continue
+                extra_filepath = os.path.join(
+                    self.temp_dirpath, f"after_kfx2epub.{extra_format}"
+                )
+                with open(extra_filepath, "wb") as f:
+                    f.write(results[extra_format])
+                self.extra_filepaths.append(extra_filepath)
+                logger.info(f"Converted {self.filepath} to {extra_filepath}")
             return filepath
         logger.debug(
-            f"Skipping {self.filepath} because it's not a KFX-ZIP file (extensions {', '.join(valid_extensions)})."
+            f"Skipping {self.filepath} because it's not a KFX-ZIP file (extensions {', '.join(kfx_index.KFX_EXTENSIONS)})."
         )
         return self.filepath
 
 
+class KfxImageBookAction(BaseAction):
+    image_format: str
+
+    @classmethod
+    def description(cls) -> str:
+        return f"convert fixed layout kfx (comics, print replica) to {cls.image_format}"
+
+    @classmethod
+    def id(cls) -> str:
+        return f"kfx2{cls.image_format}"
+
+    def perform(self):
+        if not kfx_index.is_kfx_filepath(self.filepath):
+            logger.debug(
+                f"Skipping {self.filepath} because it's not a KFX-ZIP file (extensions {', '.join(kfx_index.KFX_EXTENSIONS)})."
+            )
+            return self.filepath
+
+        # written straight into the temp dir, so the pages are never all held in memory for a cbz
+        filepath = kfxconvert.convert_to_image_book(
+            self.filepath,
+            self.image_format,
+            os.path.join(self.temp_dirpath, f"after_{self.id()}"),
+            max_memory_mb=(
+                self.config.kfx_image_max_memory_mb if self.config else None
+            ),
+            cache_dir=(self.config.conversion_cache_dir if self.config else None),
+            cache_max_mb=(self.config.conversion_cache_max_mb if self.config else None),
+            timing_file=(self.config.kfx_timing_file if self.config else None),
+        )
+        if filepath is None:
+            logger.debug(
+                f"Skipping {self.filepath} because it's not made of page images."
+            )
+            return self.filepath
+        logger.info(f"Converted {self.filepath} to {filepath}")
+        return filepath
+
+
+class Kfx2CbzAction(KfxImageBookAction):
+    image_format = "cbz"
+
+
+class Kfx2PdfAction(KfxImageBookAction):
+    image_format = "pdf"
+
+
 ALL_ACTIONS: Sequence[type[BaseAction]] = [
     DeDrmAction,
     RenameAction,
@@ -454,4 +546,6 @@ ALL_ACTIONS: Sequence[type[BaseAction]] = [
     ReformatPdfAction,
     DownloadAcsmAction,
     Kfx2EpubAction,
+    Kfx2CbzAction,
+    Kfx2PdfAction,
 ]
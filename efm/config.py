@@ -1,10 +1,21 @@
 from pathlib import Path
-from schema import Schema, Optional
+from schema import And, Schema, Optional
 
 # NOTE: can't use ALL_ACTIONS cause circular dependencies
 # NOTE: order matters. drm has to come first for any metadata to work, download has to happen before
 #       anything to do with files, etc.
-valid_actions = ["download_acsm", "drm", "kfx2epub", "rename", "pdf", "print", "none"]
+#       kfx2cbz and kfx2pdf come before kfx2epub so fixed layout books get page images and the rest get an epub
+valid_actions = [
+    "download_acsm",
+    "drm",
+    "kfx2cbz",
+    "kfx2pdf",
+    "kfx2epub",
+    "rename",
+    "pdf",
+    "print",
+    "none",
+]
 
 
 schema = Schema(
@@ -21,6 +32,23 @@ schema = Schema(
         # kindle_database_files is a list of files created by kindlekey
         Optional("kindle_database_files"): list[str],
         Optional("kindle_android_files"): [str],
+        # zlib level (0-9) for text files in converted epubs
+        Optional("epub_compress_level"): And(int, lambda n: 0 <= n <= 9),
+        # store jpeg/png/woff/etc uncompressed in converted epubs
+        Optional("epub_store_compressed_media"): bool,
+        # directory where converted kfx images are cached between conversions (no cache if unset)
+        Optional("conversion_cache_dir"): str,
+        # size limit of the conversion cache in megabytes, least recently used entries are removed first
+        Optional("conversion_cache_max_mb"): And(int, lambda n: n > 0),
+        # other formats (cbz, pdf) written next to books converted by kfx2epub, from the same decode
+        Optional("kfx_extra_formats"): [And(str, lambda s: s in ["cbz", "pdf"])],
+        # memory in megabytes kfx2cbz/kfx2pdf may use for page images on top of the decoded book.
+        # limits parallel JPEG-XR conversion, and kfx2pdf writes a cbz instead if the pages don't fit
+        Optional("kfx_image_max_memory_mb"): And(int, lambda n: n > 0),
+        # file that kfx conversions append the time spent in each phase to, one json line per book
+        Optional("kfx_timing_file"): str,
+        # sqlite file indexing kfx book metadata, so print/rename don't reopen unchanged books (build with efm-index)
+        Optional("kfx_index_file"): str,
     },
     ignore_extra_keys=True,
 )
@@ -38,6 +66,14 @@ class Config(object):
     adobe_user: str | None
     adobe_password: str | None
     pdf_passwords: list[str] | None
+    epub_compress_level: int | None
+    epub_store_compressed_media: bool | None
+    conversion_cache_dir: str | None
+    conversion_cache_max_mb: int | None
+    kfx_extra_formats: list[str] | None
+    kfx_image_max_memory_mb: int | None
+    kfx_timing_file: str | None
+    kfx_index_file: str | None
 
     def __init__(self, filepath: Path):
         data = schema.validate(load_config(filepath))
@@ -52,6 +88,14 @@ class Config(object):
         self.adobe_user = data.get("adobe_user")
         self.adobe_password = data.get("adobe_password")
         self.pdf_passwords = data.get("pdf_passwords")
+        self.epub_compress_level = data.get("epub_compress_level")
+        self.epub_store_compressed_media = data.get("epub_store_compressed_media")
+        self.conversion_cache_dir = data.get("conversion_cache_dir")
+        self.conversion_cache_max_mb = data.get("conversion_cache_max_mb")
+        self.kfx_extra_formats = data.get("kfx_extra_formats")
+        self.kfx_image_max_memory_mb = data.get("kfx_image_max_memory_mb")
+        self.kfx_timing_file = data.get("kfx_timing_file")
+        self.kfx_index_file = data.get("kfx_index_file")
 
 
 def optional_value(d: dict[str, str], key: str, parent: Config | None) -> str | None:
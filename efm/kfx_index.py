@@ -0,0 +1,377 @@
+"""
+Local index of KFX book metadata.
+
+Opening a KFX book to read its title and authors means unpacking the container and decoding its
+metadata fragments, which adds up across a library. The index keeps what the print and rename actions
+need (plus asset id, content type, cover hash and layout flags) in a SQLite file keyed by file path,
+and re-reads a book only when its modification time or size changes.
+
+    efm-index --index library.db ~/Books
+    efm-index --index library.db --author pratchett
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable
+
+from kfxlib import JobLog, set_logger, YJ_Book
+
+from efm.metadata import Metadata
+
+logger = logging.getLogger(__name__)
+
+KFX_EXTENSIONS = ["kfx", "kfx-zip", "kpf"]
+
+# bump when the columns or the way they are extracted change, older indexes are rebuilt
+INDEX_VERSION = 1
+
+COLUMNS = [
+    "filepath",
+    "mtime_ns",
+    "size",
+    "title",
+    "authors",
+    "asset_id",
+    "cde_type",
+    "cover_sha256",
+    "is_fixed_layout",
+    "is_print_replica",
+    "is_pdf_backed_fixed_layout",
+    "error",
+]
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS books (
+    filepath TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    title TEXT,
+    authors TEXT NOT NULL,
+    asset_id TEXT,
+    cde_type TEXT,
+    cover_sha256 TEXT,
+    is_fixed_layout INTEGER NOT NULL,
+    is_print_replica INTEGER NOT NULL,
+    is_pdf_backed_fixed_layout INTEGER NOT NULL,
+    error TEXT
+)
+"""
+
+
+class KfxBookEntry(object):
+    filepath: str
+    mtime_ns: int
+    size: int
+    title: str | None
+    authors: list[str]
+    asset_id: str | None
+    cde_type: str | None
+    cover_sha256: str | None
+    is_fixed_layout: bool
+    is_print_replica: bool
+    is_pdf_backed_fixed_layout: bool
+    # set instead of the metadata when the book could not be read
+    error: str | None
+
+    def __init__(self, row: dict[str, Any]):
+        self.filepath = row["filepath"]
+        self.mtime_ns = row["mtime_ns"]
+        self.size = row["size"]
+        self.title = row["title"]
+        self.authors = json.loads(row["authors"])
+        self.asset_id = row["asset_id"]
+        self.cde_type = row["cde_type"]
+        self.cover_sha256 = row["cover_sha256"]
+        self.is_fixed_layout = bool(row["is_fixed_layout"])
+        self.is_print_replica = bool(row["is_print_replica"])
+        self.is_pdf_backed_fixed_layout = bool(row["is_pdf_backed_fixed_layout"])
+        self.error = row["error"]
+
+    def to_metadata(self) -> Metadata:
+        return Metadata(
+            format="KFX",
+            encryption=None,
+            title=self.title,
+            author=" & ".join(self.authors) if self.authors else None,
+            subject=None,
+            keywords=None,
+            creator=None,
+            producer=None,
+            creation_date=None,
+            mod_date=None,
+            is_k2pdfopt_version=False,
+        )
+
+
+def is_kfx_filepath(filepath: str) -> bool:
+    return os.path.splitext(filepath)[1].lower()[1:] in KFX_EXTENSIONS
+
+
+def extract_kfx_metadata(filepath: str) -> dict[str, Any]:
+    """
+    Read the index columns of one book. Runs in worker processes, so it returns a plain dict and
+    reports a book that can't be read in the error column rather than raising.
+    """
+    stat = os.stat(filepath)
+    row: dict[str, Any] = {
+        "filepath": filepath,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "title": None,
+        "authors": "[]",
+        "asset_id": None,
+        "cde_type": None,
+        "cover_sha256": None,
+        "is_fixed_layout": False,
+        "is_print_replica": False,
+        "is_pdf_backed_fixed_layout": False,
+        "error": None,
+    }
+
+    set_logger(JobLog(logger))
+    try:
+        book = YJ_Book(filepath)
+        metadata = book.get_metadata()
+        row["title"] = metadata.title
+        row["authors"] = json.dumps(metadata.authors or [])
+        row["asset_id"] = metadata.asset_id
+        row["cde_type"] = metadata.cde_content_type
+        if metadata.cover_image_data is not None:
+            row["cover_sha256"] = hashlib.sha256(metadata.cover_image_data[1]).hexdigest()
+        row["is_fixed_layout"] = book.is_fixed_layout
+        row["is_print_replica"] = book.is_print_replica
+        row["is_pdf_backed_fixed_layout"] = book.is_pdf_backed_fixed_layout
+    except Exception as e:
+        row["error"] = repr(e)
+    finally:
+        set_logger()
+
+    return row
+
+
+class KfxIndex(object):
+    db_filepath: str
+
+    def __init__(self, db_filepath: str):
+        self.db_filepath = os.path.expanduser(db_filepath)
+        self.connection = sqlite3.connect(self.db_filepath)
+        self.connection.row_factory = sqlite3.Row
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_VERSION:
+            logger.debug(
+                f"Rebuilding KFX index {self.db_filepath} (version {version}, expected {INDEX_VERSION})"
+            )
+            with self.connection:
+                self.connection.execute("DROP TABLE IF EXISTS books")
+                self.connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        with self.connection:
+            self.connection.execute(CREATE_TABLE)
+
+    def __enter__(self) -> "KfxIndex":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, filepath: str) -> KfxBookEntry | None:
+        """
+        Get the entry for a book, or None if it isn't indexed or has changed since it was.
+        """
+        filepath = os.path.abspath(filepath)
+        row = self.connection.execute(
+            "SELECT * FROM books WHERE filepath = ?", (filepath,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+        if row["mtime_ns"] != stat.st_mtime_ns or row["size"] != stat.st_size:
+            return None
+        return KfxBookEntry(row)
+
+    def add(self, filepath: str) -> KfxBookEntry:
+        """
+        Get the entry for a book, reading the book and storing it first if needed.
+        """
+        entry = self.get(filepath)
+        if entry is None:
+            row = extract_kfx_metadata(os.path.abspath(filepath))
+            self._store([row])
+            entry = KfxBookEntry(row)
+        return entry
+
+    def update(self, dirpaths: Iterable[str], workers: int | None = None) -> dict[str, int]:
+        """
+        Index the KFX books under each folder, reading new and changed books in parallel and removing
+        entries for books that are gone.
+        """
+        stale: list[str] = []
+        found = 0
+        removed = 0
+        for dirpath in dirpaths:
+            dirpath = os.path.abspath(dirpath)
+            indexed = {
+                row["filepath"]: (row["mtime_ns"], row["size"])
+                for row in self.connection.execute(
+                    "SELECT filepath, mtime_ns, size FROM books WHERE filepath LIKE ? ESCAPE '\\'",
+                    (like_prefix(os.path.join(dirpath, "")),),
+                )
+            }
+            present = set()
+            for root, dirs, files in os.walk(dirpath):
+                for file in files:
+                    filepath = os.path.join(root, file)
+                    if not is_kfx_filepath(filepath) or file.endswith(".bak"):
+                        continue
+                    try:
+                        stat = os.stat(filepath)
+                    except FileNotFoundError:
+                        continue
+                    found += 1
+                    present.add(filepath)
+                    if indexed.get(filepath) != (stat.st_mtime_ns, stat.st_size):
+                        stale.append(filepath)
+
+            gone = [(filepath,) for filepath in indexed if filepath not in present]
+            with self.connection:
+                self.connection.executemany("DELETE FROM books WHERE filepath = ?", gone)
+            removed += len(gone)
+
+        rows: list[dict[str, Any]] = []
+        if len(stale) > 1 and workers != 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rows = list(executor.map(extract_kfx_metadata, stale, chunksize=4))
+        else:
+            rows = [extract_kfx_metadata(filepath) for filepath in stale]
+        self._store(rows)
+
+        failed = [row for row in rows if row["error"] is not None]
+        for row in failed:
+            logger.warning(f"Couldn't read KFX metadata from {row['filepath']}: {row['error']}")
+
+        stats = {
+            "books": found,
+            "read": len(rows),
+            "unchanged": found - len(rows),
+            "removed": removed,
+            "failed": len(failed),
+        }
+        logger.info(f"Updated KFX index {self.db_filepath}: {stats}")
+        return stats
+
+    def search(
+        self,
+        title: str | None = None,
+        author: str | None = None,
+        cde_type: str | None = None,
+        fixed_layout: bool | None = None,
+    ) -> list[KfxBookEntry]:
+        """
+        Find indexed books. Title and author match case-insensitive substrings, all given filters must match.
+        """
+        conditions = ["error IS NULL"]
+        params: list[Any] = []
+        if title is not None:
+            conditions.append("title LIKE ? ESCAPE '\\'")
+            params.append(f"%{like_escape(title)}%")
+        if author is not None:
+            conditions.append("authors LIKE ? ESCAPE '\\'")
+            params.append(f"%{like_escape(json.dumps(author)[1:-1])}%")
+        if cde_type is not None:
+            conditions.append("cde_type = ?")
+            params.append(cde_type)
+        if fixed_layout is not None:
+            conditions.append("is_fixed_layout = ?")
+            params.append(int(fixed_layout))
+        rows = self.connection.execute(
+            f"SELECT * FROM books WHERE {' AND '.join(conditions)} ORDER BY title, filepath",
+            params,
+        )
+        return [KfxBookEntry(row) for row in rows]
+
+    def _store(self, rows: list[dict[str, Any]]):
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO books ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [tuple(row[column] for column in COLUMNS) for row in rows],
+            )
+
+
+def like_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def like_prefix(text: str) -> str:
+    return f"{like_escape(text)}%"
+
+
+def get_kfx_metadata(filepath: str, db_filepath: str, store: bool = True) -> Metadata | None:
+    """
+    Metadata for the print and rename actions when an index is configured. Stores books read for
+    the first time unless they are temporary copies (store=False).
+    """
+    with KfxIndex(db_filepath) as index:
+        entry = index.add(filepath) if store else index.get(filepath)
+        if entry is None:
+            entry = KfxBookEntry(extract_kfx_metadata(filepath))
+    if entry.error is not None:
+        logger.info(f"Couldn't read KFX metadata from {filepath}: {entry.error}")
+        return None
+    return entry.to_metadata()
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Build and query an index of KFX book metadata."
+    )
+    argparser.add_argument("--index", required=True, help="SQLite index file")
+    argparser.add_argument(
+        "--workers", type=int, help="processes reading books (default: one per CPU)"
+    )
+    argparser.add_argument("--title", help="list books with titles containing this")
+    argparser.add_argument("--author", help="list books with an author containing this")
+    argparser.add_argument("--cde-type", help="list books of this type (EBOK, PDOC, ...)")
+    argparser.add_argument(
+        "--fixed-layout", action=argparse.BooleanOptionalAction, help="list (non) fixed-layout books"
+    )
+    argparser.add_argument("folders", nargs="*", help="folders to index before listing")
+    args = argparser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    with KfxIndex(args.index) as index:
+        if args.folders:
+            index.update(args.folders, workers=args.workers)
+        if args.folders and all(
+            v is None for v in [args.title, args.author, args.cde_type, args.fixed_layout]
+        ):
+            return 0
+        for entry in index.search(
+            title=args.title,
+            author=args.author,
+            cde_type=args.cde_type,
+            fixed_layout=args.fixed_layout,
+        ):
+            fields = [
+                entry.filepath,
+                f"{' & '.join(entry.authors) or 'unknown'} - {entry.title}",
+                entry.cde_type or "",
+            ]
+            if entry.is_fixed_layout:
+                fields.append("fixed-layout")
+            print("\t".join(fields))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
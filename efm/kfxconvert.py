@@ -7,45 +7,238 @@ Notable changes:
 - no symbol_catalog_filename. there seems to be a default one, but I'm not sure how you're supposed to have this thing anyway...
 """
 
+import json
 import logging
+import os
 from typing import cast
 from kfxlib import (
+    CONVERSION_CACHE_MAX_SIZE,
+    ConversionCache,
     JobLog,
+    PhaseTimer,
+    set_conversion_cache,
     set_logger,
+    set_phase_timer,
     YJ_Book,
 )
 
 logger = logging.getLogger(__name__)
 
+IMAGE_FORMATS = ["cbz", "pdf"]
 
-def convert_to_epub(filepath: str, convert_to_epub_2=False) -> bytes:
+
+def convert_to_epub(
+    filepath: str,
+    convert_to_epub_2=False,
+    compress_level: int | None = None,
+    store_compressed_media=True,
+    cache_dir: str | None = None,
+    cache_max_mb: int | None = None,
+    timing_file: str | None = None,
+) -> bytes:
+    return convert_to_formats(
+        filepath,
+        ["epub"],
+        convert_to_epub_2=convert_to_epub_2,
+        compress_level=compress_level,
+        store_compressed_media=store_compressed_media,
+        cache_dir=cache_dir,
+        cache_max_mb=cache_max_mb,
+        timing_file=timing_file,
+    )["epub"]
+
+
+def convert_to_formats(
+    filepath: str,
+    formats: list[str],
+    convert_to_epub_2=False,
+    compress_level: int | None = None,
+    store_compressed_media=True,
+    cache_dir: str | None = None,
+    cache_max_mb: int | None = None,
+    timing_file: str | None = None,
+) -> dict[str, bytes | None]:
+    """
+    Convert a KFX book to each of formats (see kfxlib.CONVERSION_FORMATS), decoding it once.
+    The result maps each format to its data, None when there was nothing to convert (say a cbz of a reflowable book).
+    """
+    job_log, cache, phase_timer = start_conversion(
+        f"Converting {filepath} to {', '.join(formats)}", cache_dir, cache_max_mb
+    )
+
+    try:
+        # no symbol_catalog_filename because I have no idea where it is
+        book = YJ_Book(filepath)
+        book.decode_book(retain_yj_locals=True)
+
+        if "epub" in formats and book.has_pdf_resource:
+            job_log.warning(
+                "This book contains PDF content. It can be extracted using either the From KFX user interface "
+                "plugin or the KFX Input plugin CLI. See the KFX Input plugin documentation for more information."
+            )
+
+        if "epub" in formats and (book.is_fixed_layout or book.is_magazine):
+            job_log.warning(
+                "This book has a layout that is incompatible with calibre conversion. For best results use either "
+                "the From KFX user interface plugin or the KFX Input plugin CLI for conversion. See the KFX Input "
+                "plugin documentation for more information."
+            )
+
+        # cbz and pdf are made from page images, which only fixed layout books without text have
+        skipped_formats = (
+            [f for f in formats if f in IMAGE_FORMATS]
+            if not (book.is_fixed_layout and book.is_image_based_fixed_layout)
+            else []
+        )
+        if skipped_formats:
+            job_log.info(
+                f"Not converting to {', '.join(skipped_formats)} because the book is not made of page images"
+            )
+
+        # compress_level is the zlib level (0-9) used for xhtml/css/etc, None means zlib's default
+        # store_compressed_media skips deflate for jpeg/png/woff/etc since it barely shrinks them
+        # the formats share the decoded book, its position data and converted JPEG-XR images
+        results: dict[str, bytes | None] = {f: None for f in skipped_formats}
+        results |= book.convert_to_formats(
+            [f for f in formats if f not in skipped_formats],
+            epub2_desired=convert_to_epub_2,
+            compress_level=compress_level,
+            store_compressed_media=store_compressed_media,
+        )
+    finally:
+        end_conversion()
+
+    finish_conversion(job_log, cache, phase_timer, filepath, formats, timing_file)
+    return results
+
+
+def convert_to_image_book(
+    filepath: str,
+    image_format: str,
+    output_filepath_base: str,
+    max_memory_mb: int | None = None,
+    cache_dir: str | None = None,
+    cache_max_mb: int | None = None,
+    timing_file: str | None = None,
+) -> str | None:
+    """
+    Convert a fixed layout KFX book to a cbz or pdf written straight to output_filepath_base plus the extension.
+    Returns the file written, or None when the book is not made of page images (reflowable, or fixed layout with text)
+    or nothing was written.
+    """
+    job_log, cache, phase_timer = start_conversion(
+        f"Converting {filepath} to {image_format}", cache_dir, cache_max_mb
+    )
+
+    try:
+        # the metadata is enough to tell the layout, so a reflowable book is never decoded. It is read into
+        # its own YJ_Book, since decode_book will not add to the fragments get_metadata leaves behind
+        probe = YJ_Book(filepath)
+        probe.get_metadata()
+
+        output_filepath = None
+        book = None
+        if probe.is_fixed_layout:
+            book = YJ_Book(filepath)
+            book.decode_book(retain_yj_locals=True)
+
+        # fixed layout books with text (say Kids' Book Creator books) have no page images either,
+        # they are left to kfx2epub
+        if book is None or not book.is_image_based_fixed_layout:
+            job_log.info(
+                f"Not converting to {image_format} because the book is not made of page images"
+            )
+        else:
+            max_memory = max_memory_mb * 1024 * 1024 if max_memory_mb else None
+            # a cbz is written a page at a time, but a pdf holds every page until it is written.
+            # the raw resources ($417 fragments) are about the size of the page images
+            if image_format == "pdf" and max_memory is not None:
+                images_size = sum(
+                    len(fragment.value) for fragment in book.fragments.get_all("$417")
+                )
+                if images_size > max_memory:
+                    job_log.warning(
+                        f"Converting to cbz instead of pdf because the {images_size // (1024 * 1024)} MB of "
+                        f"page images would not fit in {max_memory_mb} MB"
+                    )
+                    image_format = "cbz"
+
+            output_filepath = f"{output_filepath_base}.{image_format}"
+            if image_format == "pdf":
+                written = book.convert_to_pdf(output_file=output_filepath)
+            else:
+                written = book.convert_to_cbz(
+                    output_file=output_filepath, max_memory=max_memory
+                )
+
+            if written is None:
+                job_log.warning(f"No {image_format} was written")
+                # a conversion that gave up part way may have left a file behind
+                if os.path.exists(output_filepath):
+                    os.remove(output_filepath)
+                output_filepath = None
+    finally:
+        end_conversion()
+
+    finish_conversion(
+        job_log, cache, phase_timer, filepath, [image_format], timing_file
+    )
+    return output_filepath
+
+
+def start_conversion(
+    message: str, cache_dir: str | None, cache_max_mb: int | None
+) -> tuple[JobLog, ConversionCache | None, PhaseTimer]:
     # set_logger puts my logger onto a thread local
     job_log = cast(JobLog, set_logger(JobLog(logger)))
-    job_log.info("Converting %s" % filepath)
+    job_log.info(message)
 
-    # no symbol_catalog_filename because I have no idea where it is
-    book = YJ_Book(filepath)
-    book.decode_book(retain_yj_locals=True)
+    # kfxlib times its phases (decode, content, styles, resources, zip, ...) into the thread's phase timer
+    phase_timer = cast(PhaseTimer, set_phase_timer(PhaseTimer()))
 
-    if book.has_pdf_resource:
-        job_log.warning(
-            "This book contains PDF content. It can be extracted using either the From KFX user interface "
-            "plugin or the KFX Input plugin CLI. See the KFX Input plugin documentation for more information."
+    # converted images are cached by content, so reconverting a book (say after a config change)
+    # reuses the images from the last conversion. the cache object is kept between books so the
+    # hit counts below add up over the run
+    cache = (
+        set_conversion_cache(
+            os.path.expanduser(cache_dir),
+            cache_max_mb * 1024 * 1024 if cache_max_mb else CONVERSION_CACHE_MAX_SIZE,
         )
+        if cache_dir is not None
+        else set_conversion_cache()
+    )
+    return job_log, cache, phase_timer
 
-    if book.is_fixed_layout or book.is_magazine:
-        job_log.warning(
-            "This book has a layout that is incompatible with calibre conversion. For best results use either "
-            "the From KFX user interface plugin or the KFX Input plugin CLI for conversion. See the KFX Input "
-            "plugin documentation for more information."
-        )
 
-    epub_data = book.convert_to_epub(epub2_desired=convert_to_epub_2)
+def finish_conversion(
+    job_log: JobLog,
+    cache: ConversionCache | None,
+    phase_timer: PhaseTimer,
+    filepath: str,
+    formats: list[str],
+    timing_file: str | None,
+):
+    if cache is not None:
+        job_log.info(
+            f"Conversion cache {cache.dirname}: {cache.hits} hits, {cache.misses} misses "
+            f"({cache.hit_rate():.0%}), {cache.evictions} evicted"
+        )
 
-    # unset global logger
-    set_logger()
+    # one json object per book, so a slow book shows which phase the time went to
+    timing = json.dumps(
+        {"book": filepath, "formats": formats, "phases": phase_timer.report()}
+    )
+    job_log.debug(f"Conversion phases: {timing}")
+    if timing_file is not None:
+        with open(os.path.expanduser(timing_file), "a") as f:
+            f.write(timing + "\n")
 
     if job_log.errors:
         raise Exception("\n".join(job_log.errors))
 
-    return epub_data
+
+def end_conversion():
+    # unset global logger and phase timer, also when the conversion failed, so the next book
+    # converted on this thread does not log to or time into this one
+    set_logger()
+    set_phase_timer()
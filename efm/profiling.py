@@ -0,0 +1,260 @@
+"""
+Profiling of whole efm runs.
+
+A slow run is hard to diagnose by rerunning books by hand, since most of the time goes to kfxlib and
+the DeDRM tools. With --profile, each book's Transaction runs under cProfile (cpu) or tracemalloc
+(alloc), and the results are added up per action and per module over the run. The report lists those
+totals along with the books that took longest or needed the most memory.
+
+Only the efm process is profiled. JPEG-XR conversions in worker processes and external tools count
+towards the time of the action that waited for them, but not towards any module.
+
+    efm --profile cpu --profile-report profile.json ~/Books
+"""
+
+import cProfile
+import contextlib
+import json
+import logging
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from typing import Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ["cpu", "alloc"]
+
+MB = 1024 * 1024
+
+
+class BookProfile(object):
+    filepath: str
+    wall_sec: float
+    cpu_sec: float
+    # the most memory traced at once while the book was processed (alloc only)
+    peak_mb: float
+    # memory allocated while the book was processed and still held at the end (alloc only)
+    held_mb: float
+    actions: dict[str, float]
+    failed: bool
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.wall_sec = 0.0
+        self.cpu_sec = 0.0
+        self.peak_mb = 0.0
+        self.held_mb = 0.0
+        self.actions = {}
+        self.failed = False
+
+    def to_dict(self, mode: str) -> dict[str, Any]:
+        book: dict[str, Any] = {
+            "book": self.filepath,
+            "wall_sec": round(self.wall_sec, 4),
+            "cpu_sec": round(self.cpu_sec, 4),
+        }
+        if mode == "alloc":
+            book["peak_mb"] = round(self.peak_mb, 2)
+            book["held_mb"] = round(self.held_mb, 2)
+        book["actions"] = {k: round(v, 4) for k, v in self.actions.items()}
+        book["failed"] = self.failed
+        return book
+
+
+class RunProfiler(object):
+    def __init__(self, mode: str, top: int = 10):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode}, expected one of {PROFILE_MODES}")
+        self.mode = mode
+        self.top = top
+        self.books: list[BookProfile] = []
+        self.actions: dict[str, dict[str, float]] = {}
+        self.modules: dict[str, dict[str, float]] = {}
+        # cProfile results of every book, added together (cpu only)
+        self.stats: pstats.Stats | None = None
+        self.current_book: BookProfile | None = None
+        self.module_names: dict[str, str] = {}
+
+    @contextlib.contextmanager
+    def book(self, filepath: str) -> Iterator[BookProfile]:
+        book = BookProfile(filepath)
+        self.current_book = book
+        profile = cProfile.Profile() if self.mode == "cpu" else None
+        if profile is not None:
+            profile.enable()
+        else:
+            tracemalloc.start()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield book
+        except BaseException:
+            book.failed = True
+            raise
+        finally:
+            book.wall_sec = time.perf_counter() - wall_start
+            book.cpu_sec = time.thread_time() - cpu_start
+            if profile is not None:
+                profile.disable()
+                self.add_stats(profile)
+            else:
+                held, peak = tracemalloc.get_traced_memory()
+                book.peak_mb = max(book.peak_mb, peak / MB)
+                book.held_mb = held / MB
+                self.add_snapshot(tracemalloc.take_snapshot())
+                tracemalloc.stop()
+
+            self.current_book = None
+            self.books.append(book)
+
+    @contextlib.contextmanager
+    def action(self, action_id: str) -> Iterator[None]:
+        book = self.current_book
+        if self.mode == "alloc" and book is not None:
+            # each action gets its own peak, the book keeps the highest
+            book.peak_mb = max(book.peak_mb, tracemalloc.get_traced_memory()[1] / MB)
+            tracemalloc.reset_peak()
+
+        totals = self.actions.setdefault(action_id, {"calls": 0, "wall_sec": 0.0, "cpu_sec": 0.0})
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall_sec = time.perf_counter() - wall_start
+            totals["calls"] += 1
+            totals["wall_sec"] += wall_sec
+            totals["cpu_sec"] += time.thread_time() - cpu_start
+            if book is not None:
+                book.actions[action_id] = book.actions.get(action_id, 0.0) + wall_sec
+
+            if self.mode == "alloc" and tracemalloc.is_tracing():
+                peak_mb = tracemalloc.get_traced_memory()[1] / MB
+                totals["peak_mb"] = max(totals.get("peak_mb", 0.0), peak_mb)
+                if book is not None:
+                    book.peak_mb = max(book.peak_mb, peak_mb)
+
+    def add_stats(self, profile: cProfile.Profile):
+        stats = pstats.Stats(profile)
+        for (filename, _, _), (_, calls, own_sec, _, _) in stats.stats.items():
+            totals = self.modules.setdefault(self.module_name(filename), {"calls": 0, "own_sec": 0.0})
+            totals["calls"] += calls
+            totals["own_sec"] += own_sec
+
+        if self.stats is None:
+            self.stats = stats
+        else:
+            self.stats.add(stats)
+
+    def add_snapshot(self, snapshot: tracemalloc.Snapshot):
+        # what each module allocated during the book and still holds once it is done: caches and leaks
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        for stat in snapshot.statistics("filename"):
+            totals = self.modules.setdefault(
+                self.module_name(stat.traceback[0].filename), {"blocks": 0, "held_mb": 0.0}
+            )
+            totals["blocks"] += stat.count
+            totals["held_mb"] += stat.size / MB
+
+    def module_name(self, filename: str) -> str:
+        if filename not in self.module_names:
+            self.module_names[filename] = module_name(filename)
+        return self.module_names[filename]
+
+    def report(self) -> dict[str, Any]:
+        sort_key = "own_sec" if self.mode == "cpu" else "held_mb"
+        modules = sorted(self.modules.items(), key=lambda kv: kv[1].get(sort_key, 0), reverse=True)
+        if self.mode == "cpu":
+            top_books = sorted(self.books, key=lambda book: book.wall_sec, reverse=True)
+        else:
+            top_books = sorted(self.books, key=lambda book: book.peak_mb, reverse=True)
+
+        report: dict[str, Any] = {
+            "mode": self.mode,
+            "books": len(self.books),
+            "failed_books": sum(1 for book in self.books if book.failed),
+            "wall_sec": round(sum(book.wall_sec for book in self.books), 4),
+            "actions": [
+                {"action": action_id, **{k: round(v, 4) for k, v in totals.items()}}
+                for action_id, totals in sorted(
+                    self.actions.items(), key=lambda kv: kv[1]["wall_sec"], reverse=True
+                )
+            ],
+            "modules": [
+                {"module": name, **{k: round(v, 4) for k, v in totals.items()}}
+                for name, totals in modules
+            ],
+            "slowest_books" if self.mode == "cpu" else "most_memory_books": [
+                book.to_dict(self.mode) for book in top_books[: self.top]
+            ],
+        }
+
+        if self.stats is not None:
+            # the functions the time went to, for finding the hot spot inside a slow module
+            functions = sorted(
+                self.stats.stats.items(),
+                key=lambda kv: kv[1][2],
+                reverse=True,
+            )
+            report["functions"] = [
+                {
+                    "function": f"{self.module_name(filename)}:{lineno}({funcname})",
+                    "calls": calls,
+                    "own_sec": round(own_sec, 4),
+                    "cumulative_sec": round(cumulative_sec, 4),
+                }
+                for (filename, lineno, funcname), (_, calls, own_sec, cumulative_sec, _) in functions[: self.top]
+            ]
+
+        return report
+
+    def write(self, report_filepath: str) -> dict[str, Any]:
+        report = self.report()
+        with open(os.path.expanduser(report_filepath), "w") as f:
+            json.dump(report, f, indent=2)
+
+        logger.info(
+            f"Profiled {report['books']} books ({self.mode}) in {report['wall_sec']:.1f}s, report written to {report_filepath}"
+        )
+        for action in report["actions"]:
+            logger.info(f"  {action['action']:<10} {action['calls']:>5} calls {action['wall_sec']:>10.2f}s")
+        for book in report["slowest_books" if self.mode == "cpu" else "most_memory_books"]:
+            if self.mode == "cpu":
+                logger.info(f"  {book['wall_sec']:>10.2f}s {book['book']}")
+            else:
+                logger.info(f"  {book['peak_mb']:>10.1f}MB {book['book']}")
+
+        return report
+
+
+def module_name(filename: str) -> str:
+    # named from the sys.path entry the file is found under. efm also puts folders such as kfxlib on
+    # sys.path, so entries that are packages themselves are passed over
+    if filename == "~":
+        return "builtins"
+    if filename.startswith("<"):
+        # frozen and generated code
+        return filename
+
+    filepath = os.path.abspath(filename)
+    root = ""
+    for entry in sys.path:
+        entry = os.path.abspath(entry or os.curdir)
+        if (
+            filepath.startswith(entry + os.sep)
+            and len(entry) > len(root)
+            and not os.path.isfile(os.path.join(entry, "__init__.py"))
+        ):
+            root = entry
+
+    if not root:
+        return filename
+
+    parts = os.path.splitext(os.path.relpath(filepath, root))[0].split(os.sep)
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts.pop()
+    return ".".join(parts)
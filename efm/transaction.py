@@ -1,3 +1,4 @@
+import contextlib
 import logging
 import os
 import shutil
@@ -9,6 +10,7 @@ from typing import Literal
 from efm.action import ALL_ACTIONS, BaseAction
 from efm.metadata import Metadata
 from efm.config import Config, get_closest_config, valid_actions
+from efm.profiling import RunProfiler
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +21,7 @@ class Transaction:
         original_filepath: str,
         action_ids: list[str] | None,
         dry: bool,
+        profiler: RunProfiler | None = None,
     ):
         self.config = get_closest_config(os.path.dirname(original_filepath))
         self.metadata = None  # we save metadata so each action can have / modify it
@@ -33,6 +36,7 @@ class Transaction:
             else ["print"]
         )
         self.dry = dry
+        self.profiler = profiler
 
     def perform(self):
         temp_dirpath = tempfile.mkdtemp(prefix=self.filename)
@@ -41,6 +45,7 @@ class Transaction:
                 f"Processing {self.original_filepath} with actions {self.action_ids}"
             )
             action_ids_run = []
+            extra_filepaths = []
             for action_id in valid_actions:
                 if action_id == "none":
                     continue
@@ -56,12 +61,18 @@ class Transaction:
                     logger.debug(
                         f"Performing action {action_id} on {self.current_filepath}"
                     )
-                    after_filepath = action.perform()
+                    with (
+                        self.profiler.action(action_id)
+                        if self.profiler is not None
+                        else contextlib.nullcontext()
+                    ):
+                        after_filepath = action.perform()
                     logger.debug(
                         f"Action {action_id} succeeded and returned filepath {after_filepath}"
                     )
                     # save metadata for next action
                     self.metadata = action.metadata
+                    extra_filepaths.extend(action.extra_filepaths)
                     if after_filepath != self.current_filepath:
                         action_ids_run.append(action_id)
                         old_ext = os.path.splitext(self.current_filepath)[1]
@@ -111,6 +122,19 @@ class Transaction:
                 )
                 logger.debug(f"Moving {self.current_filepath} to {new_filepath}")
                 shutil.copy(self.current_filepath, new_filepath)
+                for extra_filepath in extra_filepaths:
+                    # extra outputs are named after the final book, so they follow a rename
+                    extra_new_filepath = os.path.join(
+                        os.path.dirname(self.original_filepath),
+                        f"{os.path.splitext(self.filename)[0]}{os.path.splitext(extra_filepath)[1]}",
+                    )
+                    if os.path.exists(extra_new_filepath):
+                        logger.warning(
+                            f"Not replacing {extra_new_filepath}, the new version is {extra_filepath}"
+                        )
+                        continue
+                    logger.debug(f"Copying {extra_filepath} to {extra_new_filepath}")
+                    shutil.copy(extra_filepath, extra_new_filepath)
                 logger.info(
                     f"Successfully executed {', '.join(action_ids_run)} for {new_filepath}. Intermediate files are in {temp_dirpath}. {self.original_filepath} has been backed up to {bak_filepath}."
                 )
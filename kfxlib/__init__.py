@@ -1,4 +1,6 @@
+from . import conversion_cache
 from . import message_logging
+from . import phase_timing
 from . import utilities
 from . import yj_book
 from . import yj_metadata
@@ -11,8 +13,14 @@ __copyright__ = "2016-2025, John Howell <jhowell@acm.org>"
 set_logger = message_logging.set_logger
 JobLog = message_logging.JobLog
 YJ_Book = yj_book.YJ_Book
+CONVERSION_FORMATS = yj_book.CONVERSION_FORMATS
 YJ_Metadata = yj_metadata.YJ_Metadata
 KFXDRMError = utilities.KFXDRMError
+set_conversion_cache = conversion_cache.set_conversion_cache
+ConversionCache = conversion_cache.ConversionCache
+PhaseTimer = phase_timing.PhaseTimer
+set_phase_timer = phase_timing.set_phase_timer
+CONVERSION_CACHE_MAX_SIZE = conversion_cache.CONVERSION_CACHE_MAX_SIZE
 
 
 clean_message = utilities.clean_message
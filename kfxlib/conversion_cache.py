@@ -0,0 +1,268 @@
+import functools
+import hashlib
+import json
+import os
+
+from .ion import IonSymbol
+from .message_logging import (log, record_messages, replay_messages)
+from .version import __version__
+
+
+__license__ = "GPL v3"
+__copyright__ = "2016-2025, John Howell <jhowell@acm.org>"
+
+
+CONVERSION_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+CONVERSION_CACHE_EVICT_PERCENTAGE = 90
+CONVERSION_CACHE_FORMAT = 2
+CONVERSION_CACHE_MESSAGE_METHODS = {"debug", "info", "warning", "error"}
+
+active_conversion_cache = None
+
+
+class ConversionCache(object):
+    '''
+    On-disk cache of derived image resources, keyed by a hash of the operation, its settings and its input data.
+
+    Each entry is a line of JSON describing the result and its messages, followed by the binary data of the result.
+    Entries are only ever read as data, so the worst a damaged or planted entry can do is supply a wrong image.
+    '''
+
+    def __init__(self, dirname, max_size=CONVERSION_CACHE_MAX_SIZE):
+        self.dirname = dirname
+        self.max_size = max_size
+        self.size = None
+        self.hits = self.misses = self.stores = self.evictions = 0
+
+    def key(self, params):
+        digest = hashlib.sha256()
+        update_digest(digest, (CONVERSION_CACHE_FORMAT, __version__, params))
+        return digest.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.dirname, key[:2], key)
+
+    def get(self, key):
+        filename = self.filename(key)
+        try:
+            with open(filename, "rb") as f:
+                entry = decode_entry(f.read())
+
+            os.utime(filename)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            log.warning("Discarding unreadable conversion cache entry %s: %s" % (filename, repr(e)))
+            self.remove(filename)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def put(self, key, result, messages):
+        # a failed conversion logs an error and usually returns its input, so leave it to be tried again next time
+        if any(method_name == "error" for method_name, msg in messages):
+            return
+
+        filename = self.filename(key)
+        try:
+            data = encode_entry(result, messages)
+        except Exception as e:
+            log.warning("Cannot store conversion cache entry %s: %s" % (filename, repr(e)))
+            return
+
+        temp_filename = "%s.%d.tmp" % (filename, os.getpid())
+
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(temp_filename, "wb") as f:
+                f.write(data)
+
+            os.replace(temp_filename, filename)
+        except Exception as e:
+            log.warning("Failed to write conversion cache entry %s: %s" % (filename, repr(e)))
+            self.remove(temp_filename)
+            return
+
+        self.stores += 1
+
+        if self.size is None:
+            self.size = sum(size for mtime, size, filename in self.entries())
+        else:
+            self.size += len(data)
+
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        entries = sorted(self.entries())
+        self.size = sum(size for mtime, size, filename in entries)
+
+        for mtime, size, filename in entries:
+            if self.size * 100 <= self.max_size * CONVERSION_CACHE_EVICT_PERCENTAGE:
+                break
+
+            if self.remove(filename):
+                self.size -= size
+                self.evictions += 1
+
+    def entries(self):
+        if not os.path.isdir(self.dirname):
+            return
+
+        for subdir in os.scandir(self.dirname):
+            if subdir.is_dir() and len(subdir.name) == 2:
+                for entry in os.scandir(subdir.path):
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+
+                        yield (stat.st_mtime, stat.st_size, entry.path)
+
+    def remove(self, filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            return False
+
+        return True
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def set_conversion_cache(dirname=None, max_size=CONVERSION_CACHE_MAX_SIZE):
+    global active_conversion_cache
+
+    if dirname is None:
+        active_conversion_cache = None
+    elif (active_conversion_cache is None or active_conversion_cache.dirname != dirname or
+            active_conversion_cache.max_size != max_size):
+        active_conversion_cache = ConversionCache(dirname, max_size)
+
+    return active_conversion_cache
+
+
+def get_conversion_cache():
+    return active_conversion_cache
+
+
+def cached_conversion(operation, settings=lambda: (), ignore_kwargs=()):
+    def decorator(fn):
+        def cache_key(cache, args, kwargs):
+            return cache.key((operation, settings(), args, sorted(kv for kv in kwargs.items() if kv[0] not in ignore_kwargs)))
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = active_conversion_cache
+            if cache is None:
+                return fn(*args, **kwargs)
+
+            key = cache_key(cache, args, kwargs)
+            entry = cache.get(key)
+            if entry is not None:
+                result, messages = entry
+                replay_messages(messages)
+                return result
+
+            with record_messages() as recorder:
+                result = fn(*args, **kwargs)
+
+            cache.put(key, result, recorder.messages)
+            return result
+
+        wrapper.uncached = fn
+        wrapper.cache_key = lambda cache, *args, **kwargs: cache_key(cache, args, kwargs)
+        return wrapper
+
+    return decorator
+
+
+def encode_entry(result, messages):
+    blobs = []
+
+    def encode(value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            blobs.append(bytes(value))
+            return {"blob": len(blobs) - 1}
+
+        if isinstance(value, IonSymbol):
+            return {"symbol": str(value)}
+
+        if isinstance(value, str) or isinstance(value, (int, float)) or value is None:
+            return value
+
+        if isinstance(value, tuple):
+            return {"tuple": [encode(item) for item in value]}
+
+        if isinstance(value, list):
+            return [encode(item) for item in value]
+
+        raise Exception("Cannot store %s in conversion cache" % type(value).__name__)
+
+    header = {"result": encode(result), "messages": [list(message) for message in messages],
+              "blob_sizes": [len(blob) for blob in blobs]}
+    return json.dumps(header).encode("utf8") + b"\n" + b"".join(blobs)
+
+
+def decode_entry(data):
+    header_data, sep, blob_data = data.partition(b"\n")
+    header = json.loads(header_data.decode("utf8"))
+    blob_sizes = header["blob_sizes"]
+    if not sep or sum(blob_sizes) != len(blob_data):
+        raise Exception("Truncated conversion cache entry")
+
+    blobs = []
+    offset = 0
+    for size in blob_sizes:
+        blobs.append(blob_data[offset:offset + size])
+        offset += size
+
+    def decode(value):
+        if isinstance(value, list):
+            return [decode(item) for item in value]
+
+        if isinstance(value, dict):
+            if "blob" in value:
+                return blobs[value["blob"]]
+
+            if "symbol" in value:
+                return IonSymbol(value["symbol"])
+
+            return tuple(decode(item) for item in value["tuple"])
+
+        return value
+
+    messages = []
+    for method_name, msg in header["messages"]:
+        if method_name not in CONVERSION_CACHE_MESSAGE_METHODS or not isinstance(msg, str):
+            raise Exception("Unexpected conversion cache message: %s" % method_name)
+
+        messages.append((method_name, msg))
+
+    return (decode(header["result"]), messages)
+
+
+def update_digest(digest, value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        digest.update(b"b%d:" % len(value))
+        digest.update(value)
+    elif isinstance(value, str):
+        data = value.encode("utf8")
+        digest.update(b"s%d:" % len(data))
+        digest.update(data)
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"l%d:" % len(value))
+        for item in value:
+            update_digest(digest, item)
+    elif isinstance(value, dict):
+        update_digest(digest, sorted(value.items()))
+    else:
+        data = repr(value).encode("utf8")
+        digest.update(b"r%d:" % len(data))
+        digest.update(data)
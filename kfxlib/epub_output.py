@@ -16,6 +16,7 @@ except ImportError:
     tweaks = {}
 
 from .message_logging import log
+from .phase_timing import phase
 from .resources import (EPUB2_ALT_MIMETYPES, MIMETYPE_OF_EXT)
 from .utilities import (make_unique_name, urlrelpath)
 
@@ -28,6 +29,7 @@ GENERATE_EPUB2_NCX_DOCTYPE = False
 CONSOLIDATE_HTML = True
 BEAUTIFY_HTML = True
 USE_HIDDEN_ATTRIBUTE = True
+STORE_COMPRESSED_MEDIA = True
 
 
 STANDARD_GUIDE_TYPE = {
@@ -71,6 +73,10 @@ SPINE_ITEMREF_PROPERTIES = {
 
 OPF_PROPERTIES = MANIFEST_ITEM_PROPERTIES | SPINE_ITEMREF_PROPERTIES
 
+COMPRESSED_MEDIA_MIMETYPES = {
+    "application/font-woff", "audio/mpeg", "audio/mp4", "font/woff", "font/woff2", "image/gif", "image/jpeg",
+    "image/png", "image/webp", "video/mp4", "video/mpeg", "video/ogg", "video/webm"}
+
 
 XML_NS_URI = "http://www.w3.org/XML/1998/namespace"
 
@@ -263,11 +269,14 @@ class EPUB_Output(object):
         RESET_CSS_FILEPATH = "/css" + RESET_CSS_FILEPATH
         LAYOUT_CSS_FILEPATH = "/css" + LAYOUT_CSS_FILEPATH
 
-    def __init__(self, epub2_desired=False, force_cover=False, will_output=True):
+    def __init__(self, epub2_desired=False, force_cover=False, will_output=True, compress_level=None,
+                 store_compressed_media=STORE_COMPRESSED_MEDIA):
         self.epub2_desired = epub2_desired
         self.generate_epub2 = epub2_desired
         self.force_cover = force_cover
         self.will_output = will_output
+        self.compress_level = compress_level
+        self.store_compressed_media = store_compressed_media
 
         self.oebps_files = {}
         self.book_parts = []
@@ -472,18 +481,21 @@ class EPUB_Output(object):
         if self.fixed_layout and (self.original_height is None or self.original_width is None) and (self.is_comic or self.is_children):
             self.compare_fixed_layout_viewports()
 
-        self.save_book_parts()
+        with phase("epub_save_parts", len(self.book_parts)):
+            self.save_book_parts()
 
-        if self.ncx_location is None and (self.generate_epub2 or self.GENERATE_EPUB2_COMPATIBLE):
-            self.create_ncx()
+        with phase("epub_package"):
+            if self.ncx_location is None and (self.generate_epub2 or self.GENERATE_EPUB2_COMPATIBLE):
+                self.create_ncx()
 
-        self.create_opf()
+            self.create_opf()
 
         if self.generate_epub2 is not self.epub2_desired:
             log.warning("Book converted to EPUB %s to accommodate content not supported in EPUB %s" % (
                 "2" if self.generate_epub2 else "3", "2" if self.epub2_desired else "3"))
 
-        return self.zip_epub()
+        with phase("epub_zip", len(self.oebps_files)):
+            return self.zip_epub()
 
     def fix_html_id(self, id):
         if self.illustrated_layout:
@@ -1285,12 +1297,15 @@ class EPUB_Output(object):
     def zip_epub(self):
         file = io.BytesIO()
 
-        with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=self.compress_level) as zf:
             zf.writestr("mimetype", "application/epub+zip".encode("ascii"), compress_type=zipfile.ZIP_STORED)
             zf.writestr("META-INF/container.xml", self.container_xml())
 
             for filename, oebps_file in sorted(self.oebps_files.items()):
-                zf.writestr(self.OEBPS_DIR + filename, oebps_file.binary_data)
+                if self.store_compressed_media and oebps_file.mimetype in COMPRESSED_MEDIA_MIMETYPES:
+                    zf.writestr(self.OEBPS_DIR + filename, oebps_file.binary_data, compress_type=zipfile.ZIP_STORED)
+                else:
+                    zf.writestr(self.OEBPS_DIR + filename, oebps_file.binary_data)
 
         data = file.getvalue()
         file.close()
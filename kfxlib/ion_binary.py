@@ -37,12 +37,14 @@ class IonBinary(IonSerial):
 
     def serialize_multiple_values_(self, values):
         serial = Serializer()
+        self.serialize_multiple_values_into(values, serial)
+        return serial.serialize()
+
+    def serialize_multiple_values_into(self, values, serial):
         serial.append(IonBinary.SIGNATURE)
 
         for value in values:
-            serial.append(self.serialize_value(value))
-
-        return serial.serialize()
+            self.serialize_value(value, serial)
 
     def deserialize_multiple_values_(self, data, import_symbols, with_offsets):
         if DEBUG:
@@ -76,19 +78,8 @@ class IonBinary(IonSerial):
 
         return result
 
-    def serialize_value(self, value):
-        handler = IonBinary.ION_TYPE_HANDLERS[ion_type(value)]
-        signature, data = handler(self, value)
-
-        if signature is None:
-            return data
-
-        length = len(data)
-
-        if length < IonBinary.VARIABLE_LEN_FLAG:
-            return descriptor(signature, length) + data
-
-        return descriptor(signature, IonBinary.VARIABLE_LEN_FLAG) + serialize_vluint(length) + data
+    def serialize_value(self, value, serial):
+        IonBinary.ION_TYPE_HANDLERS[ion_type(value)](self, value, serial)
 
     def deserialize_value(self, serial):
 
@@ -116,8 +107,8 @@ class IonBinary(IonSerial):
 
     NULL_VALUE_SIGNATURE = 0
 
-    def serialize_null_value(self, value):
-        return (None, descriptor(IonBinary.NULL_VALUE_SIGNATURE, IonBinary.NULL_FLAG))
+    def serialize_null_value(self, value, serial):
+        serial.append(descriptor(IonBinary.NULL_VALUE_SIGNATURE, IonBinary.NULL_FLAG))
 
     def deserialize_null_value(self, flag, serial):
         if flag == IonBinary.NULL_FLAG:
@@ -129,8 +120,8 @@ class IonBinary(IonSerial):
 
     BOOL_VALUE_SIGNATURE = 1
 
-    def serialize_bool_value(self, value):
-        return (None, descriptor(IonBinary.BOOL_VALUE_SIGNATURE, 1 if value else 0))
+    def serialize_bool_value(self, value, serial):
+        serial.append(descriptor(IonBinary.BOOL_VALUE_SIGNATURE, 1 if value else 0))
 
     def deserialize_bool_value(self, flag, serial):
         if flag > 1:
@@ -138,9 +129,11 @@ class IonBinary(IonSerial):
 
         return flag != 0
 
-    def serialize_int_value(self, value):
-        return ((IonBinary.POSINT_VALUE_SIGNATURE, serialize_unsignedint(value)) if value >= 0 else
-                (IonBinary.NEGINT_VALUE_SIGNATURE, serialize_unsignedint(-value)))
+    def serialize_int_value(self, value, serial):
+        if value >= 0:
+            serialize_typed_value(IonBinary.POSINT_VALUE_SIGNATURE, serialize_unsignedint(value), serial)
+        else:
+            serialize_typed_value(IonBinary.NEGINT_VALUE_SIGNATURE, serialize_unsignedint(-value), serial)
 
     POSINT_VALUE_SIGNATURE = 2
 
@@ -160,8 +153,8 @@ class IonBinary(IonSerial):
 
     FLOAT_VALUE_SIGNATURE = 4
 
-    def serialize_float_value(self, value):
-        return (IonBinary.FLOAT_VALUE_SIGNATURE, b"" if value == 0.0 else struct.pack(">d", value))
+    def serialize_float_value(self, value, serial):
+        serialize_typed_value(IonBinary.FLOAT_VALUE_SIGNATURE, b"" if value == 0.0 else struct.pack(">d", value), serial)
 
     def deserialize_float_value(self, data):
         if len(data) == 0:
@@ -177,13 +170,14 @@ class IonBinary(IonSerial):
 
     DECIMAL_VALUE_SIGNATURE = 5
 
-    def serialize_decimal_value(self, value):
+    def serialize_decimal_value(self, value, serial):
         if value.is_zero():
-            return (IonBinary.DECIMAL_VALUE_SIGNATURE, b"")
+            serialize_typed_value(IonBinary.DECIMAL_VALUE_SIGNATURE, b"", serial)
+            return
 
         vt = value.as_tuple()
-        return (IonBinary.DECIMAL_VALUE_SIGNATURE, serialize_vlsint(vt.exponent) +
-                serialize_signedint(combine_decimal_digits(vt.digits, vt.sign)))
+        serialize_typed_value(IonBinary.DECIMAL_VALUE_SIGNATURE, serialize_vlsint(vt.exponent) +
+                              serialize_signedint(combine_decimal_digits(vt.digits, vt.sign)), serial)
 
     def deserialize_decimal_value(self, data):
         if len(data) == 0:
@@ -196,8 +190,8 @@ class IonBinary(IonSerial):
 
     TIMESTAMP_VALUE_SIGNATURE = 6
 
-    def serialize_timestamp_value(self, value):
-        serial = Serializer()
+    def serialize_timestamp_value(self, value, serial):
+        data = Serializer()
 
         if isinstance(value.tzinfo, IonTimestampTZ):
             offset_minutes = value.tzinfo.offset_minutes()
@@ -208,28 +202,28 @@ class IonBinary(IonSerial):
             format_len = len(ION_TIMESTAMP_YMDHMSF)
             fraction_exponent = -3
 
-        serial.append(serialize_vlsint(offset_minutes))
-        serial.append(serialize_vluint(value.year))
+        data.append(serialize_vlsint(offset_minutes))
+        data.append(serialize_vluint(value.year))
 
         if format_len >= len(ION_TIMESTAMP_YM):
-            serial.append(serialize_vluint(value.month))
+            data.append(serialize_vluint(value.month))
 
             if format_len >= len(ION_TIMESTAMP_YMD):
-                serial.append(serialize_vluint(value.day))
+                data.append(serialize_vluint(value.day))
 
                 if format_len >= len(ION_TIMESTAMP_YMDHM):
-                    serial.append(serialize_vluint(value.hour))
-                    serial.append(serialize_vluint(value.minute))
+                    data.append(serialize_vluint(value.hour))
+                    data.append(serialize_vluint(value.minute))
 
                     if format_len >= len(ION_TIMESTAMP_YMDHMS):
-                        serial.append(serialize_vluint(value.second))
+                        data.append(serialize_vluint(value.second))
 
                         if format_len >= len(ION_TIMESTAMP_YMDHMSF):
-                            serial.append(serialize_vlsint(fraction_exponent))
-                            serial.append(serialize_signedint(
+                            data.append(serialize_vlsint(fraction_exponent))
+                            data.append(serialize_signedint(
                                     (value.microsecond * int(10 ** -fraction_exponent)) // 1000000))
 
-        return (IonBinary.TIMESTAMP_VALUE_SIGNATURE, serial.serialize())
+        serialize_typed_value(IonBinary.TIMESTAMP_VALUE_SIGNATURE, data.serialize(), serial)
 
     def deserialize_timestamp_value(self, data):
         serial = Deserializer(data)
@@ -291,29 +285,29 @@ class IonBinary(IonSerial):
 
     SYMBOL_VALUE_SIGNATURE = 7
 
-    def serialize_symbol_value(self, value):
+    def serialize_symbol_value(self, value, serial):
         symbol_id = self.symtab.get_id(value)
         if not symbol_id:
             raise Exception("attempt to serialize undefined symbol %s" % repr(value))
 
-        return (IonBinary.SYMBOL_VALUE_SIGNATURE, serialize_unsignedint(symbol_id))
+        serialize_typed_value(IonBinary.SYMBOL_VALUE_SIGNATURE, serialize_unsignedint(symbol_id), serial)
 
     def deserialize_symbol_value(self, data):
         return self.symtab.get_symbol(deserialize_unsignedint(data))
 
     STRING_VALUE_SIGNATURE = 8
 
-    def serialize_string_value(self, value):
-        return (IonBinary.STRING_VALUE_SIGNATURE, value.encode("utf-8"))
+    def serialize_string_value(self, value, serial):
+        serialize_typed_value(IonBinary.STRING_VALUE_SIGNATURE, value.encode("utf-8"), serial)
 
     def deserialize_string_value(self, data):
         return data.decode("utf-8")
 
     CLOB_VALUE_SIGNATURE = 9
 
-    def serialize_clob_value(self, value):
+    def serialize_clob_value(self, value, serial):
         log.error("Serialize CLOB")
-        return (IonBinary.CLOB_VALUE_SIGNATURE, bytes(value))
+        serialize_typed_value(IonBinary.CLOB_VALUE_SIGNATURE, bytes(value), serial)
 
     def deserialize_clob_value(self, data):
         log.error("Deserialize CLOB")
@@ -321,20 +315,22 @@ class IonBinary(IonSerial):
 
     BLOB_VALUE_SIGNATURE = 10
 
-    def serialize_blob_value(self, value):
-        return (IonBinary.BLOB_VALUE_SIGNATURE, bytes(value))
+    def serialize_blob_value(self, value, serial):
+        serialize_typed_value(IonBinary.BLOB_VALUE_SIGNATURE, bytes(value), serial)
 
     def deserialize_blob_value(self, data):
         return IonBLOB(data)
 
     LIST_VALUE_SIGNATURE = 11
 
-    def serialize_list_value(self, value):
-        serial = Serializer()
+    def serialize_list_value(self, value, serial, signature=LIST_VALUE_SIGNATURE):
+        header_pos = serial.reserve()
+        start = len(serial)
+
         for val in value:
-            serial.append(self.serialize_value(val))
+            self.serialize_value(val, serial)
 
-        return (IonBinary.LIST_VALUE_SIGNATURE, serial.serialize())
+        serial.fill(header_pos, value_header(signature, len(serial) - start))
 
     def deserialize_list_value(self, data, top_level=False):
         serial = Deserializer(data)
@@ -349,22 +345,23 @@ class IonBinary(IonSerial):
 
     SEXP_VALUE_SIGNATURE = 12
 
-    def serialize_sexp_value(self, value):
-        return (IonBinary.SEXP_VALUE_SIGNATURE, self.serialize_list_value(list(value))[1])
+    def serialize_sexp_value(self, value, serial):
+        self.serialize_list_value(value, serial, IonBinary.SEXP_VALUE_SIGNATURE)
 
     def deserialize_sexp_value(self, data):
         return IonSExp(self.deserialize_list_value(data))
 
     STRUCT_VALUE_SIGNATURE = 13
 
-    def serialize_struct_value(self, value):
-        serial = Serializer()
+    def serialize_struct_value(self, value, serial):
+        header_pos = serial.reserve()
+        start = len(serial)
 
         for key, val in value.items():
             serial.append(serialize_vluint(self.symtab.get_id(key)))
-            serial.append(self.serialize_value(val))
+            self.serialize_value(val, serial)
 
-        return (IonBinary.STRUCT_VALUE_SIGNATURE, serial.serialize())
+        serial.fill(header_pos, value_header(IonBinary.STRUCT_VALUE_SIGNATURE, len(serial) - start))
 
     def deserialize_struct_value(self, flag, serial):
         if flag == IonBinary.SORTED_STRUCT_FLAG:
@@ -391,22 +388,20 @@ class IonBinary(IonSerial):
 
     ANNOTATION_VALUE_SIGNATURE = 14
 
-    def serialize_annotation_value(self, value):
+    def serialize_annotation_value(self, value, serial):
         if not value.annotations:
             raise Exception("Serializing IonAnnotation without annotations")
 
-        serial = Serializer()
-
-        annotation_data = Serializer()
-        for annotation in value.annotations:
-            annotation_data.append(serialize_vluint(self.symtab.get_id(annotation)))
+        header_pos = serial.reserve()
+        start = len(serial)
 
+        annotation_data = b"".join([serialize_vluint(self.symtab.get_id(annotation)) for annotation in value.annotations])
         serial.append(serialize_vluint(len(annotation_data)))
-        serial.append(annotation_data.serialize())
+        serial.append(annotation_data)
 
-        serial.append(self.serialize_value(value.value))
+        self.serialize_value(value.value, serial)
 
-        return (IonBinary.ANNOTATION_VALUE_SIGNATURE, serial.serialize())
+        serial.fill(header_pos, value_header(IonBinary.ANNOTATION_VALUE_SIGNATURE, len(serial) - start))
 
     def deserialize_annotation_value(self, data):
         serial = Deserializer(data)
@@ -473,7 +468,22 @@ def descriptor(signature, flag):
     if flag < 0 or flag > 0x0f:
         raise Exception("Serialize bad descriptor flag: %d" % flag)
 
-    return bytes([(signature << 4) + flag])
+    return DESCRIPTORS[(signature << 4) + flag]
+
+
+DESCRIPTORS = [bytes([i]) for i in range(256)]
+
+
+def value_header(signature, length):
+    if length < IonBinary.VARIABLE_LEN_FLAG:
+        return descriptor(signature, length)
+
+    return descriptor(signature, IonBinary.VARIABLE_LEN_FLAG) + serialize_vluint(length)
+
+
+def serialize_typed_value(signature, data, serial):
+    serial.append(value_header(signature, len(data)))
+    serial.append(data)
 
 
 def serialize_unsignedint(value):
@@ -510,13 +520,17 @@ def serialize_vluint(value):
     if value < 0:
         raise Exception("Cannot serialize negative value as IonVLUInt: %d" % value)
 
+    if value < 0x80:
+        return DESCRIPTORS[value + 0x80]
+
     datalst = [(value & 0x7f) + 0x80]
-    while True:
+    value = value >> 7
+    while value:
+        datalst.append(value & 0x7f)
         value = value >> 7
-        if value == 0:
-            return bytes(datalst)
 
-        datalst.insert(0, value & 0x7f)
+    datalst.reverse()
+    return bytes(datalst)
 
 
 def deserialize_vluint(serial):
@@ -587,10 +601,7 @@ def lpad0(data, size):
 
 
 def ltrim0(data):
-    while len(data) and data[0] == 0:
-        data = data[1:]
-
-    return data
+    return data.lstrip(b"\x00")
 
 
 def ltrim0x(data):
@@ -12,6 +12,8 @@ __copyright__ = "2016-2025, John Howell <jhowell@acm.org>"
 DEBUG = False
 REPORT_ALL_USED_SYMBOLS = False
 
+SYMBOL_ID_RE = re.compile(r"^\$[0-9]+$")
+
 
 class SymbolTableCatalog(object):
     def __init__(self, add_global_shared_symbol_tables=False):
@@ -238,7 +240,7 @@ class LocalSymbolTable(object):
 
         symbol = ion_symbol.tostring()
 
-        if symbol.startswith("$") and re.match(r"^\$[0-9]+$", symbol):
+        if symbol.startswith("$") and SYMBOL_ID_RE.match(symbol):
             symbol_id = int(symbol[1:])
 
             if symbol_id not in self.symbol_of_id:
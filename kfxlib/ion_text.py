@@ -30,6 +30,11 @@ INDENT_SPACES = 2
 
 OPERATOR_RE = r"^[!#%&*+./;<=>?@^`|~-]+$"
 
+NULL_TOKENS = {
+    "null", "null.null", "null.bool", "null.int", "null.float", "null.decimal", "null.timestamp",
+    "null.string", "null.symbol", "null.blob", "null.clob", "null.struct", "null.list", "null.sexp",
+    }
+
 
 class ParseError(ValueError):
     pass
@@ -168,32 +173,32 @@ class IonText(IonSerial):
 
     def deserialize_next_value(self):
         token = self.file.current_token()
-        if token.ttype in ["null", "null.null", "null.bool", "null.int", "null.float", "null.decimal", "null.timestamp",
-                           "null.string", "null.symbol", "null.blob", "null.clob", "null.struct", "null.list", "null.sexp"]:
+        ttype = token.ttype
+        if ttype in NULL_TOKENS:
             value = self.deserialize_null_value(token)
 
-        elif token.ttype == "true" or token.ttype == "false":
+        elif ttype == "true" or ttype == "false":
             value = self.deserialize_bool_value(token)
 
-        elif token.ttype == TOKEN_INT:
+        elif ttype == TOKEN_INT:
             value = self.deserialize_int_value(token)
 
-        elif token.ttype == TOKEN_FLOAT or token.ttype in ["nan", "+inf", "-inf"]:
+        elif ttype == TOKEN_FLOAT or ttype in {"nan", "+inf", "-inf"}:
             value = self.deserialize_float_value(token)
 
-        elif token.ttype == TOKEN_DECIMAL:
+        elif ttype == TOKEN_DECIMAL:
             value = self.deserialize_decimal_value(token)
 
-        elif token.ttype == TOKEN_TIMESTAMP:
+        elif ttype == TOKEN_TIMESTAMP:
             value = self.deserialize_timestamp_value(token)
 
-        elif token.ttype in [TOKEN_IDENTIFIER, TOKEN_QUOTED_SYMBOL, TOKEN_OPERATOR]:
+        elif ttype in {TOKEN_IDENTIFIER, TOKEN_QUOTED_SYMBOL, TOKEN_OPERATOR}:
             value = self.deserialize_symbol_value(token)
 
-        elif token.ttype in [TOKEN_STRING, TOKEN_LONG_STRING]:
+        elif ttype in {TOKEN_STRING, TOKEN_LONG_STRING}:
             value = self.deserialize_string_value(token)
 
-        elif token.ttype == "{{":
+        elif ttype == "{{":
             self.file.allow_comments(False)
             self.file.allow_double_close(True)
             self.allow_unicode_strings = False
@@ -207,16 +212,16 @@ class IonText(IonSerial):
             self.file.allow_double_close(False)
             self.file.allow_comments(True)
 
-        elif token.ttype == "[":
+        elif ttype == "[":
             value = self.deserialize_list_value(token)
 
-        elif token.ttype == "(":
+        elif ttype == "(":
             value = self.deserialize_sexp_value(token)
 
-        elif token.ttype == "{":
+        elif ttype == "{":
             value = self.deserialize_struct_value(token)
 
-        elif token.ttype == TOKEN_EOF:
+        elif ttype == TOKEN_EOF:
             raise ParseError("End of file encountered when value expected")
 
         else:
@@ -425,12 +430,12 @@ class IonText(IonSerial):
         if token.ttype == TOKEN_QUOTED_SYMBOL and token.text.startswith("'") and token.text.endswith("'"):
             return self.create_symbol(unescape_quoted_symbol(token.text))
 
-        if token.ttype == TOKEN_IDENTIFIER and re.match(r"^\$[0-9]+$", token.text):
+        if token.ttype == TOKEN_IDENTIFIER and SYMBOL_ID_RE.match(token.text):
             symnum = int(token.text[1:])
             if self.symtab and symnum > 0:
                 return self.symtab.get_symbol(symnum)
 
-        if token.ttype == TOKEN_IDENTIFIER and re.match(r"^[a-zA-Z$_][a-zA-Z0-9$_]*$", token.text):
+        if token.ttype == TOKEN_IDENTIFIER and IDENTIFIER_RE.match(token.text):
             return self.create_symbol(token.text)
 
         if token.ttype == TOKEN_OPERATOR and self.allow_operators and re.match(OPERATOR_RE, token.text):
@@ -505,7 +510,7 @@ class IonText(IonSerial):
             if token.ttype == "}}":
                 break
 
-            if re.match(r"^[0-9A-Za-z+/=]+$", token.text):
+            if BASE64_RE.match(token.text):
                 b64text.append(token.text)
             else:
                 raise ParseError("Incorrect BLOB value (not base64)")
@@ -691,6 +696,8 @@ class IonText(IonSerial):
 
 
 def remove_underscores_between_digits(text, hex=False):
+    if "_" not in text:
+        return text
 
     while True:
         text, n = re.subn(r"([0-9a-fA-F])_([0-9a-fA-F])" if hex else r"([0-9])_([0-9])", r"\1\2", text)
@@ -777,6 +784,9 @@ def unescape_quoted_symbol(qs):
 
 
 def unescape_string_(s, allow_unicode=True, allow_eol=False):
+    if (PLAIN_STRING_RE if allow_unicode else PLAIN_ASCII_STRING_RE).fullmatch(s):
+        return s
+
     ss = []
     idx = 0
 
@@ -840,6 +850,10 @@ def unescape_string_(s, allow_unicode=True, allow_eol=False):
     return "".join(ss)
 
 
+PLAIN_STRING_RE = re.compile(r"[^\\\x00-\x1f\x7f]*")
+PLAIN_ASCII_STRING_RE = re.compile(r"[\x20-\x5b\x5d-\x7e]*")
+
+
 def split_string(s, max_size=80):
     return [s[i:i+max_size] for i in range(0, len(s), max_size)]
 
@@ -859,120 +873,140 @@ TOKEN_OPERATOR = "operator"
 
 
 class Token(object):
-    def __init__(self, text, line_number, start_col):
+    def __init__(self, text, ttype, offset, file):
         self.text = text
-        self.line_number = line_number
-        self.start_col = start_col
-        self.ttype = self.classify()
+        self.ttype = ttype
+        self.offset = offset
+        self.file = file
 
     def __repr__(self):
         return "line=%d col=%d type=%s text=%s" % (self.line_number, self.start_col + 1, quote_name(self.ttype), quote_name(self.text))
 
-    def classify(self):
-        if not self.text:
-            return TOKEN_EOF
+    @property
+    def line_number(self):
+        return self.file.line_and_column(self.offset)[0]
 
-        c = self.text[:1]
+    @property
+    def start_col(self):
+        return self.file.line_and_column(self.offset)[1]
 
-        if c == "'" or c == "\"":
-            if len(self.text) >= 2 and c == "\"" and self.text[-1] == "\"":
-                return TOKEN_STRING
 
-            if len(self.text) >= 6 and self.text.startswith("'''") and self.text.endswith("'''"):
-                return TOKEN_LONG_STRING
+PUNCTUATION_TOKENS = {"[", "]", "{", "}", "{{", "}}", "(", ")", ":", "::", ","}
 
-            if len(self.text) >= 2 and c == "'" and self.text[-1] == "'":
-                return TOKEN_QUOTED_SYMBOL
+IDENTIFIER_RE = re.compile(r"^[a-zA-Z$_][a-zA-Z0-9$_]*$")
+SYMBOL_ID_RE = re.compile(r"^\$[0-9]+$")
+OPERATOR_TOKEN_RE = re.compile(OPERATOR_RE)
+BASE64_RE = re.compile(r"^[0-9A-Za-z+/=]+$")
+RADIX_INT_RE = re.compile(r"^-?0[bx]")
+INT_RE = re.compile(r"^-?[0-9_]+$")
+FLOAT_CHARS_RE = re.compile(r"^[0-9_e.+-]+$")
+DECIMAL_CHARS_RE = re.compile(r"^[0-9_d.+-]+$")
+TIMESTAMP_CHARS_RE = re.compile(r"^[0-9][0-9.:TZ+-]+$")
 
-            return TOKEN_UNTERMINATED_STRING
+STRING_ESCAPE = r"\\(?:\r\n|[\s\S])?"
 
-        if self.text in {"[", "]", "{", "}", "{{", "}}", "(", ")", ":", "::", ",", ""}:
-            return self.text
+TOKEN_PATTERNS = [
+    ("eof", r"\Z"),
+    ("comment", r"/\*"),
+    ("long_string", r"'''(?:[^'\\]+|%s|'(?!''))*(?:''')?" % STRING_ESCAPE),
+    ("string", r"\"(?:[^\"\\]+|%s)*\"?" % STRING_ESCAPE),
+    ("quoted_symbol", r"'(?:[^'\\]+|%s)*'?" % STRING_ESCAPE),
+    ("punctuation", r"\{\{?|::?|%s|[\[\](),]"),
+    ("reserved", r"[+-]inf(?![a-zA-Z0-9_$])|null\.[a-zA-Z0-9_$]*"),
+    ("number", r"-?[0-9][0-9a-zA-Z.:_+-]*"),
+    ("identifier", r"[a-zA-Z_$][a-zA-Z0-9_$]*"),
+    ("operator", r"[!#%&*+./;<=>?@^`|~-]+"),
+    ("other", r"[\s\S]"),
+    ]
 
-        if self.text in RESERVED_TOKENS:
-            return self.text
 
-        if re.match("^[a-zA-Z$_][0-9a-zA-Z$_]*$", self.text):
-            return TOKEN_IDENTIFIER
+def token_re(allow_comments, allow_double_close):
+    patterns = []
+    for name, pattern in TOKEN_PATTERNS:
+        if name == "comment" and not allow_comments:
+            continue
 
-        if re.match(OPERATOR_RE, self.text):
-            return TOKEN_OPERATOR
+        if name == "punctuation":
+            pattern = pattern % (r"\}\}?" if allow_double_close else r"\}")
 
-        if c in {"-", ".", "0", "1", "2", "3", "4", "5", "6", "7", "8", "9"}:
-            ltext = self.text.lower()
+        patterns.append("(?P<%s>%s)" % (name, pattern))
 
-            if re.match(r"^-?0[bx]", ltext):
-                return TOKEN_INT
+    skip = r"(?:[ \t\r\n]+|//[^\r\n]*|/\*[\s\S]*?\*/)*" if allow_comments else r"[ \t\r\n]*"
+    return re.compile("%s(?:%s)" % (skip, "|".join(patterns)))
 
-            if re.match(r"^-?[0-9_]+$", ltext):
-                return TOKEN_INT
 
-            if "e" in ltext and re.match(r"^[0-9_e.+-]+$", ltext):
-                return TOKEN_FLOAT
+TOKEN_RES = {(c, d): token_re(c, d) for c in (False, True) for d in (False, True)}
 
-            if ("d" in ltext or "." in ltext) and re.match(r"^[0-9_d.+-]+$", ltext):
-                return TOKEN_DECIMAL
 
-            if ((":" in self.text or "T" in self.text or "Z" in self.text or (self.text[4:5] == "-" and self.text[7:8] == "-")) and
-                    re.match(r"^[0-9][0-9.:TZ+-]+$", self.text)):
-                return TOKEN_TIMESTAMP
+def classify_token(text):
+    if not text:
+        return TOKEN_EOF
 
-        return TOKEN_UNKNOWN
+    c = text[:1]
 
+    if c == "'" or c == "\"":
+        if len(text) >= 2 and c == "\"" and text[-1] == "\"":
+            return TOKEN_STRING
 
-class IonTextFile(object):
-    def __init__(self, data):
-        self.data = data
-        self.cursor = 0
-        self.line_number = 1
-        self.column_number = 1
-        self.eof = False
+        if len(text) >= 6 and text.startswith("'''") and text.endswith("'''"):
+            return TOKEN_LONG_STRING
 
-        self.allow_comments_ = True
-        self.allow_double_close_ = False
-        self.current_token_ = None
-        self.peek_token_ = None
+        if len(text) >= 2 and c == "'" and text[-1] == "'":
+            return TOKEN_QUOTED_SYMBOL
 
-    def next_char(self):
-        if self.cursor >= len(self.data):
-            self.eof = True
-            return ""
+        return TOKEN_UNTERMINATED_STRING
 
-        c = self.data[self.cursor]
-        self.cursor += 1
+    if text in PUNCTUATION_TOKENS:
+        return text
 
-        if c == "\r":
-            c = "\n"
-            if self.cursor < len(self.data) and self.data[self.cursor] == "\n":
-                self.cursor += 1
+    if text in RESERVED_TOKENS:
+        return text
 
-        if c == "\n":
-            self.line_number += 1
-            self.column_number = 0
-        else:
-            self.column_number += 1
+    if IDENTIFIER_RE.match(text):
+        return TOKEN_IDENTIFIER
+
+    if OPERATOR_TOKEN_RE.match(text):
+        return TOKEN_OPERATOR
+
+    if c in {"-", ".", "0", "1", "2", "3", "4", "5", "6", "7", "8", "9"}:
+        ltext = text.lower()
+
+        if RADIX_INT_RE.match(ltext):
+            return TOKEN_INT
 
-        return c
+        if INT_RE.match(ltext):
+            return TOKEN_INT
 
-    def advance_char(self, count=1):
-        while count:
-            self.next_char()
-            count -= 1
+        if "e" in ltext and FLOAT_CHARS_RE.match(ltext):
+            return TOKEN_FLOAT
 
-    def peek_char(self, offset=0):
-        if self.cursor + offset >= len(self.data):
-            return ""
+        if ("d" in ltext or "." in ltext) and DECIMAL_CHARS_RE.match(ltext):
+            return TOKEN_DECIMAL
 
-        c = self.data[self.cursor + offset]
-        return "\n" if c == "\r" else c
+        if ((":" in text or "T" in text or "Z" in text or (text[4:5] == "-" and text[7:8] == "-")) and
+                TIMESTAMP_CHARS_RE.match(text)):
+            return TOKEN_TIMESTAMP
 
-    def get_next_line(self):
-        while (not self.eof) and self.next_char() != "\n":
-            pass
+    return TOKEN_UNKNOWN
 
-    def skip_whitespace(self):
-        while self.peek_char() in [" ", "\t", "\n"]:
-            self.next_char()
+
+class IonTextFile(object):
+    def __init__(self, data):
+        self.data = data
+        self.cursor = 0
+
+        self.allow_comments_ = True
+        self.allow_double_close_ = False
+        self.current_token_ = None
+        self.peek_token_ = None
+
+    def line_and_column(self, offset):
+        text = self.data[:offset]
+        line_breaks = text.count("\n") + text.count("\r") - text.count("\r\n")
+        if not line_breaks:
+            return (1, offset + 1)
+
+        return (line_breaks + 1, offset - max(text.rfind("\n"), text.rfind("\r")) - 1)
 
     def next_token(self):
         if self.peek_token_ is not None:
@@ -1005,105 +1039,31 @@ class IonTextFile(object):
         self.allow_double_close_ = val
 
     def get_next_token(self):
-        in_comment = False
-
-        while not self.eof:
-            while self.peek_char() in [" ", "\t", "\n"]:
-                self.next_char()
-
-            if in_comment:
-                if self.peek_char() == "*" and self.peek_char(1) == "/":
-                    self.advance_char(2)
-                    in_comment = False
-                    continue
-
-                self.advance_char()
-                continue
+        m = TOKEN_RES[(self.allow_comments_, self.allow_double_close_)].match(self.data, self.cursor)
+        kind = m.lastgroup
+        start = m.start(kind)
+        text = m.group(kind)
 
-            if self.allow_comments_ and self.peek_char() == "/":
-                if self.peek_char(1) == "*":
-                    self.advance_char(2)
-                    in_comment = True
-                    continue
+        if kind == "eof":
+            self.cursor = start
+            return Token("", TOKEN_EOF, start, self)
 
-                if self.peek_char(1) == "/":
-                    self.get_next_line()
-                    continue
-
-            break
-
-        if in_comment:
+        if kind == "comment":
+            self.cursor = len(self.data)
             raise ParseError("Reached end of file within a comment")
 
-        start_line = self.line_number
-        start_column = self.column_number
-        start_cursor = self.cursor
-        c = self.next_char()
-
-        if self.eof:
-            token_text = ""
-        else:
-            if c == "'" or c == "\"":
-                endc = c
-                long_string = (c == "'" and self.peek_char() == "'" and self.peek_char(1) == "'")
-                if long_string:
-                    self.advance_char(2)
-
-                while True:
-                    c = self.next_char()
-                    if not c:
-                        break
-
-                    if c == "\\":
-                        self.next_char()
-                    elif long_string:
-                        if c == "'" and self.peek_char() == "'" and self.peek_char(1) == "'":
-                            self.advance_char(2)
-                            break
-                    elif c == endc:
-                        break
-
-            elif c in ["[", "]", "(", ")", ","]:
-                pass
-
-            elif c in ["{", ":"]:
-                if self.peek_char() == c:
-                    self.next_char()
-
-            elif c == "}":
-                if self.allow_double_close_ and self.peek_char() == c:
-                    self.next_char()
-
-            elif ((c == "-" or c == "+") and self.peek_char() == "i" and self.peek_char(1) == "n" and
-                    self.peek_char(2) == "f" and not re.match(r"^[a-zA-Z0-9_$]$", self.peek_char(3))):
-                self.advance_char(3)
-
-            elif (c == "n" and self.peek_char() == "u" and self.peek_char(1) == "l" and
-                    self.peek_char(2) == "l" and self.peek_char(3) == "."):
-                self.advance_char(4)
-
-                while re.match(r"^[a-zA-Z0-9_$]$", self.peek_char()):
-                    self.next_char()
+        if text[-1] == ":" and text[0] != ":":
+            text = text.rstrip(":")
 
-            elif (c >= "0" and c <= "9") or (c == "-" and self.peek_char() >= "0" and self.peek_char() <= "9"):
-                while re.match(r"^[0-9a-zA-Z.:_+-]$", self.peek_char()):
-                    self.next_char()
+        self.cursor = start + len(text)
 
-            elif re.match(r"^[a-zA-Z_$]$", c):
-                while re.match(r"^[a-zA-Z0-9_$]$", self.peek_char()):
-                    self.next_char()
-
-            elif re.match(OPERATOR_RE, c):
-                while re.match(OPERATOR_RE, self.peek_char()):
-                    self.next_char()
-
-            else:
-                pass
-
-            if self.data[start_cursor] != ":":
-                while self.data[self.cursor - 1] == ":":
-                    self.cursor -= 1
-
-            token_text = self.data[start_cursor:self.cursor]
+        if kind == "punctuation":
+            ttype = text
+        elif kind == "identifier":
+            ttype = text if text in RESERVED_TOKENS else TOKEN_IDENTIFIER
+        elif kind == "operator":
+            ttype = TOKEN_OPERATOR
+        else:
+            ttype = classify_token(text)
 
-        return Token(token_text, start_line, start_column)
+        return Token(text, ttype, start, self)
@@ -1,8 +1,10 @@
+import array
 import collections
-import math
+import itertools
+import sys
 from PIL import Image
 
-from .jxr_misc import (Deserializer, bytes_to_separated_hex)
+from .jxr_misc import (Deserializer, HuffmanTable, bytes_to_separated_hex)
 from .message_logging import log
 
 
@@ -106,29 +108,14 @@ grgiZigzagInv4x4V_ = [None, 10, 2, 12, 5, 9, 4, 8, 1, 13, 6, 15, 14, 3, 11, 7]
 
 iTransposeFlex = [None, 5, 1, 6, 10, 12, 8, 14, 2, 4, 3, 7, 9, 13, 11, 15]
 
-mb_pixel_map = [0, 1, 5, 4, 2, 3, 7, 6, 10, 11, 15, 14, 8, 9, 13, 12]
-
 
 NumBlkCBPHPDelta1 = [[0, -1, 0, 1, 1]]
 
 NumBlkCBPHPDelta2 = [[2, 2, 1, 1, -1, -2, -2, -2, -3]]
 
-YX4 = [(0, 0), (0, 1), (0, 2), (0, 3), (1, 0), (1, 1), (1, 2), (1, 3), (2, 0), (2, 1), (2, 2), (2, 3), (3, 0), (3, 1), (3, 2), (3, 3)]
-XY4 = [(0, 0), (1, 0), (2, 0), (3, 0), (0, 1), (1, 1), (2, 1), (3, 1), (0, 2), (1, 2), (2, 2), (3, 2), (0, 3), (1, 3), (2, 3), (3, 3)]
-
-XY2 = [(0, 0), (1, 0), (0, 1), (1, 1)]
-YX2 = [(0, 0), (0, 1), (1, 0), (1, 1)]
-
-X4 = [(0, 0), (1, 0), (2, 0), (3, 0)]
-
-Y4 = [(0, 0), (0, 1), (0, 2), (0, 3)]
-
 
 def HBIN(stbl):
-    btbl = {}
-    for k, v in stbl.items():
-        btbl[int("1" + k, 2)] = v
-    return btbl
+    return HuffmanTable(stbl)
 
 
 VAL_DC_YUV = HBIN({"10": 0, "001": 1, "00001": 2, "0001": 3, "11": 4, "010": 5, "00000": 6, "011": 7})
@@ -471,47 +458,32 @@ class JXRImage(object):
             raise Exception("Color format %s with %d components is not supported" % (
                     OUTPUT_COLOR_NAME[self.output_clr_fmt], self.primary_plane.NumComponents))
 
-        im = Image.new(mode, (self.image_width, self.image_height))
-        pixels = im.load()
+        shift = 8 if self.output_bitdepth == BD16 and mode != "I;16" else 0
 
         if mode == "RGBA":
-            r_data = self.primary_plane.ImagePlane[0]
-            g_data = self.primary_plane.ImagePlane[1]
-            b_data = self.primary_plane.ImagePlane[2]
             a_data = self.primary_plane.ImagePlane[3] if self.output_clr_fmt == NCOMPONENT else self.alpha_plane.ImagePlane[0]
-
-            for y in range(self.image_height):
-                for x in range(self.image_width):
-                    pixels[x, y] = (r_data[x][y], g_data[x][y], b_data[x][y], a_data[x][y]) if self.output_bitdepth == BD8 else \
-                        (r_data[x][y] >> 8, g_data[x][y] >> 8, b_data[x][y] >> 8, a_data[x][y] >> 8)
+            im = Image.merge(mode, [self.plane_band(data, shift) for data in self.primary_plane.ImagePlane[:3] + [a_data]])
 
         elif mode == "RGB":
-            r_data = self.primary_plane.ImagePlane[0]
-            g_data = self.primary_plane.ImagePlane[1]
-            b_data = self.primary_plane.ImagePlane[2]
-
-            for y in range(self.image_height):
-                for x in range(self.image_width):
-                    pixels[x, y] = (r_data[x][y], g_data[x][y], b_data[x][y]) if self.output_bitdepth == BD8 else \
-                        (r_data[x][y] >> 8, g_data[x][y] >> 8, b_data[x][y] >> 8)
+            im = Image.merge(mode, [self.plane_band(data, shift) for data in self.primary_plane.ImagePlane[:3]])
 
         elif mode == "1":
-            y_data = self.primary_plane.ImagePlane[0]
-
-            for y in range(self.image_height):
-                for x in range(self.image_width):
-                    pixels[x, y] = y_data[x][y] * 255
+            im = self.plane_band(self.primary_plane.ImagePlane[0]).point(lambda v: 255 if v else 0, mode)
 
         else:
-            y_data = self.primary_plane.ImagePlane[0]
+            im = self.plane_band(self.primary_plane.ImagePlane[0], mode=mode)
 
-            for y in range(self.image_height):
-                for x in range(self.image_width):
-                    pixels[x, y] = y_data[x][y]
-
-        del pixels
         return im
 
+    def plane_band(self, data, shift=0, mode="L"):
+        if shift:
+            data = array.array("B", [v >> shift for v in data])
+        elif mode == "I;16" and sys.byteorder != "little":
+            data = array.array("H", data)
+            data.byteswap()
+
+        return Image.frombuffer(mode, (self.image_width, self.image_height), data, "raw", mode, 0, 1)
+
 
 class ImgPlane(object):
 
@@ -611,8 +583,6 @@ class ImgPlane(object):
                                 MBx, MBy, MBxt, MByt, tile_mb_width, self.NumComponents,
                                 self.Mb[MBx-1][MBy] if MBx > 0 else None, self.Mb[MBx][MBy-1] if MBy > 0 else None)
 
-        self.image_data = Array(self.NumComponents, self.image.width, self.image.height)
-
         self.ds.discard_remainder_bits()
 
         if DEBUG0:
@@ -642,13 +612,16 @@ class ImgPlane(object):
             self.FirstLevelOverlapFiltering()
 
         self.SecondLevelInverseTransform()
-        self.SecondLevelCoefficientCombination()
 
         if self.image.overlap_mode in [FIRST_AND_SECOND_LEVEL_OVERLAP_FILTERING, SECOND_LEVEL_OVERLAP_FILTERING]:
             self.second_level_overlap_filtering()
 
     def FirstLevelInverseTransform(self):
+        dc_width = self.image.MBWidth * 4
+        self.DCPlane = []
+
         for i in range(self.NumComponents):
+            dcp = [0] * (dc_width * self.image.MBHeight * 4)
             for MBy in range(self.image.MBHeight):
                 for MBx in range(self.image.MBWidth):
                     mbp = self.Mb[MBx][MBy].MBBuffer[i]
@@ -658,266 +631,132 @@ class ImgPlane(object):
                         for iy in range(16):
                             log.info(", ".join(["%d" % mbp[iy*16+ix] for ix in range(16)]))
 
-                    DCLP0 = [mbp[j*16] for j in range(16)]
+                    DCLP0 = mbp[0::16]
                     if DEBUG1:
                         log.info("MB[%d,%d] DCLP0=%s" % (MBx, MBy, ", ".join(["%d" % z for z in DCLP0])))
 
-                    DCLP1 = strIDCT4x4Stage2(DCLP0)
+                    DCLP1 = strIDCT4x4Stage2(*DCLP0)
                     if DEBUG1:
                         log.info("MB[%d,%d] DCLP1=%s" % (MBx, MBy, ", ".join(["%d" % z for z in DCLP1])))
 
                     if i > 0 and self.scaled_flag:
                         DCLP1 = [v*2 for v in DCLP1]
 
-                    for j in range(16):
-                        mbp[j*16] = DCLP1[j]
-
-    def FirstLevelOverlapFiltering(self):
-        image = self.image
-
-        LE1 = [(0, 0, 8), (0, 0, 12), (0, 1, 0), (0, 1, 4)]
-        LE2 = [(0, 0, 9), (0, 0, 13), (0, 1, 1), (0, 1, 5)]
-
-        TE1 = [(0, 0, 2), (0, 0, 3), (1, 0, 0), (1, 0, 1)]
-        TE2 = [(0, 0, 6), (0, 0, 7), (1, 0, 4), (1, 0, 5)]
-
-        RE1 = [(0, 0, 10), (0, 0, 14), (0, 1, 2), (0, 1, 6)]
-        RE2 = [(0, 0, 11), (0, 0, 15), (0, 1, 3), (0, 1, 7)]
-
-        BE1 = [(0, 0, 10), (0, 0, 11), (1, 0, 8), (1, 0, 9)]
-        BE2 = [(0, 0, 14), (0, 0, 15), (1, 0, 12), (1, 0, 13)]
-
-        TLC = [(0, 0, 0), (0, 0, 1), (0, 0, 4), (0, 0, 5)]
-        TRC = [(0, 0, 2), (0, 0, 3), (0, 0, 6), (0, 0, 7)]
-        BLC = [(0, 0, 8), (0, 0, 9), (0, 0, 12), (0, 0, 13)]
-        BRC = [(0, 0, 10), (0, 0, 11), (0, 0, 14), (0, 0, 15)]
-
-        FLC = [(0, 0, 10), (0, 0, 11), (1, 0, 8), (1, 0, 9),
-               (0, 0, 14), (0, 0, 15), (1, 0, 12), (1, 0, 13),
-               (0, 1, 2), (0, 1, 3), (1, 1, 0), (1, 1, 1),
-               (0, 1, 6), (0, 1, 7), (1, 1, 4), (1, 1, 5)]
-
-        XYTRANSPOSE = [0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15]
-
-        def zzz(z):
-            return XYTRANSPOSE[z]*16
-
-        def FirstLevelCallOverlapPostFilter4x4(x, y):
-            if DEBUG1:
-                log.info("FirstLevelCallOverlapPostFilter4x4 x=%d y=%d" % (x, y))
-            arrayLocal = strPost4x4Stage2Split_alternate([self.Mb[x+xx][y+yy].MBBuffer[i][zzz(zz)] for xx, yy, zz in FLC])
-            for xx, yy, zz in FLC:
-                self.Mb[x+xx][y+yy].MBBuffer[i][zzz(zz)] = arrayLocal.pop(0)
-
-        def OverlapPostFilter4_(x, y, xyz_list):
-            if DEBUG1:
-                log.info("OverlapPostFilter4_ x=%d y=%d xyz=%s" % (x, y, repr(xyz_list)))
-            arrayLocal = OverlapPostFilter4([self.Mb[x+xx][y+yy].MBBuffer[i][zzz(zz)] for xx, yy, zz in xyz_list])
-            for xx, yy, zz in xyz_list:
-                self.Mb[x+xx][y+yy].MBBuffer[i][zzz(zz)] = arrayLocal.pop(0)
-
-        for i in range(self.NumComponents):
-            for Tx in range(image.NumTileCols):
-                for Ty in range(image.NumTileRows):
-                    first_MBx = image.LeftMBIndexOfTile[Tx]
-                    last_MBx = image.LeftMBIndexOfTile[Tx+1]-1
-                    first_MBy = image.TopMBIndexOfTile[Ty]
-                    last_MBy = image.TopMBIndexOfTile[Ty+1]-1
-                    if DEBUG1:
-                        log.info("tile i=%d x=%d y=%d MBx=%d-%d MBy=%d-%d" % (i, Tx, Ty, first_MBx, last_MBx, first_MBy, last_MBy))
-
-                    for y in range(first_MBy, last_MBy):
-                        for x in range(first_MBx, last_MBx):
-                            FirstLevelCallOverlapPostFilter4x4(x, y)
-
-                    if Tx == 0 or image.hard_tiling_flag:
-                        for y in range(first_MBy, last_MBy):
-                            OverlapPostFilter4_(first_MBx, y, LE1)
-                            OverlapPostFilter4_(first_MBx, y, LE2)
-
-                    if Ty == 0 or image.hard_tiling_flag:
-                        for x in range(first_MBx, last_MBx):
-                            OverlapPostFilter4_(x, first_MBy, TE1)
-                            OverlapPostFilter4_(x, first_MBy, TE2)
-
-                    if Tx == image.NumTileCols-1 or image.hard_tiling_flag:
-                        for y in range(first_MBy, last_MBy):
-                            OverlapPostFilter4_(last_MBx, y, RE1)
-                            OverlapPostFilter4_(last_MBx, y, RE2)
-
-                    if Ty == image.NumTileRows-1 or image.hard_tiling_flag:
-                        for x in range(first_MBx, last_MBx):
-                            OverlapPostFilter4_(x, last_MBy, BE1)
-                            OverlapPostFilter4_(x, last_MBy, BE2)
-
-                    if (Tx == 0 and Ty == 0) or image.hard_tiling_flag:
-                        OverlapPostFilter4_(first_MBx, first_MBy, TLC)
-
-                    if (Tx == image.NumTileCols-1 and Ty == 0) or image.hard_tiling_flag:
-                        OverlapPostFilter4_(last_MBx, first_MBy, TRC)
-
-                    if (Tx == 0 and Ty == image.NumTileRows-1) or image.hard_tiling_flag:
-                        OverlapPostFilter4_(first_MBx, last_MBy, BLC)
-
-                    if (Tx == image.NumTileCols-1 and Ty == image.NumTileRows-1) or image.hard_tiling_flag:
-                        OverlapPostFilter4_(last_MBx, last_MBy, BRC)
-
-                    if not image.hard_tiling_flag:
-                        if Tx != image.NumTileCols-1:
-                            for y in range(first_MBy, last_MBy):
-                                FirstLevelCallOverlapPostFilter4x4(last_MBx, y)
-
-                        if Ty != image.NumTileRows-1:
-                            for x in range(first_MBx, last_MBx):
-                                FirstLevelCallOverlapPostFilter4x4(x, last_MBy)
-
-                        if Tx != image.NumTileCols-1 and Ty != image.NumTileRows-1:
-                            FirstLevelCallOverlapPostFilter4x4(last_MBx, last_MBy)
-
-                        if Tx == 0 and Ty != image.NumTileRows-1:
-                            OverlapPostFilter4_(first_MBx, last_MBy, LE1)
-                            OverlapPostFilter4_(first_MBx, last_MBy, LE2)
-
-                        if Tx != image.NumTileCols-1 and Ty == 0:
-                            OverlapPostFilter4_(last_MBx, first_MBy, TE1)
-                            OverlapPostFilter4_(last_MBx, first_MBy, TE2)
+                    for by in range(4):
+                        p = ((MBy << 2) + by) * dc_width + (MBx << 2)
+                        dcp[p:p+4] = DCLP1[by::4]
 
-                        if Tx == image.NumTileCols-1 and Ty != image.NumTileRows-1:
-                            OverlapPostFilter4_(last_MBx, last_MBy, RE1)
-                            OverlapPostFilter4_(last_MBx, last_MBy, RE2)
+            self.DCPlane.append(dcp)
 
-                        if Tx != image.NumTileCols-1 and Ty == image.NumTileRows-1:
-                            OverlapPostFilter4_(last_MBx, last_MBy, BE1)
-                            OverlapPostFilter4_(last_MBx, last_MBy, BE2)
+    def FirstLevelOverlapFiltering(self):
+        for dcp in self.DCPlane:
+            self.overlap_filter_plane(dcp, 4, strPost4x4Stage2Split_alternate)
 
     def SecondLevelInverseTransform(self):
-        for i in range(self.NumComponents):
-            for MBy in range(self.image.MBHeight):
-                for MBx in range(self.image.MBWidth):
-                    mbp = self.Mb[MBx][MBy].MBBuffer[i]
-
-                    for j in range(0, 16):
-                        coeff0 = [mbp[j*16+k] for k in range(16)]
-                        if DEBUG1:
-                            log.info("MB[%d,%d] COEF[%d]0=%s" % (MBx, MBy, j, ", ".join(["%d" % z for z in coeff0])))
-
-                        coeff1 = strIDCT4x4Stage1(coeff0)
-                        if DEBUG1:
-                            log.info("MB[%d,%d] COEF[%d]1=%s" % (MBx, MBy, j, ", ".join(["%d" % z for z in coeff1])))
-
-                        for k in range(16):
-                            mbp[j*16+k] = coeff1[k]
-
-    def SecondLevelCoefficientCombination(self):
-        self.ImagePlane = Array(self.NumComponents, self.image.width, self.image.height, None)
+        width = self.image.width
+        dc_width = self.image.MBWidth * 4
+        self.ImagePlane = []
 
         for i in range(self.NumComponents):
-            ip = self.ImagePlane[i]
+            ip = [0] * (width * self.image.height)
+            dcp = self.DCPlane[i]
+
             for MBy in range(self.image.MBHeight):
-                MByy = MBy << 4
+                blocks = []
                 for MBx in range(self.image.MBWidth):
-                    MBxx = MBx << 4
                     mbp = self.Mb[MBx][MBy].MBBuffer[i]
+                    for j in range(16):
+                        bx = (MBx << 2) + (j >> 2)
+                        by = (MBy << 2) + (j & 3)
+                        coeff = mbp[j*16:j*16+16]
+                        coeff[0] = dcp[by * dc_width + bx]
+                        blocks.append(((by << 2) * width + (bx << 2), coeff))
 
-                    for by in range(4):
-                        by_x4 = MByy + (by << 2)
-                        by_x16 = by << 4
-                        for bx in range(4):
-                            bx_x4 = MBxx + (bx << 2)
-                            bx_x64 = bx << 6
+                InverseTransformBlocks(ip, width, blocks)
 
-                            for py in range(4):
-                                py_x4 = py << 2
-                                for px in range(4):
-                                    ip[bx_x4+px][by_x4+py] = mbp[by_x16+bx_x64+mb_pixel_map[px+py_x4]]
+            self.ImagePlane.append(ip)
 
+        del self.DCPlane
         del self.Mb
 
     def second_level_overlap_filtering(self):
-        def OverlapPostFilter4x4_(x, y, xy_list):
-            arrayLocal = OverlapPostFilter4x4([ip[x+xx][y+yy] for xx, yy in xy_list])
-            for xx, yy in xy_list:
-                ip[x+xx][y+yy] = arrayLocal.pop(0)
-
-        def OverlapPostFilter4_(x, y, xy_list):
-            arrayLocal = OverlapPostFilter4([ip[x+xx][y+yy] for xx, yy in xy_list])
-            for xx, yy in xy_list:
-                ip[x+xx][y+yy] = arrayLocal.pop(0)
+        for ip in self.ImagePlane:
+            self.overlap_filter_plane(ip, 16, OverlapPostFilter4x4)
 
+    def overlap_filter_plane(self, ip, mb_size, filter4x4):
         image = self.image
-        for i in range(self.NumComponents):
-            ip = self.ImagePlane[i]
+        width = image.MBWidth * mb_size
+        blocks = []
+        rows = []
+        columns = []
+        corners = []
 
-            for Tx in range(image.NumTileCols):
-                for Ty in range(image.NumTileRows):
-                    first_MBx = image.LeftMBIndexOfTile[Tx]*16
-                    next_MBx = image.LeftMBIndexOfTile[Tx+1]*16
-                    first_MBy = image.TopMBIndexOfTile[Ty]*16
-                    next_MBy = image.TopMBIndexOfTile[Ty+1]*16
+        for Tx in range(image.NumTileCols):
+            for Ty in range(image.NumTileRows):
+                first_x = image.LeftMBIndexOfTile[Tx] * mb_size
+                next_x = image.LeftMBIndexOfTile[Tx+1] * mb_size
+                first_y = image.TopMBIndexOfTile[Ty] * mb_size
+                next_y = image.TopMBIndexOfTile[Ty+1] * mb_size
+                inner_x = range(first_x+2, next_x-2, 4)
+                inner_y = range(first_y+2, next_y-2, 4)
+
+                for y in inner_y:
+                    blocks.extend(y * width + x for x in inner_x)
+
+                if Tx == 0 or image.hard_tiling_flag:
+                    columns.extend(y * width + first_x + xx for y in inner_y for xx in [0, 1])
 
-                    for x in range(first_MBx+2, next_MBx-2, 4):
-                        for y in range(first_MBy+2, next_MBy-2, 4):
-                            OverlapPostFilter4x4_(x, y, XY4)
+                if Ty == 0 or image.hard_tiling_flag:
+                    rows.extend((first_y + yy) * width + x for x in inner_x for yy in [0, 1])
 
-                    if Tx == 0 or image.hard_tiling_flag:
-                        for y in range(first_MBy+2, next_MBy-2, 4):
-                            for xx in [0, 1]:
-                                OverlapPostFilter4_(first_MBx+xx, y, Y4)
+                if Tx == image.NumTileCols-1 or image.hard_tiling_flag:
+                    columns.extend(y * width + next_x + xx for y in inner_y for xx in [-2, -1])
 
-                    if Ty == 0 or image.hard_tiling_flag:
-                        for x in range(first_MBx+2, next_MBx-2, 4):
-                            for yy in [0, 1]:
-                                OverlapPostFilter4_(x, first_MBy+yy, X4)
+                if Ty == image.NumTileRows-1 or image.hard_tiling_flag:
+                    rows.extend((next_y + yy) * width + x for x in inner_x for yy in [-2, -1])
 
-                    if Tx == image.NumTileCols-1 or image.hard_tiling_flag:
-                        for y in range(first_MBy+2, next_MBy-2, 4):
-                            for xx in [-2, -1]:
-                                OverlapPostFilter4_(next_MBx+xx, y, Y4)
+                if (Tx == 0 and Ty == 0) or image.hard_tiling_flag:
+                    corners.append(first_y * width + first_x)
 
-                    if Ty == image.NumTileRows-1 or image.hard_tiling_flag:
-                        for x in range(first_MBx+2, next_MBx-2, 4):
-                            for yy in [-2, -1]:
-                                OverlapPostFilter4_(x, next_MBy+yy, X4)
+                if (Tx == image.NumTileCols-1 and Ty == 0) or image.hard_tiling_flag:
+                    corners.append(first_y * width + next_x - 2)
 
-                    if (Tx == 0 and Ty == 0) or image.hard_tiling_flag:
-                        OverlapPostFilter4_(first_MBx, first_MBy, XY2)
+                if (Tx == 0 and Ty == image.NumTileRows-1) or image.hard_tiling_flag:
+                    corners.append((next_y - 2) * width + first_x)
 
-                    if (Tx == image.NumTileCols-1 and Ty == 0) or image.hard_tiling_flag:
-                        OverlapPostFilter4_(next_MBx-2, first_MBy, XY2)
+                if (Tx == image.NumTileCols-1 and Ty == image.NumTileRows-1) or image.hard_tiling_flag:
+                    corners.append((next_y - 2) * width + next_x - 2)
 
-                    if (Tx == 0 and Ty == image.NumTileRows-1) or image.hard_tiling_flag:
-                        OverlapPostFilter4_(first_MBx, next_MBy-2, XY2)
+                if not image.hard_tiling_flag:
+                    if Tx != image.NumTileCols-1:
+                        blocks.extend(y * width + next_x - 2 for y in inner_y)
 
-                    if (Tx == image.NumTileCols-1 and Ty == image.NumTileRows-1) or image.hard_tiling_flag:
-                        OverlapPostFilter4_(next_MBx-2, next_MBy-2, XY2)
+                    if Ty != image.NumTileRows-1:
+                        blocks.extend((next_y - 2) * width + x for x in inner_x)
 
-                    if not image.hard_tiling_flag:
-                        if Tx != image.NumTileCols-1:
-                            for y in range(first_MBy+2, next_MBy-2, 4):
-                                OverlapPostFilter4x4_(next_MBx-2, y, XY4)
+                    if Tx != image.NumTileCols-1 and Ty != image.NumTileRows-1:
+                        blocks.append((next_y - 2) * width + next_x - 2)
 
-                        if Ty != image.NumTileRows-1:
-                            for x in range(first_MBx+2, next_MBx-2, 4):
-                                OverlapPostFilter4x4_(x, next_MBy-2, XY4)
+                    if Tx == 0 and Ty != image.NumTileRows-1:
+                        columns.extend((next_y - 2) * width + first_x + xx for xx in [0, 1])
 
-                        if Tx != image.NumTileCols-1 and Ty != image.NumTileRows-1:
-                            OverlapPostFilter4x4_(next_MBx-2, next_MBy-2, XY4)
+                    if Tx != image.NumTileCols-1 and Ty == 0:
+                        rows.extend((first_y + yy) * width + next_x - 2 for yy in [0, 1])
 
-                        if Tx == 0 and Ty != image.NumTileRows-1:
-                            for xx in range(2):
-                                OverlapPostFilter4_(first_MBx+xx, next_MBy-2, Y4)
+                    if Tx == image.NumTileCols-1 and Ty != image.NumTileRows-1:
+                        columns.extend((next_y - 2) * width + next_x + xx for xx in [-2, -1])
 
-                        if Tx != image.NumTileCols-1 and Ty == 0:
-                            for yy in range(2):
-                                OverlapPostFilter4_(next_MBx-2, first_MBy+yy, X4)
+                    if Tx != image.NumTileCols-1 and Ty == image.NumTileRows-1:
+                        rows.extend((next_y + yy) * width + next_x - 2 for yy in [-2, -1])
 
-                        if Tx == image.NumTileCols-1 and Ty != image.NumTileRows-1:
-                            for xx in [-2, -1]:
-                                OverlapPostFilter4_(next_MBx+xx, next_MBy-2, Y4)
+        if DEBUG1:
+            log.info("overlap filter mb_size=%d blocks=%d rows=%d columns=%d corners=%d" % (
+                mb_size, len(blocks), len(rows), len(columns), len(corners)))
 
-                        if Tx != image.NumTileCols-1 and Ty == image.NumTileRows-1:
-                            for yy in [-2, -1]:
-                                OverlapPostFilter4_(next_MBx-2, next_MBy+yy, X4)
+        OverlapPostFilterBlocks(ip, width, blocks, filter4x4)
+        OverlapPostFilterLines(ip, (1, 2, 3), rows)
+        OverlapPostFilterLines(ip, (width, width*2, width*3), columns)
+        OverlapPostFilterLines(ip, (1, width, width+1), corners)
 
     def OutputFormatting(self):
         self.ConvertInternalToOutputClrFmt()
@@ -932,30 +771,21 @@ class ImgPlane(object):
                 raise Exception("Color format of alpha plane must by YONLY")
 
         elif self.internal_clr_fmt == YONLY and self.image.output_clr_fmt == RGB:
-            self.ImagePlane.append(Array(self.image.width, self.image.height, None))
-            self.ImagePlane.append(Array(self.image.width, self.image.height, None))
-
-            for y in range(self.image.height):
-                for x in range(self.image.width):
-                    self.ImagePlane[1][x][y] = self.ImagePlane[2][x][y] = self.ImagePlane[0][x][y]
+            self.ImagePlane.append(self.ImagePlane[0][:])
+            self.ImagePlane.append(self.ImagePlane[0][:])
 
             self.internal_clr_fmt == RGB
             self.NumComponents = 3
 
         elif self.internal_clr_fmt == YUV444 and self.image.output_clr_fmt == RGB:
             do_swap = self.image.output_bitdepth in [BD5, BD565, BD10] and not self.image.red_blue_not_swapped_flag
-            for y in range(self.image.height):
-                for x in range(self.image.width):
-                    tempT = -self.ImagePlane[1][x][y]
-                    Out1 = self.ImagePlane[0][x][y] - int(math.floor(tempT / 2))
-                    Out0 = tempT + Out1 - int(math.ceil(self.ImagePlane[2][x][y] / 2))
-                    Out2 = self.ImagePlane[2][x][y] + Out0
+            Y, U, V = self.ImagePlane[:3]
 
-                    if do_swap:
-                        Out0, Out2 = (Out2, Out0)
-
-                    self.ImagePlane[0][x][y], self.ImagePlane[1][x][y], self.ImagePlane[2][x][y] = (Out0, Out1, Out2)
+            Out1 = [y - ((-u) >> 1) for y, u in zip(Y, U)]
+            Out0 = [out1 - u + ((-v) >> 1) for out1, u, v in zip(Out1, U, V)]
+            Out2 = [v + out0 for v, out0 in zip(V, Out0)]
 
+            self.ImagePlane[:3] = [Out2, Out1, Out0] if do_swap else [Out0, Out1, Out2]
             self.internal_clr_fmt == RGB
 
         elif INTERNAL_COLOR_NAME[self.internal_clr_fmt] != OUTPUT_COLOR_NAME[self.image.output_clr_fmt]:
@@ -972,11 +802,7 @@ class ImgPlane(object):
 
         if iBias:
             for i in range(self.NumComponents):
-                ip = self.ImagePlane[i]
-                for x in range(0, self.image.width):
-                    ipx = ip[x]
-                    for y in range(0, self.image.height):
-                        ipx[y] += iBias
+                self.ImagePlane[i] = [v + iBias for v in self.ImagePlane[i]]
 
     def ComputeScaling(self):
         iScale = 0
@@ -991,15 +817,12 @@ class ImgPlane(object):
         outputComponents = 3 if self.internal_clr_fmt in [RGB, RGBE, YUV444] else self.NumComponents
         for i in range(outputComponents):
             jScale = iScale + 1 if self.image.output_bitdepth == BD565 and i != 1 else iScale
-            ip = self.ImagePlane[i]
 
             if iRoundingFactor or jScale:
                 if DEBUG1:
                     log.info("rounding factor = %d, scale = %d" % (iRoundingFactor, jScale))
 
-                for y in range(self.image.height):
-                    for x in range(self.image.width):
-                        ip[x][y] = (ip[x][y] + iRoundingFactor) >> jScale
+                self.ImagePlane[i] = [(v + iRoundingFactor) >> jScale for v in self.ImagePlane[i]]
 
     def PostscalingProcess(self):
         if self.image.output_clr_fmt == RGBE:
@@ -1012,17 +835,18 @@ class ImgPlane(object):
 
             if self.image.output_bitdepth in [BD16, BD16S, BD32S] and self.shift_bits != 0:
                 for i in range(self.NumComponents):
-                    for y in range(self.image.height):
-                        for x in range(self.image.width):
-                            self.ImagePlane[i][x][y] = self.ImagePlane[i][x][y] << self.shift_bits
+                    self.ImagePlane[i] = [v << self.shift_bits for v in self.ImagePlane[i]]
 
     def ClippingAndPackingStage(self):
 
-        CLIP_RANGE = {BD1BLACK1: (0, 1), BD1WHITE1: (0, 1), BD8: (0, 255), BD16: {0, 65535}, BD16S: (-32768, 32767)}
+        CLIP_RANGE = {BD1BLACK1: (0, 1), BD1WHITE1: (0, 1), BD8: (0, 255), BD16: (0, 65535), BD16S: (-32768, 32767)}
+        PACKING_TYPECODE = {BD1BLACK1: "B", BD1WHITE1: "B", BD8: "B", BD16: "H", BD16S: "h"}
 
         if self.image.output_bitdepth in CLIP_RANGE.keys():
             clip_low, clip_high = CLIP_RANGE[self.image.output_bitdepth]
+            typecode = PACKING_TYPECODE[self.image.output_bitdepth]
 
+            width = self.image.width
             outputHeight = self.image.image_height
             outputWidth = self.image.image_width
             n = self.image.ExtraPixelsTop
@@ -1030,19 +854,11 @@ class ImgPlane(object):
 
             for i in range(self.NumComponents):
                 ip = self.ImagePlane[i]
+                rows = (ip[p:p+outputWidth] for p in range(n * width + m, (n + outputHeight) * width, width))
 
-                if m == 0 and n == 0:
-                    for y in range(outputHeight):
-                        for x in range(outputWidth):
-                            v = ip[x][y]
-                            if v < clip_low:
-                                ip[x][y] = clip_low
-                            if v > clip_high:
-                                ip[x][y] = clip_high
-                else:
-                    for y in range(outputHeight):
-                        for x in range(outputWidth):
-                            ip[x][y] = Clip(ip[x+m][y+n], clip_low, clip_high)
+                self.ImagePlane[i] = array.array(typecode, [
+                    clip_low if v < clip_low else (clip_high if v > clip_high else v)
+                    for v in itertools.chain.from_iterable(rows)])
         else:
             raise Exception("Output bit depth %s is not supported" % (OUTPUT_BITDEPTH_NAME[self.image.output_bitdepth]))
 
@@ -2252,39 +2068,145 @@ def Array(*args):
     return [Array(*args[1:]) for i in range(args[0])]
 
 
-def strIDCT4x4Stage1(iCoeff):
-    iCoeff[0], iCoeff[1], iCoeff[2], iCoeff[3] = strDCT2x2up([iCoeff[0], iCoeff[1], iCoeff[2], iCoeff[3]])
-
-    iCoeff[5], iCoeff[4], iCoeff[7], iCoeff[6] = invOdd([iCoeff[5], iCoeff[4], iCoeff[7], iCoeff[6]])
-
-    iCoeff[10], iCoeff[8], iCoeff[11], iCoeff[9] = invOdd([iCoeff[10], iCoeff[8], iCoeff[11], iCoeff[9]])
-
-    iCoeff[15], iCoeff[14], iCoeff[13], iCoeff[12] = invOddOdd([iCoeff[15], iCoeff[14], iCoeff[13], iCoeff[12]])
-
-    return fourbutterfly(iCoeff, [[0, 4, 8, 12], [1, 5, 9, 13], [2, 6, 10, 14], [3, 7, 11, 15]])
-
-
-def strIDCT4x4Stage2(iCoeff):
-    iCoeff[2], iCoeff[3], iCoeff[6], iCoeff[7] = invOdd([iCoeff[2], iCoeff[3], iCoeff[6], iCoeff[7]])
-
-    iCoeff[8], iCoeff[12], iCoeff[9], iCoeff[13] = invOdd([iCoeff[8], iCoeff[12], iCoeff[9], iCoeff[13]])
-
-    iCoeff[10], iCoeff[14], iCoeff[11], iCoeff[15] = invOddOdd([iCoeff[10], iCoeff[14], iCoeff[11], iCoeff[15]])
-
-    iCoeff[0], iCoeff[4], iCoeff[1], iCoeff[5] = strDCT2x2up([iCoeff[0], iCoeff[4], iCoeff[1], iCoeff[5]])
-
-    return fourbutterfly(iCoeff, [[0, 12, 3, 15], [4, 8, 7, 11], [1, 13, 2, 14], [5, 9, 6, 10]])
-
-
-def strPost4x4Stage2Split_alternate(iCoeff):
-    p0m96, p0m32, p0p32, p0p96, p0m80, p0m16, p0p48, p0p112, p1m128, p1m64, p1p0, p1p64, p1m112, p1m48, p1p16, p1p80 = iCoeff
-
-    p0m96, p0p96, p1m112, p1p80 = strDCT2x2dn([p0m96, p0p96, p1m112, p1p80])
-    p0m32, p0p32, p1m48, p1p16 = strDCT2x2dn([p0m32, p0p32, p1m48, p1p16])
-    p0m80, p0p112, p1m128, p1p64 = strDCT2x2dn([p0m80, p0p112, p1m128, p1p64])
-    p0m16, p0p48, p1m64, p1p0 = strDCT2x2dn([p0m16, p0p48, p1m64, p1p0])
-
-    p1p0, p1p64, p1p16, p1p80 = invOddOddPost([p1p0, p1p64, p1p16, p1p80])
+def InverseTransformBlocks(ip, width, blocks):
+    # strIDCT4x4Stage1 with the lifting steps inlined, followed by coefficient combination into the 4x4 pixels at p
+    for p, (c0, c1, c2, c3, c4, c5, c6, c7, c8, c9, c10, c11, c12, c13, c14, c15) in blocks:
+        # strDCT2x2up(c0, c1, c2, c3)
+        c0 += c3
+        c1 -= c2
+        t = (c0 - c1 + 1) >> 1
+        c2, c3 = t - c3, t - c2
+        c0 -= c3
+        c1 += c2
+
+        # invOdd(c5, c4, c7, c6)
+        c4 += c6
+        c5 -= c7
+        c6 -= c4 >> 1
+        c7 += (c5 + 1) >> 1
+        c5 -= (c4*3 + 4) >> 3
+        c4 += (c5*3 + 4) >> 3
+        c7 -= (c6*3 + 4) >> 3
+        c6 += (c7*3 + 4) >> 3
+        c7 -= (c4 + 1) >> 1
+        c6 = ((c5 + 1) >> 1) - c6
+        c4 += c7
+        c5 -= c6
+
+        # invOdd(c10, c8, c11, c9)
+        c8 += c9
+        c10 -= c11
+        c9 -= c8 >> 1
+        c11 += (c10 + 1) >> 1
+        c10 -= (c8*3 + 4) >> 3
+        c8 += (c10*3 + 4) >> 3
+        c11 -= (c9*3 + 4) >> 3
+        c9 += (c11*3 + 4) >> 3
+        c11 -= (c8 + 1) >> 1
+        c9 = ((c10 + 1) >> 1) - c9
+        c8 += c11
+        c10 -= c9
+
+        # invOddOdd(c15, c14, c13, c12)
+        c12 += c15
+        c13 -= c14
+        t1 = c12 >> 1
+        c15 -= t1
+        t2 = c13 >> 1
+        c14 += t2
+        c15 -= (c14 * 3 + 3) >> 3
+        c14 += (c15 * 3 + 3) >> 2
+        c15 -= (c14 * 3 + 4) >> 3
+        c14 -= t2
+        c15 += t1
+        c13 += c14
+        c12 -= c15
+        c14 = -c14
+        c13 = -c13
+
+        # strDCT2x2dn(c0, c4, c8, c12)
+        c0 += c12
+        c4 -= c8
+        t = (c0 - c4) >> 1
+        c8, c12 = t - c12, t - c8
+        c0 -= c12
+        c4 += c8
+
+        # strDCT2x2dn(c1, c5, c9, c13)
+        c1 += c13
+        c5 -= c9
+        t = (c1 - c5) >> 1
+        c9, c13 = t - c13, t - c9
+        c1 -= c13
+        c5 += c9
+
+        # strDCT2x2dn(c2, c6, c10, c14)
+        c2 += c14
+        c6 -= c10
+        t = (c2 - c6) >> 1
+        c10, c14 = t - c14, t - c10
+        c2 -= c14
+        c6 += c10
+
+        # strDCT2x2dn(c3, c7, c11, c15)
+        c3 += c15
+        c7 -= c11
+        t = (c3 - c7) >> 1
+        c11, c15 = t - c15, t - c11
+        c3 -= c15
+        c7 += c11
+
+        ip[p:p+4] = (c0, c1, c5, c4)
+        p += width
+        ip[p:p+4] = (c2, c3, c7, c6)
+        p += width
+        ip[p:p+4] = (c10, c11, c15, c14)
+        p += width
+        ip[p:p+4] = (c8, c9, c13, c12)
+
+
+def OverlapPostFilterBlocks(ip, width, blocks, filter4x4):
+    for p in blocks:
+        q = p + width
+        r = q + width
+        s = r + width
+        c = filter4x4(*ip[p:p+4], *ip[q:q+4], *ip[r:r+4], *ip[s:s+4])
+        ip[p:p+4] = c[0:4]
+        ip[q:q+4] = c[4:8]
+        ip[r:r+4] = c[8:12]
+        ip[s:s+4] = c[12:16]
+
+
+def OverlapPostFilterLines(ip, offsets, positions):
+    o1, o2, o3 = offsets
+    for p in positions:
+        ip[p], ip[p+o1], ip[p+o2], ip[p+o3] = OverlapPostFilter4(ip[p], ip[p+o1], ip[p+o2], ip[p+o3])
+
+
+def strIDCT4x4Stage2(c0, c1, c2, c3, c4, c5, c6, c7, c8, c9, c10, c11, c12, c13, c14, c15):
+    c2, c3, c6, c7 = invOdd(c2, c3, c6, c7)
+
+    c8, c12, c9, c13 = invOdd(c8, c12, c9, c13)
+
+    c10, c14, c11, c15 = invOddOdd(c10, c14, c11, c15)
+
+    c0, c4, c1, c5 = strDCT2x2up(c0, c4, c1, c5)
+
+    c0, c12, c3, c15 = strDCT2x2dn(c0, c12, c3, c15)
+    c4, c8, c7, c11 = strDCT2x2dn(c4, c8, c7, c11)
+    c1, c13, c2, c14 = strDCT2x2dn(c1, c13, c2, c14)
+    c5, c9, c6, c10 = strDCT2x2dn(c5, c9, c6, c10)
+
+    return (c0, c1, c2, c3, c4, c5, c6, c7, c8, c9, c10, c11, c12, c13, c14, c15)
+
+
+def strPost4x4Stage2Split_alternate(p0m96, p0m32, p0p32, p0p96, p0m80, p0m16, p0p48, p0p112, p1m128, p1m64, p1p0, p1p64, p1m112, p1m48, p1p16, p1p80):
+    p0m96, p0p96, p1m112, p1p80 = strDCT2x2dn(p0m96, p0p96, p1m112, p1p80)
+    p0m32, p0p32, p1m48, p1p16 = strDCT2x2dn(p0m32, p0p32, p1m48, p1p16)
+    p0m80, p0p112, p1m128, p1p64 = strDCT2x2dn(p0m80, p0p112, p1m128, p1p64)
+    p0m16, p0p48, p1m64, p1p0 = strDCT2x2dn(p0m16, p0p48, p1m64, p1p0)
+
+    p1p0, p1p64, p1p16, p1p80 = invOddOddPost(p1p0, p1p64, p1p16, p1p80)
 
     p0p48, p0p32 = irotate1(p0p48, p0p32)
     p0p112, p0p96 = irotate1(p0p112, p0p96)
@@ -2301,13 +2223,10 @@ def strPost4x4Stage2Split_alternate(iCoeff):
     p0m80, p1m128, p0p112, p1p64 = strHSTdec(p0m80, p1m128, p0p112, p1p64)
     p0m16, p1m64, p0p48, p1p0 = strHSTdec(p0m16, p1m64, p0p48, p1p0)
 
-    return [p0m96, p0m32, p0p32, p0p96, p0m80, p0m16, p0p48, p0p112, p1m128, p1m64, p1p0, p1p64, p1m112, p1m48, p1p16, p1p80]
+    return (p0m96, p0m32, p0p32, p0p96, p0m80, p0m16, p0p48, p0p112, p1m128, p1m64, p1p0, p1p64, p1m112, p1m48, p1p16, p1p80)
 
 
-def invOdd(iCoeff):
-
-    a, b, c, d = iCoeff
-
+def invOdd(a, b, c, d):
     b += d
     a -= c
     d -= (b) >> 1
@@ -2321,13 +2240,10 @@ def invOdd(iCoeff):
     b += c
     a -= d
 
-    return [a, b, c, d]
-
-
-def invOddOdd(iCoeff):
+    return (a, b, c, d)
 
-    a, b, c, d = iCoeff
 
+def invOddOdd(a, b, c, d):
     d += a
     c -= b
     t1 = d >> 1
@@ -2344,31 +2260,22 @@ def invOddOdd(iCoeff):
     c += b
     d -= a
 
-    return [a, -b, -c, d]
+    return (a, -b, -c, d)
 
 
 def irotate1(a, b):
     a -= (b + 1) >> 1
     b += (a + 1) >> 1
-    return [a, b]
+    return (a, b)
 
 
 def irotate2(a, b):
     a -= (b*3 + 4) >> 3
     b += (a*3 + 4) >> 3
-    return [a, b]
-
-
-def fourbutterfly(iCoeff, order):
-    for o in order:
-        iCoeff[o[0]], iCoeff[o[1]], iCoeff[o[2]], iCoeff[o[3]] = strDCT2x2dn([iCoeff[o[0]], iCoeff[o[1]], iCoeff[o[2]], iCoeff[o[3]]])
+    return (a, b)
 
-    return iCoeff
-
-
-def strDCT2x2up(iCoeff):
-    a, b, C, d = iCoeff
 
+def strDCT2x2up(a, b, C, d):
     a += d
     b -= C
     t = ((a - b + 1) >> 1)
@@ -2377,12 +2284,10 @@ def strDCT2x2up(iCoeff):
     a -= d
     b += c
 
-    return [a, b, c, d]
-
+    return (a, b, c, d)
 
-def strDCT2x2dn(iCoeff):
-    a, b, C, d = iCoeff
 
+def strDCT2x2dn(a, b, C, d):
     a += d
     b -= C
     t = ((a - b) >> 1)
@@ -2394,9 +2299,7 @@ def strDCT2x2dn(iCoeff):
     return (a, b, c, d)
 
 
-def invOddOddPost(iCoeff):
-    a, b, c, d = iCoeff
-
+def invOddOddPost(a, b, c, d):
     d += a
     c -= b
     t1 = d >> 1
@@ -2413,7 +2316,7 @@ def invOddOddPost(iCoeff):
     c += b
     d -= a
 
-    return [a, b, c, d]
+    return (a, b, c, d)
 
 
 def strHSTdec1_alternate(a, d):
@@ -2426,7 +2329,7 @@ def strHSTdec1_alternate(a, d):
     d += (a >> 7)
     d -= (a >> 10)
 
-    return [a, d]
+    return (a, d)
 
 
 def strHSTdec(a, b, c, d):
@@ -2437,78 +2340,159 @@ def strHSTdec(a, b, c, d):
     d -= (b >> 1)
     c = ((a - b) >> 1) - c
 
-    return [a - c, b + d, d, c]
-
-
-def OverlapPostFilter4x4(iCoeff):
-    iCoeff[0], iCoeff[3], iCoeff[12], iCoeff[15] = T2x2h([iCoeff[0], iCoeff[3], iCoeff[12], iCoeff[15]], 0)
-    iCoeff[1], iCoeff[2], iCoeff[13], iCoeff[14] = T2x2h([iCoeff[1], iCoeff[2], iCoeff[13], iCoeff[14]], 0)
-    iCoeff[4], iCoeff[7], iCoeff[8], iCoeff[11] = T2x2h([iCoeff[4], iCoeff[7], iCoeff[8], iCoeff[11]], 0)
-    iCoeff[5], iCoeff[6], iCoeff[9], iCoeff[10] = T2x2h([iCoeff[5], iCoeff[6], iCoeff[9], iCoeff[10]], 0)
-
-    iCoeff[13], iCoeff[12] = InvRotate(iCoeff[13], iCoeff[12])
-    iCoeff[9], iCoeff[8] = InvRotate(iCoeff[9], iCoeff[8])
-    iCoeff[7], iCoeff[3] = InvRotate(iCoeff[7], iCoeff[3])
-    iCoeff[6], iCoeff[2] = InvRotate(iCoeff[6], iCoeff[2])
-
-    iCoeff[10], iCoeff[11], iCoeff[14], iCoeff[15] = InvToddoddPOST([iCoeff[10], iCoeff[11], iCoeff[14], iCoeff[15]])
-
-    iCoeff[0], iCoeff[15] = InvScale(iCoeff[0], iCoeff[15])
-    iCoeff[1], iCoeff[14] = InvScale(iCoeff[1], iCoeff[14])
-    iCoeff[4], iCoeff[11] = InvScale(iCoeff[4], iCoeff[11])
-    iCoeff[5], iCoeff[10] = InvScale(iCoeff[5], iCoeff[10])
-
-    iCoeff[0], iCoeff[3], iCoeff[12], iCoeff[15] = T2x2hPOST([iCoeff[0], iCoeff[3], iCoeff[12], iCoeff[15]])
-    iCoeff[1], iCoeff[2], iCoeff[13], iCoeff[14] = T2x2hPOST([iCoeff[1], iCoeff[2], iCoeff[13], iCoeff[14]])
-    iCoeff[4], iCoeff[7], iCoeff[8], iCoeff[11] = T2x2hPOST([iCoeff[4], iCoeff[7], iCoeff[8], iCoeff[11]])
-    iCoeff[5], iCoeff[6], iCoeff[9], iCoeff[10] = T2x2hPOST([iCoeff[5], iCoeff[6], iCoeff[9], iCoeff[10]])
-    return iCoeff
-
-
-def T2x2h(iCoeff, valRound):
-    iCoeff[0] += iCoeff[3]
-    iCoeff[1] -= iCoeff[2]
-    valT1 = ((iCoeff[0] - iCoeff[1] + valRound) >> 1)
-    valT2 = iCoeff[2]
-    iCoeff[2] = valT1 - iCoeff[3]
-    iCoeff[3] = valT1 - valT2
-    iCoeff[0] -= iCoeff[3]
-    iCoeff[1] += iCoeff[2]
-    return iCoeff
-
-
-def T2x2hPOST(iCoeff):
-    iCoeff[1] -= iCoeff[2]
-    iCoeff[0] += (iCoeff[3] * 3 + 4) >> 3
-    iCoeff[3] -= (iCoeff[1] >> 1)
-    iCoeff[2] = ((iCoeff[0] - iCoeff[1]) >> 1) - iCoeff[2]
-    iCoeff[2], iCoeff[3] = (iCoeff[3], iCoeff[2])
-    iCoeff[0] -= iCoeff[3]
-    iCoeff[1] += iCoeff[2]
-    return iCoeff
-
-
-def OverlapPostFilter4(iCoeff):
-    iCoeff[0] += iCoeff[3]
-    iCoeff[1] += iCoeff[2]
-    iCoeff[3] -= ((iCoeff[0] + 1) >> 1)
-    iCoeff[2] -= ((iCoeff[1] + 1) >> 1)
-    iCoeff[0], iCoeff[3] = InvScale(iCoeff[0], iCoeff[3])
-    iCoeff[1], iCoeff[2] = InvScale(iCoeff[1], iCoeff[2])
-    iCoeff[0] += ((iCoeff[3] * 3 + 4) >> 3)
-    iCoeff[1] += ((iCoeff[2] * 3 + 4) >> 3)
-    iCoeff[3] -= (iCoeff[0] >> 1)
-    iCoeff[2] -= (iCoeff[1] >> 1)
-    iCoeff[0] += iCoeff[3]
-    iCoeff[1] += iCoeff[2]
-    iCoeff[3] = -iCoeff[3]
-    iCoeff[2] = -iCoeff[2]
-    iCoeff[2], iCoeff[3] = InvRotate(iCoeff[2], iCoeff[3])
-    iCoeff[3] += ((iCoeff[0] + 1) >> 1)
-    iCoeff[2] += ((iCoeff[1] + 1) >> 1)
-    iCoeff[0] -= iCoeff[3]
-    iCoeff[1] -= iCoeff[2]
-    return iCoeff
+    return (a - c, b + d, d, c)
+
+
+def OverlapPostFilter4x4(c0, c1, c2, c3, c4, c5, c6, c7, c8, c9, c10, c11, c12, c13, c14, c15):
+    # T2x2h(c0, c3, c12, c15, 0), T2x2h(c1, c2, c13, c14, 0), T2x2h(c4, c7, c8, c11, 0), T2x2h(c5, c6, c9, c10, 0)
+    c0 += c15
+    c3 -= c12
+    t = (c0 - c3) >> 1
+    c12, c15 = t - c15, t - c12
+    c0 -= c15
+    c3 += c12
+
+    c1 += c14
+    c2 -= c13
+    t = (c1 - c2) >> 1
+    c13, c14 = t - c14, t - c13
+    c1 -= c14
+    c2 += c13
+
+    c4 += c11
+    c7 -= c8
+    t = (c4 - c7) >> 1
+    c8, c11 = t - c11, t - c8
+    c4 -= c11
+    c7 += c8
+
+    c5 += c10
+    c6 -= c9
+    t = (c5 - c6) >> 1
+    c9, c10 = t - c10, t - c9
+    c5 -= c10
+    c6 += c9
+
+    # InvRotate(c13, c12), InvRotate(c9, c8), InvRotate(c7, c3), InvRotate(c6, c2)
+    c13 -= (c12 + 1) >> 1
+    c12 += (c13 + 1) >> 1
+    c9 -= (c8 + 1) >> 1
+    c8 += (c9 + 1) >> 1
+    c7 -= (c3 + 1) >> 1
+    c3 += (c7 + 1) >> 1
+    c6 -= (c2 + 1) >> 1
+    c2 += (c6 + 1) >> 1
+
+    # invOddOddPost(c10, c11, c14, c15)
+    c15 += c10
+    c14 -= c11
+    t1 = c15 >> 1
+    c10 -= t1
+    t2 = c14 >> 1
+    c11 += t2
+    c10 -= (c11 * 3 + 6) >> 3
+    c11 += (c10 * 3 + 2) >> 2
+    c10 -= (c11 * 3 + 4) >> 3
+    c11 -= t2
+    c10 += t1
+    c14 += c11
+    c15 -= c10
+
+    # InvScale(c0, c15), InvScale(c1, c14), InvScale(c4, c11), InvScale(c5, c10)
+    c0 += c15
+    c15 = (c0 >> 1) - c15
+    c0 += (c15 * 3) >> 3
+    c15 += ((c0 * 3) >> 4) + (c0 >> 7) - (c0 >> 10)
+
+    c1 += c14
+    c14 = (c1 >> 1) - c14
+    c1 += (c14 * 3) >> 3
+    c14 += ((c1 * 3) >> 4) + (c1 >> 7) - (c1 >> 10)
+
+    c4 += c11
+    c11 = (c4 >> 1) - c11
+    c4 += (c11 * 3) >> 3
+    c11 += ((c4 * 3) >> 4) + (c4 >> 7) - (c4 >> 10)
+
+    c5 += c10
+    c10 = (c5 >> 1) - c10
+    c5 += (c10 * 3) >> 3
+    c10 += ((c5 * 3) >> 4) + (c5 >> 7) - (c5 >> 10)
+
+    # T2x2hPOST(c0, c3, c12, c15), T2x2hPOST(c1, c2, c13, c14), T2x2hPOST(c4, c7, c8, c11), T2x2hPOST(c5, c6, c9, c10)
+    c3 -= c12
+    c0 += (c15 * 3 + 4) >> 3
+    c15 -= c3 >> 1
+    c12 = ((c0 - c3) >> 1) - c12
+    c0 -= c12
+    c3 += c15
+
+    c2 -= c13
+    c1 += (c14 * 3 + 4) >> 3
+    c14 -= c2 >> 1
+    c13 = ((c1 - c2) >> 1) - c13
+    c1 -= c13
+    c2 += c14
+
+    c7 -= c8
+    c4 += (c11 * 3 + 4) >> 3
+    c11 -= c7 >> 1
+    c8 = ((c4 - c7) >> 1) - c8
+    c4 -= c8
+    c7 += c11
+
+    c6 -= c9
+    c5 += (c10 * 3 + 4) >> 3
+    c10 -= c6 >> 1
+    c9 = ((c5 - c6) >> 1) - c9
+    c5 -= c9
+    c6 += c10
+
+    # T2x2hPOST swaps its last two outputs
+    return (c0, c1, c2, c3, c4, c5, c6, c7, c11, c10, c9, c8, c15, c14, c13, c12)
+
+
+def T2x2h(a, b, c, d, valRound):
+    a += d
+    b -= c
+    valT1 = ((a - b + valRound) >> 1)
+    valT2 = c
+    c = valT1 - d
+    d = valT1 - valT2
+    a -= d
+    b += c
+    return (a, b, c, d)
+
+
+def T2x2hPOST(a, b, c, d):
+    b -= c
+    a += (d * 3 + 4) >> 3
+    d -= (b >> 1)
+    c = ((a - b) >> 1) - c
+    a -= c
+    b += d
+    return (a, b, d, c)
+
+
+def OverlapPostFilter4(a, b, c, d):
+    a += d
+    b += c
+    d -= ((a + 1) >> 1)
+    c -= ((b + 1) >> 1)
+    a, d = InvScale(a, d)
+    b, c = InvScale(b, c)
+    a += ((d * 3 + 4) >> 3)
+    b += ((c * 3 + 4) >> 3)
+    d -= (a >> 1)
+    c -= (b >> 1)
+    a += d
+    b += c
+    c, d = InvRotate(-c, -d)
+    d += ((a + 1) >> 1)
+    c += ((b + 1) >> 1)
+    a -= d
+    b -= c
+    return (a, b, c, d)
 
 
 def InvScale(iCoeff0, iCoeff1):
@@ -2525,20 +2509,3 @@ def InvRotate(iCoeff0, iCoeff1):
     iCoeff0 -= ((iCoeff1 + 1) >> 1)
     iCoeff1 += ((iCoeff0 + 1) >> 1)
     return (iCoeff0, iCoeff1)
-
-
-def InvToddoddPOST(iCoeff):
-    iCoeff[3] += iCoeff[0]
-    iCoeff[2] -= iCoeff[1]
-    valT1 = iCoeff[3] >> 1
-    valT2 = iCoeff[2] >> 1
-    iCoeff[0] -= valT1
-    iCoeff[1] += valT2
-    iCoeff[0] -= (iCoeff[1] * 3 + 6) >> 3
-    iCoeff[1] += (iCoeff[0] * 3 + 2) >> 2
-    iCoeff[0] -= (iCoeff[1] * 3 + 4) >> 3
-    iCoeff[1] -= valT2
-    iCoeff[0] += valT1
-    iCoeff[2] += iCoeff[1]
-    iCoeff[3] -= iCoeff[0]
-    return iCoeff
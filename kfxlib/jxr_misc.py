@@ -10,56 +10,92 @@ __copyright__ = "2016-2025, John Howell <jhowell@acm.org>"
 DEBUG = False
 
 
+BIT_WINDOW_BYTES = 8
+
+
 class Deserializer(object):
     def __init__(self, data):
         self.buffer = data
-        self.offset = 0
+        self.window_end = 0
         self.bits_remaining = self.remainder = 0
 
+    @property
+    def offset(self):
+        return self.window_end - (self.bits_remaining >> 3)
+
+    @offset.setter
+    def offset(self, value):
+        self.window_end = value
+        self.bits_remaining = self.remainder = 0
+
+    def release_window(self):
+        whole_bytes = self.bits_remaining >> 3
+        if whole_bytes:
+            self.window_end -= whole_bytes
+            self.bits_remaining &= 7
+            self.remainder >>= whole_bytes << 3
+
     def extract(self, size=None, upto=None, advance=True, check_remaining=True):
+        self.release_window()
+
         if check_remaining and self.bits_remaining:
             raise Exception("Deserializer: unexpected %d bit remaining" % self.bits_remaining)
 
         if size is None:
             size = len(self) if upto is None else (upto - self.offset)
 
-        data = self.buffer[self.offset:self.offset + size]
+        data = self.buffer[self.window_end:self.window_end + size]
 
         if len(data) < size or size < 0:
             raise Exception("Deserializer: Insufficient data (need %d bytes, have %d bytes)" % (size, len(data)))
 
         if advance:
-            self.offset += size
+            self.window_end += size
 
         return data
 
     def unpack(self, fmt, name="", advance=True):
+        self.release_window()
+
         if self.bits_remaining:
             raise Exception("Deserializer: unexpected %d bit remaining" % self.bits_remaining)
 
-        result = struct.unpack_from(fmt, self.buffer, self.offset)[0]
+        result = struct.unpack_from(fmt, self.buffer, self.window_end)[0]
 
         if DEBUG:
-            log.info("%d: unpack(%s)=%s %s" % (self.offset, fmt, repr(result), name))
+            log.info("%d: unpack(%s)=%s %s" % (self.window_end, fmt, repr(result), name))
 
         if advance:
-            self.offset += struct.calcsize(fmt)
+            self.window_end += struct.calcsize(fmt)
 
         return result
 
-    def unpack_bits(self, size, name=""):
-
+    def fill_window(self, size, required=True):
         while self.bits_remaining < size:
-            self.remainder = (self.remainder << 8) + ord(self.extract(1, check_remaining=False))
-            self.bits_remaining += 8
+            data = self.buffer[self.window_end:self.window_end + BIT_WINDOW_BYTES]
+
+            if not data:
+                if required:
+                    raise Exception("Deserializer: Insufficient data (need %d bits, have %d bits)" % (size, self.bits_remaining))
+
+                break
+
+            self.remainder = (self.remainder << (len(data) << 3)) | int.from_bytes(data, "big")
+            self.bits_remaining += len(data) << 3
+            self.window_end += len(data)
+
+        return self.bits_remaining
 
-        self.bits_remaining -= size
-        value = self.remainder >> self.bits_remaining
+    def unpack_bits(self, size, name=""):
+        bits_remaining = self.bits_remaining
 
-        if value > (1 << size) - 1:
-            raise Exception()
+        if bits_remaining < size:
+            bits_remaining = self.fill_window(size)
 
-        self.remainder = self.remainder & (0xff >> (8 - self.bits_remaining))
+        bits_remaining -= size
+        value = self.remainder >> bits_remaining
+        self.remainder &= (1 << bits_remaining) - 1
+        self.bits_remaining = bits_remaining
 
         if DEBUG:
             log.info("%d: unpack_bits(%d)=%u (%s) %s" % (self.offset, size, value, ("{0:0%sb}" % size).format(value), name))
@@ -87,21 +123,60 @@ class Deserializer(object):
         return value
 
     def huff(self, table, name):
-        k = 1
-        while k <= 0xff:
-            k = (k << 1) + self.unpack_bits(1, name)
-            v = table.get(k)
-            if v is not None:
-                return v
+        bits = table.bits
+        bits_remaining = self.bits_remaining
+
+        if bits_remaining < bits:
+            bits_remaining = self.fill_window(bits, required=False)
+
+            if bits_remaining < bits:
+                code = table.lookup[self.remainder << (bits - bits_remaining)]
+                if code is None or code[1] > bits_remaining:
+                    raise Exception("decode using huffman table failed")
+            else:
+                code = table.lookup[self.remainder >> (bits_remaining - bits)]
+        else:
+            code = table.lookup[self.remainder >> (bits_remaining - bits)]
+
+        if code is None:
+            raise Exception("decode using huffman table failed")
+
+        value, length = code
+        bits_remaining -= length
+        self.remainder &= (1 << bits_remaining) - 1
+        self.bits_remaining = bits_remaining
+
+        if DEBUG:
+            log.info("%d: huff(%d bits)=%s %s" % (self.offset, length, repr(value), name))
 
-        raise Exception("decode using huffman table failed")
+        return value
 
     def discard_remainder_bits(self):
+        self.release_window()
         self.bits_remaining = self.remainder = 0
 
     def __len__(self):
         return len(self.buffer) - self.offset
 
 
+class HuffmanTable(object):
+    def __init__(self, codes):
+        self.bits = max(len(code) for code in codes)
+
+        if self.bits > 8:
+            raise Exception("Huffman code too long: %s" % repr(codes))
+
+        self.lookup = [None] * (1 << self.bits)
+
+        for code, value in codes.items():
+            pad = self.bits - len(code)
+            first = int(code, 2) << pad
+            for i in range(first, first + (1 << pad)):
+                if self.lookup[i] is not None:
+                    raise Exception("Huffman code %s is not prefix free in %s" % (code, repr(codes)))
+
+                self.lookup[i] = (value, len(code))
+
+
 def bytes_to_separated_hex(data, sep=" "):
     return sep.join("%02x" % ord(data[i:i+1]) for i in range(len(data)))
@@ -441,7 +441,7 @@ class KfxContainerEntity(object):
             else:
                 raise Exception("KfxContainerEntity %s must be IonBLOB, found %s" % (ftype, type_name(self.value)))
         else:
-            entity.append(IonBinary(self.symtab).serialize_single_value(self.value))
+            IonBinary(self.symtab).serialize_multiple_values_into([self.value], entity)
 
         return entity.serialize()
 
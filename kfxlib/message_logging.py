@@ -1,3 +1,4 @@
+import contextlib
 import logging
 import threading
 
@@ -64,4 +65,58 @@ class JobLog(object):
         self.info(" ".join([str(arg) for arg in args]))
 
 
+class MessageRecorder(object):
+    '''
+    Logger that saves messages so that they can be passed back from a worker process and logged there,
+    or stored with a cached result. Messages are also passed on to the given logger, if any.
+    '''
+
+    def __init__(self, logger=None):
+        self.messages = []
+        self.logger = logger
+
+    def record(self, method_name, msg):
+        self.messages.append((method_name, msg))
+        if self.logger is not None:
+            getattr(self.logger, method_name)(msg)
+
+    def debug(self, msg):
+        self.record("debug", msg)
+
+    def info(self, msg):
+        self.record("info", msg)
+
+    def warn(self, msg):
+        self.record("warning", msg)
+
+    def warning(self, desc):
+        self.warn(desc)
+
+    def error(self, msg):
+        self.record("error", msg)
+
+    def exception(self, msg):
+        self.messages.append(("error", "EXCEPTION: %s" % msg))
+        if self.logger is not None:
+            self.logger.exception(msg)
+
+    def __call__(self, *args):
+        self.info(" ".join([str(arg) for arg in args]))
+
+
+@contextlib.contextmanager
+def record_messages():
+    previous_logger = getattr(thread_local_cfg, "logger", None)
+    recorder = set_logger(MessageRecorder(get_current_logger()))
+    try:
+        yield recorder
+    finally:
+        set_logger(previous_logger)
+
+
+def replay_messages(messages):
+    for method_name, msg in messages:
+        getattr(log, method_name)(msg)
+
+
 log = LogCurrent()
@@ -0,0 +1,95 @@
+import contextlib
+import threading
+import time
+
+
+__license__ = "GPL v3"
+__copyright__ = "2016-2025, John Howell <jhowell@acm.org>"
+
+
+thread_local_cfg = threading.local()
+
+
+class PhaseTotals(object):
+    def __init__(self):
+        self.calls = 0
+        self.wall_time = self.cpu_time = 0.0
+        self.items = 0
+
+
+class PhaseSpan(object):
+    def __init__(self):
+        self.items = 0
+
+    def add_items(self, count=1):
+        self.items += count
+
+
+class PhaseTimer(object):
+    '''
+    Wall clock and CPU time spent in the named phases of a conversion, with the number of items each phase handled.
+    Phases started within another phase are reported by their path, such as "epub/reading_order/resource".
+    CPU time is that of the converting thread, so it excludes work done by other processes.
+    '''
+
+    def __init__(self):
+        self.phases = {}
+        self.active_names = []
+
+    @contextlib.contextmanager
+    def span(self, name, items=None):
+        self.active_names.append(name)
+        path = "/".join(self.active_names)
+        totals = self.phases.get(path)
+        if totals is None:
+            totals = self.phases[path] = PhaseTotals()
+
+        span = PhaseSpan()
+        if items is not None:
+            span.add_items(items)
+
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield span
+        finally:
+            totals.calls += 1
+            totals.wall_time += time.perf_counter() - start_wall
+            totals.cpu_time += time.thread_time() - start_cpu
+            totals.items += span.items
+            self.active_names.pop()
+
+    def report(self):
+        return [{
+            "phase": path,
+            "calls": totals.calls,
+            "wall_sec": round(totals.wall_time, 4),
+            "cpu_sec": round(totals.cpu_time, 4),
+            "items": totals.items,
+            } for path, totals in self.phases.items()]
+
+
+def set_phase_timer(phase_timer=None):
+    global thread_local_cfg
+
+    if phase_timer is not None:
+        thread_local_cfg.phase_timer = phase_timer
+    elif hasattr(thread_local_cfg, "phase_timer"):
+        del thread_local_cfg.phase_timer
+
+    return phase_timer
+
+
+def get_phase_timer():
+    return getattr(thread_local_cfg, "phase_timer", None)
+
+
+@contextlib.contextmanager
+def phase(name, items=None):
+    phase_timer = getattr(thread_local_cfg, "phase_timer", None)
+    if phase_timer is None:
+        yield PhaseSpan()
+        return
+
+    with phase_timer.span(name, items) as span:
+        yield span
@@ -1,13 +1,20 @@
+import collections
+import concurrent.futures
+import hashlib
 import io
+import itertools
+import math
 import os
 from PIL import Image
 import time
+import zlib
 
+from .conversion_cache import (cached_conversion, get_conversion_cache)
 from .jxr_container import JXRContainer
-from .message_logging import log
+from .message_logging import (log, MessageRecorder, replay_messages, set_logger)
 from .utilities import (
     add_plugin_path, calibre_numeric_version, create_temp_dir, disable_debug_log, natural_sort_key,
-    remove_plugin_path, temp_filename)
+    remove_plugin_path, sha1, temp_filename)
 
 if calibre_numeric_version is not None:
     add_plugin_path()
@@ -16,6 +23,11 @@ if calibre_numeric_version is not None:
 else:
     import pypdf
 
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
 
 __license__ = "GPL v3"
 __copyright__ = "2016-2025, John Howell <jhowell@acm.org>"
@@ -23,11 +35,18 @@ __copyright__ = "2016-2025, John Howell <jhowell@acm.org>"
 COMBINE_TILES_LOSSLESS = True
 MIN_JPEG_QUALITY = 90
 MAX_JPEG_QUALITY = 100
+JPEG_SIZE_TOLERANCE_PERCENTAGE = 2
+JPEG_OPTIMIZED_SIZE_RATIO = 0.96
+JPEG_QUALITY_SIZE_SLOPE = 0.1
 COMBINED_TILE_SIZE_FACTOR = 1.2
 TILE_SIZE_REPORT_PERCENTAGE = 10
 DEBUG_TILES = False
 
 CONVERT_JXR_LOSSLESS = False
+JXR_CONVERSION_PROCESSES = None
+JXR_CONVERSIONS_AHEAD_PER_PROCESS = 2
+JXR_CONVERSION_PROCESS_MEMORY = 64 * 1024 * 1024
+PDF_PAGE_JPEG_QUALITY = 90
 
 IMAGE_COLOR_MODES = [
     "1",
@@ -38,6 +57,13 @@ IMAGE_COLOR_MODES = [
 
 IMAGE_OPACITY_MODE = "A"
 
+PDF_IMAGE_COLOR_SPACES = {
+    "1": "/DeviceGray",
+    "L": "/DeviceGray",
+    "RGB": "/DeviceRGB",
+    "CMYK": "/DeviceCMYK",
+    }
+
 
 FORMAT_SYMBOLS = {
     "bmp": "$599",
@@ -260,6 +286,12 @@ class PdfImageResource(ImageResource):
         return ranges
 
 
+def image_settings():
+    return (Image.__version__, calibre_numeric_version, CONVERT_JXR_LOSSLESS, COMBINE_TILES_LOSSLESS, MIN_JPEG_QUALITY,
+            MAX_JPEG_QUALITY, JPEG_SIZE_TOLERANCE_PERCENTAGE, COMBINED_TILE_SIZE_FACTOR)
+
+
+@cached_conversion("jxr", image_settings)
 def convert_jxr_to_jpeg_or_png(jxr_data, resource_name, return_mime=False):
     try:
         image_data = convert_jxr_to_tiff(jxr_data, resource_name)
@@ -314,17 +346,232 @@ def convert_jxr_to_tiff(jxr_data, resource_name):
     return outfile.getvalue()
 
 
-def convert_pdf_to_jpeg(pdf_data, page_num, dpi=150, reported_errors=None):
-    pdf_file = temp_filename("pdf", pdf_data)
-    jpeg_dir = create_temp_dir()
+class JXRConversions(object):
+    def __init__(self, processes=None, retain=True):
+        self.processes = processes if processes is not None else (JXR_CONVERSION_PROCESSES or os.cpu_count() or 1)
+        self.retain = retain
+        self.converted = {}
+        self.prefetched_uses = {}
+
+    def convert(self, jxr_data, resource_name):
+        key = sha1(jxr_data)
+        result = self.converted.get(key)
+        if result is None:
+            result = convert_jxr_to_jpeg_or_png(jxr_data, resource_name)
+            if self.retain:
+                self.converted[key] = result
+        else:
+            self.release(key)
 
-    if calibre_numeric_version is not None:
+        return result
+
+    def release(self, key):
+        # without retain, a prefetched result is kept only until each resource prefetched with it has used it
+        if self.retain:
+            return
+
+        uses = self.prefetched_uses.pop(key, 1) - 1
+        if uses > 0:
+            self.prefetched_uses[key] = uses
+        else:
+            self.converted.pop(key, None)
+
+    def iter_convert(self, jxr_resources):
+        jxr_resources = iter(jxr_resources)
+        processes = self.processes if calibre_numeric_version is None else 1
+
+        if processes < 2:
+            for resource_name, jxr_data in jxr_resources:
+                yield self.convert(jxr_data, resource_name)
+
+            return
+
+        cache = get_conversion_cache()
+
+        def start(resource_name, jxr_data):
+            result = self.converted.get(sha1(jxr_data))
+            if result is not None:
+                self.release(sha1(jxr_data))
+            elif cache is not None:
+                entry = cache.get(convert_jxr_to_jpeg_or_png.cache_key(cache, jxr_data, resource_name))
+                if entry is not None:
+                    result, messages = entry
+                    replay_messages(messages)
+
+            if result is None:
+                result = executor.submit(convert_jxr_resource, bytes(jxr_data), resource_name)
+
+            return (resource_name, jxr_data, result)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            pending = collections.deque(
+                start(resource_name, jxr_data) for resource_name, jxr_data in itertools.islice(
+                    jxr_resources, processes * JXR_CONVERSIONS_AHEAD_PER_PROCESS))
+
+            while pending:
+                resource_name, jxr_data, result = pending.popleft()
+                if isinstance(result, concurrent.futures.Future):
+                    try:
+                        image_data, image_type, messages = result.result()
+                    except Exception:
+                        result = self.convert(jxr_data, resource_name)    # repeat the conversion to raise its error here
+                    else:
+                        replay_messages(messages)
+                        result = (image_data, image_type)
+
+                        if cache is not None:
+                            cache.put(convert_jxr_to_jpeg_or_png.cache_key(cache, jxr_data, resource_name), result, messages)
+
+                if self.retain:
+                    self.converted[sha1(jxr_data)] = result
+
+                next_resource = next(jxr_resources, None)
+                if next_resource is not None:
+                    pending.append(start(*next_resource))
+
+                yield result
+
+    def prefetch(self, jxr_resources):
+        cache = get_conversion_cache()
+        pending = {}
+        for resource_name, jxr_data in jxr_resources:
+            key = sha1(jxr_data)
+            if not self.retain:
+                self.prefetched_uses[key] = self.prefetched_uses.get(key, 0) + 1
+
+            if key not in self.converted and key not in pending:
+                if cache is not None:
+                    entry = cache.get(convert_jxr_to_jpeg_or_png.cache_key(cache, jxr_data, resource_name))
+                    if entry is not None:
+                        result, messages = entry
+                        replay_messages(messages)
+                        self.converted[key] = result
+                        continue
+
+                pending[key] = (resource_name, bytes(jxr_data))
+
+        processes = min(self.processes, len(pending))
+
+        if processes < 2 or calibre_numeric_version is not None:
+            return
+
+        start_time = time.time()
+
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = [(key, executor.submit(convert_jxr_resource, jxr_data, resource_name))
+                           for key, (resource_name, jxr_data) in pending.items()]
+
+                for key, future in futures:
+                    try:
+                        image_data, image_type, messages = future.result()
+                    except Exception:
+                        continue    # convert() repeats the conversion and raises where the resource is used
+
+                    replay_messages(messages)
+                    self.converted[key] = (image_data, image_type)
+
+                    if cache is not None:
+                        resource_name, jxr_data = pending[key]
+                        cache.put(convert_jxr_to_jpeg_or_png.cache_key(cache, jxr_data, resource_name),
+                                  self.converted[key], messages)
+        except Exception as e:
+            log.warning("Parallel JPEG-XR conversion failed, converting resources individually: %s" % repr(e))
+            return
+
+        log.info("Converted %d JPEG-XR resources using %d processes in %0.1f sec" % (
+            len(pending), processes, time.time() - start_time))
+
+
+def convert_jxr_resource(jxr_data, resource_name):
+    recorder = set_logger(MessageRecorder())
+    try:
+        image_data, image_type = convert_jxr_to_jpeg_or_png.uncached(jxr_data, resource_name)
+    finally:
+        set_logger()
+
+    return image_data, image_type, recorder.messages
+
+
+class PdfRasterizer(object):
+    def __init__(self):
+        self.documents = {}
+        self.digests = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def open(self, pdf_data):
+        # a book refers to the same raw media object for every page of its PDF, so avoid hashing it for each page
+        entry = self.documents.get(id(pdf_data))
+        if entry is None:
+            entry = self.documents[id(pdf_data)] = (pdf_data, pymupdf.open(stream=pdf_data, filetype="pdf"))
+
+        return entry[1]
+
+    def digest(self, pdf_data):
+        # identifies the PDF in the conversion cache, hashed once rather than for every page
+        entry = self.digests.get(id(pdf_data))
+        if entry is None:
+            entry = self.digests[id(pdf_data)] = (pdf_data, hashlib.sha256(pdf_data).hexdigest())
+
+        return entry[1]
+
+    def convert(self, pdf_data, page_num, dpi=150):
+        doc = self.open(pdf_data)
+        if page_num < 1 or page_num > doc.page_count:
+            raise Exception("PDF page %d does not exist (%d pages)" % (page_num, doc.page_count))
+
+        pixmap = doc[page_num - 1].get_pixmap(dpi=dpi, alpha=False)
+        jpeg_data = pixmap.tobytes("jpeg", jpg_quality=PDF_PAGE_JPEG_QUALITY)
+        return (jpeg_data, pymupdf.TOOLS.mupdf_warnings().splitlines())
+
+    def close(self):
+        for pdf_data, doc in self.documents.values():
+            doc.close()
+
+        self.documents = {}
+        self.digests = {}
+
+
+def convert_pdf_to_jpeg(pdf_data, page_num, dpi=150, reported_errors=None, pdf_rasterizer=None):
+    if pdf_rasterizer is None:
+        with PdfRasterizer() as pdf_rasterizer:
+            return convert_pdf_to_jpeg(pdf_data, page_num, dpi, reported_errors, pdf_rasterizer)
+
+    jpeg_data, warnings = render_pdf_page(
+        pdf_rasterizer.digest(pdf_data), page_num, dpi, pdf_data=pdf_data, pdf_rasterizer=pdf_rasterizer)
+
+    for warning in warnings:
+        if reported_errors is None or warning not in reported_errors:
+            log.warning("PDF page %d rendering: %s" % (page_num, warning))
+            if reported_errors is not None:
+                reported_errors.add(warning)
+
+    return jpeg_data
+
+
+@cached_conversion("pdf_page", image_settings, ignore_kwargs={"pdf_data", "pdf_rasterizer"})
+def render_pdf_page(pdf_digest, page_num, dpi, pdf_data, pdf_rasterizer):
+    # keyed by the digest of the PDF, so a cached page costs no hash of the whole PDF. rendering warnings are
+    # returned rather than logged, so that cached pages are reported once per book as well
+    if pymupdf is not None:
+        return pdf_rasterizer.convert(pdf_data, page_num, dpi)
+
+    if calibre_numeric_version is None:
+        raise Exception("PDF page conversion requires pymupdf")
 
-        if dpi != 150:
-            raise Exception("calibre PDF page_images supports only default 150dpi")
+    if dpi != 150:
+        raise Exception("calibre PDF page_images supports only default 150dpi")
 
-        from calibre.ebooks.metadata.pdf import page_images
-        page_images(pdf_file, jpeg_dir, first=page_num, last=page_num)
+    pdf_file = temp_filename("pdf", pdf_data)
+    jpeg_dir = create_temp_dir()
+
+    from calibre.ebooks.metadata.pdf import page_images
+    page_images(pdf_file, jpeg_dir, first=page_num, last=page_num)
 
     for dirpath, dirnames, filenames in os.walk(jpeg_dir):
         if len(filenames) != 1:
@@ -340,17 +587,29 @@ def convert_pdf_to_jpeg(pdf_data, page_num, dpi=150, reported_errors=None):
     else:
         raise Exception("pdftoppm created no files")
 
-    return jpeg_data
+    return (jpeg_data, [])
+
+
+def convert_pdf_pages_to_jpeg(pdf_data, page_nums, dpi=150, reported_errors=None, pdf_rasterizer=None):
+    if pdf_rasterizer is None:
+        with PdfRasterizer() as pdf_rasterizer:
+            return convert_pdf_pages_to_jpeg(pdf_data, page_nums, dpi, reported_errors, pdf_rasterizer)
+
+    return [convert_pdf_to_jpeg(pdf_data, page_num, dpi, reported_errors=reported_errors, pdf_rasterizer=pdf_rasterizer)
+            for page_num in page_nums]
 
 
-def convert_image_to_pdf(image_resource):
+def convert_image_to_pdf(image_resource, jxr_conversions=None):
     if image_resource.format == "$565":
         return image_resource
 
     image_data = image_resource.raw_media
 
     if image_resource.format == "$548":
-        image_data = convert_jxr_to_jpeg_or_png(image_data, image_resource.location)[0]
+        if jxr_conversions is not None:
+            image_data = jxr_conversions.convert(image_data, image_resource.location)[0]
+        else:
+            image_data = convert_jxr_to_jpeg_or_png(image_data, image_resource.location)[0]
 
     pdf_file = io.BytesIO()
 
@@ -368,6 +627,77 @@ def convert_image_to_pdf(image_resource):
     return PdfImageResource(image_resource.location, pdf_data, 0, 1)
 
 
+def add_image_pdf_page(pdf_writer, image_resource, jxr_conversions=None):
+    image_data = image_resource.raw_media
+
+    if image_resource.format == "$548":
+        if jxr_conversions is not None:
+            image_data = jxr_conversions.convert(image_data, image_resource.location)[0]
+        else:
+            image_data = convert_jxr_to_jpeg_or_png(image_data, image_resource.location)[0]
+
+    with disable_debug_log():
+        image = Image.open(io.BytesIO(image_data))
+        width, height = image.size
+
+        if image.format == "JPEG" and image.mode in PDF_IMAGE_COLOR_SPACES:
+            image_xobject = pdf_image_xobject(
+                width, height, image.mode, "/DCTDecode", image_data, inverted=image.mode == "CMYK" and "adobe" in image.info)
+        else:
+            if image.mode == "P":
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            elif image.mode not in PDF_IMAGE_COLOR_SPACES and image.mode not in {"LA", "RGBA"}:
+                image = image.convert("RGB")
+
+            mask = None
+            if image.mode in {"LA", "RGBA"}:
+                mask = pdf_image_xobject(width, height, "L", "/FlateDecode", zlib.compress(image.getchannel("A").tobytes()))
+                image = image.convert(image.mode[:-1])
+
+            image_xobject = pdf_image_xobject(width, height, image.mode, "/FlateDecode", zlib.compress(image.tobytes()))
+            if mask is not None:
+                image_xobject[pypdf.generic.NameObject("/SMask")] = add_pdf_object(pdf_writer, mask)
+
+        image.close()
+
+    page = pdf_writer.add_blank_page(width, height)
+    page[pypdf.generic.NameObject("/Resources")] = pypdf.generic.DictionaryObject({
+        pypdf.generic.NameObject("/XObject"): pypdf.generic.DictionaryObject({
+            pypdf.generic.NameObject("/Im0"): add_pdf_object(pdf_writer, image_xobject)})})
+
+    contents = pypdf.generic.StreamObject()
+    contents.set_data(b"q %d 0 0 %d 0 0 cm /Im0 Do Q" % (width, height))
+    page[pypdf.generic.NameObject("/Contents")] = add_pdf_object(pdf_writer, contents)
+    return page
+
+
+def add_pdf_object(pdf_writer, pdf_object):
+    # pypdf has no public way to add an indirect object to a writer. _add_object is the same throughout pypdf 5,
+    # which is all pyproject.toml allows, so check it here when raising that bound
+    return pdf_writer._add_object(pdf_object)
+
+
+def pdf_image_xobject(width, height, mode, pdf_filter, stream_data, inverted=False):
+    image_xobject = pypdf.generic.StreamObject()
+    image_xobject.update({
+        pypdf.generic.NameObject("/Type"): pypdf.generic.NameObject("/XObject"),
+        pypdf.generic.NameObject("/Subtype"): pypdf.generic.NameObject("/Image"),
+        pypdf.generic.NameObject("/Width"): pypdf.generic.NumberObject(width),
+        pypdf.generic.NameObject("/Height"): pypdf.generic.NumberObject(height),
+        pypdf.generic.NameObject("/ColorSpace"): pypdf.generic.NameObject(PDF_IMAGE_COLOR_SPACES[mode]),
+        pypdf.generic.NameObject("/BitsPerComponent"): pypdf.generic.NumberObject(1 if mode == "1" else 8),
+        pypdf.generic.NameObject("/Filter"): pypdf.generic.NameObject(pdf_filter),
+        })
+
+    if inverted:
+        image_xobject[pypdf.generic.NameObject("/Decode")] = pypdf.generic.ArrayObject(
+            [pypdf.generic.NumberObject(n) for n in [1, 0] * len(mode)])
+
+    image_xobject.set_data(stream_data)
+    return image_xobject
+
+
+@cached_conversion("combine_tiles", image_settings)
 def combine_image_tiles(
         resource_name, resource_height, resource_width, resource_format, tile_height, tile_width, tile_padding,
         yj_tiles, tiles_raw_media, ignore_variants):
@@ -378,7 +708,6 @@ def combine_image_tiles(
         log.warning("tiled image %dx%d: %s" % (nrows, ncols, resource_name))
 
     with disable_debug_log():
-        tile_images = []
         separate_tiles_size = tile_count = 0
         full_image_color_mode = IMAGE_COLOR_MODES[0]
         full_image_opacity_mode = ""
@@ -391,23 +720,22 @@ def combine_image_tiles(
                 if tile_raw_media is not None:
                     tile_count += 1
                     separate_tiles_size += len(tile_raw_media)
-                    tile = Image.open(io.BytesIO(tile_raw_media))
+                    with Image.open(io.BytesIO(tile_raw_media)) as tile:
+                        tile_mode = tile.mode
 
-                    if tile.mode.endswith(IMAGE_OPACITY_MODE):
-                        tile_color_mode = tile.mode[:-1]
+                    if tile_mode.endswith(IMAGE_OPACITY_MODE):
+                        tile_color_mode = tile_mode[:-1]
                         full_image_opacity_mode = IMAGE_OPACITY_MODE
                     else:
-                        tile_color_mode = tile.mode
+                        tile_color_mode = tile_mode
 
                     if tile_color_mode not in IMAGE_COLOR_MODES:
-                        log.error("Resource %s tile %s has unexpected image mode %s" % (resource_name, tile_location, tile.mode))
+                        log.error("Resource %s tile %s has unexpected image mode %s" % (resource_name, tile_location, tile_mode))
                     elif IMAGE_COLOR_MODES.index(tile_color_mode) > IMAGE_COLOR_MODES.index(full_image_color_mode):
                         full_image_color_mode = tile_color_mode
                 else:
-                    tile = None
                     missing_tiles.append((x, y))
 
-                tile_images.append(tile)
                 tile_num += 1
 
         if missing_tiles:
@@ -417,6 +745,7 @@ def combine_image_tiles(
 
         full_image = Image.new(full_image_color_mode + full_image_opacity_mode, (resource_width, resource_height))
 
+        tile_num = 0
         for y, row in enumerate(yj_tiles):
             top_padding = 0 if y == 0 else tile_padding
             bottom_padding = min(tile_padding, resource_height - tile_height * (y + 1))
@@ -425,8 +754,12 @@ def combine_image_tiles(
                 left_padding = 0 if x == 0 else tile_padding
                 right_padding = min(tile_padding, resource_width - tile_width * (x + 1))
 
-                tile = tile_images.pop(0)
-                if tile is not None:
+                tile_raw_media = tiles_raw_media[tile_num]
+                tile_num += 1
+                if tile_raw_media is None:
+                    continue
+
+                with Image.open(io.BytesIO(tile_raw_media)) as tile:
                     twidth, theight = tile.size
                     if twidth != tile_width + left_padding + right_padding or theight != tile_height + top_padding + bottom_padding:
                         log.error("Resource %s tile %d, %d size (%d, %d) does not have padding %d of expected size (%d, %d)" % (
@@ -434,9 +767,8 @@ def combine_image_tiles(
                         log.info("tile padding ltrb: %d, %d, %d, %d" % (left_padding, top_padding, right_padding, bottom_padding))
 
                     crop = (left_padding, top_padding, tile_width + left_padding, tile_height + top_padding)
-                    tile = tile.crop(crop)
-                    full_image.paste(tile, (x * tile_width, y * tile_height))
-                    tile.close()
+                    with tile.crop(crop) as cropped_tile:
+                        full_image.paste(cropped_tile, (x * tile_width, y * tile_height))
 
         if full_image.size != (resource_width, resource_height):
             log.error("Resource %s combined tiled image size is (%d, %d) but should be (%d, %d)" % (
@@ -469,17 +801,39 @@ def combine_image_tiles(
 
 
 def optimize_jpeg_image_quality(jpeg_image, desired_size):
-    min_quality = MIN_JPEG_QUALITY
-    max_quality = MAX_JPEG_QUALITY
-    best_size_diff = best_quality = best_raw_media = None
-
-    while max_quality >= min_quality:
-        quality = (max_quality + min_quality) // 2
+    def encode(quality, optimize):
         outfile = io.BytesIO()
-        jpeg_image.save(outfile, "JPEG", quality=quality, optimize=True)
+        jpeg_image.save(outfile, "JPEG", quality=quality, optimize=optimize)
         raw_media = outfile.getvalue()
         outfile.close()
+        return raw_media
 
+    def limit_quality(quality):
+        return max(MIN_JPEG_QUALITY, min(MAX_JPEG_QUALITY, quality))
+
+    slope = JPEG_QUALITY_SIZE_SLOPE
+
+    if desired_size <= 0:
+        quality = MIN_JPEG_QUALITY      # every encode is too large, so the smallest is the closest
+    else:
+        probe_quality = (MIN_JPEG_QUALITY + MAX_JPEG_QUALITY + 1) // 2
+        probe_size = max(len(encode(probe_quality, False)), 1)
+        log_size_diff = math.log(desired_size / JPEG_OPTIMIZED_SIZE_RATIO / probe_size)
+
+        quality = limit_quality(probe_quality + round(log_size_diff / slope))
+        if quality != probe_quality:
+            size = max(len(encode(quality, False)), 1)
+            slope = max(math.log(size / probe_size) / (quality - probe_quality), 0.01)
+            quality = limit_quality(probe_quality + round(log_size_diff / slope))
+
+    best_size_diff = best_quality = best_raw_media = None
+    min_quality = MIN_JPEG_QUALITY
+    max_quality = MAX_JPEG_QUALITY
+    optimized_encodes = 0
+
+    while True:
+        raw_media = encode(quality, True)
+        optimized_encodes += 1
         size_diff = len(raw_media) - desired_size
 
         if best_size_diff is None or abs(size_diff) < abs(best_size_diff):
@@ -487,11 +841,24 @@ def optimize_jpeg_image_quality(jpeg_image, desired_size):
             best_quality = quality
             best_raw_media = raw_media
 
-        if len(raw_media) < desired_size:
+        if abs(size_diff) * 100 <= desired_size * JPEG_SIZE_TOLERANCE_PERCENTAGE:
+            break
+
+        if size_diff < 0:
             min_quality = quality + 1
         else:
             max_quality = quality - 1
 
+        if max_quality < min_quality:
+            break
+
+        if optimized_encodes == 1:
+            # the fitted slope usually predicts the target from the first optimized size, before bisecting what is left
+            quality += round(math.log(desired_size / max(len(raw_media), 1)) / slope)
+            quality = max(min_quality, min(max_quality, quality))
+        else:
+            quality = (min_quality + max_quality) // 2
+
     return best_raw_media, best_quality
 
 
@@ -534,6 +901,7 @@ def box_size(box):
     return (box.upper_right[0] - box.lower_left[0], box.upper_right[1] - box.lower_left[1])
 
 
+@cached_conversion("crop", image_settings)
 def crop_image(raw_media, resource_name, resource_width, resource_height, margin_left, margin_right, margin_top, margin_bottom):
 
     with disable_debug_log():
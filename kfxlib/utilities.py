@@ -744,6 +744,14 @@ class Serializer(object):
             self.buffers.append(buf)
             self.length += len(buf)
 
+    def reserve(self):
+        self.buffers.append(b"")
+        return len(self.buffers) - 1
+
+    def fill(self, position, buf):
+        self.buffers[position] = buf
+        self.length += len(buf)
+
     def extend(self, serializer):
         self.buffers.extend(serializer.buffers)
         self.length += serializer.length
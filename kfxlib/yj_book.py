@@ -10,6 +10,7 @@ from .kfx_container import (KfxContainer, MAX_KFX_CONTAINER_SIZE)
 from .kpf_book import KpfBook
 from .kpf_container import KpfContainer
 from .message_logging import log
+from .phase_timing import phase
 from .unpack_container import (IonTextContainer, JsonContentContainer, ZipUnpackContainer)
 from .utilities import (
         DataFile, file_read_utf8, flush_unicode_cache, bytes_to_separated_hex,
@@ -25,6 +26,9 @@ __license__ = "GPL v3"
 __copyright__ = "2016-2025, John Howell <jhowell@acm.org>"
 
 
+CONVERSION_FORMATS = ["epub", "cbz", "pdf", "json"]
+
+
 class YJ_Book(BookStructure, BookPosLoc, BookMetadata, KpfBook):
     def __init__(self, file, credentials=[], is_netfs=False, symbol_catalog_filename=None):
         self.datafile = DataFile(file)
@@ -34,6 +38,9 @@ class YJ_Book(BookStructure, BookPosLoc, BookMetadata, KpfBook):
         self.reported_errors = set()
         self.symtab = LocalSymbolTable(YJ_SYMBOLS.name)
         self.fragments = YJFragmentList()
+        self.content_position_info_cache_ = {}
+        self.content_position_info_fragments_ = self.content_position_info_version_ = None
+        self.content_position_walks = self.content_position_walks_avoided = 0
         self.reported_missing_fids = set()
         self.is_kpf_prepub = self.is_dictionary = self.is_scribe_notebook = False
         self.is_entity_dependencies_modified = False
@@ -99,28 +106,65 @@ class YJ_Book(BookStructure, BookPosLoc, BookMetadata, KpfBook):
         self.final_actions()
         return result
 
-    def convert_to_epub(self, epub2_desired=False, force_cover=False, progress_fn=None):
+    def convert_to_epub(self, epub2_desired=False, force_cover=False, progress_fn=None, compress_level=None,
+                        store_compressed_media=True):
         from .yj_to_epub import KFX_EPUB
         self.decode_book()
         result = KFX_EPUB(self, epub2_desired=epub2_desired, force_cover=force_cover,
-                          progress=make_progress(progress_fn)).decompile_to_epub()
+                          progress=make_progress(progress_fn), compress_level=compress_level,
+                          store_compressed_media=store_compressed_media).decompile_to_epub()
         self.final_actions()
         return result
 
-    def convert_to_cbz(self, split_landscape_comic_images=False, progress_fn=None):
+    def convert_to_cbz(self, split_landscape_comic_images=False, progress_fn=None, output_file=None, max_memory=None):
         from .yj_to_image_book import KFX_IMAGE_BOOK
         self.decode_book()
-        result = KFX_IMAGE_BOOK(self).convert_book_to_cbz(split_landscape_comic_images, make_progress(progress_fn))
+        result = KFX_IMAGE_BOOK(self).convert_book_to_cbz(
+            split_landscape_comic_images, make_progress(progress_fn), output_file, max_memory)
         self.final_actions()
         return result
 
-    def convert_to_pdf(self, split_landscape_comic_images=False, progress_fn=None):
+    def convert_to_pdf(self, split_landscape_comic_images=False, progress_fn=None, output_file=None):
         from .yj_to_image_book import KFX_IMAGE_BOOK
         self.decode_book()
-        result = KFX_IMAGE_BOOK(self).convert_book_to_pdf(split_landscape_comic_images, make_progress(progress_fn))
+        result = KFX_IMAGE_BOOK(self).convert_book_to_pdf(split_landscape_comic_images, make_progress(progress_fn), output_file)
         self.final_actions()
         return result
 
+    def convert_to_formats(self, formats, epub2_desired=False, force_cover=False, split_landscape_comic_images=False,
+                           keep_footnote_refs=False, progress_fn=None, compress_level=None, store_compressed_media=True):
+        from .resources import JXRConversions
+        from .yj_to_epub import KFX_EPUB
+        from .yj_to_image_book import KFX_IMAGE_BOOK
+
+        for output_format in formats:
+            if output_format not in CONVERSION_FORMATS:
+                raise Exception("Unknown conversion format: %s" % output_format)
+
+        self.decode_book()
+        jxr_conversions = JXRConversions()
+        image_book = KFX_IMAGE_BOOK(self, jxr_conversions)
+        results = {}
+
+        for output_format in formats:
+            if output_format in results:
+                continue
+
+            if output_format == "epub":
+                results[output_format] = KFX_EPUB(
+                        self, epub2_desired=epub2_desired, force_cover=force_cover, progress=make_progress(progress_fn),
+                        compress_level=compress_level, store_compressed_media=store_compressed_media,
+                        jxr_conversions=jxr_conversions).decompile_to_epub()
+            elif output_format == "cbz":
+                results[output_format] = image_book.convert_book_to_cbz(split_landscape_comic_images, make_progress(progress_fn))
+            elif output_format == "pdf":
+                results[output_format] = image_book.convert_book_to_pdf(split_landscape_comic_images, make_progress(progress_fn))
+            else:
+                results[output_format] = JsonContentContainer(self).serialize(keep_footnote_refs)
+
+        self.final_actions()
+        return results
+
     def get_metadata(self):
 
         self.locate_book_datafiles()
@@ -206,42 +250,53 @@ class YJ_Book(BookStructure, BookPosLoc, BookMetadata, KpfBook):
                 raise Exception("Attempt to change metadata after book has already been decoded")
             return
 
-        self.locate_book_datafiles()
+        with phase("decode_book"):
+            with phase("containers") as span:
+                self.locate_book_datafiles()
 
-        for datafile in self.container_datafiles:
-            log.info("Processing container: %s" % datafile.name)
-            container = self.get_container(datafile)
-            container.deserialize()
-            self.yj_containers.append(container)
+                for datafile in self.container_datafiles:
+                    log.info("Processing container: %s" % datafile.name)
+                    container = self.get_container(datafile)
+                    container.deserialize()
+                    self.yj_containers.append(container)
 
-        for container in self.yj_containers:
-            self.fragments.extend(container.get_fragments())
+                for container in self.yj_containers:
+                    self.fragments.extend(container.get_fragments())
 
-        if self.is_kpf_prepub:
-            self.fix_kpf_prepub_book(not pure, retain_yj_locals)
+                span.add_items(len(self.fragments))
 
-        if True:
-            self.check_consistency()
+            if self.is_kpf_prepub:
+                with phase("kpf_fixup"):
+                    self.fix_kpf_prepub_book(not pure, retain_yj_locals)
 
-        if not pure:
-            if set_metadata is not None:
-                self.set_yj_metadata_to_book(set_metadata)
+            if True:
+                with phase("consistency", len(self.fragments)):
+                    self.check_consistency()
 
-            if set_approximate_pages is not None and set_approximate_pages >= 0:
+            if not pure:
+                with phase("metadata"):
+                    if set_metadata is not None:
+                        self.set_yj_metadata_to_book(set_metadata)
+
+                    if set_approximate_pages is not None and set_approximate_pages >= 0:
+                        try:
+                            self.create_approximate_page_list(set_approximate_pages)
+                        except Exception as e:
+                            traceback.print_exc()
+                            log.error("Exception creating approximate page numbers: %s" % repr(e))
+
+            with phase("features"):
                 try:
-                    self.create_approximate_page_list(set_approximate_pages)
+                    self.report_features_and_metadata(unknown_only=False)
                 except Exception as e:
                     traceback.print_exc()
-                    log.error("Exception creating approximate page numbers: %s" % repr(e))
+                    log.error("Exception checking book features and metadata: %s" % repr(e))
 
-        try:
-            self.report_features_and_metadata(unknown_only=False)
-        except Exception as e:
-            traceback.print_exc()
-            log.error("Exception checking book features and metadata: %s" % repr(e))
+            with phase("fragment_usage", len(self.fragments)):
+                self.check_fragment_usage(rebuild=not pure, ignore_extra=False)
 
-        self.check_fragment_usage(rebuild=not pure, ignore_extra=False)
-        self.check_symbol_table(rebuild=not pure, ignore_unused=self.is_scribe_notebook)
+            with phase("symbol_table"):
+                self.check_symbol_table(rebuild=not pure, ignore_unused=self.is_scribe_notebook)
 
         self.final_actions()
 
@@ -274,6 +274,7 @@ class YJFragmentList(IonList):
     def __init__(self, *args):
         IonList.__init__(self, *args)
         self.yj_dirty = True
+        self.yj_version = 0
         self.yj_ftype_index = collections.defaultdict(list)
         self.yj_fragment_index = collections.defaultdict(list)
 
@@ -333,14 +334,21 @@ class YJFragmentList(IonList):
             raise Exception("YJFragmentList append non-YJFragment: %s" % type_name(value))
 
         IonList.append(self, value)
-        self.yj_dirty = True
+        self.yj_modified()
 
     def extend(self, values):
         if not isinstance(values, YJFragmentList):
             raise Exception("YJFragmentList extend non-YJFragmentList: %s" % type_name(values))
 
         IonList.extend(self, values)
-        self.yj_dirty = True
+        self.yj_modified()
+
+    def insert(self, index, value):
+        if not isinstance(value, YJFragment):
+            raise Exception("YJFragmentList insert non-YJFragment: %s" % type_name(value))
+
+        IonList.insert(self, index, value)
+        self.yj_modified()
 
     def remove(self, value):
         if not self.discard(value):
@@ -353,7 +361,7 @@ class YJFragmentList(IonList):
         for i, f in enumerate(self):
             if f is value:
                 self.pop(i)
-                self.yj_dirty = True
+                self.yj_modified()
                 return True
 
         return False
@@ -383,3 +391,8 @@ class YJFragmentList(IonList):
 
     def clear(self):
         del self[:]
+        self.yj_modified()
+
+    def yj_modified(self):
+        self.yj_dirty = True
+        self.yj_version += 1
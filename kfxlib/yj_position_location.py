@@ -1,3 +1,5 @@
+import array
+import bisect
 import collections
 
 from .ion import (ion_type, IonAnnotation, IonInt, IonList, IonSExp, IonString, IonStruct, IonSymbol, IS, unannotated)
@@ -16,6 +18,7 @@ REPORT_LOCATION_DATA = False
 MAX_REPORT_ERRORS = 0
 
 KFX_POSITIONS_PER_LOCATION = 110
+EID_SCAN_CHUNKS = 16
 
 TYPICAL_POSITIONS_PER_PAGE = 1850
 MIN_POSITIONS_PER_PAGE = 1
@@ -29,6 +32,8 @@ RANGE_OPERS = ["$298", "$299"]
 
 
 class ContentChunk(object):
+    __slots__ = ("pid", "eid", "eid_offset", "length", "section_name", "match_zero_len", "text", "image_resource")
+
     def __init__(self, pid, eid, eid_offset, length=0, section_name=None, match_zero_len=False, text=None, image_resource=None):
         self.pid = pid
         self.eid = eid
@@ -62,6 +67,273 @@ class ContentChunk(object):
                 repr(self.image_resource))
 
 
+class PositionTableChunk(object):
+    '''
+    View of one row of a PositionTable that can be used in place of a ContentChunk.
+    '''
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def pid(self):
+        return self.table.pids[self.index]
+
+    @pid.setter
+    def pid(self, value):
+        self.table.pids[self.index] = value
+
+    @property
+    def eid(self):
+        return self.table.other_eids.get(self.index, self.table.int_eids[self.index])
+
+    @eid.setter
+    def eid(self, value):
+        self.table.set_eid(self.index, value)
+
+    @property
+    def eid_offset(self):
+        return self.table.eid_offsets[self.index]
+
+    @eid_offset.setter
+    def eid_offset(self, value):
+        self.table.eid_offsets[self.index] = value
+
+    @property
+    def length(self):
+        return self.table.lengths[self.index]
+
+    @length.setter
+    def length(self, value):
+        self.table.lengths[self.index] = value
+
+    @property
+    def section_name(self):
+        return self.table.section_names[self.table.section_numbers[self.index]]
+
+    @section_name.setter
+    def section_name(self, value):
+        self.table.section_numbers[self.index] = self.table.section_number(value)
+
+    @property
+    def match_zero_len(self):
+        return self.table.match_zero_lens[self.index] != 0
+
+    @match_zero_len.setter
+    def match_zero_len(self, value):
+        self.table.match_zero_lens[self.index] = 1 if value else 0
+
+    @property
+    def text(self):
+        return self.table.texts[self.index]
+
+    @text.setter
+    def text(self, value):
+        self.table.texts[self.index] = value
+
+    @property
+    def image_resource(self):
+        return self.table.image_resources.get(self.index)
+
+    @image_resource.setter
+    def image_resource(self, value):
+        if value is None:
+            self.table.image_resources.pop(self.index, None)
+        else:
+            self.table.image_resources[self.index] = value
+
+    __eq__ = ContentChunk.__eq__
+    __repr__ = ContentChunk.__repr__
+
+
+class PositionTable(object):
+    '''
+    Position info for a book stored by column. Int eids are stored in an array with any others kept by row, and
+    section names are numbered in order of first use (with None as 0).
+    '''
+
+    def __init__(self, chunks=()):
+        self.pids = array.array("q")
+        self.int_eids = array.array("q")
+        self.eid_offsets = array.array("q")
+        self.lengths = array.array("q")
+        self.section_numbers = array.array("l")
+        self.match_zero_lens = bytearray()
+        self.texts = []
+        self.other_eids = {}
+        self.image_resources = {}
+        self.section_names = []
+        self.section_numbers_ = {}
+        self.last_section_name_ = None
+        self.last_section_number_ = self.section_number(None)
+        self.extend(chunks)
+
+    def set_eid(self, index, eid):
+        if type(eid) is int:
+            self.int_eids[index] = eid
+            self.other_eids.pop(index, None)
+        else:
+            self.int_eids[index] = 0
+            self.other_eids[index] = eid
+
+    def section_number(self, section_name):
+        key = (type(section_name), section_name)
+        number = self.section_numbers_.get(key)
+        if number is None:
+            number = self.section_numbers_[key] = len(self.section_names)
+            self.section_names.append(section_name)
+
+        return number
+
+    def append(self, chunk):
+        eid = chunk.eid
+        if type(eid) is int:
+            self.int_eids.append(eid)
+        else:
+            self.other_eids[len(self.int_eids)] = eid
+            self.int_eids.append(0)
+
+        if chunk.image_resource is not None:
+            self.image_resources[len(self.pids)] = chunk.image_resource
+
+        section_name = chunk.section_name
+        if section_name is not self.last_section_name_:
+            self.last_section_number_ = self.section_number(section_name)
+            self.last_section_name_ = section_name
+
+        self.pids.append(chunk.pid)
+        self.eid_offsets.append(chunk.eid_offset)
+        self.lengths.append(chunk.length)
+        self.section_numbers.append(self.last_section_number_)
+        self.match_zero_lens.append(1 if chunk.match_zero_len else 0)
+        self.texts.append(chunk.text)
+
+    def extend(self, chunks):
+        for chunk in chunks:
+            self.append(chunk)
+
+    def eid_list(self):
+        eids = list(self.int_eids)
+        for index, eid in self.other_eids.items():
+            eids[index] = eid
+
+        return eids
+
+    def rows(self):
+        return zip(
+            self.pids, self.eid_list(), self.eid_offsets, self.lengths,
+            [self.section_names[number] for number in self.section_numbers], self.texts)
+
+    def __len__(self):
+        return len(self.pids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [PositionTableChunk(self, i) for i in range(*index.indices(len(self.pids)))]
+
+        if index < 0:
+            index += len(self.pids)
+
+        if index < 0 or index >= len(self.pids):
+            raise IndexError("PositionTable index out of range")
+
+        return PositionTableChunk(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.pids)):
+            yield PositionTableChunk(self, index)
+
+
+def position_rows(pos_info):
+    if isinstance(pos_info, PositionTable):
+        return pos_info.rows()
+
+    return ((chunk.pid, chunk.eid, chunk.eid_offset, chunk.length, chunk.section_name, chunk.text) for chunk in pos_info)
+
+
+class EidPositionIndex(object):
+    '''
+    Columns of a position info list with its chunks grouped by eid, to locate an eid offset without scanning the list.
+    '''
+
+    def __init__(self, pos_info):
+        self.pos_info = pos_info
+        self.size = len(pos_info)
+
+        if isinstance(pos_info, PositionTable):
+            self.pids = pos_info.pids
+            self.eids = pos_info.eid_list()
+            self.eid_offsets = pos_info.eid_offsets
+            self.lengths = pos_info.lengths
+        else:
+            self.pids = [chunk.pid for chunk in pos_info]
+            self.eids = [chunk.eid for chunk in pos_info]
+            self.eid_offsets = [chunk.eid_offset for chunk in pos_info]
+            self.lengths = [chunk.length for chunk in pos_info]
+
+        self.eid_piis = None
+        self.eid_sorted_chunks = {}
+
+    def is_current(self, pos_info):
+        return pos_info is self.pos_info and len(pos_info) == self.size
+
+    def find(self, eid, eid_offset, start_pii=0):
+        eids = self.eids
+        eid_offsets = self.eid_offsets
+        lengths = self.lengths
+
+        for pii in range(start_pii, min(start_pii + EID_SCAN_CHUNKS, self.size)):
+            if eids[pii] == eid and eid_offset >= eid_offsets[pii] and eid_offset <= eid_offsets[pii] + lengths[pii]:
+                return pii
+
+        if self.eid_piis is None:
+            self.eid_piis = {}
+            for pii, chunk_eid in enumerate(eids):
+                piis = self.eid_piis.get(chunk_eid)
+                if piis is None:
+                    self.eid_piis[chunk_eid] = [pii]
+                else:
+                    piis.append(pii)
+
+        piis = self.eid_piis.get(eid)
+        if piis is None:
+            return None
+
+        if len(piis) > EID_SCAN_CHUNKS:
+            piis = self.candidate_piis(eid, piis, eid_offset)
+
+        first_pii = None
+        for pii in piis:
+            if eid_offset >= eid_offsets[pii] and eid_offset <= eid_offsets[pii] + lengths[pii]:
+                if pii >= start_pii:
+                    return pii
+
+                if first_pii is None:
+                    first_pii = pii
+
+        return first_pii
+
+    def candidate_piis(self, eid, piis, eid_offset):
+        sorted_chunks = self.eid_sorted_chunks.get(eid)
+        if sorted_chunks is None:
+            chunks = sorted((self.eid_offsets[pii], pii) for pii in piis)
+            sorted_chunks = self.eid_sorted_chunks[eid] = (
+                [chunk_eid_offset for chunk_eid_offset, pii in chunks], [pii for chunk_eid_offset, pii in chunks],
+                max(self.lengths[pii] for pii in piis))
+
+        offsets, offset_piis, max_length = sorted_chunks
+        candidates = []
+        i = bisect.bisect_right(offsets, eid_offset) - 1
+        while i >= 0 and offsets[i] >= eid_offset - max_length:
+            candidates.append(offset_piis[i])
+            i -= 1
+
+        return sorted(candidates)
+
+
 class ConditionalTemplate(object):
     def __init__(self, end_eid, end_eid_offset, oper, pos_info):
         self.end_eid = end_eid
@@ -126,9 +398,27 @@ class BookPosLoc(object):
                             reflow_section_size, reflow_section_size_calculated, max_section_pid_count))
 
     def collect_content_position_info(self, keep_footnote_refs=True, skip_non_rendered_content=False, include_background_images=False):
+        if (self.content_position_info_fragments_ is not self.fragments or
+                self.content_position_info_version_ != self.fragments.yj_version):
+            self.content_position_info_cache_.clear()
+            self.content_position_info_fragments_ = self.fragments
+            self.content_position_info_version_ = self.fragments.yj_version
+
+        key = (keep_footnote_refs, skip_non_rendered_content, include_background_images, self.is_kpf_prepub)
+        pos_info = self.content_position_info_cache_.get(key)
+        if pos_info is not None:
+            self.content_position_walks_avoided += 1
+            return pos_info
+
+        pos_info = self.content_position_info_cache_[key] = self.walk_content_position_info(
+                keep_footnote_refs, skip_non_rendered_content, include_background_images)
+        self.content_position_walks += 1
+        return pos_info
+
+    def walk_content_position_info(self, keep_footnote_refs, skip_non_rendered_content, include_background_images):
         eid_section = {}
         eid_start_pos = {}
-        pos_info = []
+        pos_info = PositionTable()
         section_pos_info = []
         eid_cond_info = []
         processed_story_names = set()
@@ -621,7 +911,7 @@ class BookPosLoc(object):
         return self._cached_has_non_image_render_inline
 
     def collect_position_map_info(self):
-        pos_info = []
+        pos_info = PositionTable()
         eid_start_pos = {}
         prev_eid_offset = {}
         eid_section = {}
@@ -961,25 +1251,25 @@ class BookPosLoc(object):
         if not hasattr(self, "last_pii_"):
             self.last_pii_ = 0
 
-        if len(pos_info) > 0:
-            if self.last_pii_ >= len(pos_info):
+        pos_info_len = len(pos_info)
+        if pos_info_len > 0:
+            if self.last_pii_ >= pos_info_len:
                 self.last_pii_ = 0
 
-            start_pii = self.last_pii_
+            index = self.eid_position_index(pos_info)
+            pii = index.find(eid, eid_offset, self.last_pii_)
+            if pii is not None:
+                self.last_pii_ = pii
+                return index.pids[pii] + eid_offset - index.eid_offsets[pii]
 
-            while True:
-                pi = pos_info[self.last_pii_]
-                if pi.eid == eid and eid_offset >= pi.eid_offset and eid_offset <= pi.eid_offset + pi.length:
-                    return pi.pid + eid_offset - pi.eid_offset
+        return None
 
-                self.last_pii_ += 1
-                if self.last_pii_ >= len(pos_info):
-                    self.last_pii_ = 0
+    def eid_position_index(self, pos_info):
+        index = getattr(self, "eid_position_index_", None)
+        if index is None or not index.is_current(pos_info):
+            index = self.eid_position_index_ = EidPositionIndex(pos_info)
 
-                if self.last_pii_ == start_pii:
-                    break
-
-        return None
+        return index
 
     def eid_for_pid(self, pid, pos_info):
         low = 0
@@ -999,13 +1289,13 @@ class BookPosLoc(object):
         return (None, None)
 
     def collect_location_map_info(self, pos_info):
-        loc_info = []
+        loc_info = PositionTable()
         self.prev_loc_ = None
         report = MatchReport(REPORT_LOCATION_DATA)
 
         def add_loc(pid, eid, eid_offset):
-            loc = ContentChunk(pid, eid, eid_offset)
-            loc_info.append(loc)
+            loc_info.append(ContentChunk(pid, eid, eid_offset))
+            loc = PositionTableChunk(loc_info, len(loc_info) - 1)
 
             if REPORT_LOCATION_DATA:
                 log.info("location %d %s" % (i+1, loc))
@@ -1084,7 +1374,7 @@ class BookPosLoc(object):
         pid = 0
         next_loc_position = 0
         current_section_name = None
-        loc_info = []
+        loc_info = PositionTable()
 
         for chunk in pos_info:
             eid_loc_offset = 0
@@ -1267,36 +1557,36 @@ class BookPosLoc(object):
             log.info("determine_approximate_pages: first_section_name=%s, positions_per_page=%d" % (
                 first_section_name, positions_per_page))
 
-        for chunk in pos_info:
+        for pid, eid, eid_offset, length, section_name, text in position_rows(pos_info):
 
-            if chunk.eid in page_template_eids:
+            if eid in page_template_eids:
                 continue
 
-            if chunk.section_name == first_section_name and not GEN_COVER_PAGE_NUMBER:
+            if section_name == first_section_name and not GEN_COVER_PAGE_NUMBER:
                 continue
 
-            new_section = chunk.section_name != prev_section_name
-            prev_section_name = chunk.section_name
+            new_section = section_name != prev_section_name
+            prev_section_name = section_name
 
             if fixed_layout:
                 if new_section:
                     new_section_page_count += 1
                     pages.append(IonStruct(
                         IS("$241"), IonStruct(IS("$244"), "%d" % (len(pages) + 1)),
-                        IS("$246"), IonStruct(IS("$155"), chunk.eid, IS("$143"), chunk.eid_offset)))
+                        IS("$246"), IonStruct(IS("$155"), eid, IS("$143"), eid_offset)))
             else:
                 if new_section:
 
-                    next_page_pid = chunk.pid
+                    next_page_pid = pid
                     new_section_page_count += 1
 
                 min_chunk_offset = 0
                 while True:
-                    chunk_offset = max(next_page_pid - chunk.pid, 0)
-                    if chunk_offset >= chunk.length:
+                    chunk_offset = max(next_page_pid - pid, 0)
+                    if chunk_offset >= length:
                         break
 
-                    if chunk.text and not chunk.text[chunk_offset].isspace():
+                    if text and not text[chunk_offset].isspace():
                         init_chunk_offset = chunk_offset
                         while True:
                             if chunk_offset == 0:
@@ -1306,14 +1596,14 @@ class BookPosLoc(object):
                                 chunk_offset = init_chunk_offset
                                 break
 
-                            if chunk.text[chunk_offset-1].isspace():
+                            if text[chunk_offset-1].isspace():
                                 break
 
                             chunk_offset -= 1
 
                     pages.append(IonStruct(
                         IS("$241"), IonStruct(IS("$244"), "%d" % (len(pages) + 1)),
-                        IS("$246"), IonStruct(IS("$155"), chunk.eid, IS("$143"), chunk.eid_offset + chunk_offset)))
+                        IS("$246"), IonStruct(IS("$155"), eid, IS("$143"), eid_offset + chunk_offset)))
 
                     next_page_pid += positions_per_page
                     min_chunk_offset = chunk_offset + max(positions_per_page - MAX_WHITE_SPACE_ADJUST, 1)
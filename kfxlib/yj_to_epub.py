@@ -7,6 +7,7 @@ from .epub_output import (EPUB_Output)
 
 from .ion import (ion_type, IonAnnotation, IonList, IonSExp, IonString, IonStruct, IonSymbol)
 from .message_logging import log
+from .phase_timing import phase
 from .utilities import (check_empty, list_symbols, UUID_MATCH_RE)
 from .yj_structure import SYM_TYPE
 from .yj_to_epub_content import KFX_EPUB_Content
@@ -49,7 +50,8 @@ class KFX_EPUB(
 
     DEBUG = False
 
-    def __init__(self, book, epub2_desired=False, force_cover=False, metadata_only=False, progress=None):
+    def __init__(self, book, epub2_desired=False, force_cover=False, metadata_only=False, progress=None,
+                 compress_level=None, store_compressed_media=True, jxr_conversions=None):
         decimal.getcontext().prec = 6
         KFX_EPUB_Content.__init__(self)
         KFX_EPUB_Illustrated_Layout.__init__(self)
@@ -59,54 +61,73 @@ class KFX_EPUB(
         KFX_EPUB_Notebook.__init__(self)
         KFX_EPUB_Properties.__init__(self)
         KFX_EPUB_Resources.__init__(self)
-        EPUB_Output.__init__(self, epub2_desired, force_cover, not metadata_only)
+        if jxr_conversions is not None:
+            self.jxr_conversions = jxr_conversions
+
+        EPUB_Output.__init__(self, epub2_desired, force_cover, not metadata_only, compress_level, store_compressed_media)
 
         self.book = book
         self.book_symbols = set()
-        self.book_data = self.organize_fragments_by_type(book.fragments)
         self.is_kpf = book.kpf_container is not None
         self.book_has_illustrated_layout_conditional_page_template = book.has_illustrated_layout_conditional_page_template
         self.used_fragments = {}
 
-        self.progress = progress
-        if self.progress is not None:
-            self.progress_limit = self.progress_countdown()
-            self.progress.set_limit(self.progress_limit)
+        try:
+            with phase("epub_metadata", len(book.fragments)):
+                self.book_data = self.organize_fragments_by_type(book.fragments)
+
+                self.progress = progress
+                if self.progress is not None:
+                    self.progress_limit = self.progress_countdown()
+                    self.progress.set_limit(self.progress_limit)
+
+                self.determine_book_symbol_format()
+                self.process_content_features()
+                self.process_fonts()
+                self.process_document_data()
+                self.process_metadata()
+
+                self.set_condition_operators()
+
+                self.process_anchors()
+                self.process_navigation()
+
+            if metadata_only:
+                return
 
-        self.determine_book_symbol_format()
-        self.process_content_features()
-        self.process_fonts()
-        self.process_document_data()
-        self.process_metadata()
+            for style_name, yj_properties in self.book_data.get("$157", {}).items():
+                self.check_fragment_name(yj_properties, "$157", style_name, delete=False)
 
-        self.set_condition_operators()
+            with phase("epub_content") as span:
+                with phase("jxr_prefetch"):
+                    self.prefetch_jxr_resources()
 
-        self.process_anchors()
-        self.process_navigation()
+                self.process_reading_order()
 
-        if metadata_only:
-            return
+                if self.cover_resource and not self.html_cover:
+                    self.process_external_resource(self.cover_resource).manifest_entry.is_cover_image = True
 
-        for style_name, yj_properties in self.book_data.get("$157", {}).items():
-            self.check_fragment_name(yj_properties, "$157", style_name, delete=False)
+                span.add_items(len(self.book_parts))
 
-        self.process_reading_order()
+            with phase("epub_fixups", len(self.book_parts)):
+                self.fixup_anchors_and_hrefs()
+                self.fixup_illustrated_layout_anchors()
+                self.update_default_font_and_language()
+                self.set_html_defaults()
 
-        if self.cover_resource and not self.html_cover:
-            self.process_external_resource(self.cover_resource).manifest_entry.is_cover_image = True
+            with phase("epub_styles", len(self.book_parts)):
+                self.fixup_styles_and_classes()
+                self.create_css_files()
 
-        self.fixup_anchors_and_hrefs()
-        self.fixup_illustrated_layout_anchors()
-        self.update_default_font_and_language()
-        self.set_html_defaults()
-        self.fixup_styles_and_classes()
-        self.create_css_files()
-        self.prepare_book_parts()
-        self.report_missing_positions()
+            with phase("epub_book_parts", len(self.book_parts)):
+                self.prepare_book_parts()
+                self.report_missing_positions()
 
-        if RETAIN_UNUSED_RESOURCES:
-            for external_resource in self.book_data.get("$164", {}):
-                self.process_external_resource(external_resource)
+            if RETAIN_UNUSED_RESOURCES:
+                for external_resource in self.book_data.get("$164", {}):
+                    self.process_external_resource(external_resource)
+        finally:
+            self.close_pdf_rasterizer()
 
         self.check_empty(self.book_data.pop("$164", {}), "external_resource")
 
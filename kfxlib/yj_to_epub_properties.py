@@ -1,6 +1,7 @@
 import collections
 import decimal
 import functools
+import itertools
 from lxml import etree
 import re
 
@@ -24,6 +25,8 @@ REMOVE_EMPTY_NAMED_CLASSES = True
 REVERSE_INHERITANCE = True
 REVERSE_INHERITANCE_FRACTION = 0.8
 
+STYLE_LAYER_DEPTH_LIMIT = 8
+
 FIX_NONSTANDARD_FONT_WEIGHT = False
 
 USE_NORMAL_LINE_HEIGHT = True
@@ -37,6 +40,8 @@ MINIMUM_LINE_HEIGHT = decimal.Decimal("1.0")
 
 CVT_DIRECTION_PROPERTY_TO_MARKUP = False
 
+STYLE_CACHE_SIZE = 4096
+
 DEFAULT_DOCUMENT_FONT_FAMILY = "serif"
 DEFAULT_DOCUMENT_LINE_HEIGHT = "normal" if USE_NORMAL_LINE_HEIGHT else NORMAL_LINE_HEIGHT_EM
 DEFAULT_DOCUMENT_FONT_SIZE = "1em"
@@ -1056,8 +1061,7 @@ AMAZON_SPECIAL_CLASSES = [
 
 INLINE_ELEMENTS = {"a", "bdo", "br", "img", "object", "rp", "ruby", "span"}
 
-
-style_cache = {}
+PADDING_PROPERTIES = {"padding", "padding-top", "padding-bottom", "padding-left", "padding-right"}
 
 
 class KFX_EPUB_Properties(object):
@@ -1071,12 +1075,14 @@ class KFX_EPUB_Properties(object):
         self.fixed_font_names = {}
         self.font_faces = []
         self.incorrect_font_quoting = set()
+        self.element_styles = None
+        self.style_cache = StyleCache()
 
         for name in GENERIC_FONT_NAMES:
             self.fix_font_name(name, add=True, generic=True)
 
     def Style(self, x):
-        return Style(x)
+        return self.style_cache.get(x) if isinstance(x, str) else Style(x)
 
     def process_content_properties(self, content):
         content_properties = {}
@@ -1393,6 +1399,7 @@ class KFX_EPUB_Properties(object):
         self.css_rules = {}
 
         self.non_heritable_default_properties = self.Style(NON_HERITABLE_DEFAULT_PROPERTIES)
+        self.load_element_styles()
 
         for book_part in self.book_parts:
             self.last_kfx_heading_level = "1"
@@ -1401,13 +1408,18 @@ class KFX_EPUB_Properties(object):
             if lang:
                 heritable_default_properties.update(self.Style({"-kfx-attrib-xml-lang": lang}), replace=True)
 
-            self.simplify_styles(book_part.body(), book_part, heritable_default_properties)
+            self.simplify_styles(book_part.body(), book_part, StyleLayer(heritable_default_properties.properties))
 
             self.add_composite_and_equivalent_styles(book_part.body(), book_part)
 
-        self.create_conditional_page_templates()
+        if self.has_conditional_content:
+            self.store_element_styles()
+            self.create_conditional_page_templates()
+            self.load_element_styles()
 
         style_counts = collections.defaultdict(lambda: 0)
+        style_styles = {}
+        style_keys = {}
 
         for book_part in self.book_parts:
             body = book_part.body()
@@ -1419,7 +1431,7 @@ class KFX_EPUB_Properties(object):
                         log.error("Unexpected class found: %s" % class_name)
                         self.missing_special_classes.add(selector)
 
-                if "style" in e.attrib:
+                if e in self.element_styles:
 
                     style = self.get_style(e)
                     style_modified = False
@@ -1503,8 +1515,13 @@ class KFX_EPUB_Properties(object):
                         style.pop("-kfx-layout-hints", None)
                         self.set_style(e, style)
 
-                if "style" in e.attrib:
-                    style_counts[e.get("style")] += 1
+                style = self.element_styles.get(e)
+                if style is not None:
+                    style_key = style_keys[e] = style.key()
+                    if style_key not in style_counts:
+                        style_styles[style_key] = style
+
+                    style_counts[style_key] += 1
 
         sorted_style_data = []
         known_class_name_count = collections.defaultdict(lambda: 0)
@@ -1512,8 +1529,8 @@ class KFX_EPUB_Properties(object):
         for class_name in AMAZON_SPECIAL_CLASSES:
             known_class_name_count[class_name] = 2
 
-        for style_str, count in sorted(style_counts.items(), key=lambda sc: -sc[1]):
-            style = self.Style(style_str)
+        for style_key, count in sorted(style_counts.items(), key=lambda sc: -sc[1]):
+            style = style_styles[style_key].copy()
 
             class_name = re.sub(r"[^A-Za-z0-9_-]", "_", style.pop("-kfx-style-name", ""))
 
@@ -1526,7 +1543,7 @@ class KFX_EPUB_Properties(object):
 
             class_name = self.prefix_unique_part_of_symbol(class_name, class_name_prefix)
             known_class_name_count[class_name] += 1
-            sorted_style_data.append((style_str, style, class_name))
+            sorted_style_data.append((style_key, style, class_name))
 
         classes = {}
         style_class_names = {}
@@ -1534,7 +1551,7 @@ class KFX_EPUB_Properties(object):
         referenced_classes = set()
         selector_classes = set()
 
-        for style_str, style, class_name in sorted_style_data:
+        for style_key, style, class_name in sorted_style_data:
             if known_class_name_count[class_name] > 1 or class_name in classes:
                 while True:
                     unique = used_class_name_count[class_name]
@@ -1554,14 +1571,14 @@ class KFX_EPUB_Properties(object):
                     selector_classes.add(class_name)
 
             classes[class_name] = style
-            style_class_names[style_str] = class_name
+            style_class_names[style_key] = class_name
 
         for book_part in self.book_parts:
             body = book_part.body()
             for e in body.iter("*"):
-                style_str = e.get("style", "")
-                if style_str in style_class_names:
-                    class_name = style_class_names[style_str]
+                style_key = style_keys.get(e)
+                if style_key in style_class_names:
+                    class_name = style_class_names[style_key]
                     class_style = classes[class_name]
 
                     if ((KEEP_STYLES_INLINE or book_part.is_fxl) and
@@ -1574,8 +1591,11 @@ class KFX_EPUB_Properties(object):
                         referenced_classes.add(class_name)
                         e.attrib.pop("style", None)
 
-                elif style_str:
-                    log.warning("Style has no class name: %s" % style_str)
+                elif e in self.element_styles:
+                    e.set("style", self.element_styles[e].tostring())
+                    log.warning("Style has no class name: %s" % e.get("style"))
+
+        self.element_styles = None
 
         for class_name, class_style in classes.items():
             if class_name in referenced_classes:
@@ -1672,14 +1692,24 @@ class KFX_EPUB_Properties(object):
                 if self.language:
                     book_part.html.set(XML_LANG, self.language)
 
-    def simplify_styles(self, elem, book_part, inherited_properties, default_ordered_list_value=None, known_width=True):
-        inherited_properties = inherited_properties.copy()
+    def simplify_styles(self, elem, book_part, inherited_properties, default_ordered_list_value=None, known_width=True,
+                        inherited_conversions=None):
+        # inherited_properties is the StyleLayer shared by elem and its siblings, so changes go in layers on top of it
+        parent_properties = inherited_properties
 
-        if split_value(inherited_properties.get("font-size", ""))[1] == "em":
-            inherited_properties["font-size"] = "1em"
+        if split_value(inherited_properties.get("font-size", ""))[1] == "em" and inherited_properties["font-size"] != "1em":
+            inherited_properties = StyleLayer(parent_properties, {"font-size": "1em"})
 
-        sty = inherited_properties.copy().update(self.get_style(elem), replace=True)
-        orig_sty = sty.copy()
+        inherited_filtered = inherited_conversions is not None
+        if not inherited_filtered:
+            inherited_conversions = {name for name, val in inherited_properties.properties().items()
+                                     if property_needs_conversion(name, val)}
+
+        sty = StyleLayer(inherited_properties).update(self.get_style(elem), replace=True)
+
+        original_names = ["font-size", "-kfx-user-margin-bottom-percentage", "-kfx-user-margin-left-percentage",
+                          "-kfx-user-margin-right-percentage", "-kfx-user-margin-top-percentage"]
+        orig_sty = {name: sty[name] for name in original_names if name in sty}
 
         sty.pop("-kfx-render", None)
 
@@ -1704,8 +1734,13 @@ class KFX_EPUB_Properties(object):
 
         page_align = sty["-amzn-page-align"] = (",".join(sides) if len(sides) < 4 else "all") if len(sides) > 0 else "none"
 
-        for name, val in list(sty.items()):
-            if name in {"padding", "padding-top", "padding-bottom", "padding-left", "padding-right"} and val.startswith("-"):
+        changed = [(name, val) for name, val in sty.changes.items()
+                   if val is not None and (val != inherited_properties.get(name) or name in inherited_conversions)]
+        changed.extend((name, sty[name]) for name in sorted(inherited_conversions)
+                       if name not in sty.changes and name in sty)
+
+        for name, val in changed:
+            if name in PADDING_PROPERTIES and val.startswith("-"):
                 log.warning("Discarding invalid %s: %s" % (name, val))
                 sty.pop(name)
 
@@ -1841,17 +1876,42 @@ class KFX_EPUB_Properties(object):
             sty["color"] = sty.pop("-kfx-link-color")
             sty.pop("-kfx-visited-color")
 
-        parent_sty = sty.copy()
-
-        for name in ["font-size", "-kfx-user-margin-bottom-percentage", "-kfx-user-margin-left-percentage",
-                     "-kfx-user-margin-right-percentage", "-kfx-user-margin-top-percentage"]:
-            parent_sty[name] = orig_sty[name]
+        # only properties changed by elem can differ between the properties inherited by elem and by its children
+        parent_changes = {}
+        parent_conversions = inherited_conversions
+        names = itertools.chain(original_names, sty.changes)
+        if not inherited_filtered:
+            names = itertools.chain(names, inherited_properties.properties())
+
+        for name in dict.fromkeys(names):
+            # properties filtered for a parent are all heritable, so other properties are neither inherited nor passed on
+            if inherited_filtered and name not in HERITABLE_PROPERTIES:
+                continue
+
+            val = orig_sty[name] if name in original_names else sty.get(name)
+            inherited_val = inherited_properties.get(name)
+
+            if val is not None and (val != inherited_val or not inherited_filtered):
+                if name not in HERITABLE_PROPERTIES:
+                    val = None
+                elif name not in ARBITRARY_VALUE_PROPERTIES and name != "line-height" and split_value(val)[1] == "%":
+                    val = None
+
+            if val != parent_properties.get(name):
+                parent_changes[name] = val
+
+            needs_conversion = val is not None and (
+                name in inherited_conversions if val == inherited_val else property_needs_conversion(name, val))
+            if needs_conversion is not (name in parent_conversions):
+                if parent_conversions is inherited_conversions:
+                    parent_conversions = set(inherited_conversions)
+
+                if needs_conversion:
+                    parent_conversions.add(name)
+                else:
+                    parent_conversions.discard(name)
 
-        for name, val in list(parent_sty.items()):
-            if name not in HERITABLE_PROPERTIES:
-                parent_sty.pop(name)
-            elif name not in ARBITRARY_VALUE_PROPERTIES and name != "line-height" and split_value(val)[1] == "%":
-                parent_sty.pop(name)
+        parent_sty = parent_properties.layer(parent_changes) if parent_changes else parent_properties
 
         kfx_layout_hints = sty.get("-kfx-layout-hints", "").split()
         self.last_kfx_heading_level = kfx_heading_level = sty.pop("-kfx-heading-level", self.last_kfx_heading_level)
@@ -1859,7 +1919,7 @@ class KFX_EPUB_Properties(object):
         contains_block_elem = contains_text = contains_image = False
         for child in elem.findall("*"):
             contains_block_elem_, contains_text_, contains_image_ = self.simplify_styles(
-                child, book_part, parent_sty, default_ordered_list_value, known_width)
+                child, book_part, parent_sty, default_ordered_list_value, known_width, parent_conversions)
             contains_block_elem = contains_block_elem or contains_block_elem_
             contains_text = contains_text or contains_text_
             contains_image = contains_image or contains_image_
@@ -1915,7 +1975,9 @@ class KFX_EPUB_Properties(object):
 
                     sty.update(new_heritable_sty, replace=True)
 
-        inherited_properties.update(self.non_heritable_default_properties)
+        # non-heritable properties are never inherited, so their defaults are a layer above the heritable ones
+        inherited_properties = StyleLayer(
+            StyleLayer(inherited_properties, self.non_heritable_default_properties.properties))
 
         if elem.tag == "div" and not (self.fixed_layout or self.illustrated_layout or self.has_conditional_content):
             if "heading" in kfx_layout_hints and not contains_block_elem:
@@ -1955,11 +2017,13 @@ class KFX_EPUB_Properties(object):
         remove_from.pop("-kfx-link-color", None)
         remove_from.pop("-kfx-visited-color", None)
 
-        for name, val in list(sty.items()):
-            if val == inherited_properties.get(name, ""):
-                sty.pop(name)
+        simplified_sty = {}
+        for name in dict.fromkeys(itertools.chain(sty.changes, inherited_properties.changes)):
+            val = sty.get(name)
+            if val is not None and val != inherited_properties.get(name, ""):
+                simplified_sty[name] = val
 
-        self.set_style(elem, sty)
+        self.set_style(elem, Style(simplified_sty))
 
         contains_block_elem = contains_block_elem or elem.tag in {
                 "aside", "caption", "div", "figure", "h1", "h2", "h3", "h4", "h5", "h6", "li", "p", "td",
@@ -2208,12 +2272,32 @@ class KFX_EPUB_Properties(object):
             elem.set("class", " ".join(classes))
 
     def get_style(self, elem, remove=False):
+        if self.element_styles is not None and elem in self.element_styles:
+            if remove:
+                elem.attrib.pop("style", None)
+                return self.element_styles.pop(elem)
+
+            return self.element_styles[elem].copy()
+
         return self.Style(elem.attrib.pop("style", "") if remove else elem.get("style", ""))
 
     def set_style(self, elem, new_style):
         if type(new_style) is not Style:
             raise Exception("set_style: type %s" % type_name(new_style))
 
+        if self.element_styles is not None:
+            if len(new_style):
+                if "style" not in elem.attrib:
+                    elem.set("style", "")
+
+                # same property order as parsing the rendered style, which conflict reporting in update() depends on
+                self.element_styles[elem] = new_style.rendered_order_copy()
+            else:
+                elem.attrib.pop("style", None)
+                self.element_styles.pop(elem, None)
+
+            return
+
         style_str = new_style.tostring()
         if style_str:
             elem.set("style", style_str)
@@ -2225,15 +2309,30 @@ class KFX_EPUB_Properties(object):
             raise Exception("add_style: type %s" % type_name(new_style))
 
         if new_style:
-            orig_style_str = elem.get("style", "")
+            orig_style = self.get_style(elem)
 
-            if orig_style_str:
-                new_style = self.Style(orig_style_str).update(new_style, replace)
+            if orig_style:
+                new_style = orig_style.update(new_style, replace)
             elif type(new_style) is not Style:
                 new_style = self.Style(new_style)
 
             self.set_style(elem, new_style)
 
+    def load_element_styles(self):
+        self.element_styles = {}
+
+        for book_part in self.book_parts:
+            for e in book_part.body().iter("*"):
+                style_str = e.get("style")
+                if style_str is not None:
+                    self.element_styles[e] = self.Style(style_str)
+
+    def store_element_styles(self):
+        for e, style in self.element_styles.items():
+            e.set("style", style.tostring())
+
+        self.element_styles = None
+
     def create_css_files(self):
         for css_file in sorted(list(self.css_files)):
             if css_file == self.RESET_CSS_FILEPATH:
@@ -2284,6 +2383,7 @@ class KFX_EPUB_Properties(object):
 class Style(object):
     def __init__(self, src, sstr=None):
         self.style_str = self.properties = None
+        self.shared = False
 
         if type(src) is etree.Element:
             src = src.get("style", "")
@@ -2304,25 +2404,24 @@ class Style(object):
         if style_str == "None":
             raise Exception("Unexpected 'None' encountered in style")
 
-        if style_str not in style_cache:
-            style_cache[style_str] = properties = {}
+        properties = {}
 
-            for property in re.split(r"((?:[^;\(]|\([^\)]*\))+)", style_str)[1::2]:
-                property = property.strip()
-                if property:
-                    name, sep, value = property.partition(":")
-                    name = name.strip()
-                    value = value.strip()
+        for property in re.split(r"((?:[^;\(]|\([^\)]*\))+)", style_str)[1::2]:
+            property = property.strip()
+            if property:
+                name, sep, value = property.partition(":")
+                name = name.strip()
+                value = value.strip()
 
-                    if sep != ":":
-                        log.error("Malformed property %s in style: %s" % (name, style_str))
-                    else:
-                        if name in properties and properties[name] != value:
-                            log.error("Conflicting property %s values in style: %s" % (name, style_str))
+                if sep != ":":
+                    log.error("Malformed property %s in style: %s" % (name, style_str))
+                else:
+                    if name in properties and properties[name] != value:
+                        log.error("Conflicting property %s values in style: %s" % (name, style_str))
 
-                        properties[name] = value
+                    properties[name] = value
 
-        return dict(style_cache[style_str])
+        return properties
 
     def tostring(self):
         if self.style_str is None:
@@ -2330,6 +2429,14 @@ class Style(object):
 
         return self.style_str
 
+    def key(self):
+        return frozenset(self.properties.items())
+
+    def unshare(self):
+        if self.shared:
+            self.properties = dict(self.properties)
+            self.shared = False
+
     def keys(self):
         return self.properties.keys()
 
@@ -2373,28 +2480,54 @@ class Style(object):
         return key in self.properties
 
     def __setitem__(self, key, value):
+        if self.shared:
+            self.unshare()
+
         self.properties[key] = value
         self.style_str = None
 
     def pop(self, key, default=None):
-        value = self.properties.pop(key, default)
+        if key not in self.properties:
+            return default
+
+        if self.shared:
+            self.unshare()
+
         self.style_str = None
-        return value
+        return self.properties.pop(key)
 
     def clear(self):
         self.properties = {}
+        self.shared = False
         self.style_str = None
         return self
 
     def copy(self):
-        return Style(self.properties, self.style_str)
+        style = Style.__new__(Style)
+        style.properties = self.properties
+        style.style_str = self.style_str
+        style.shared = self.shared = True
+        return style
+
+    def rendered_order_copy(self):
+        names = self.properties.keys()
+        if all(a < b for a, b in zip(names, itertools.islice(names, 1, None))):
+            return self.copy()
+
+        style = Style.__new__(Style)
+        style.properties = dict(sorted(self.properties.items()))
+        style.style_str = self.style_str
+        style.shared = False
+        return style
 
     def update(self, other, replace=None):
         if type(other) is Style:
             other = other.properties
 
+        self.unshare()
+
         for name, value in other.items():
-            if (name in CONFLICTING_PROPERTIES) and not CONFLICTING_PROPERTIES[name].isdisjoint(set(self.properties.keys())):
+            if (name in CONFLICTING_PROPERTIES) and not self.properties.keys().isdisjoint(CONFLICTING_PROPERTIES[name]):
                 log.error("Setting conflicting property: %s with %s" % (name, list_symbols(self.properties.keys())))
 
             if name in self.properties and self.properties[name] != value:
@@ -2436,6 +2569,7 @@ class Style(object):
 
         if keep and modify:
             self.properties = match_props
+            self.shared = False
             self.style_str = None
 
         if keep or keep_all:
@@ -2443,12 +2577,14 @@ class Style(object):
 
         if modify:
             self.properties = other_props
+            self.shared = False
             self.style_str = None
 
         return Style(match_props)
 
     def remove_default_properties(self, default_style):
         defaults = default_style.properties
+        self.unshare()
 
         for name, value in self.properties.items():
             if value == defaults.get(name, ""):
@@ -2458,6 +2594,127 @@ class Style(object):
         return self
 
 
+class StyleLayer(object):
+    # properties as changes to a parent layer or dict, with None for a property removed from the parent
+    __slots__ = ("parent", "changes", "depth", "flat")
+
+    def __init__(self, parent, changes=None):
+        self.parent = parent
+        self.changes = {} if changes is None else changes
+        self.depth = parent.depth + 1 if type(parent) is StyleLayer else 1
+        self.flat = None
+
+    def get(self, key, default=None):
+        layer = self
+        while type(layer) is StyleLayer:
+            if key in layer.changes:
+                val = layer.changes[key]
+                return default if val is None else val
+
+            layer = layer.parent
+
+        return layer.get(key, default)
+
+    def __getitem__(self, key):
+        val = self.get(key)
+        if val is None:
+            raise KeyError(key)
+
+        return val
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, value):
+        self.changes[key] = value
+
+    def pop(self, key, default=None):
+        val = self.get(key)
+        if val is None:
+            return default
+
+        self.changes[key] = None
+        return val
+
+    def update(self, other, replace=None):
+        if type(other) is Style:
+            other = other.properties
+
+        for name, value in other.items():
+            if (name in CONFLICTING_PROPERTIES) and any(conf in self for conf in CONFLICTING_PROPERTIES[name]):
+                log.error("Setting conflicting property: %s with %s" % (name, list_symbols(self.properties().keys())))
+
+            val = self.get(name)
+            if val is not None and val != value:
+                if replace is Exception:
+                    raise Exception("Setting conflicting property value: %s = %s >> %s" % (name, val, value))
+
+                if replace is None:
+                    log.error("Setting conflicting property value: %s = %s >> %s" % (name, val, value))
+                elif not replace:
+                    continue
+
+            self.changes[name] = value
+
+        return self
+
+    def properties(self):
+        layers = []
+        layer = self
+        while type(layer) is StyleLayer:
+            layers.append(layer.changes)
+            layer = layer.parent
+
+        properties = dict(layer)
+        for changes in reversed(layers):
+            for name, value in changes.items():
+                if value is None:
+                    properties.pop(name, None)
+                else:
+                    properties[name] = value
+
+        return properties
+
+    def layer(self, changes):
+        # collapse long chains so that lookups stay short, which is safe once a layer is no longer changed
+        if self.depth < STYLE_LAYER_DEPTH_LIMIT:
+            return StyleLayer(self, changes)
+
+        if self.flat is None:
+            self.flat = self.properties()
+
+        return StyleLayer(self.flat, changes)
+
+    def tostring(self):
+        return Style(self.properties()).tostring()
+
+    def __repr__(self):
+        return self.tostring()
+
+
+class StyleCache(object):
+    def __init__(self, max_size=STYLE_CACHE_SIZE):
+        self.max_size = max_size
+        self.styles = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, style_str):
+        style = self.styles.get(style_str)
+        if style is not None:
+            self.hits += 1
+            self.styles.move_to_end(style_str)
+        else:
+            self.misses += 1
+            style = self.styles[style_str] = Style(style_str)
+            if len(self.styles) > self.max_size:
+                self.styles.popitem(last=False)
+
+        return style.copy()
+
+    def __len__(self):
+        return len(self.styles)
+
+
 def zero_quantity(val):
 
     if re.match(r"^#[0-9a-f]+$", val) or re.match(r"^rgba\([0-9]+,[0-9]+,[0-9]+,[0-9.]+\)$", val) or val in COLOR_NAMES:
@@ -2470,6 +2727,12 @@ def zero_quantity(val):
     return val
 
 
+def property_needs_conversion(name, val):
+    return ((name in PADDING_PROPERTIES and val.startswith("-")) or
+            (name not in ARBITRARY_VALUE_PROPERTIES and split_value(val)[1] in {"lh", "rem", "vh", "vw"}))
+
+
+@functools.lru_cache(maxsize=1024)
 def split_value(val):
     num_match = re.match(r"^([+-]?[0-9]+\.?[0-9]*)", val)
     if not num_match:
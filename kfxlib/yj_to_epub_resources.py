@@ -2,10 +2,12 @@ import posixpath
 import re
 import urllib.parse
 
+from .ion import (ion_type, IonAnnotation, IonList, IonSExp, IonStruct)
 from .message_logging import log
+from .phase_timing import phase
 from .resources import (
-    EXTS_OF_MIMETYPE, combine_image_tiles, convert_jxr_to_jpeg_or_png, convert_pdf_to_jpeg, font_file_ext,
-    image_file_ext, RESOURCE_TYPE_OF_EXT, SYMBOL_FORMATS)
+    EXTS_OF_MIMETYPE, combine_image_tiles, convert_pdf_to_jpeg, font_file_ext,
+    image_file_ext, JXRConversions, PdfRasterizer, RESOURCE_TYPE_OF_EXT, SYMBOL_FORMATS)
 from .utilities import (root_filename, urlrelpath)
 
 
@@ -31,6 +33,92 @@ class KFX_EPUB_Resources(object):
         self.save_resources = True
         self.location_filenames = {}
         self.reported_pdf_errors = set()
+        self.jxr_conversions = JXRConversions(retain=False)
+        self.pdf_rasterizer = None
+
+    def prefetch_jxr_resources(self):
+        if not FIX_JPEG_XR:
+            return
+
+        raw_media = self.book_data.get("$417", {})
+        resources = self.book_data.get("$164", {})
+        jxr_resources = []
+        for resource_name in self.reading_order_resource_names():
+            resource = resources.get(resource_name)
+            if resource is None:
+                continue
+
+            location = resource.get("$165")
+            if resource.get("$161") == "$548" and location in raw_media:
+                # named as get_external_resource names the conversion
+                location_fn = resource.get("yj.conversion.source_resource_filename", location)
+                location_fn = resource.get("yj.authoring.source_file_name", location_fn)
+                if not location_fn.endswith(".jxr"):
+                    location_fn = location_fn.partition(".")[0] + ".jxr"
+
+                jxr_resources.append((location_fn, raw_media[location]))
+
+        self.jxr_conversions.prefetch(jxr_resources)
+
+    def reading_order_resource_names(self):
+        resources = self.book_data.get("$164", {})
+        storylines = self.book_data.get("$259", {})
+        sections = self.book_data.get("$260", {})
+        resource_names = []
+        used_names = set()
+        used_storylines = set()
+
+        def add_resource(resource_name):
+            if resource_name in used_names:
+                return
+
+            used_names.add(resource_name)
+            resource_names.append(resource_name)
+
+            # variants and thumbnails are converted along with the resource
+            resource = resources.get(resource_name)
+            if resource is not None:
+                for variant_name in resource.get("$635", []):
+                    add_resource(variant_name)
+
+                if "$214" in resource:
+                    add_resource(resource["$214"])
+
+        def walk(data):
+            data_type = ion_type(data)
+
+            if data_type is IonAnnotation:
+                walk(data.value)
+
+            elif data_type is IonList or data_type is IonSExp:
+                for fc in data:
+                    walk(fc)
+
+            elif data_type is IonStruct:
+                for fk, fv in data.items():
+                    if fk == "$175":
+                        add_resource(fv)
+                    elif fk == "$176" and fv in storylines:
+                        if fv not in used_storylines:
+                            used_storylines.add(fv)
+                            walk(storylines[fv])
+                    else:
+                        walk(fv)
+
+        for reading_order in self.reading_orders:
+            for section_name in reading_order.get("$170", []):
+                if section_name in sections:
+                    walk(sections[section_name])
+
+        if self.cover_resource:
+            add_resource(self.cover_resource)
+
+        return resource_names
+
+    def close_pdf_rasterizer(self):
+        if self.pdf_rasterizer is not None:
+            self.pdf_rasterizer.close()
+            self.pdf_rasterizer = None
 
     def get_external_resource(self, resource_name, ignore_variants=False):
         resource_obj = self.resource_cache.get(resource_name)
@@ -63,9 +151,10 @@ class KFX_EPUB_Resources(object):
                 for tile_location in row:
                     tiles_raw_media.append(self.locate_raw_media(tile_location))
 
-            raw_media, resource_format = combine_image_tiles(
-                resource_name, resource_height, resource_width, resource_format, tile_height, tile_width, tile_padding,
-                yj_tiles, tiles_raw_media, ignore_variants)
+            with phase("image_tiles", len(tiles_raw_media)):
+                raw_media, resource_format = combine_image_tiles(
+                    resource_name, resource_height, resource_width, resource_format, tile_height, tile_width, tile_padding,
+                    yj_tiles, tiles_raw_media, ignore_variants)
         else:
             location = resource.pop("$165")
             search_path = resource.pop("$166", location)
@@ -121,7 +210,8 @@ class KFX_EPUB_Resources(object):
             self.process_external_resource(resource.pop("$214"), save=False)
 
         if FIX_JPEG_XR and (resource_format == "$548") and (raw_media is not None):
-            raw_media, resource_format = convert_jxr_to_jpeg_or_png(raw_media, location_fn)
+            with phase("jxr_image", 1):
+                raw_media, resource_format = self.jxr_conversions.convert(raw_media, location_fn)
             extension = "." + SYMBOL_FORMATS[resource_format]
             location_fn = location_fn.rpartition(".")[0] + extension
 
@@ -146,7 +236,12 @@ class KFX_EPUB_Resources(object):
 
             if FIX_PDF:
                 try:
-                    jpeg_data = convert_pdf_to_jpeg(raw_media, page_num, reported_errors=self.reported_pdf_errors)
+                    if self.pdf_rasterizer is None:
+                        self.pdf_rasterizer = PdfRasterizer()
+
+                    with phase("pdf_page", 1):
+                        jpeg_data = convert_pdf_to_jpeg(
+                            raw_media, page_num, reported_errors=self.reported_pdf_errors, pdf_rasterizer=self.pdf_rasterizer)
                 except Exception as e:
                     log.error("Exception during conversion of PDF \"%s\" page %d to JPEG: %s" % (location_fn, page_num, repr(e)))
                 else:
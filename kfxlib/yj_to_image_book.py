@@ -1,13 +1,16 @@
 import collections
+import copy
 import datetime
 import io
 import re
 import zipfile
 
 from .message_logging import log
+from .phase_timing import phase
 from .resources import (
-    combine_image_tiles, convert_image_to_pdf, convert_jxr_to_jpeg_or_png, convert_pdf_to_jpeg,
-    crop_image, ImageResource, PdfImageResource, pypdf, SYMBOL_FORMATS)
+    add_image_pdf_page, combine_image_tiles, convert_pdf_pages_to_jpeg,
+    crop_image, ImageResource, JXR_CONVERSION_PROCESS_MEMORY, JXR_CONVERSIONS_AHEAD_PER_PROCESS,
+    JXRConversions, PdfImageResource, PdfRasterizer, pypdf, SYMBOL_FORMATS)
 from .utilities import (json_serialize_compact, list_counts)
 from .yj_to_epub import KFX_EPUB
 
@@ -16,17 +19,31 @@ __copyright__ = "2016-2025, John Howell <jhowell@acm.org>"
 
 USE_HIGHEST_RESOLUTION_IMAGE_VARIANT = True
 DEBUG_VARIANTS = False
+COMPRESSED_IMAGE_FORMATS = {"$284", "$285", "$286"}
 
 
 class KFX_IMAGE_BOOK(object):
-    def __init__(self, book):
+    def __init__(self, book, jxr_conversions=None):
         self.book = book
+        self.jxr_conversions = jxr_conversions
+        self.kfx_epub_ = None
+        self.ordered_images_ = {}
 
-    def convert_book_to_cbz(self, split_landscape_comic_images, progress):
-        kfx_epub = KFX_EPUB(self.book, metadata_only=True)
+    def get_metadata_epub(self):
+        if self.kfx_epub_ is None:
+            self.kfx_epub_ = KFX_EPUB(self.book, metadata_only=True)
+
+        return self.kfx_epub_
+
+    def convert_book_to_cbz(self, split_landscape_comic_images, progress, output_file=None, max_memory=None):
+        kfx_epub = self.get_metadata_epub()
         is_rtl = kfx_epub.page_progression_direction == "rtl"
         ordered_images = self.get_ordered_images(split_landscape_comic_images, kfx_epub.is_comic, is_rtl, progress)[0]
 
+        jxr_conversions = self.jxr_conversions
+        if jxr_conversions is None and max_memory is not None:
+            jxr_conversions = JXRConversions(jxr_processes_within(ordered_images, max_memory), retain=False)
+
         yj_metadata = self.book.get_yj_metadata_from_book()
         comic_book_info = {}
 
@@ -52,10 +69,11 @@ class KFX_IMAGE_BOOK(object):
                 comic_book_info["publicationYear"] = pubdate.year
 
         cbz_metadata = {"ComicBookInfo/1.0": comic_book_info} if comic_book_info else None
-        return combine_images_into_cbz(ordered_images, cbz_metadata)
+        with phase("cbz", len(ordered_images)):
+            return combine_images_into_cbz(ordered_images, cbz_metadata, jxr_conversions, output_file)
 
-    def convert_book_to_pdf(self, split_landscape_comic_images, progress):
-        kfx_epub = KFX_EPUB(self.book, metadata_only=True)
+    def convert_book_to_pdf(self, split_landscape_comic_images, progress, output_file=None):
+        kfx_epub = self.get_metadata_epub()
         is_rtl = kfx_epub.page_progression_direction == "rtl"
         ordered_images, ordered_image_pids, content_pos_info = self.get_ordered_images(
             split_landscape_comic_images, kfx_epub.is_comic, is_rtl, progress)
@@ -96,9 +114,20 @@ class KFX_IMAGE_BOOK(object):
                 add_pages_nums_to_toc(toc_entry.children)
 
         add_pages_nums_to_toc(kfx_epub.ncx_toc)
-        return combine_images_into_pdf(ordered_images, pdf_metadata, is_rtl, kfx_epub.ncx_toc)
+        with phase("pdf", len(ordered_images)):
+            return combine_images_into_pdf(
+                ordered_images, pdf_metadata, is_rtl, kfx_epub.ncx_toc, self.jxr_conversions, output_file)
 
     def get_ordered_images(self, split_landscape_comic_images=False, is_comic=False, is_rtl=False, progress=None):
+        key = (split_landscape_comic_images, is_comic, is_rtl)
+        if key not in self.ordered_images_:
+            with phase("ordered_images") as span:
+                self.ordered_images_[key] = self.collect_ordered_images(split_landscape_comic_images, is_comic, is_rtl, progress)
+                span.add_items(len(self.ordered_images_[key][0]))
+
+        return self.ordered_images_[key]
+
+    def collect_ordered_images(self, split_landscape_comic_images, is_comic, is_rtl, progress):
 
         ordered_image_resources, ordered_image_resource_pids, content_pos_info = self.book.get_ordered_image_resources()
 
@@ -212,10 +241,12 @@ class KFX_IMAGE_BOOK(object):
         return ImageResource(resource_format, location, raw_media, resource_height, resource_width)
 
 
-def combine_images_into_pdf(ordered_images, metadata=None, is_rtl=False, outline=None):
+def combine_images_into_pdf(ordered_images, metadata=None, is_rtl=False, outline=None, jxr_conversions=None, output_file=None):
     if len(ordered_images) == 0:
         return None
 
+    jxr_conversions = prefetch_jxr_images(ordered_images, jxr_conversions)
+
     image_resource_formats = collections.defaultdict(set)
     combined_pdf_images = []
     for image_resource in ordered_images:
@@ -226,16 +257,19 @@ def combine_images_into_pdf(ordered_images, metadata=None, is_rtl=False, outline
                 combined_pdf_images[-1].page_nums.extend(image_resource.page_nums)
             else:
                 pdf = pypdf.PdfReader(io.BytesIO(image_resource.raw_media))
+                image_resource = copy.copy(image_resource)
+                image_resource.page_nums = list(image_resource.page_nums)
                 image_resource.total_pages = len(pdf.pages)
                 combined_pdf_images.append(image_resource)
         else:
-            combined_pdf_images.append(convert_image_to_pdf(image_resource))
+            combined_pdf_images.append(image_resource)
 
-    if len(combined_pdf_images) == 1 and combined_pdf_images[0].entire_resource_used():
+    if (len(combined_pdf_images) == 1 and combined_pdf_images[0].format == "$565" and
+            combined_pdf_images[0].entire_resource_used()):
         combined = False
         pdf_data = combined_pdf_images[0].raw_media
 
-        if not (metadata or is_rtl or outline):
+        if not (metadata or is_rtl or outline or output_file is not None):
             return pdf_data
 
         try:
@@ -249,7 +283,9 @@ def combine_images_into_pdf(ordered_images, metadata=None, is_rtl=False, outline
 
         for image_resource in combined_pdf_images:
             try:
-                if image_resource.entire_resource_used():
+                if image_resource.format != "$565":
+                    add_image_pdf_page(writer, image_resource, jxr_conversions)
+                elif image_resource.entire_resource_used():
                     writer.append(fileobj=io.BytesIO(image_resource.raw_media))
                 else:
                     log.warning("Using PDF %s pages %s of %d" % (
@@ -277,10 +313,13 @@ def combine_images_into_pdf(ordered_images, metadata=None, is_rtl=False, outline
             else:
                 log.warning("Existing PDF outline left unchanged")
 
-        updated_file = io.BytesIO()
-        writer.write(updated_file)
-        pdf_data = updated_file.getvalue()
-        updated_file.close()
+        if output_file is not None:
+            writer.write(output_file)
+        else:
+            updated_file = io.BytesIO()
+            writer.write(updated_file)
+            pdf_data = updated_file.getvalue()
+            updated_file.close()
     except Exception as e:
         log.error("pypdf error: %s" % repr(e))
         return None
@@ -288,6 +327,9 @@ def combine_images_into_pdf(ordered_images, metadata=None, is_rtl=False, outline
     if combined:
         log.info("Combined %s resources into a %d page PDF file" % (list_counts(image_resource_formats), len(ordered_images)))
 
+    if output_file is not None:
+        return output_file
+
     return pdf_data
 
 
@@ -299,32 +341,24 @@ def add_pdf_outline(pdf_writer, outline_entries, parent=None):
             add_pdf_outline(pdf_writer, outline_entry.children, new_entry)
 
 
-def combine_images_into_cbz(ordered_images, metadata=None):
+def combine_images_into_cbz(ordered_images, metadata=None, jxr_conversions=None, output_file=None):
     if len(ordered_images) == 0:
         return None
 
+    if jxr_conversions is None:
+        jxr_conversions = JXRConversions(retain=False)
+
     image_resource_formats = collections.defaultdict(set)
-    page_images = []
     for image_resource in ordered_images:
         image_resource_formats[SYMBOL_FORMATS[image_resource.format].upper()].add(image_resource.location)
 
-        if image_resource.format in {"$286", "$285", "$284"}:
-            page_images.append(image_resource)
-        elif image_resource.format == "$565":
-            for page_num in image_resource.page_nums:
-                image_data = convert_pdf_to_jpeg(image_resource.raw_media, page_num)
-                page_images.append(ImageResource("$285", None, image_data))
-        elif image_resource.format == "$548":
-            image_data, fmt = convert_jxr_to_jpeg_or_png(image_resource.raw_media, image_resource.location)
-            page_images.append(ImageResource(fmt, None, image_data))
-        else:
-            raise Exception("Unexpected image format: %s" % image_resource.format)
-
-    cbz_file = io.BytesIO()
+    cbz_file = io.BytesIO() if output_file is None else output_file
 
-    with zipfile.ZipFile(cbz_file, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for i, image_resource in enumerate(page_images):
-            zf.writestr("%04d.%s" % (i + 1, SYMBOL_FORMATS[image_resource.format]), image_resource.raw_media)
+    with PdfRasterizer() as pdf_rasterizer, zipfile.ZipFile(cbz_file, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for i, (fmt, image_data) in enumerate(cbz_page_images(ordered_images, jxr_conversions, pdf_rasterizer)):
+            zf.writestr(
+                "%04d.%s" % (i + 1, SYMBOL_FORMATS[fmt]), image_data,
+                compress_type=zipfile.ZIP_STORED if fmt in COMPRESSED_IMAGE_FORMATS else zipfile.ZIP_DEFLATED)
 
         if metadata:
             comment = json_serialize_compact(metadata).encode("utf-8")
@@ -333,15 +367,62 @@ def combine_images_into_cbz(ordered_images, metadata=None):
             else:
                 log.warning("Discarding CBZ metadata -- too long for ZIP comment")
 
-    cbz_data = cbz_file.getvalue()
-    cbz_file.close()
-
     log.info("Combined %s resources into a %d page CBZ file" % (
         list_counts(image_resource_formats), len(ordered_images)))
 
+    if output_file is not None:
+        return output_file
+
+    cbz_data = cbz_file.getvalue()
+    cbz_file.close()
     return cbz_data
 
 
+def cbz_page_images(ordered_images, jxr_conversions, pdf_rasterizer):
+    jxr_pages = jxr_conversions.iter_convert([
+        (image_resource.location, image_resource.raw_media) for image_resource in ordered_images
+        if image_resource.format == "$548"])
+
+    for image_resource in ordered_images:
+        if image_resource.format in COMPRESSED_IMAGE_FORMATS:
+            yield (image_resource.format, image_resource.raw_media)
+        elif image_resource.format == "$565":
+            for image_data in convert_pdf_pages_to_jpeg(
+                    image_resource.raw_media, image_resource.page_nums, pdf_rasterizer=pdf_rasterizer):
+                yield ("$285", image_data)
+        elif image_resource.format == "$548":
+            image_data, fmt = next(jxr_pages)
+            yield (fmt, image_data)
+        else:
+            raise Exception("Unexpected image format: %s" % image_resource.format)
+
+
+def jxr_processes_within(ordered_images, max_memory):
+    page_memory = max([(image_resource.width or 0) * (image_resource.height or 0) * 4 + len(image_resource.raw_media)
+                       for image_resource in ordered_images if image_resource.format == "$548"] or [0])
+    processes = JXRConversions().processes
+
+    if page_memory:
+        max_processes = max(1, int(max_memory // (
+            JXR_CONVERSION_PROCESS_MEMORY + page_memory * JXR_CONVERSIONS_AHEAD_PER_PROCESS)))
+        if max_processes < processes:
+            log.info("Converting JPEG-XR resources using %d of %d processes to stay within %d MB" % (
+                max_processes, processes, max_memory // (1024 * 1024)))
+            processes = max_processes
+
+    return processes
+
+
+def prefetch_jxr_images(ordered_images, jxr_conversions=None):
+    if jxr_conversions is None:
+        jxr_conversions = JXRConversions()
+
+    jxr_conversions.prefetch([
+        (image_resource.location, image_resource.raw_media) for image_resource in ordered_images
+        if image_resource.format == "$548"])
+    return jxr_conversions
+
+
 def suffix_location(location, suffix):
     if "." in location:
         return re.sub("\\.", suffix + ".", location, count=1)
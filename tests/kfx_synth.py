@@ -0,0 +1,71 @@
+"""
+Builders for the synthetic KFX books used by the tests and benchmarks.
+
+A book is a local symbol table plus a list of fragments that starts with the container's symbol table
+and $270 container info fragments. The tests and benchmarks add their own content fragments, serialize
+it with KfxContainer and, where a conversion needs them, add the maps of a real book with complete_book.
+"""
+
+from kfxlib.ion import IonStruct, IS
+from kfxlib.ion_symbol_table import LocalSymbolTable
+from kfxlib.yj_book import YJ_Book
+from kfxlib.yj_container import YJFragment, YJFragmentList
+from kfxlib.yj_symbol_catalog import YJ_SYMBOLS
+
+
+def struct(*items):
+    value = IonStruct()
+    for key, val in zip(items[::2], items[1::2]):
+        value[IS(key)] = val
+    return value
+
+
+def new_container(local_names, container_id="CR!TEST", kfx_main=True):
+    """Return the symbol table holding local_names and the fragment list of a container started with its preamble"""
+    symtab = LocalSymbolTable(YJ_SYMBOLS.name)
+    for name in local_names:
+        symtab.create_local_symbol(name)
+
+    container_info = ["$409", container_id, "$412", 4096, "$587", "1.0", "$588", "2.0"]
+    if kfx_main:
+        container_info.extend(["$161", "KFX main", "version", 2])
+
+    fragments = YJFragmentList()
+    fragments.append(YJFragment(ftype="$ion_symbol_table", value=struct(
+        "imports", [struct("name", YJ_SYMBOLS.name, "version", YJ_SYMBOLS.version, "max_id", len(YJ_SYMBOLS.symbols))],
+        "symbols", list(local_names))))
+    fragments.append(YJFragment(ftype="$270", value=struct(*container_info)))
+    return symtab, fragments
+
+
+def metadata_fragment(title_metadata, fixed_layout=False):
+    """Return the $490 book metadata fragment with title_metadata entries, marked fixed layout if asked"""
+    categories = [struct("$495", "kindle_title_metadata", "$258", title_metadata)]
+    if fixed_layout:
+        categories.append(struct("$495", "kindle_capability_metadata", "$258", [struct("$492", "yj_fixed_layout", "$307", 1)]))
+
+    return YJFragment(ftype="$490", value=struct("$491", categories))
+
+
+def reading_order_fragment(section_names):
+    """Return the $538 document data fragment with one reading order of section_names"""
+    return YJFragment(ftype="$538", value=struct("$169", [struct("$178", IS("$351"), "$170", [IS(name) for name in section_names])]))
+
+
+def complete_book(filepath, container_id="CR!TEST"):
+    """Add the position, location, navigation and entity map fragments of a real book, so conversions log no errors"""
+    book = YJ_Book(filepath)
+    book.decode_book()
+    pos_info = book.collect_content_position_info()
+    book.create_position_map(pos_info)
+    book.create_location_map(book.generate_approximate_locations(pos_info))
+    book.fragments.append(YJFragment(ftype="$389", value=[]))
+    # text content is only converted from books that declare the text block content feature
+    book.fragments.append(YJFragment(ftype="$593", value=[struct("$492", "kfxgen.textBlock", "version", 1)]
+                                     if book.fragments.get_all("$145") else []))
+    book.fragments.get("$538", first=True).value[IS("max_id")] = len(YJ_SYMBOLS.symbols) + len(
+        book.symtab.get_local_symbols())
+    book.rebuild_container_entity_map(container_id)
+
+    with open(filepath, "wb") as f:
+        f.write(book.convert_to_single_kfx())
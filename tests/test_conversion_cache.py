@@ -0,0 +1,176 @@
+import glob
+import hashlib
+import logging
+import os
+import pickle
+
+import pytest
+
+from kfxlib import resources
+from kfxlib.conversion_cache import ConversionCache, cached_conversion, set_conversion_cache
+from kfxlib.ion import IS
+from kfxlib.message_logging import JobLog, log, set_logger
+from kfxlib.resources import JXRConversions, convert_jxr_to_jpeg_or_png, convert_pdf_to_jpeg
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "jxr")
+
+calls = []
+
+
+@cached_conversion("test", ignore_kwargs={"reported"})
+def double(data, name, reported=None):
+    calls.append(name)
+    log.warning("doubled %s" % name)
+    return data * 2
+
+
+@pytest.fixture
+def cache(tmp_path):
+    calls.clear()
+    yield set_conversion_cache(str(tmp_path))
+    set_conversion_cache()
+
+
+def test_cached_result_replays_messages(cache):
+    """Test a cached result is returned without converting again and its messages are logged again"""
+    job_log = set_logger(JobLog(logging.getLogger(__name__)))
+    try:
+        first = double(b"ab", "x", reported=set())
+        second = double(b"ab", "x", reported={"other"})
+    finally:
+        set_logger()
+
+    assert first == second == b"abab"
+    assert calls == ["x"]
+    assert job_log.warnings == ["doubled x", "doubled x"]
+    assert (cache.hits, cache.misses, cache.stores) == (1, 1, 1)
+    assert cache.hit_rate() == 0.5
+
+
+def test_failed_conversion_is_not_cached(cache):
+    """Test a result logged with an error is converted again instead of replaying the error"""
+    job_log = set_logger(JobLog(logging.getLogger(__name__)))
+    try:
+        first = convert_jxr_to_jpeg_or_png(b"not a JPEG-XR image", "bad.jxr")
+        second = convert_jxr_to_jpeg_or_png(b"not a JPEG-XR image", "bad.jxr")
+    finally:
+        set_logger()
+
+    assert first == second == (b"not a JPEG-XR image", "$548")
+    assert len(job_log.errors) == 2
+    assert (cache.hits, cache.stores) == (0, 0)
+
+
+def test_cached_pdf_page_warnings_reported_once(cache, monkeypatch):
+    """Test a rendering warning replayed from the cache counts towards the warnings already reported"""
+    monkeypatch.setattr(resources.PdfRasterizer, "convert", lambda self, pdf_data, page_num, dpi=150: (
+        b"page %d" % page_num, ["bad xref"]))
+
+    job_log = set_logger(JobLog(logging.getLogger(__name__)))
+    try:
+        convert_pdf_to_jpeg(b"pdf", 1)
+        reported_errors = set()
+        assert convert_pdf_to_jpeg(b"pdf", 1, reported_errors=reported_errors) == b"page 1"
+        assert convert_pdf_to_jpeg(b"pdf", 2, reported_errors=reported_errors) == b"page 2"
+    finally:
+        set_logger()
+
+    assert job_log.warnings == ["PDF page 1 rendering: bad xref"] * 2
+    assert cache.hits == 1
+
+
+def test_pdf_hashed_once_per_rasterizer(cache, monkeypatch):
+    """Test the pages of one PDF are cached by a digest of the PDF made once rather than for every page"""
+    monkeypatch.setattr(resources.PdfRasterizer, "convert", lambda self, pdf_data, page_num, dpi=150: (
+        b"page %d" % page_num, []))
+    hashed = []
+    monkeypatch.setattr(resources, "hashlib", type("hashlib", (), {
+        "sha256": staticmethod(lambda data: hashed.append(data) or hashlib.sha256(data))}))
+
+    pdf_data = b"pdf" * 1000
+    with resources.PdfRasterizer() as pdf_rasterizer:
+        for page_num in [1, 2, 3, 1, 2, 3]:
+            assert convert_pdf_to_jpeg(pdf_data, page_num, pdf_rasterizer=pdf_rasterizer) == b"page %d" % page_num
+
+    assert hashed == [pdf_data]
+    assert (cache.hits, cache.stores) == (3, 3)
+
+
+def test_key_covers_data_and_parameters(cache):
+    """Test different input data or parameters are converted separately"""
+    double(b"ab", "x")
+    double(b"ac", "x")
+    double(b"ab", "y")
+    double(bytearray(b"ab"), "x")
+
+    assert calls == ["x", "x", "y"]
+
+
+def test_cache_is_shared_across_instances(tmp_path):
+    """Test entries written by one cache are found by another on the same directory"""
+    ConversionCache(str(tmp_path)).put("ab" * 32, b"result", [("info", "message")])
+
+    assert ConversionCache(str(tmp_path)).get("ab" * 32) == (b"result", [("info", "message")])
+
+
+def test_entries_are_data_only(tmp_path):
+    """Test entries hold results as plain data and a pickled entry is discarded without being loaded"""
+    cache = ConversionCache(str(tmp_path))
+    result = ([b"\x00\n" * 3, b""], (b"image", IS("$285"), "png", 2, None))
+    cache.put("ef" * 32, result, [("warning", "message")])
+
+    entry = cache.get("ef" * 32)
+    assert entry == (result, [("warning", "message")])
+    assert type(entry[0][1][1]) is type(IS("$285"))
+
+    with open(cache.filename("ef" * 32), "wb") as f:
+        f.write(pickle.dumps((b"result", [])))
+
+    assert cache.get("ef" * 32) is None
+    assert not os.path.exists(cache.filename("ef" * 32))
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    """Test the cache is kept under its size limit by removing entries not used for longest"""
+    cache = ConversionCache(str(tmp_path), max_size=3000)
+    keys = ["%064x" % i for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, bytes(1000), [])
+        os.utime(cache.filename(key), (i, i))
+
+    cache.get(keys[0])
+    cache.put(keys[2], bytes(1000), [])
+
+    assert cache.evictions == 1
+    assert [os.path.exists(cache.filename(key)) for key in keys] == [True, False, True]
+
+
+def test_unreadable_entry_is_discarded(tmp_path):
+    """Test a damaged entry counts as a miss and is removed"""
+    cache = ConversionCache(str(tmp_path))
+    cache.put("cd" * 32, b"result", [])
+    with open(cache.filename("cd" * 32), "wb") as f:
+        f.write(b"damaged")
+
+    assert cache.get("cd" * 32) is None
+    assert not os.path.exists(cache.filename("cd" * 32))
+    assert cache.misses == 1
+
+
+def test_prefetch_uses_cached_jxr_conversions(cache):
+    """Test JPEG-XR images converted by worker processes are cached for later conversions"""
+    fixtures = []
+    for filepath in sorted(glob.glob(os.path.join(FIXTURE_DIR, "rgb*.jxr")))[:3]:
+        with open(filepath, "rb") as f:
+            fixtures.append((os.path.basename(filepath), f.read()))
+
+    JXRConversions(processes=2).prefetch(fixtures)
+    assert (cache.hits, cache.stores) == (0, 3)
+
+    jxr_conversions = JXRConversions(processes=2)
+    jxr_conversions.prefetch(fixtures)
+
+    assert cache.hits == 3
+    for name, data in fixtures:
+        assert jxr_conversions.convert(data, name) == convert_jxr_to_jpeg_or_png.uncached(data, name)
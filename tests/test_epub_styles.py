@@ -0,0 +1,183 @@
+import hashlib
+import random
+
+import pytest
+from lxml import etree
+
+from kfxlib.epub_output import BookPart
+from kfxlib.yj_to_epub import KFX_EPUB
+from kfxlib.yj_to_epub_properties import STYLE_LAYER_DEPTH_LIMIT, Style, StyleCache, StyleLayer
+
+
+PARAGRAPH_STYLES = [
+    "-kfx-style-name: p; text-indent: 1.5em; margin-top: 0; text-align: justify; line-height: 1.2lh",
+    "-kfx-style-name: first; text-indent: 0; margin-top: 1em; font-size: 1em",
+    "-kfx-style-name: heading; -kfx-layout-hints: heading; -kfx-heading-level: 2; font-size: 1.5em; font-weight: bold",
+    "-kfx-style-name: rtl; direction: rtl; unicode-bidi: embed; -kfx-attrib-xml-lang: he",
+]
+
+SPAN_STYLES = [
+    "-kfx-style-name: italic; font-style: italic",
+    "-kfx-style-name: small; font-size: 0.8em; margin-left: 1em; margin-right: 1em; margin-top: 1em; margin-bottom: 1em",
+    "-kfx-style-name: link; -kfx-link-color: #0000ff; -kfx-visited-color: #0000ff",
+    "-kfx-style-name: firstline; -kfx-firstline-font-weight: bold",
+]
+
+# sha256 of the XHTML and CSS produced from the synthetic book by the original string based styles,
+# with reflowable parts only and with one fixed layout part, which keeps its styles inline
+EXPECTED_STYLED_BOOKS = {
+    False: "7896f543f10860d96e9091796326300e93999a01baa4bb33cecec0cc7cf10442",
+    True: "d3a95d4e919be3c72280a98941a5ac8ca9e425d8d8de24f25baca4055cdc34a3",
+}
+
+
+def styled_book():
+    rng = random.Random(0)
+    epub = KFX_EPUB.__new__(KFX_EPUB)
+    for base in KFX_EPUB.__bases__:
+        base.__init__(epub)
+
+    epub.book_has_illustrated_layout_conditional_page_template = False
+    epub.default_font_family = "serif"
+    epub.default_font_size = "1em"
+    epub.default_line_height = "normal"
+    epub.language = "en"
+    epub.writing_mode = "horizontal-tb"
+    epub.css_files.add(epub.STYLES_CSS_FILEPATH)
+
+    for chapter in range(3):
+        html = etree.Element("html")
+        section = etree.SubElement(etree.SubElement(html, "body"), "div", style="margin-left: 5%")
+        for i in range(30):
+            para = etree.SubElement(section, "div", style=rng.choice(PARAGRAPH_STYLES))
+            for _ in range(rng.randint(1, 3)):
+                span = etree.SubElement(para, rng.choice(["span", "span", "a"]), style=rng.choice(SPAN_STYLES))
+                span.text = rng.choice(["lorem", "ipsum", "dolor"])
+
+        epub.book_parts.append(BookPart("/part%d.xhtml" % chapter, chapter, html))
+
+    return epub
+
+
+def test_style_copy_is_copy_on_write():
+    """Test copies share properties until one of them is changed"""
+    style = Style({"font-size": "1em", "color": "red"})
+    copy = style.copy()
+    assert copy.properties is style.properties
+
+    copy["color"] = "blue"
+    copy.pop("font-size")
+    style.update({"margin-top": "0"})
+
+    assert style.tostring() == "color: red; font-size: 1em; margin-top: 0"
+    assert copy.tostring() == "color: blue"
+    assert copy.pop("missing", "default") == "default"
+
+
+def test_rendered_order_copy():
+    """Test styles already in rendered property order are shared and others are reordered"""
+    ordered = Style({"color": "red", "font-size": "1em"})
+    assert ordered.rendered_order_copy().properties is ordered.properties
+
+    unordered = Style({"font-size": "1em", "color": "red"})
+    copy = unordered.rendered_order_copy()
+    assert list(copy.keys()) == ["color", "font-size"] and copy.properties is not unordered.properties
+    copy["color"] = "blue"
+    assert unordered["color"] == "red"
+
+
+def test_style_layer_keeps_changes_out_of_parent():
+    """Test style layers look properties up through their parents without changing them"""
+    parent = StyleLayer({"font-size": "1em", "color": "red"})
+    layer = StyleLayer(parent).update({"color": "blue", "margin-top": "0"}, replace=True)
+    layer.pop("font-size")
+
+    assert layer.properties() == {"color": "blue", "margin-top": "0"} and "font-size" not in layer
+    assert parent.properties() == {"font-size": "1em", "color": "red"}
+    assert layer.pop("font-size", "default") == "default"
+    with pytest.raises(KeyError):
+        layer["font-size"]
+
+    assert StyleLayer(layer).update({"color": "green"}, replace=False)["color"] == "blue"
+    with pytest.raises(Exception, match="conflicting property value"):
+        StyleLayer(layer).update({"color": "green"}, replace=Exception)
+
+
+def test_style_layer_chains_are_collapsed():
+    """Test long chains of style layers are looked up through one shared copy of their properties"""
+    layer = StyleLayer({"color": "red"})
+    for i in range(STYLE_LAYER_DEPTH_LIMIT * 3):
+        layer = layer.layer({"margin-top": "%dem" % i})
+        assert layer.depth <= STYLE_LAYER_DEPTH_LIMIT
+
+    assert layer.get("color") == "red" and layer["margin-top"] == "%dem" % (STYLE_LAYER_DEPTH_LIMIT * 3 - 1)
+
+    while layer.depth < STYLE_LAYER_DEPTH_LIMIT:
+        layer = layer.layer({})
+
+    first, second = layer.layer({"color": "blue"}), layer.layer({})
+    assert first.depth == second.depth == 1 and first.parent is second.parent
+    assert (first["color"], second["color"]) == ("blue", "red")
+
+
+def test_style_cache_is_bounded():
+    """Test the parse cache evicts the least recently used style and counts hits and misses"""
+    cache = StyleCache(max_size=2)
+
+    first = cache.get("color: red; font-size: 1em")
+    first["color"] = "blue"
+    assert cache.get("color: red; font-size: 1em").tostring() == "color: red; font-size: 1em"
+
+    cache.get("color: green")
+    cache.get("color: red; font-size: 1em")
+    cache.get("color: black")
+
+    assert list(cache.styles) == ["color: red; font-size: 1em", "color: black"]
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_style_cache_is_per_conversion():
+    """Test each conversion parses styles into its own cache"""
+    first, second = styled_book(), styled_book()
+    first.Style("color: red")
+
+    assert len(first.style_cache) == 1
+    assert len(second.style_cache) == 0
+
+
+def test_element_styles_round_trip():
+    """Test styles held in the element table are written back to the style attributes"""
+    epub = styled_book()
+    body = epub.book_parts[0].body()
+    para = body[0][0]
+    style_str = para.get("style")
+
+    epub.load_element_styles()
+    assert epub.get_style(para) == Style(style_str)
+
+    epub.add_style(para, {"color": "red"})
+    epub.set_style(body[0], Style({}))
+    epub.store_element_styles()
+
+    assert para.get("style") == Style(style_str).update({"color": "red"}).tostring()
+    assert "style" not in body[0].attrib
+
+
+@pytest.mark.parametrize("fixed_layout_part", [False, True])
+def test_styled_book_matches_string_styles(fixed_layout_part):
+    """Test the style passes produce the same XHTML and CSS as the original string based styles"""
+    epub = styled_book()
+    if fixed_layout_part:
+        epub.book_parts[1].opf_properties.add("rendition:layout-pre-paginated")
+
+    epub.update_default_font_and_language()
+    epub.set_html_defaults()
+    epub.fixup_styles_and_classes()
+    epub.create_css_files()
+
+    digest = hashlib.sha256()
+    for book_part in epub.book_parts:
+        digest.update(etree.tostring(book_part.html))
+    digest.update(epub.oebps_files[epub.STYLES_CSS_FILEPATH].binary_data)
+    assert digest.hexdigest() == EXPECTED_STYLED_BOOKS[fixed_layout_part]
+    assert epub.element_styles is None
@@ -0,0 +1,346 @@
+import io
+import json
+import logging
+import os
+import random
+import zipfile
+
+import pytest
+from PIL import Image
+
+from kfxlib.ion import IonBLOB, IS
+from kfxlib.kfx_container import KfxContainer
+from kfxlib import resources
+from kfxlib.resources import convert_jxr_to_jpeg_or_png, ImageResource, JXR_CONVERSION_PROCESS_MEMORY, pypdf
+from kfxlib.yj_book import YJ_Book
+from kfxlib.yj_container import YJFragment
+from kfxlib.yj_to_image_book import jxr_processes_within
+
+from efm import kfxconvert
+from tests.kfx_synth import complete_book, metadata_fragment, new_container, reading_order_fragment, struct
+
+
+JXR_FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "jxr", "rgb_lossy.jxr")
+
+
+def jpeg_page(page):
+    image_file = io.BytesIO()
+    Image.new("RGB", (60, 80), (page * 40 % 256, 100, 150)).save(image_file, "JPEG")
+    return image_file.getvalue()
+
+
+def jpeg_pages(pages):
+    return [("$285", jpeg_page(page)) for page in range(pages)]
+
+
+def write_comic(filepath, images, fixed_layout=True):
+    pages = len(images)
+    local_names = []
+    for page in range(pages):
+        local_names.extend(["section_%d" % page, "story_%d" % page, "image_%d" % page, "raw_%d" % page, "content_%d" % page])
+
+    symtab, fragments = new_container(local_names)
+    fragments.append(metadata_fragment([
+        struct("$492", "title", "$307", "Comic"), struct("$492", "author", "$307", "Artist")], fixed_layout))
+    fragments.append(reading_order_fragment(["section_%d" % page for page in range(pages)]))
+
+    eid = 1000
+    for page, (image_format, image_data) in enumerate(images):
+        image_name = IS("image_%d" % page)
+        story_name = IS("story_%d" % page)
+        eid += 1
+        if image_format == "text":
+            # a page of text rather than an image, as in a fixed layout children's book
+            content_name = IS("content_%d" % page)
+            fragments.append(YJFragment(ftype="$145", fid=content_name, value=struct("name", content_name, "$146", [image_data])))
+            page_content = struct("$155", eid, "$159", IS("$269"), "$145", struct("name", content_name, "$403", 0))
+        else:
+            fragments.append(YJFragment(ftype="$164", fid=image_name, value=struct(
+                "$175", image_name, "$161", IS(image_format), "$165", "raw_%d" % page, "$422", 60, "$423", 80)))
+            fragments.append(YJFragment(ftype="$417", fid=IS("raw_%d" % page), value=IonBLOB(image_data)))
+            page_content = struct("$155", eid, "$159", IS("$271"), "$175", image_name)
+
+        fragments.append(YJFragment(ftype="$259", fid=story_name, value=struct("$176", story_name, "$146", [page_content])))
+
+        eid += 1
+        fragments.append(YJFragment(ftype="$260", fid=IS("section_%d" % page), value=struct(
+            "$174", IS("section_%d" % page),
+            "$141", [struct("$155", eid, "$159", IS("$270"), "$176", story_name, "$156", IS("$326"), "$66", 60, "$67", 80)])))
+
+    with open(filepath, "wb") as f:
+        f.write(KfxContainer(symtab, fragments=fragments).serialize())
+
+
+def cbz_pages(cbz_data):
+    with zipfile.ZipFile(io.BytesIO(cbz_data)) as zf:
+        return [(name, zf.read(name)) for name in zf.namelist()]
+
+
+@pytest.fixture
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def test_convert_to_formats(tmp_path, quiet):
+    """Test several formats converted from one decode match converting to each format separately"""
+    filepath = str(tmp_path / "comic.kfx")
+    write_comic(filepath, jpeg_pages(5))
+
+    cbz_book = YJ_Book(filepath)
+    cbz_book.convert_to_formats(["cbz"])
+
+    book = YJ_Book(filepath)
+    results = book.convert_to_formats(["pdf", "epub", "cbz", "json", "cbz"])
+    assert sorted(results) == ["cbz", "epub", "json", "pdf"]
+    assert book.content_position_walks == cbz_book.content_position_walks + 1
+
+    assert cbz_pages(results["cbz"]) == cbz_pages(YJ_Book(filepath).convert_to_cbz())
+    assert [name for name, data in cbz_pages(results["cbz"])] == ["%04d.jpg" % (page + 1) for page in range(5)]
+    assert len(pypdf.PdfReader(io.BytesIO(results["pdf"])).pages) == 5
+    assert results["json"] == YJ_Book(filepath).convert_to_json_content()
+
+    with zipfile.ZipFile(io.BytesIO(results["epub"])) as zf:
+        assert "mimetype" in zf.namelist()
+
+
+def test_convert_to_unknown_format(tmp_path, quiet):
+    """Test an unknown format is rejected before the book is decoded"""
+    filepath = str(tmp_path / "comic.kfx")
+    write_comic(filepath, jpeg_pages(1))
+
+    book = YJ_Book(filepath)
+    with pytest.raises(Exception, match="Unknown conversion format: mobi"):
+        book.convert_to_formats(["epub", "mobi"])
+
+    assert len(book.fragments) == 0
+
+
+def test_epub_prefetches_reading_order_jxr_resources(tmp_path, quiet, monkeypatch):
+    """Test EPUB conversion prefetches only JPEG-XR resources in the reading order, named as when converted"""
+    with open(JXR_FIXTURE, "rb") as f:
+        jxr_data = f.read()
+
+    filepath = str(tmp_path / "comic.kfx")
+    write_comic(filepath, [("$548", jxr_data), ("$285", jpeg_page(1)), ("$548", jxr_data + b"\0")])
+    prefetched = []
+    converted = []
+    monkeypatch.setattr(resources.JXRConversions, "prefetch", lambda self, jxr_resources: prefetched.extend(
+        name for name, data in jxr_resources))
+    monkeypatch.setattr(resources, "convert_jxr_to_jpeg_or_png", lambda data, name: converted.append(name) or (data, "$548"))
+
+    book = YJ_Book(filepath)
+    book.decode_book()
+    book.fragments.get("$538", first=True).value["$169"][0]["$170"].pop()
+    book.convert_to_epub()
+
+    assert prefetched == converted == ["raw_0.jxr"]
+
+
+def test_epub_pdf_rasterizer_closed_on_failure(tmp_path, quiet, monkeypatch):
+    """Test the PDF rasterizer of an EPUB conversion is made when needed and closed when the conversion fails"""
+    from kfxlib.yj_to_epub import KFX_EPUB
+
+    filepath = str(tmp_path / "comic.kfx")
+    write_comic(filepath, jpeg_pages(1))
+    book = YJ_Book(filepath)
+    book.decode_book()
+    assert KFX_EPUB(book, metadata_only=True).pdf_rasterizer is None
+
+    pdf_docs = []
+
+    def failing_reading_order(self):
+        self.pdf_rasterizer = resources.PdfRasterizer()
+        pdf_file = io.BytesIO()
+        Image.new("RGB", (60, 80)).save(pdf_file, "PDF")
+        pdf_docs.append(self.pdf_rasterizer.open(pdf_file.getvalue()))
+        raise Exception("conversion failed")
+
+    monkeypatch.setattr(KFX_EPUB, "process_reading_order", failing_reading_order)
+    book = YJ_Book(filepath)
+    book.decode_book()
+    with pytest.raises(Exception, match="conversion failed"):
+        KFX_EPUB(book)
+
+    assert pdf_docs[0].is_closed
+
+
+def test_cbz_written_to_file(tmp_path, quiet):
+    """Test a CBZ streamed to a file stores already compressed pages in order, with converted JPEG-XR pages"""
+    with open(JXR_FIXTURE, "rb") as f:
+        jxr_data = f.read()
+
+    images = jpeg_pages(4)
+    images[1] = images[3] = ("$548", jxr_data)
+    filepath = str(tmp_path / "comic.kfx")
+    write_comic(filepath, images)
+
+    cbz_filepath = str(tmp_path / "comic.cbz")
+    assert YJ_Book(filepath).convert_to_cbz(output_file=cbz_filepath) == cbz_filepath
+
+    jxr_image = convert_jxr_to_jpeg_or_png(jxr_data, "page")
+    with zipfile.ZipFile(cbz_filepath) as zf:
+        assert [info.compress_type for info in zf.infolist()] == [zipfile.ZIP_STORED] * 4
+        assert [zf.read(name) for name in zf.namelist()] == [images[0][1], jxr_image[0], images[2][1], jxr_image[0]]
+        assert b"Comic" in zf.comment
+
+    with open(cbz_filepath, "rb") as f:
+        assert cbz_pages(f.read()) == cbz_pages(YJ_Book(filepath).convert_to_cbz())
+
+
+def png_page(mode, color):
+    image_file = io.BytesIO()
+    Image.new(mode, (60, 80), color).save(image_file, "PNG")
+    return image_file.getvalue()
+
+
+def test_pdf_pages_written_directly(tmp_path, quiet):
+    """Test PDF pages hold JPEG images unchanged and other images losslessly, at the size of each image"""
+    with open(JXR_FIXTURE, "rb") as f:
+        jxr_data = f.read()
+
+    bilevel = Image.new("1", (60, 80), 0)
+    bilevel.putpixel((5, 5), 1)
+    bilevel_file = io.BytesIO()
+    bilevel.save(bilevel_file, "PNG")
+
+    images = jpeg_pages(2) + [
+        ("$284", png_page("RGBA", (200, 40, 10, 128))), ("$284", png_page("L", 90)), ("$548", jxr_data),
+        ("$284", bilevel_file.getvalue())]
+    filepath = str(tmp_path / "comic.kfx")
+    write_comic(filepath, images)
+
+    reader = pypdf.PdfReader(io.BytesIO(YJ_Book(filepath).convert_to_pdf()))
+    assert len(reader.pages) == 6
+
+    page_images = []
+    for page in reader.pages:
+        image_xobject = page["/Resources"]["/XObject"]["/Im0"].get_object()
+        assert (float(page.mediabox.width), float(page.mediabox.height)) == (
+            image_xobject["/Width"], image_xobject["/Height"])
+        page_images.append(image_xobject)
+
+    assert [page_images[page]._data for page in range(2)] == [images[0][1], images[1][1]]
+    assert page_images[2]["/Filter"] == "/FlateDecode" and "/SMask" in page_images[2]
+    assert reader.pages[2].images[0].image.convert("RGBA").getpixel((5, 5)) == (200, 40, 10, 128)
+    assert page_images[3]["/ColorSpace"] == "/DeviceGray"
+    assert reader.pages[3].images[0].image.getpixel((5, 5)) == 90
+    assert (page_images[4]["/Width"], page_images[4]["/Height"]) == Image.open(
+        io.BytesIO(convert_jxr_to_jpeg_or_png(jxr_data, "page")[0])).size
+    assert (page_images[5]["/ColorSpace"], page_images[5]["/BitsPerComponent"]) == ("/DeviceGray", 1)
+    assert len(page_images[5].get_data()) == 8 * 80
+    bilevel_page = reader.pages[5].images[0].image.convert("L")
+    assert (bilevel_page.getpixel((5, 5)), bilevel_page.getpixel((6, 5))) == (255, 0)
+
+
+def test_convert_to_image_book(tmp_path, quiet, monkeypatch):
+    """Test fixed layout books are written straight to a cbz or pdf file, other books are left alone and no file is
+    returned when the conversion writes nothing"""
+    filepath = str(tmp_path / "comic.kfx")
+    write_comic(filepath, jpeg_pages(3))
+    complete_book(filepath)
+
+    cbz_filepath = kfxconvert.convert_to_image_book(filepath, "cbz", str(tmp_path / "out"))
+    assert cbz_filepath == str(tmp_path / "out.cbz")
+    with open(cbz_filepath, "rb") as f:
+        assert cbz_pages(f.read()) == cbz_pages(YJ_Book(filepath).convert_to_cbz())
+
+    pdf_filepath = kfxconvert.convert_to_image_book(filepath, "pdf", str(tmp_path / "out"), max_memory_mb=100)
+    assert pdf_filepath == str(tmp_path / "out.pdf")
+    assert len(pypdf.PdfReader(pdf_filepath).pages) == 3
+
+    write_comic(str(tmp_path / "book.kfx"), jpeg_pages(3), fixed_layout=False)
+    complete_book(str(tmp_path / "book.kfx"))
+    decoded = []
+    monkeypatch.setattr(YJ_Book, "decode_book", lambda self, **kwargs: decoded.append(self))
+    assert kfxconvert.convert_to_image_book(str(tmp_path / "book.kfx"), "pdf", str(tmp_path / "book")) is None
+    assert decoded == []
+    assert sorted(os.listdir(tmp_path)) == ["book.kfx", "comic.kfx", "out.cbz", "out.pdf"]
+
+    monkeypatch.undo()
+    monkeypatch.setattr(YJ_Book, "convert_to_cbz", lambda self, output_file, **kwargs: open(output_file, "wb").close())
+    assert kfxconvert.convert_to_image_book(filepath, "cbz", str(tmp_path / "failed")) is None
+    assert not os.path.exists(tmp_path / "failed.cbz")
+
+
+def test_fixed_layout_text_book(tmp_path, quiet):
+    """Test a fixed layout book with text is converted to an epub but not to a cbz or pdf"""
+    filepath = str(tmp_path / "picture_book.kfx")
+    write_comic(filepath, jpeg_pages(1) + [("text", "Once upon a time")])
+    complete_book(filepath)
+
+    book = YJ_Book(filepath)
+    book.decode_book()
+    assert book.is_fixed_layout and not book.is_image_based_fixed_layout
+
+    for image_format in kfxconvert.IMAGE_FORMATS:
+        assert kfxconvert.convert_to_image_book(filepath, image_format, str(tmp_path / "out")) is None
+
+    assert os.listdir(tmp_path) == ["picture_book.kfx"]
+
+    results = kfxconvert.convert_to_formats(filepath, ["epub", "cbz", "pdf"])
+    assert results["cbz"] is None and results["pdf"] is None
+    with zipfile.ZipFile(io.BytesIO(results["epub"])) as zf:
+        assert any(b"Once upon a time" in zf.read(name) for name in zf.namelist() if name.endswith(".xhtml"))
+
+
+def test_failed_conversion_resets_thread_state(tmp_path, quiet):
+    """Test a conversion that fails leaves no logger or phase timer on the thread for the next book"""
+    from kfxlib.message_logging import get_current_logger
+    from kfxlib.phase_timing import get_phase_timer
+
+    filepath = str(tmp_path / "broken.kfx")
+    with open(filepath, "wb") as f:
+        f.write(b"not a kfx book")
+
+    with pytest.raises(Exception):
+        kfxconvert.convert_to_formats(filepath, ["epub"])
+    with pytest.raises(Exception):
+        kfxconvert.convert_to_image_book(filepath, "cbz", str(tmp_path / "out"))
+
+    assert get_current_logger() is logging
+    assert get_phase_timer() is None
+
+
+def test_image_book_memory_limit(tmp_path, quiet, monkeypatch):
+    """Test a PDF too large for the memory limit is written as a CBZ and JPEG-XR processes are limited"""
+    noise_file = io.BytesIO()
+    Image.frombytes("RGB", (700, 700), random.Random(0).randbytes(700 * 700 * 3)).save(noise_file, "JPEG", quality=95)
+    filepath = str(tmp_path / "comic.kfx")
+    write_comic(filepath, [("$285", noise_file.getvalue())] * 4)
+    complete_book(filepath)
+
+    assert kfxconvert.convert_to_image_book(filepath, "pdf", str(tmp_path / "out"), max_memory_mb=1) == str(
+        tmp_path / "out.cbz")
+    assert not os.path.exists(tmp_path / "out.pdf")
+
+    monkeypatch.setattr(resources, "JXR_CONVERSION_PROCESSES", 8)
+    jxr_page = ImageResource("$548", "page", b"jxr" * 10, 1000, 1000)
+    assert jxr_processes_within([jxr_page], JXR_CONVERSION_PROCESS_MEMORY * 3) == 2
+    assert jxr_processes_within([jxr_page], 1) == 1
+    assert jxr_processes_within([jxr_page], JXR_CONVERSION_PROCESS_MEMORY * 100) == 8
+    assert jxr_processes_within([ImageResource("$285", "page", b"jpeg")], 1) == 8
+
+
+def test_conversion_phase_timing(tmp_path, quiet):
+    """Test efm appends the time spent in each phase of decoding and converting a book as a JSON line"""
+    filepath = str(tmp_path / "comic.kfx")
+    write_comic(filepath, jpeg_pages(3))
+    complete_book(filepath)
+    timing_file = str(tmp_path / "timing.jsonl")
+
+    kfxconvert.convert_to_formats(filepath, ["epub", "cbz"], timing_file=timing_file)
+    kfxconvert.convert_to_image_book(filepath, "pdf", str(tmp_path / "out"), timing_file=timing_file)
+
+    with open(timing_file) as f:
+        timings = [json.loads(line) for line in f]
+
+    assert [(timing["book"], timing["formats"]) for timing in timings] == [(filepath, ["epub", "cbz"]), (filepath, ["pdf"])]
+    phases = {entry["phase"]: entry for entry in timings[0]["phases"]}
+    assert {"decode_book", "decode_book/containers", "decode_book/consistency", "epub_metadata", "epub_content",
+            "epub_styles", "epub_save_parts", "epub_zip", "ordered_images", "cbz"} <= set(phases)
+    assert phases["decode_book/containers"]["items"] == phases["decode_book/consistency"]["items"] > 0
+    assert phases["cbz"]["items"] == 3 and phases["cbz"]["calls"] == 1
+    assert all(entry["wall_sec"] >= 0 and entry["cpu_sec"] >= 0 for entry in phases.values())
+    assert "pdf" in [entry["phase"] for entry in timings[1]["phases"]]
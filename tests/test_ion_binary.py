@@ -0,0 +1,98 @@
+import decimal
+import hashlib
+import random
+
+from kfxlib.ion import (
+        IonAnnotation, IonBLOB, IonSExp, IonStruct, IonTimestamp, IonTimestampTZ, IS,
+        ION_TIMESTAMP_Y, ION_TIMESTAMP_YMD, ION_TIMESTAMP_YMDHM, ION_TIMESTAMP_YMDHMSF)
+from kfxlib.ion_binary import IonBinary, deserialize_vluint, serialize_vluint
+from kfxlib.kfx_container import KfxContainer
+from kfxlib.yj_container import YJFragment
+from kfxlib.utilities import Deserializer
+
+from tests.kfx_synth import new_container, struct
+
+
+# sha256 of the container serialized from the synthetic book by the original nested IonBinary serializer
+EXPECTED_CONTAINER = "37c915610634a15859ecb6fcac14f3e1c5e2c5fc585c4f7f407859768a31ab5e"
+
+
+def random_value(rng, symbols, depth=0):
+    kind = rng.randint(0, 12 if depth < 4 else 8)
+    if kind == 0:
+        return rng.choice([None, True, False])
+    if kind == 1:
+        return rng.choice([0, 1, -1, 13, 255, -256, 0x7fffffff, -(2 ** 40), rng.randint(-10 ** 9, 10 ** 9)])
+    if kind == 2:
+        return rng.choice([0.0, 1.5, -2.25e-10, rng.random()])
+    if kind == 3:
+        return decimal.Decimal(rng.choice(["0", "1.5", "-0.001", "12", "-3.14159"]))
+    if kind == 4:
+        format = rng.choice([ION_TIMESTAMP_Y, ION_TIMESTAMP_YMD, ION_TIMESTAMP_YMDHM, ION_TIMESTAMP_YMDHMSF])
+        return IonTimestamp(2020, 1, 2, 3, 4, 5, 678000, IonTimestampTZ(
+                rng.choice([0, 60, -300, None]) if format in {ION_TIMESTAMP_YMDHM, ION_TIMESTAMP_YMDHMSF} else None, format,
+                3 if format == ION_TIMESTAMP_YMDHMSF else 0))
+    if kind == 5:
+        return rng.choice(symbols)
+    if kind == 6:
+        return "x" * rng.choice([0, 1, 13, 14, 127, 128, 16383, 16384]) + "é"
+    if kind == 7:
+        return IonBLOB(bytes(rng.randint(0, 255) for _ in range(rng.choice([0, 13, 14, 200]))))
+    if kind == 8:
+        return [random_value(rng, symbols, depth + 1) for _ in range(rng.randint(0, 3))]
+    if kind == 9:
+        return IonSExp([random_value(rng, symbols, depth + 1) for _ in range(rng.randint(0, 3))])
+    if kind == 10:
+        value = random_value(rng, symbols, depth + 1)
+        return value if isinstance(value, IonAnnotation) else IonAnnotation(rng.sample(symbols, rng.randint(1, 2)), value)
+
+    value = IonStruct()
+    for _ in range(rng.randint(0, 4)):
+        value[rng.choice(symbols)] = random_value(rng, symbols, depth + 1)
+    return value
+
+
+def synthetic_book():
+    rng = random.Random(0)
+    symtab, fragments = new_container(["content_%d" % i for i in range(20)] + ["resource_%d" % i for i in range(20)],
+                                      kfx_main=False)
+    local_symbols = [IS("content_%d" % i) for i in range(20)]
+    symbols = local_symbols + [IS("$%d" % i) for i in range(10, 600, 7)]
+
+    fragments.append(YJFragment(ftype="$593", value=[struct("$492", "kfxgen.textBlock", "version", 1)]))
+    fragments.append(YJFragment(ftype="$419", value=struct("$252", [struct("$155", "CR!TEST", "$181", local_symbols)])))
+
+    for i, fid in enumerate(local_symbols):
+        fragments.append(YJFragment(ftype=rng.choice(["$145", "$259", "$157", "$164"]), fid=fid, value=struct(
+            "$176", fid, "$146", [random_value(rng, symbols) for _ in range(rng.randint(5, 30))])))
+        fragments.append(YJFragment(ftype="$417", fid=IS("resource_%d" % i), value=IonBLOB(
+            bytes(rng.randint(0, 255) for _ in range(rng.randint(1, 5000))))))
+
+    return symtab, fragments
+
+
+def test_values_round_trip():
+    """Test each kind of value is serialized and deserialized back to itself"""
+    symtab, fragments = synthetic_book()
+    values = [fragment.value for fragment in fragments if fragment.ftype != "$417"]
+
+    data = IonBinary(symtab).serialize_multiple_values(values)
+    assert repr(IonBinary(symtab).deserialize_multiple_values(data)) == repr(values)
+
+
+def test_container_matches_nested_serializer():
+    """Test a KFX container is byte identical to the one built by the original nested serializer"""
+    symtab, fragments = synthetic_book()
+    data = KfxContainer(symtab, fragments=fragments).serialize()
+
+    assert hashlib.sha256(data).hexdigest() == EXPECTED_CONTAINER
+
+
+def test_vluint_encoding():
+    """Test variable length unsigned ints are encoded most significant group first"""
+    encodings = {0: b"\x80", 127: b"\xff", 128: b"\x01\x80", 16383: b"\x7f\xff", 16384: b"\x01\x00\x80"}
+    for value, data in encodings.items():
+        assert serialize_vluint(value) == data
+
+    for value in [2 ** 21 - 1, 2 ** 21, 2 ** 49 + 12345]:
+        assert deserialize_vluint(Deserializer(serialize_vluint(value))) == value
@@ -0,0 +1,63 @@
+import decimal
+
+import pytest
+
+from kfxlib.ion import IonAnnotation, IonBLOB, IonSExp, IonStruct, IonSymbol
+from kfxlib.ion_symbol_table import LocalSymbolTable, SymbolTableCatalog
+from kfxlib.ion_text import IonText, IonTextFile, ParseError
+
+
+def test_values_round_trip():
+    """Test serialized values of each type parse back to the same values"""
+    struct = IonStruct()
+    struct[IonSymbol("name")] = "caf\u00e9 \"quoted\"\n"
+    struct[IonSymbol("two words")] = [1, -2, 0x12345678, 1.5e-10, float("inf"), decimal.Decimal("3.25"), None, True]
+    struct[IonSymbol("sexp")] = IonSExp([IonSymbol("+"), IonSymbol("x"), 2])
+    struct[IonSymbol("blob")] = IonBLOB(bytes(range(256)))
+    values = [IonAnnotation([IonSymbol("$145"), IonSymbol("a b")], struct), IonSymbol("null"), "", []]
+
+    data = IonText().serialize_multiple_values(values)
+    assert repr(IonText().deserialize_multiple_values(data)) == repr(values)
+
+
+def test_comments_and_adjacent_tokens():
+    """Test comments, long strings, clobs and tokens without separating whitespace"""
+    data = ("/* header\r\n comment */ a::b::{x:1,y:'''long ''' // line comment\r\n'''string'''}\n"
+            "{{ \"clob\" }} {{aGVsbG8=}} (a+b) [1.5d2,2020-01-02T03:04Z,-inf,0x1_f]")
+    values = IonText().deserialize_multiple_values(data)
+
+    assert values[0].annotations == (IonSymbol("a"), IonSymbol("b"))
+    assert values[0].value == {IonSymbol("x"): 1, IonSymbol("y"): "long string"}
+    assert values[1:3] == [b"clob", b"hello"]
+    assert values[3] == [IonSymbol("a"), IonSymbol("+"), IonSymbol("b")]
+    assert values[4][0] == decimal.Decimal("150")
+    assert str(values[4][1]) == "2020-01-02 03:04:00+00:00"
+    assert values[4][2:] == [-float("inf"), 31]
+
+
+def test_token_positions():
+    """Test tokens report the line and column where they start"""
+    f = IonTextFile("{a:\r\n  1,\n\t// c\n  'b'}")
+    tokens = [f.next_token() for _ in range(8)]
+
+    assert [t.text for t in tokens] == ["{", "a", ":", "1", ",", "'b'", "}", ""]
+    assert [(t.line_number, t.start_col) for t in tokens[3:7]] == [(2, 2), (2, 3), (4, 2), (4, 5)]
+    assert repr(tokens[5]) == "line=4 col=3 type=\"quoted symbol\" text='b'"
+
+
+@pytest.mark.parametrize("data", ["[1, 2", "{a 1}", "/* unterminated", "\"unterminated", "{{ not base64! }}"])
+def test_parse_errors(data):
+    """Test malformed text is reported as a parse failure"""
+    with pytest.raises(ValueError, match="Ion text parse failure"):
+        IonText().deserialize_multiple_values(data)
+
+    assert issubclass(ParseError, ValueError)
+
+
+def test_symbol_catalog():
+    """Test a shared symbol table catalog is added to the symbol table catalog"""
+    data = "$ion_1_0 $ion_shared_symbol_table::{name:\"YJ_symbols\",version:10,symbols:[\"$10\",\"language\"]}"
+    catalog = SymbolTableCatalog()
+    IonText(LocalSymbolTable(catalog=catalog)).deserialize_multiple_values(data, import_symbols=True)
+
+    assert catalog.get_shared_symbol_table("YJ_symbols").symbols == ["$10", "language"]
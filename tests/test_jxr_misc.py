@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from kfxlib.jxr_misc import Deserializer, HuffmanTable
+
+
+CODES = {"1": 0, "01": 1, "001": 2, "0000": 3, "0001": 4}
+
+
+def bit_string(data):
+    return "".join(format(b, "08b") for b in data)
+
+
+def test_unpack_bits_matches_bit_string():
+    """Test reads of every size up to 64 bits across refills of the bit window"""
+    rng = random.Random(0)
+    data = rng.randbytes(200)
+    bits = bit_string(data)
+    ds = Deserializer(data)
+
+    pos = 0
+    while pos < len(bits) - 64:
+        size = rng.randint(0, 64)
+        assert ds.unpack_bits(size) == int(bits[pos : pos + size] or "0", 2)
+        pos += size
+        assert ds.offset == (pos + 7) // 8
+
+
+def test_byte_reads_after_bits():
+    """Test byte-level reads resume at the byte after the partially read one"""
+    ds = Deserializer(bytes(range(1, 21)))
+    assert ds.unpack_bits(12) == 0x010
+    ds.discard_remainder_bits()
+    assert ds.offset == 2
+    assert ds.extract(2) == b"\x03\x04"
+    assert ds.unpack("<H") == 0x0605
+    assert len(ds) == 14
+
+    ds.unpack_bits(3)
+    with pytest.raises(Exception, match="unexpected 5 bit remaining"):
+        ds.extract(1)
+
+
+def test_offset_assignment_resets_bits():
+    """Test seeking drops any bits buffered from the old position"""
+    ds = Deserializer(bytes(range(20)))
+    ds.unpack_bits(5)
+    ds.offset = 10
+    assert ds.unpack_bits(16) == 0x0A0B
+
+
+def test_huff_matches_bitwise_decode():
+    """Test table lookup decodes the same values as walking the code bit by bit"""
+    rng = random.Random(1)
+    table = HuffmanTable(CODES)
+    data = rng.randbytes(100)
+    bits = bit_string(data)
+    ds = Deserializer(data)
+
+    pos = 0
+    while len(bits) - pos >= 4:
+        code = next(c for c in CODES if bits.startswith(c, pos))
+        assert ds.huff(table, "test") == CODES[code]
+        pos += len(code)
+
+
+def test_huff_at_end_of_data():
+    """Test short codes decode from the last bits even when a full lookup is not possible"""
+    table = HuffmanTable(CODES)
+    ds = Deserializer(b"\xfd")
+    assert [ds.huff(table, "test") for _ in range(6)] == [0] * 6
+    assert ds.huff(table, "test") == 1
+
+
+def test_huffman_table_rejects_bad_codes():
+    """Test tables are limited to 8 bit prefix-free codes like the original bitwise decoder"""
+    with pytest.raises(Exception, match="too long"):
+        HuffmanTable({"1": 0, "000000000": 1})
+
+    with pytest.raises(Exception, match="not prefix free"):
+        HuffmanTable({"1": 0, "10": 1})
+
+
+def test_huff_rejects_truncated_code():
+    """Test a code cut off by the end of the data is an error"""
+    ds = Deserializer(b"\x00")
+    ds.unpack_bits(6)
+    with pytest.raises(Exception, match="huffman"):
+        ds.huff(HuffmanTable(CODES), "test")
@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+from kfxlib.ion import IonBLOB, IS
+from kfxlib.kfx_container import KfxContainer
+from kfxlib.yj_container import YJFragment
+
+from efm import kfx_index
+from efm.kfx_index import KfxIndex, get_kfx_metadata
+from tests.kfx_synth import metadata_fragment, new_container, struct
+
+
+def write_kfx_book(filepath, title, authors, fixed_layout=False, cover=b"\xff\xd8\xff\xe0cover"):
+    title_metadata = [
+        struct("$492", "title", "$307", title),
+        struct("$492", "cde_content_type", "$307", "EBOK"),
+        struct("$492", "asset_id", "$307", "ASSET_%s" % title.replace(" ", "_")),
+        struct("$492", "cover_image", "$307", "cover_res"),
+    ] + [struct("$492", "author", "$307", author) for author in authors]
+
+    symtab, fragments = new_container(["cover_res", "cover_raw"])
+    fragments.append(YJFragment(ftype="$419", value=struct("$252", [struct("$155", "CR!TEST", "$181", [IS("$490")])])))
+    fragments.append(metadata_fragment(title_metadata, fixed_layout))
+    fragments.append(YJFragment(ftype="$164", fid=IS("cover_res"), value=struct(
+        "$175", IS("cover_res"), "$161", IS("$285"), "$165", "cover_raw", "$422", 10, "$423", 10)))
+    fragments.append(YJFragment(ftype="$417", fid=IS("cover_raw"), value=IonBLOB(cover)))
+
+    with open(filepath, "wb") as f:
+        f.write(KfxContainer(symtab, fragments=fragments).serialize())
+
+
+def make_library(dirpath):
+    os.makedirs(os.path.join(dirpath, "comics"))
+    write_kfx_book(os.path.join(dirpath, "mort.kfx"), "Mort", ["Terry Pratchett"])
+    write_kfx_book(os.path.join(dirpath, "good_omens.kfx"), "Good Omens", ["Terry Pratchett", "Neil Gaiman"])
+    write_kfx_book(os.path.join(dirpath, "comics", "sandman.kfx"), "Sandman", ["Neil Gaiman"], fixed_layout=True)
+    with open(os.path.join(dirpath, "broken.kfx"), "wb") as f:
+        f.write(b"not a kfx book")
+    with open(os.path.join(dirpath, "notes.txt"), "w") as f:
+        f.write("not a book")
+
+
+def test_update_and_search(tmp_path):
+    """Test a folder of KFX books is indexed in parallel and can be searched"""
+    make_library(tmp_path / "books")
+
+    with KfxIndex(str(tmp_path / "index.db")) as index:
+        stats = index.update([str(tmp_path / "books")], workers=2)
+        assert stats == {"books": 4, "read": 4, "unchanged": 0, "removed": 0, "failed": 1}
+
+        assert [entry.title for entry in index.search()] == ["Good Omens", "Mort", "Sandman"]
+        assert [entry.title for entry in index.search(author="gaiman")] == ["Good Omens", "Sandman"]
+        assert [entry.title for entry in index.search(title="o", fixed_layout=False)] == ["Good Omens", "Mort"]
+        assert index.search(cde_type="PDOC") == []
+
+        sandman = index.search(fixed_layout=True)[0]
+        assert sandman.filepath == str(tmp_path / "books" / "comics" / "sandman.kfx")
+        assert (sandman.authors, sandman.asset_id, sandman.cde_type) == (["Neil Gaiman"], "ASSET_Sandman", "EBOK")
+        assert len(sandman.cover_sha256) == 64
+        assert not sandman.is_print_replica
+
+        broken = index.get(str(tmp_path / "books" / "broken.kfx"))
+        assert broken.error is not None and broken.title is None
+
+
+def test_changed_and_removed_books(tmp_path):
+    """Test only new or modified books are read again and removed books are dropped"""
+    make_library(tmp_path / "books")
+    mort = str(tmp_path / "books" / "mort.kfx")
+
+    with KfxIndex(str(tmp_path / "index.db")) as index:
+        index.update([str(tmp_path / "books")], workers=1)
+
+    with KfxIndex(str(tmp_path / "index.db")) as index:
+        assert index.update([str(tmp_path / "books")], workers=1)["read"] == 0
+
+        write_kfx_book(mort, "Mort", ["Terry Pratchett"], cover=b"\xff\xd8\xff\xe0new cover")
+        os.utime(mort, ns=(1, 1))
+        assert index.get(mort) is None
+
+        os.remove(tmp_path / "books" / "good_omens.kfx")
+        stats = index.update([str(tmp_path / "books")], workers=1)
+        assert (stats["books"], stats["read"], stats["removed"]) == (3, 1, 1)
+        assert index.get(mort).mtime_ns == 1
+        assert [entry.title for entry in index.search(author="pratchett")] == ["Mort"]
+
+
+def test_action_metadata(tmp_path, monkeypatch):
+    """Test print/rename metadata comes from the index without reopening indexed books"""
+    make_library(tmp_path / "books")
+    good_omens = str(tmp_path / "books" / "good_omens.kfx")
+    db_filepath = str(tmp_path / "index.db")
+
+    metadata = get_kfx_metadata(good_omens, db_filepath)
+    assert (metadata.format, metadata.title, metadata.author) == ("KFX", "Good Omens", "Terry Pratchett & Neil Gaiman")
+    assert get_kfx_metadata(str(tmp_path / "books" / "broken.kfx"), db_filepath) is None
+
+    def fail(filepath):
+        raise AssertionError("book was reopened")
+
+    monkeypatch.setattr(kfx_index, "extract_kfx_metadata", fail)
+    assert get_kfx_metadata(good_omens, db_filepath).title == "Good Omens"
+
+
+def test_action_metadata_without_index(tmp_path, monkeypatch):
+    """Test print/rename skip KFX books without reading them when no index is configured"""
+    action = pytest.importorskip("efm.action")
+    make_library(tmp_path / "books")
+
+    def fail(filepath):
+        raise AssertionError("book was read")
+
+    monkeypatch.setattr(kfx_index, "extract_kfx_metadata", fail)
+    rename = action.RenameAction(None, None, str(tmp_path / "books" / "good_omens.kfx"), str(tmp_path / "tmp"), True)
+    assert rename.get_metadata() is False
@@ -0,0 +1,46 @@
+import time
+
+from kfxlib.phase_timing import get_phase_timer, phase, PhaseTimer, set_phase_timer
+
+
+def test_nested_phases():
+    """Test repeated and nested phases are totalled by their path, with calls, items, wall and CPU time"""
+    phase_timer = set_phase_timer(PhaseTimer())
+    try:
+        with phase("decode", 10):
+            with phase("containers") as span:
+                span.add_items(3)
+                span.add_items()
+
+            for _ in range(3):
+                with phase("resource", 1):
+                    time.sleep(0.01)
+    finally:
+        set_phase_timer()
+
+    report = {entry["phase"]: entry for entry in phase_timer.report()}
+    assert list(report) == ["decode", "decode/containers", "decode/resource"]
+    assert [(entry["calls"], entry["items"]) for entry in report.values()] == [(1, 10), (1, 4), (3, 3)]
+    assert report["decode/resource"]["wall_sec"] >= 0.03
+    assert report["decode"]["wall_sec"] >= report["decode/resource"]["wall_sec"]
+    assert report["decode/resource"]["cpu_sec"] < report["decode/resource"]["wall_sec"]
+
+
+def test_phase_without_timer():
+    """Test phases outside of a phase timer are not recorded and a failed phase is still timed"""
+    with phase("decode") as span:
+        span.add_items(5)
+
+    assert get_phase_timer() is None
+
+    phase_timer = set_phase_timer(PhaseTimer())
+    try:
+        with phase("decode"):
+            raise ValueError("bad book")
+    except ValueError:
+        pass
+    finally:
+        set_phase_timer()
+
+    assert [(entry["phase"], entry["calls"]) for entry in phase_timer.report()] == [("decode", 1)]
+    assert phase_timer.active_names == []
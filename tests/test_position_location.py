@@ -0,0 +1,191 @@
+import logging
+import random
+
+import pytest
+
+from kfxlib.ion import IS
+from kfxlib.kfx_container import KfxContainer
+from kfxlib.yj_book import YJ_Book
+from kfxlib.yj_container import YJFragment
+from kfxlib.yj_position_location import BookPosLoc, ContentChunk, EID_SCAN_CHUNKS, PositionTable
+
+from tests.kfx_synth import new_container, reading_order_fragment, struct
+
+
+def write_book(filepath, sections):
+    rng = random.Random(0)
+    local_names = []
+    for section in range(sections):
+        local_names.extend(["section_%d" % section, "story_%d" % section, "content_%d" % section])
+
+    symtab, fragments = new_container(local_names)
+    fragments.append(reading_order_fragment(["section_%d" % section for section in range(sections)]))
+
+    eid = 1000
+    for section in range(sections):
+        content_name = IS("content_%d" % section)
+        story_name = IS("story_%d" % section)
+        text = [" ".join(["lorem", "ipsum"] * rng.randint(1, 40)) for _ in range(rng.randint(5, 30))]
+        fragments.append(YJFragment(ftype="$145", fid=content_name, value=struct("name", content_name, "$146", text)))
+
+        paragraphs = []
+        for i in range(len(text)):
+            eid += 1
+            paragraphs.append(struct("$155", eid, "$159", IS("$269"), "$145", struct("name", content_name, "$403", i)))
+
+        fragments.append(YJFragment(ftype="$259", fid=story_name, value=struct("$176", story_name, "$146", paragraphs)))
+
+        eid += 1
+        fragments.append(YJFragment(ftype="$260", fid=IS("section_%d" % section), value=struct(
+            "$174", IS("section_%d" % section),
+            "$141", [struct("$155", eid, "$159", IS("$270"), "$176", story_name, "$156", IS("$326"))])))
+
+    with open(filepath, "wb") as f:
+        f.write(KfxContainer(symtab, fragments=fragments).serialize())
+
+
+def scan_pid_for_eid(eid, eid_offset, pos_info, start_pii):
+    # the original lookup: first chunk containing the offset at or after start_pii, wrapping around
+    for i in range(len(pos_info)):
+        pii = (start_pii + i) % len(pos_info)
+        pi = pos_info[pii]
+        if pi.eid == eid and pi.eid_offset <= eid_offset <= pi.eid_offset + pi.length:
+            return (pi.pid + eid_offset - pi.eid_offset, pii)
+
+    return (None, start_pii)
+
+
+def random_pos_info(rng, eids, chunks):
+    pos_info = []
+    pid = 0
+    for _ in range(chunks):
+        length = rng.choice([0, 1, 3, 10, 50])
+        pos_info.append(ContentChunk(pid, rng.choice(eids), rng.choice([0, 0, 1, 3, 10, 20, 60]), length))
+        pid += length
+
+    return pos_info
+
+
+def test_pid_for_eid_matches_scan():
+    """Test out of order lookups give the same pid as scanning from the last match"""
+    for seed in range(50):
+        rng = random.Random(seed)
+        eids = [1, 2, IS("para"), IS("image")] + [rng.randint(3, 100) for _ in range(10)]
+        pos_info = random_pos_info(rng, eids, rng.randint(1, 300))
+        book = BookPosLoc()
+        start_pii = 0
+
+        for _ in range(100):
+            chunk = rng.choice(pos_info)
+            eid, eid_offset = rng.choice([
+                (chunk.eid, max(chunk.eid_offset + rng.randint(-2, chunk.length + 2), 0)),
+                (rng.choice(eids + [999]), rng.randint(0, 80))])
+
+            pid, start_pii = scan_pid_for_eid(eid, eid_offset, pos_info, start_pii)
+            assert book.pid_for_eid(eid, eid_offset, pos_info) == pid
+            assert book.last_pii_ == start_pii
+
+
+def test_pid_for_eid_prefers_next_chunk():
+    """Test an eid offset found in several chunks resolves to the next one after the last match"""
+    pos_info = [ContentChunk(i * 10, 5 if i % 2 else 6, 0, 10) for i in range(EID_SCAN_CHUNKS * 6)]
+    book = BookPosLoc()
+
+    assert book.pid_for_eid(5, 4, pos_info) == 14
+    assert book.pid_for_eid(6, 0, pos_info) == 20
+    book.last_pii_ = len(pos_info) - 3
+    assert book.pid_for_eid(6, 2, pos_info) == (len(pos_info) - 2) * 10 + 2
+    assert book.pid_for_eid(6, 2, pos_info) == (len(pos_info) - 2) * 10 + 2
+    book.last_pii_ = len(pos_info) - 1
+    assert book.pid_for_eid(6, 2, pos_info) == 2
+    assert book.pid_for_eid(5, 11, pos_info) is None
+
+
+def test_pid_for_eid_index_follows_pos_info():
+    """Test lookups in a different or extended position info list are not answered from a stale index"""
+    pos_info = [ContentChunk(i * 10, 100 + i, 0, 10) for i in range(100)]
+    other_pos_info = [ContentChunk(i * 20, 100 + i, 0, 20) for i in range(100)]
+    book = BookPosLoc()
+
+    assert book.pid_for_eid(150, 5, pos_info) == 505
+    assert book.pid_for_eid(150, 5, other_pos_info) == 1005
+
+    pos_info.append(ContentChunk(1000, 300, 0, 10))
+    assert book.pid_for_eid(300, 5, pos_info) == 1005
+
+
+def test_position_table_rows():
+    """Test chunks stored in a position table read back as equal chunks and can be updated in place"""
+    chunks = [
+        ContentChunk(0, 1001, 0, 5, IS("c0"), text="hello"),
+        ContentChunk(5, IS("eid_symbol"), 2, 1, IS("c0"), image_resource=IS("rsrc1")),
+        ContentChunk(6, 1002, 0, 0, IS("c1"), match_zero_len=True),
+        ContentChunk(6, 2 ** 40, 7, 3, None),
+    ]
+    table = PositionTable(chunks)
+
+    assert len(table) == 4 and table.section_names == [None, IS("c0"), IS("c1")]
+    assert [repr(chunk) for chunk in table] == [repr(chunk) for chunk in chunks]
+    assert all(row == chunk for row, chunk in zip(table, chunks))
+    assert table[-3].eid == IS("eid_symbol") and isinstance(table[-3].eid, IS)
+    assert [chunk.pid for chunk in table[1:3]] == [5, 6]
+    assert list(table.rows())[0] == (0, 1001, 0, 5, IS("c0"), "hello")
+
+    with pytest.raises(IndexError):
+        table[4]
+
+    table[1].eid = 1003
+    table[1].image_resource = None
+    table[2].length = 9
+    table[3].section_name = IS("c2")
+    assert repr(table[1]) == repr(ContentChunk(5, 1003, 2, 1, IS("c0")))
+    assert table[2].length == 9 and table[3].section_name == IS("c2")
+
+
+def test_book_position_info(tmp_path):
+    """Test the position, position map and location info of a book are position tables that agree"""
+    write_book(str(tmp_path / "book.kfx"), 5)
+    logging.disable(logging.CRITICAL)
+    try:
+        book = YJ_Book(str(tmp_path / "book.kfx"))
+        book.decode_book()
+
+        pos_info = book.collect_content_position_info()
+        book.create_position_map(pos_info)
+        book.create_location_map(book.generate_approximate_locations(pos_info))
+        map_pos_info = book.collect_position_map_info()
+        loc_info = book.collect_location_map_info(map_pos_info)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert isinstance(pos_info, PositionTable) and isinstance(map_pos_info, PositionTable)
+    assert isinstance(loc_info, PositionTable)
+    assert [chunk.pid for chunk in pos_info] == [chunk.pid for chunk in map_pos_info]
+    assert all(chunk.__eq__(map_chunk) and chunk.text is not None for chunk, map_chunk in zip(
+        pos_info, map_pos_info) if chunk.length > 1)
+    assert sum(loc.length for loc in loc_info) == pos_info[-1].pid + pos_info[-1].length
+    assert all(loc.pid < next_loc.pid for loc, next_loc in zip(loc_info, loc_info[1:]))
+
+
+def test_content_position_info_reused(tmp_path):
+    """Test content position info is walked once per set of options until the book fragments change"""
+    write_book(str(tmp_path / "book.kfx"), 3)
+    logging.disable(logging.CRITICAL)
+    try:
+        book = YJ_Book(str(tmp_path / "book.kfx"))
+        book.decode_book()
+        walks = book.content_position_walks
+
+        pos_info = book.collect_content_position_info()
+        assert book.collect_content_position_info() is pos_info
+        assert book.collect_content_position_info(keep_footnote_refs=False) is not pos_info
+        assert (book.content_position_walks - walks, book.content_position_walks_avoided) == (2, 1)
+
+        book.create_position_map(pos_info)
+        new_pos_info = book.collect_content_position_info()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert new_pos_info is not pos_info
+    assert [repr(chunk) for chunk in new_pos_info] == [repr(chunk) for chunk in pos_info]
+    assert (book.content_position_walks - walks, book.content_position_walks_avoided) == (3, 1)
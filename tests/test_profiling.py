@@ -0,0 +1,93 @@
+import json
+import os
+import time
+
+import pytest
+
+import kfxlib
+from efm.profiling import module_name, RunProfiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_cpu_profile_totals(tmp_path):
+    """Test cpu profiles are totalled per action and module and the slowest books are reported"""
+    profiler = RunProfiler("cpu", top=2)
+    for filepath, seconds in [("a.kfx", 0.01), ("b.kfx", 0.05), ("c.kfx", 0.03)]:
+        with profiler.book(filepath):
+            with profiler.action("kfx2epub"):
+                busy(seconds)
+            with profiler.action("rename"):
+                pass
+
+    report = profiler.write(str(tmp_path / "profile.json"))
+    with open(tmp_path / "profile.json") as f:
+        assert json.load(f) == report
+
+    assert (report["mode"], report["books"], report["failed_books"]) == ("cpu", 3, 0)
+    assert [action["action"] for action in report["actions"]] == ["kfx2epub", "rename"]
+    assert report["actions"][0]["calls"] == 3 and report["actions"][0]["wall_sec"] >= 0.09
+    assert [book["book"] for book in report["slowest_books"]] == ["b.kfx", "c.kfx"]
+    assert set(report["slowest_books"][0]["actions"]) == {"kfx2epub", "rename"}
+
+    modules = {module["module"]: module for module in report["modules"]}
+    assert modules["test_profiling"]["own_sec"] > 0
+    assert any(function["function"].startswith("test_profiling:") for function in report["functions"])
+
+
+def test_alloc_profile_peaks():
+    """Test alloc profiles report the memory peak of each action and book and what each module still holds"""
+    held = []
+    profiler = RunProfiler("alloc")
+    with profiler.book("small.kfx"):
+        with profiler.action("kfx2cbz"):
+            bytearray(1024 * 1024)
+    with profiler.book("large.kfx"):
+        with profiler.action("kfx2cbz"):
+            held.append(bytearray(4 * 1024 * 1024))
+        with profiler.action("print"):
+            bytearray(8 * 1024 * 1024)
+
+    report = profiler.report()
+    assert [book["book"] for book in report["most_memory_books"]] == ["large.kfx", "small.kfx"]
+    large = report["most_memory_books"][0]
+    assert large["peak_mb"] >= 12 and 4 <= large["held_mb"] < 5
+    assert report["most_memory_books"][1]["peak_mb"] >= 1
+
+    actions = {action["action"]: action for action in report["actions"]}
+    assert actions["kfx2cbz"]["calls"] == 2 and actions["kfx2cbz"]["peak_mb"] >= 4
+    assert actions["print"]["peak_mb"] >= 8
+    assert report["modules"][0]["module"] == "test_profiling" and report["modules"][0]["held_mb"] >= 4
+    assert "functions" not in report
+
+
+def test_failed_book_profiled():
+    """Test a book that fails is recorded as failed and the failure still reaches the caller"""
+    profiler = RunProfiler("cpu")
+    with pytest.raises(ValueError):
+        with profiler.book("bad.kfx"):
+            with profiler.action("drm"):
+                raise ValueError("bad book")
+
+    report = profiler.report()
+    assert report["failed_books"] == 1 and report["slowest_books"][0]["failed"]
+    assert report["actions"][0]["calls"] == 1
+
+    with pytest.raises(ValueError):
+        RunProfiler("io")
+
+
+def test_module_name(monkeypatch):
+    """Test files are named as modules under the sys.path entry that is not itself a package"""
+    kfxlib_dirpath = os.path.dirname(kfxlib.__file__)
+    monkeypatch.syspath_prepend(kfxlib_dirpath)
+
+    assert module_name(os.path.join(kfxlib_dirpath, "yj_book.py")) == "kfxlib.yj_book"
+    assert module_name(kfxlib.__file__) == "kfxlib"
+    assert module_name(json.__file__) == "json"
+    assert module_name("~") == "builtins"
+    assert module_name("<frozen posixpath>") == "<frozen posixpath>"
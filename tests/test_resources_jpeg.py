@@ -0,0 +1,96 @@
+import io
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from kfxlib import resources
+from kfxlib.resources import (
+    JPEG_SIZE_TOLERANCE_PERCENTAGE, MAX_JPEG_QUALITY, MIN_JPEG_QUALITY, optimize_jpeg_image_quality)
+
+
+def drawn_image(seed, mode="RGB"):
+    rng = random.Random(seed)
+    img = Image.new("RGB", (240, 320), "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y, r = rng.randint(0, 240), rng.randint(0, 320), rng.randint(5, 60)
+        fill = tuple(rng.randint(0, 255) for _ in range(3))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=fill, outline="black", width=2)
+    return Image.blend(img, Image.effect_noise(img.size, 20).convert("RGB"), 0.1).convert(mode)
+
+
+def encode(img, quality):
+    outfile = io.BytesIO()
+    img.save(outfile, "JPEG", quality=quality, optimize=True)
+    return outfile.getvalue()
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L"])
+def test_quality_is_closest_to_desired_size(mode):
+    """Test the chosen quality gives the size closest to the target, or one within the tolerance"""
+    img = drawn_image(0, mode)
+    sizes = {quality: len(encode(img, quality)) for quality in range(MIN_JPEG_QUALITY, MAX_JPEG_QUALITY + 1)}
+    rng = random.Random(1)
+
+    for _ in range(10):
+        desired_size = int(sizes[rng.randint(MIN_JPEG_QUALITY, MAX_JPEG_QUALITY)] * rng.uniform(0.8, 1.2))
+        raw_media, quality = optimize_jpeg_image_quality(img, desired_size)
+
+        assert raw_media == encode(img, quality)
+        size_diff = abs(len(raw_media) - desired_size)
+        assert (size_diff == min(abs(size - desired_size) for size in sizes.values()) or
+                size_diff * 100 <= desired_size * JPEG_SIZE_TOLERANCE_PERCENTAGE)
+
+
+def test_quality_is_limited_to_range():
+    """Test targets beyond the sizes possible give the lowest or highest allowed quality"""
+    img = drawn_image(1)
+    assert optimize_jpeg_image_quality(img, 1)[1] == MIN_JPEG_QUALITY
+    assert optimize_jpeg_image_quality(img, 10 ** 9)[1] == MAX_JPEG_QUALITY
+
+
+def test_search_uses_few_optimized_encodes(monkeypatch):
+    """Test probes are unoptimized and at most two optimized encodes bracket a well modelled target"""
+    img = drawn_image(2)
+    desired_size = (len(encode(img, 94)) + len(encode(img, 95))) // 2
+    encodes = []
+    original_save = Image.Image.save
+
+    def counting_save(self, fp, format=None, **params):
+        encodes.append(params["optimize"])
+        return original_save(self, fp, format, **params)
+
+    monkeypatch.setattr(Image.Image, "save", counting_save)
+    optimize_jpeg_image_quality(img, desired_size)
+
+    assert encodes[0] is False
+    assert 1 <= encodes.count(True) <= 2
+
+
+@pytest.mark.parametrize("optimized_size_ratio", [20, 0.05])
+def test_search_is_bounded_when_probes_mislead(monkeypatch, optimized_size_ratio):
+    """Test a target far from the probe prediction is bisected in a few optimized encodes"""
+    img = drawn_image(3)
+    sizes = {quality: len(encode(img, quality)) for quality in range(MIN_JPEG_QUALITY, MAX_JPEG_QUALITY + 1)}
+    monkeypatch.setattr(resources, "JPEG_OPTIMIZED_SIZE_RATIO", optimized_size_ratio)
+    encodes = []
+    original_save = Image.Image.save
+
+    def counting_save(self, fp, format=None, **params):
+        encodes.append(params["optimize"])
+        return original_save(self, fp, format, **params)
+
+    monkeypatch.setattr(Image.Image, "save", counting_save)
+
+    for desired_quality, desired_size in sizes.items():
+        encodes.clear()
+        assert optimize_jpeg_image_quality(img, desired_size)[1] == desired_quality
+        assert encodes.count(True) <= 6
+
+
+def test_empty_desired_size_gives_lowest_quality():
+    """Test a zero or negative target gives the lowest allowed quality without fitting the size model"""
+    img = drawn_image(4)
+    assert optimize_jpeg_image_quality(img, 0)[1] == MIN_JPEG_QUALITY
+    assert optimize_jpeg_image_quality(img, -1)[1] == MIN_JPEG_QUALITY
@@ -0,0 +1,139 @@
+import glob
+import logging
+import os
+
+import pytest
+
+from kfxlib.message_logging import JobLog, set_logger
+from kfxlib.resources import JXRConversions, convert_jxr_to_jpeg_or_png
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "jxr")
+
+
+# 16 bit grayscale decodes to mode I;16, which cannot be saved as JPEG
+UNCONVERTIBLE_FIXTURE = "gray16_lossy.jxr"
+
+
+def read_fixture(filename):
+    with open(os.path.join(FIXTURE_DIR, filename), "rb") as f:
+        return f.read()
+
+
+def read_fixtures():
+    fixtures = []
+    for filepath in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.jxr"))):
+        filename = os.path.basename(filepath)
+        if filename != UNCONVERTIBLE_FIXTURE:
+            fixtures.append((filename, read_fixture(filename)))
+    return fixtures
+
+
+def test_convert_reuses_result_for_same_content():
+    """Test an image referenced under several names is converted only once"""
+    name, data = read_fixtures()[0]
+    jxr_conversions = JXRConversions(processes=1)
+
+    first = jxr_conversions.convert(data, name)
+    second = jxr_conversions.convert(bytes(data), "other-" + name)
+
+    assert second is first
+    assert len(jxr_conversions.converted) == 1
+    assert first == convert_jxr_to_jpeg_or_png(data, name)
+
+
+def test_prefetch_in_processes_matches_serial_conversion():
+    """Test images converted by the process pool are identical to converting each one in turn"""
+    fixtures = read_fixtures()
+    jxr_conversions = JXRConversions(processes=2)
+
+    jxr_conversions.prefetch(fixtures + [("copy-" + name, data) for name, data in fixtures])
+
+    assert len(jxr_conversions.converted) == len(fixtures)
+    for name, data in fixtures:
+        assert jxr_conversions.convert(data, name) == convert_jxr_to_jpeg_or_png(data, name)
+    assert len(jxr_conversions.converted) == len(fixtures)
+
+
+def test_prefetched_results_released_after_use():
+    """Test without retain a prefetched result is dropped once every resource prefetched with it has used it"""
+    fixtures = read_fixtures()[:3]
+    name, data = fixtures[0]
+    jxr_conversions = JXRConversions(processes=2, retain=False)
+
+    jxr_conversions.prefetch(fixtures + [("copy-" + name, data)])
+    assert len(jxr_conversions.converted) == 3
+
+    first = jxr_conversions.convert(data, name)
+    assert jxr_conversions.convert(data, "copy-" + name) is first
+    assert len(jxr_conversions.converted) == 2
+
+    for other_name, other_data in fixtures[1:]:
+        assert jxr_conversions.convert(other_data, other_name) == convert_jxr_to_jpeg_or_png(other_data, other_name)
+    assert jxr_conversions.converted == {}
+
+
+def test_prefetch_with_one_process_converts_on_demand():
+    """Test prefetch leaves conversion to convert() when there is nothing to run in parallel"""
+    jxr_conversions = JXRConversions(processes=1)
+
+    jxr_conversions.prefetch(read_fixtures())
+
+    assert jxr_conversions.converted == {}
+
+
+def test_prefetch_reports_worker_errors():
+    """Test errors logged while converting in a worker process are logged by the caller"""
+    name, data = read_fixtures()[0]
+    job_log = set_logger(JobLog(logging.getLogger(__name__)))
+    try:
+        jxr_conversions = JXRConversions(processes=2)
+        jxr_conversions.prefetch([(name, data), ("bad.jxr", b"not a JPEG-XR image")])
+    finally:
+        set_logger()
+
+    assert len(jxr_conversions.converted) == 2
+    assert len(job_log.errors) == 1
+    assert "bad.jxr" in job_log.errors[0]
+    assert jxr_conversions.convert(b"not a JPEG-XR image", "bad.jxr") == (b"not a JPEG-XR image", "$548")
+
+
+def test_prefetch_leaves_failed_conversions_to_convert():
+    """Test an exception in a worker does not lose the other results and is raised by convert()"""
+    fixtures = read_fixtures()[:2]
+    data = read_fixture(UNCONVERTIBLE_FIXTURE)
+    jxr_conversions = JXRConversions(processes=2)
+
+    jxr_conversions.prefetch(fixtures + [(UNCONVERTIBLE_FIXTURE, data)])
+
+    assert len(jxr_conversions.converted) == 2
+    with pytest.raises(OSError):
+        jxr_conversions.convert(data, UNCONVERTIBLE_FIXTURE)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_iter_convert_in_order(processes):
+    """Test images converted while iterating come back in order, identical to converting each one in turn"""
+    fixtures = read_fixtures()
+    resources = fixtures + [("copy-" + name, data) for name, data in fixtures[:3]]
+    jxr_conversions = JXRConversions(processes=processes, retain=False)
+
+    results = list(jxr_conversions.iter_convert(resources))
+
+    assert results == [convert_jxr_to_jpeg_or_png(data, name) for name, data in resources]
+    assert jxr_conversions.converted == {}
+
+
+def test_iter_convert_raises_failed_conversion_in_place():
+    """Test a conversion that fails in a worker raises when its result is reached, after the earlier results"""
+    fixtures = read_fixtures()[:2]
+    data = read_fixture(UNCONVERTIBLE_FIXTURE)
+    jxr_conversions = JXRConversions(processes=2)
+
+    results = jxr_conversions.iter_convert(fixtures + [(UNCONVERTIBLE_FIXTURE, data)] + fixtures)
+
+    assert next(results) == convert_jxr_to_jpeg_or_png(fixtures[0][1], fixtures[0][0])
+    assert next(results) == convert_jxr_to_jpeg_or_png(fixtures[1][1], fixtures[1][0])
+    with pytest.raises(OSError):
+        next(results)
+    assert len(jxr_conversions.converted) == 2
@@ -0,0 +1,74 @@
+import io
+
+import pymupdf
+import pytest
+from PIL import Image
+
+from kfxlib import resources
+from kfxlib.resources import PdfRasterizer, convert_pdf_pages_to_jpeg, convert_pdf_to_jpeg
+
+
+PAGE_COLORS = [(1, 0, 0), (0, 1, 0), (0, 0, 1)]
+
+
+def make_pdf():
+    doc = pymupdf.open()
+    for color in PAGE_COLORS:
+        page = doc.new_page(width=288, height=432)
+        page.draw_rect(pymupdf.Rect(36, 36, 252, 396), color=color, fill=color)
+    return doc.tobytes()
+
+
+def center_color(jpeg_data):
+    img = Image.open(io.BytesIO(jpeg_data))
+    return img.getpixel((img.width // 2, img.height // 2))
+
+
+def test_page_is_rendered_to_jpeg():
+    """Test a PDF page is rendered at the requested resolution without leaving the process"""
+    pdf_data = make_pdf()
+    jpeg_data = convert_pdf_to_jpeg(pdf_data, 2)
+
+    img = Image.open(io.BytesIO(jpeg_data))
+    assert (img.format, img.mode, img.size) == ("JPEG", "RGB", (600, 900))
+    r, g, b = center_color(jpeg_data)
+    assert g > 200 and r < 50 and b < 50
+
+    assert Image.open(io.BytesIO(convert_pdf_to_jpeg(pdf_data, 1, dpi=72))).size == (288, 432)
+
+
+def test_batch_opens_pdf_once(monkeypatch):
+    """Test converting several pages opens the document once and matches single page conversion"""
+    pdf_data = make_pdf()
+    opened = []
+    original_open = pymupdf.open
+
+    def counting_open(*args, **kwargs):
+        opened.append(args)
+        return original_open(*args, **kwargs)
+
+    monkeypatch.setattr(resources.pymupdf, "open", counting_open)
+    pages = convert_pdf_pages_to_jpeg(pdf_data, [3, 1, 2])
+
+    assert len(opened) == 1
+    assert pages == [convert_pdf_to_jpeg(pdf_data, page_num) for page_num in [3, 1, 2]]
+
+
+def test_rasterizer_keeps_documents_until_closed():
+    """Test a rasterizer reuses the open document for the same media and closes it when done"""
+    pdf_data = make_pdf()
+    with PdfRasterizer() as pdf_rasterizer:
+        doc = pdf_rasterizer.open(pdf_data)
+        assert pdf_rasterizer.open(pdf_data) is doc
+
+        convert_pdf_to_jpeg(pdf_data, 1, pdf_rasterizer=pdf_rasterizer)
+        assert len(pdf_rasterizer.documents) == 1
+
+    assert pdf_rasterizer.documents == {}
+    assert doc.is_closed
+
+
+def test_missing_page_is_an_error():
+    """Test asking for a page beyond the end of the PDF raises an exception"""
+    with pytest.raises(Exception, match="page 4 does not exist"):
+        convert_pdf_to_jpeg(make_pdf(), 4)
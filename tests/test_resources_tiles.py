@@ -0,0 +1,88 @@
+import io
+import logging
+
+from PIL import Image, ImageDraw
+
+from kfxlib.message_logging import JobLog, set_logger
+from kfxlib.resources import combine_image_tiles
+
+
+TILE_SIZE = 32
+PADDING = 2
+
+
+def drawn_image(mode, width=100, height=70):
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for i in range(0, width, 7):
+        draw.line((i, 0, width - i, height), fill=(i * 2, 255 - i * 2, i), width=2)
+    return img.convert(mode)
+
+
+def cut_tiles(img, tile_modes=None):
+    width, height = img.size
+    yj_tiles = []
+    tiles_raw_media = []
+    for y in range((height + TILE_SIZE - 1) // TILE_SIZE):
+        row = []
+        for x in range((width + TILE_SIZE - 1) // TILE_SIZE):
+            box = (
+                max(x * TILE_SIZE - PADDING, 0), max(y * TILE_SIZE - PADDING, 0),
+                min((x + 1) * TILE_SIZE + PADDING, width), min((y + 1) * TILE_SIZE + PADDING, height))
+            tile = img.crop(box)
+            if tile_modes is not None:
+                tile = tile.convert(tile_modes.get((x, y), tile.mode))
+
+            outfile = io.BytesIO()
+            tile.save(outfile, "PNG")
+            row.append("img-tile%d-%d" % (y, x))
+            tiles_raw_media.append(outfile.getvalue())
+        yj_tiles.append(row)
+
+    return yj_tiles, tiles_raw_media
+
+
+def combine(img, yj_tiles, tiles_raw_media, ignore_variants=False):
+    width, height = img.size
+    return combine_image_tiles(
+        "img", height, width, "$284", TILE_SIZE, TILE_SIZE, PADDING, yj_tiles, tiles_raw_media, ignore_variants)
+
+
+def test_combined_tiles_match_image():
+    """Test padded tiles are cropped and placed to rebuild the original image"""
+    img = drawn_image("RGB")
+    raw_media, resource_format = combine(img, *cut_tiles(img))
+
+    assert resource_format == "$284"
+    assert Image.open(io.BytesIO(raw_media)).tobytes() == img.tobytes()
+
+
+def test_combined_mode_from_tile_headers():
+    """Test the full image takes the widest color mode of any tile and keeps opacity"""
+    img = drawn_image("RGBA")
+    yj_tiles, tiles_raw_media = cut_tiles(img, {(0, 0): "LA", (1, 1): "L"})
+    combined = Image.open(io.BytesIO(combine(img, yj_tiles, tiles_raw_media)[0]))
+
+    assert combined.mode == "RGBA"
+    assert combined.crop((TILE_SIZE * 2, 0, TILE_SIZE * 3, TILE_SIZE)).tobytes() == img.crop(
+        (TILE_SIZE * 2, 0, TILE_SIZE * 3, TILE_SIZE)).tobytes()
+
+
+def test_missing_tiles():
+    """Test missing tiles are reported and leave a gap, or fail a variant"""
+    img = drawn_image("L")
+    yj_tiles, tiles_raw_media = cut_tiles(img)
+    tiles_raw_media[1] = None
+
+    job_log = set_logger(JobLog(logging.getLogger(__name__)))
+    try:
+        raw_media = combine(img, yj_tiles, tiles_raw_media)[0]
+        assert combine(img, yj_tiles, tiles_raw_media, ignore_variants=True) == (None, None)
+    finally:
+        set_logger()
+
+    assert len(job_log.errors) == 2
+    assert "missing tiles: [(1, 0)]" in job_log.errors[0]
+    combined = Image.open(io.BytesIO(raw_media))
+    assert set(combined.crop((TILE_SIZE, 0, TILE_SIZE * 2, TILE_SIZE)).getdata()) == {0}
+    assert combined.crop((0, TILE_SIZE, 100, 70)).tobytes() == img.crop((0, TILE_SIZE, 100, 70)).tobytes()